@@ -0,0 +1,73 @@
+"""
+import_time.py
+Benchmark (and guard) for how long `import ntfslink` takes.
+
+Every run is a fresh interpreter, since only the first import costs anything. Besides the timings, it checks that a
+bare `import ntfslink` hasn't started pulling in the rest of the package (or ctypes, multiprocessing, etc) again, and
+exits with a non-zero status if it has, or if the median goes over --budget milliseconds.
+
+	python contrib/import_time.py
+	python contrib/import_time.py --runs 50 --budget 15 --module ntfslink.junctions
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+from __future__ import print_function
+import argparse, json, os, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nothing on this list should be imported by a bare `import ntfslink`.
+DEFERRED = ['ctypes', 'multiprocessing', 'uuid', 'ntfslink.common', 'ntfslink.internals']
+
+_PROBE = """
+import sys, time
+sys.path.insert(0, %(root)r)
+start = time.time()
+import %(module)s
+elapsed = time.time() - start
+import json
+print(json.dumps({'elapsed': elapsed, 'loaded': [name for name in %(deferred)r if name in sys.modules]}))
+"""
+
+def measure(module, runs):
+	""" Import module in runs fresh interpreters. Returns the times it took, in ms, and the deferred modules it loaded. """
+	code = _PROBE % {'root': ROOT, 'module': module, 'deferred': DEFERRED}
+	times = []
+	loaded = set()
+	for _ in range(runs):
+		result = json.loads(subprocess.check_output([sys.executable, '-c', code]).decode('ascii'))
+		times.append(result['elapsed'] * 1000)
+		loaded.update(result['loaded'])
+	return sorted(times), loaded
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+	parser.add_argument('--runs', type = int, default = 20, help = 'fresh interpreters to time (default: 20)')
+	parser.add_argument('--budget', type = float, default = 10.0, help = 'most the median may take, in ms (default: 10)')
+	parser.add_argument('--module', default = 'ntfslink', help = 'module to import (default: ntfslink)')
+	args = parser.parse_args(argv)
+
+	# The first run pays for writing the bytecode caches, and doesn't count.
+	measure(args.module, 1)
+	times, loaded = measure(args.module, args.runs)
+	median = times[len(times) // 2]
+	print('import %s: median %.2fms, min %.2fms, max %.2fms over %d runs' % (
+		args.module, median, times[0], times[-1], len(times)
+	))
+
+	failed = False
+	# Before Python 3.7, there's no module __getattr__ to put anything off with.
+	if args.module == 'ntfslink' and loaded and sys.version_info >= (3, 7):
+		print('FAIL: import ntfslink loaded %s' % ', '.join(sorted(loaded)))
+		failed = True
+	if median > args.budget:
+		print('FAIL: median is over the %.2fms budget' % args.budget)
+		failed = True
+	return 1 if failed else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
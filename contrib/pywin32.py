@@ -162,9 +162,9 @@ def example():
 	from os import system, unlink
 	system('cmd.exe /c echo Hello World > test.txt')
 	system('mklink test-link.txt test.txt')
-	print 'IsLink: %s' % islink('test-link.txt')
-	print 'ReadLink: %s' % readlink('test-link.txt')
-	print 'RealPath: %s' % realpath('test-link.txt')
+	print('IsLink: %s' % islink('test-link.txt'))
+	print('ReadLink: %s' % readlink('test-link.txt'))
+	print('RealPath: %s' % realpath('test-link.txt'))
 	unlink('test-link.txt')
 	unlink('test.txt')
 
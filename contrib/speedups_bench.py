@@ -0,0 +1,158 @@
+"""
+speedups_bench.py
+Parity check and benchmark for the optional C accelerator. (ntfslink/ext/speedups.c)
+
+Build it in place first:
+
+	python setup.py build_ext --inplace
+	python contrib/speedups_bench.py
+
+Every accelerated function is run against the same inputs (valid buffers of every shape, along with truncated and
+otherwise broken ones) with the accelerator on and off, and has to come back with identical results, or identical
+exceptions. Any mismatch fails the run with a non-zero exit status before anything is timed.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+from __future__ import print_function
+import os, random, sys, timeit
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ntfslink.internals import _reparse
+from ntfslink.internals._reparse import *
+
+try:
+	unichr
+except NameError:
+	unichr = chr
+
+def _random_name(rng, length):
+	""" A random path, mixing ASCII, the BMP and characters that need surrogate pairs. """
+	chars = []
+	for _ in range(length):
+		pick = rng.random()
+		if pick < 0.8:
+			chars.append(rng.choice(u'abcdefghijklmnopqrstuvwxyz0123456789\\. '))
+		elif pick < 0.95:
+			chars.append(unichr(rng.randint(0x100, 0xD7FF)))
+		else:
+			chars.append(u'\U0001F4C1')
+	return u'\\??\\C:\\' + u''.join(chars)
+
+def corpus(count = 2000, seed = 0x5EED):
+	""" ReparseData records, along with their encoded buffers. """
+	rng = random.Random(seed)
+	records = []
+	for i in range(count):
+		name = _random_name(rng, rng.randint(0, 120))
+		if i % 2:
+			records.append(ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, name, name[4:]))
+		else:
+			flags = SYMBOLIC_LINK_FLAG_RELATIVE if i % 3 == 0 else 0
+			records.append(ReparseData(IO_REPARSE_TAG_SYMBOLIC_LINK, flags, name, name[4:]))
+	return records, [bytes(EncodeReparseBuffer(record)) for record in records]
+
+def broken(buffers, seed = 0xBAD):
+	""" Truncated buffers, and buffers whose name offsets and lengths point anywhere at all. """
+	rng = random.Random(seed)
+	results = []
+	for buf in buffers[:300]:
+		results.append(buf[:rng.randint(0, len(buf))])
+		mangled = bytearray(buf)
+		at = rng.randint(REPARSE_POINT_HEADER_SIZE, REPARSE_POINT_HEADER_SIZE + 7)
+		mangled[at] = rng.randint(0, 255)
+		results.append(bytes(mangled))
+	return results
+
+def _outcome(func, *args):
+	try:
+		result = func(*args)
+	except InvalidReparseBufferException as e:
+		return ('raised', type(e), str(e))
+	except Exception as e:
+		# Whatever Python itself raises (TypeError, UnicodeDecodeError, etc) is worded differently from C.
+		return ('raised', type(e))
+	return ('returned', type(result), result)
+
+def _both(func, *args):
+	_reparse.UseSpeedups(False)
+	python = _outcome(func, *args)
+	_reparse.UseSpeedups(True)
+	return python, _outcome(func, *args)
+
+def check_parity(records, buffers):
+	""" Returns a list of (what, pure-Python outcome, accelerated outcome) for every mismatch. """
+	mismatches = []
+	def compare(what, func, *args):
+		python, native = _both(func, *args)
+		if python != native:
+			mismatches.append((what, python, native))
+
+	for buf in buffers + broken(buffers):
+		compare('DecodeReparseBuffer(%r)' % buf[:24], DecodeReparseBuffer, buf)
+		compare('DecodeReparsePoint(%r)' % buf[:24], DecodeReparsePoint, buf)
+	for record in records[:500]:
+		compare('EncodeReparseBuffer(%r)' % (record,), lambda r: bytes(EncodeReparseBuffer(r)), record)
+	compare('EncodeReparseBuffers', lambda r: (bytes(EncodeReparseBuffers(r)[0]), EncodeReparseBuffers(r)[1]), records)
+	compare('EncodeReparseBuffer(too long)', EncodeReparseBuffer,
+		ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, u'x' * MAX_REPARSE_BUFFER, u''))
+	compare('EncodeReparseBuffer(bad tag)', EncodeReparseBuffer, ReparseData(IO_REPARSE_TAG_SIS, 0, u'x', u'x'))
+
+	rng = random.Random(0x7A65)
+	known = [0, IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK, IO_REPARSE_TAG_LX_SYMLINK,
+	         IO_REPARSE_TAG_WCI_LINK, IO_REPARSE_TAG_APPEXECLINK, IO_REPARSE_TAG_WOF, IO_REPARSE_TAG_CLOUD]
+	tags = [rng.choice(known) if rng.random() < 0.8 else rng.randint(0, 0xFFFFFFFF) for _ in range(5000)]
+	for typecode in 'ILQ':
+		compare('ClassifyReparseTags(array(%r))' % typecode, ClassifyReparseTags, array(typecode, tags))
+	compare('ClassifyReparseTags(list)', ClassifyReparseTags, tags)
+	compare('ClassifyReparseTags(generator)', lambda t: ClassifyReparseTags(tag for tag in t), tags)
+	compare('ClassifyReparseTags(bad item)', ClassifyReparseTags, [0, None])
+	# Too wide to be tags, though the low 32 bits of most are.
+	wide = [(1 << 32) | tag for tag in known] + [(1 << 64) | tag for tag in known] + [-1]
+	compare('ClassifyReparseTags(wide)', ClassifyReparseTags, wide)
+	compare('ClassifyReparseTags(array(Q, wide))', ClassifyReparseTags, array('Q', wide[:len(known)]))
+	return mismatches
+
+def benchmark(records, buffers, repeat = 5):
+	""" Time the hot paths with the accelerator off and on. Returns [(name, python seconds, accelerated seconds)]. """
+	tags = array('L', [IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK, 0, IO_REPARSE_TAG_WOF] * 25000)
+	cases = [
+		('DecodeReparseBuffer x%d' % len(buffers), lambda: [DecodeReparseBuffer(buf) for buf in buffers]),
+		('DecodeReparsePoint x%d' % len(buffers), lambda: [DecodeReparsePoint(buf) for buf in buffers]),
+		('EncodeReparseBuffer x%d' % len(records), lambda: [EncodeReparseBuffer(record) for record in records]),
+		('EncodeReparseBuffers x%d' % len(records), lambda: EncodeReparseBuffers(records)),
+		('ClassifyReparseTags x%d' % len(tags), lambda: ClassifyReparseTags(tags)),
+	]
+	results = []
+	for name, func in cases:
+		timings = []
+		for enabled in (False, True):
+			_reparse.UseSpeedups(enabled)
+			timings.append(min(timeit.repeat(func, number = 1, repeat = repeat)))
+		results.append((name, timings[0], timings[1]))
+	_reparse.UseSpeedups(True)
+	return results
+
+def main():
+	if not _reparse.UseSpeedups(True):
+		print('The C accelerator is not built. (python setup.py build_ext --inplace)')
+		return 1
+	records, buffers = corpus()
+	mismatches = check_parity(records, buffers)
+	for what, python, native in mismatches[:20]:
+		print('MISMATCH: %s\n  python: %r\n  native: %r' % (what, python, native))
+	if mismatches:
+		print('FAIL: %d mismatches' % len(mismatches))
+		return 1
+	print('parity: ok')
+
+	for name, python, native in benchmark(records, buffers):
+		print('%-28s python %8.2fms   native %8.2fms   %5.1fx' % (name, python * 1000, native * 1000, python / native))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
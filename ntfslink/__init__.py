@@ -3,24 +3,78 @@
 __init__.py
 ntfslink Package
 
+Nothing below is imported until it's first used, so that `import ntfslink` stays cheap for short-lived processes.
+(Python 3.7 and up. Older versions import everything up front.)
+
 This program is free software. It comes without any warranty, to
 the extent permitted by applicable law. You can redistribute it
 and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
+import sys as _sys
+from importlib import import_module as _import_module
+
+_SUBMODULES = frozenset([
+	'junctions', 'supports', 'symlinks', 'hardlinks', 'cyglinks', 'image', 'scanner', 'resolver', 'cache', 'copier',
+	'aio',
+])
 
-from . import junctions, supports, symlinks, hardlinks, cyglinks
-from .common import passthru
+# Everything else, by the module it comes from.
+_ATTRIBUTES = {
+	'passthru': 'common', 'LinkSession': 'common', 'BatchResult': 'common', 'iter_many': 'common', 'run_many': 'common',
+	'scan': 'scanner', 'ScanEntry': 'scanner',
+	'resolve': 'resolver', 'resolve_many': 'resolver', 'Resolver': 'resolver', 'invalidate': 'resolver',
+	'LinkCache': 'cache', 'DirectoryWatcher': 'cache',
+	'copytree': 'copier', 'CopyTreeException': 'copier',
+	'GetBackend': 'internals', 'SetBackend': 'internals', 'PosixBackend': 'internals',
+	'SimulatedBackend': 'internals', 'LatencyModel': 'internals', 'privileges': 'internals',
+}
 
-cyglink =  passthru('CygLink', cyglinks)
-symlink =  passthru('SymLink', symlinks)
-junction = passthru('Junction', symlinks)
+# The PassThru instances, by (class name, module).
+_PASSTHRUS = {
+	'cyglink': ('CygLink', 'cyglinks'),
+	'symlink': ('SymLink', 'symlinks'),
+	'junction': ('Junction', 'junctions'),
+}
 
 __all__ = [
 	'junctions', 'junction',
 	'symlinks',  'symlink',
 	'cyglinks',  'cyglink',
 	'hardlinks',
-	'supports'
+	'supports',
+	'image',
+	'scanner', 'scan', 'ScanEntry',
+	'resolver', 'resolve', 'resolve_many', 'Resolver', 'invalidate',
+	'cache', 'LinkCache', 'DirectoryWatcher',
+	'copier', 'copytree', 'CopyTreeException',
+	'aio',
+	'LinkSession', 'privileges',
+	'BatchResult', 'iter_many', 'run_many',
+	'GetBackend', 'SetBackend', 'PosixBackend', 'SimulatedBackend', 'LatencyModel'
 ]
+
+def __getattr__(name):
+	if name in _SUBMODULES:
+		value = _import_module('.' + name, __name__)
+	elif name in _ATTRIBUTES:
+		value = getattr(_import_module('.' + _ATTRIBUTES[name], __name__), name)
+	elif name in _PASSTHRUS:
+		cls, modname = _PASSTHRUS[name]
+		value = __getattr__('passthru')(cls, __getattr__(modname))
+	else:
+		raise AttributeError('module %r has no attribute %r' % (__name__, name))
+	# Only looked up once: from now on, it's an ordinary module attribute.
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(__all__))
+
+if _sys.version_info < (3, 7):
+	# aio needs 3.7 itself.
+	__all__.remove('aio')
+	for _name in __all__:
+		__getattr__(_name)
+	del _name
@@ -0,0 +1,371 @@
+# encoding: utf-8
+"""
+__main__.py
+Command line interface, for working through lots of links from a single process. (python -m ntfslink --help)
+
+Paths are taken from the command line, from the files given with --from (one per line, or srcpath<TAB>linkpath for
+create), or from stdin when there are neither. --jobs threads work through them, and each result is written to stdout
+as a line of JSON as soon as it's done:
+
+	dir /b /s /a:l C:\\Build | python -m ntfslink read --jobs 32 --stats > links.jsonl
+
+Every line has the position of its input in "index", its "path", "ok", the time it took in "elapsed_ms", and either
+the result or an "error". Unless --ordered is given, lines come out in the order they finish in. The exit status is 1
+if anything failed.
+
+apply-manifest reads JSON Lines (or a single JSON array) of the links that should exist,
+
+	{"type": "junction", "path": "C:\\\\Site\\\\current", "target": "C:\\\\Site\\\\releases\\\\42"}
+
+and creates the ones that are missing. Entries with "state": "absent" are removed instead, and links that point
+somewhere else are only replaced with --replace. The entries are applied in parallel like everything else, so a link
+can't rely on another entry of the same manifest having been applied first.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+from __future__ import print_function
+import argparse, errno, io, json, math, sys
+from collections import namedtuple
+from timeit import default_timer
+from .common import *
+from . import junctions, symlinks, hardlinks, cyglinks
+from .scanner import scan
+
+# Link modules, by the name of their type on the command line and in manifests.
+LINK_TYPES = {
+	'junction': junctions,
+	'symlink': symlinks,
+	'hardlink': hardlinks,
+	'cyglink': cyglinks,
+}
+
+# What's reported as the type of each reparse tag. Anything else is just a 'reparse-point'.
+TAG_TYPES = {
+	IO_REPARSE_TAG_MOUNT_POINT: 'junction',
+	IO_REPARSE_TAG_SYMBOLIC_LINK: 'symlink',
+	IO_REPARSE_TAG_LX_SYMLINK: 'lx-symlink',
+	IO_REPARSE_TAG_APPEXECLINK: 'appexeclink',
+}
+
+# Percentiles of the latencies reported by --stats.
+STATS_PERCENTILES = (50, 90, 99)
+
+# A directory scan couldn't list, with the error code it got.
+ScanError = namedtuple('ScanError', 'path code')
+
+# A manifest that couldn't be parsed at all, with what was wrong with it.
+ManifestError = namedtuple('ManifestError', 'path error')
+
+def _read_any(fpath):
+	""" Decode whatever reparse point is at fpath. """
+	reparse = read_reparse_point(fpath, IsReparsePoint, DecodeReparsePoint)
+	if reparse is None:
+		raise WinError(GetBackend().GetLastError())
+	return reparse
+
+def _create(linktype, srcpath, linkpath):
+	""" Create a link, raising WinError instead of returning False. """
+	if not LINK_TYPES[linktype].create(srcpath, linkpath):
+		raise WinError(GetBackend().GetLastError())
+
+def _same_target(linktype, linkpath, srcpath):
+	""" Checks whether the existing link at linkpath already leads to srcpath. """
+	if linktype == 'hardlink':
+		return IsFile(srcpath) and hardlinks.identity(linkpath) == hardlinks.identity(srcpath)
+	current = LINK_TYPES[linktype].read(linkpath)
+	if current is None or current == srcpath:
+		return current is not None
+	# Relative symbolic links are relative to the link, and have to be taken as they are.
+	pathmod = GetBackend().path
+	if linktype != 'junction' and not (pathmod.isabs(current) and pathmod.isabs(srcpath)):
+		return False
+	return pathmod.normcase(GetFullPathName(current)) == pathmod.normcase(GetFullPathName(srcpath))
+
+def create_link(args, item):
+	if len(item) != 2:
+		raise ValueError('Expected srcpath<TAB>linkpath, got: %r' % '\t'.join(item))
+	_create(args.type, item[0], item[1])
+	return {'type': args.type, 'target': item[0]}
+
+def check_link(args, fpath):
+	if args.type != 'any':
+		return {'type': args.type if LINK_TYPES[args.type].check(fpath) else None}
+	if not IsReparsePoint(fpath):
+		return {'type': None}
+	return {'type': TAG_TYPES.get(_read_any(fpath).tag, 'reparse-point')}
+
+def read_link(args, fpath):
+	if args.type == 'hardlink':
+		return {'type': 'hardlink', 'links': hardlinks.read(fpath)}
+	if args.type != 'any':
+		target = LINK_TYPES[args.type].read(fpath)
+		if target is None:
+			raise WinError(GetBackend().GetLastError())
+		return {'type': args.type, 'target': target}
+	reparse = _read_any(fpath)
+	return {'type': TAG_TYPES.get(reparse.tag, 'reparse-point'), 'target': ReparseTarget(reparse)}
+
+def unlink_link(args, fpath):
+	linktype = args.type
+	if linktype == 'any':
+		if not IsReparsePoint(fpath):
+			raise InvalidLinkException('%s is not a reparse point.' % fpath)
+		linktype = TAG_TYPES.get(_read_any(fpath).tag)
+		if linktype not in LINK_TYPES:
+			raise InvalidLinkException('%s is not a junction or symbolic link.' % fpath)
+	LINK_TYPES[linktype].unlink(fpath)
+	return {'type': linktype}
+
+def scan_entry(args, entry):
+	if isinstance(entry, ScanError):
+		raise WinError(entry.code)
+	if entry.is_reparse_point:
+		linktype = TAG_TYPES.get(entry.reparse_tag, 'reparse-point')
+	else:
+		linktype = 'directory' if entry.is_dir else 'file'
+	record = {'type': linktype, 'depth': entry.depth}
+	if entry.is_reparse_point and not args.no_targets:
+		record['target'] = entry.target
+	return record
+
+def apply_entry(args, entry):
+	if isinstance(entry, ManifestError):
+		raise ValueError(entry.error)
+	if not isinstance(entry, dict):
+		raise ValueError('Not a manifest entry: %r' % (entry,))
+	linktype, linkpath, srcpath = entry.get('type'), entry.get('path'), entry.get('target')
+	state = entry.get('state', 'present')
+	if linktype not in LINK_TYPES:
+		raise ValueError('Unknown link type: %r' % (linktype,))
+	if not linkpath:
+		raise ValueError('Manifest entry has no path.')
+	module = LINK_TYPES[linktype]
+
+	if state == 'absent':
+		if not module.check(linkpath):
+			return {'type': linktype, 'action': 'none'}
+		module.unlink(linkpath)
+		return {'type': linktype, 'action': 'removed'}
+	if state != 'present':
+		raise ValueError('Unknown state: %r' % (state,))
+	if not srcpath:
+		raise ValueError('Manifest entry has no target.')
+
+	action = 'created'
+	if PathExists(linkpath):
+		if not module.check(linkpath):
+			raise InvalidSourceException('%s already exists, and is not a %s.' % (linkpath, linktype))
+		if _same_target(linktype, linkpath, srcpath):
+			return {'type': linktype, 'target': srcpath, 'action': 'none'}
+		if not args.replace:
+			raise InvalidSourceException('%s already exists, and leads somewhere else.' % linkpath)
+		module.unlink(linkpath)
+		action = 'replaced'
+	_create(linktype, srcpath, linkpath)
+	return {'type': linktype, 'target': srcpath, 'action': action}
+
+def _read_lines(paths, sources):
+	""" Every path in paths, followed by every non-blank line of the files in sources, without their line endings. """
+	for fpath in paths:
+		yield fpath
+	for source in sources:
+		stream = sys.stdin if source == '-' else io.open(source, encoding = 'utf-8')
+		try:
+			for line in stream:
+				line = line.rstrip('\r\n')
+				if line.strip():
+					yield line
+		finally:
+			if stream is not sys.stdin:
+				stream.close()
+
+def _sources(args):
+	""" The files given with --from, or stdin when nothing was given at all. """
+	if args.sources:
+		return args.sources
+	return [] if args.paths else ['-']
+
+def path_items(args):
+	return _read_lines(args.paths, _sources(args))
+
+def pair_items(args):
+	for i in range(0, len(args.paths), 2):
+		yield tuple(args.paths[i:i + 2])
+	for line in _read_lines([], _sources(args)):
+		yield tuple(line.split('\t'))
+
+def scan_items(args):
+	errors = []
+	onerror = lambda dirpath, code: errors.append(ScanError(dirpath, code))
+	for root in path_items(args):
+		for entry in scan(root, args.follow_junctions, args.follow_symlinks, args.max_depth, onerror = onerror):
+			while errors:
+				yield errors.pop(0)
+			if args.all or entry.is_reparse_point:
+				yield entry
+		while errors:
+			yield errors.pop(0)
+
+def manifest_items(args):
+	for source in args.manifests or ['-']:
+		stream = sys.stdin if source == '-' else io.open(source, encoding = 'utf-8')
+		try:
+			text = stream.read()
+		finally:
+			if stream is not sys.stdin:
+				stream.close()
+		if text.lstrip()[:1] == '[':
+			try:
+				entries = json.loads(text)
+			except ValueError as e:
+				# Like a bad line, but for the whole file.
+				yield ManifestError(source, 'Not a JSON manifest: %s' % e)
+				continue
+			for entry in entries:
+				yield entry
+			continue
+		for line in text.splitlines():
+			if not line.strip():
+				continue
+			try:
+				yield json.loads(line)
+			except ValueError:
+				# Reported as a failure of its own, along with everything else.
+				yield line
+
+def _item_path(item):
+	""" The path reported for an input item of any command. """
+	if isinstance(item, dict):
+		return item.get('path')
+	if hasattr(item, 'path'):
+		return item.path
+	if isinstance(item, tuple):
+		return item[1] if len(item) == 2 else '\t'.join(item)
+	return item
+
+# Subcommand name -> (function called for every item, function producing the items)
+COMMANDS = {
+	'create': (create_link, pair_items),
+	'check': (check_link, path_items),
+	'read': (read_link, path_items),
+	'unlink': (unlink_link, path_items),
+	'scan': (scan_entry, scan_items),
+	'apply-manifest': (apply_entry, manifest_items),
+}
+
+def _timed(func, args):
+	""" Wrap func to return the whole JSON record of an (index, item) pair, exceptions and timing included. """
+	def call(indexed):
+		index, item = indexed
+		record = {'index': index, 'path': _item_path(item)}
+		start = default_timer()
+		try:
+			record.update(func(args, item))
+			record['ok'] = True
+		except Exception as e:
+			record['ok'] = False
+			record['error'] = '%s: %s' % (type(e).__name__, e)
+		record['elapsed_ms'] = round((default_timer() - start) * 1000, 3)
+		return record
+	return call
+
+class Stats(object):
+	""" Counts and latencies of the records written, for --stats. """
+
+	def __init__(self):
+		self.start = default_timer()
+		self.latencies = []
+		self.failed = 0
+
+	def add(self, record):
+		self.latencies.append(record['elapsed_ms'])
+		if not record['ok']:
+			self.failed += 1
+
+	@staticmethod
+	def percentile(values, pct):
+		""" Nearest-rank percentile of a sorted list. """
+		return values[max(int(math.ceil(pct / 100.0 * len(values))) - 1, 0)]
+
+	def summary(self, command):
+		elapsed = default_timer() - self.start
+		count = len(self.latencies)
+		lines = ['%s: %d done, %d failed in %.3fs (%.1f/s)' % (
+			command, count, self.failed, elapsed, count / elapsed if elapsed else 0.0
+		)]
+		if count:
+			latencies = sorted(self.latencies)
+			lines.append('latency (ms): ' + ', '.join(
+				['p%d %.3f' % (pct, self.percentile(latencies, pct)) for pct in STATS_PERCENTILES] +
+				['max %.3f' % latencies[-1]]
+			))
+		return '\n'.join(lines)
+
+def build_parser():
+	parser = argparse.ArgumentParser(prog = 'python -m ntfslink', description = __doc__.split('\n')[2])
+	common = argparse.ArgumentParser(add_help = False)
+	common.add_argument('-j', '--jobs', type = int, default = DEFAULT_BATCH_WORKERS,
+		help = 'worker threads (default: %d)' % DEFAULT_BATCH_WORKERS)
+	common.add_argument('--ordered', action = 'store_true', help = 'write the results in the order of their input')
+	common.add_argument('--stats', action = 'store_true', help = 'write throughput and latencies to stderr at the end')
+	inputs = argparse.ArgumentParser(add_help = False, parents = [common])
+	inputs.add_argument('-f', '--from', dest = 'sources', action = 'append', metavar = 'FILE',
+		help = 'read paths from FILE, one per line (- for stdin; may be given more than once)')
+	linktypes = sorted(LINK_TYPES)
+
+	commands = parser.add_subparsers(dest = 'command', metavar = 'command')
+	commands.required = True
+	create = commands.add_parser('create', parents = [inputs], help = 'create links',
+		description = 'Create links. Input lines are srcpath<TAB>linkpath.')
+	create.add_argument('-t', '--type', choices = linktypes, required = True)
+	create.add_argument('paths', nargs = '*', metavar = 'srcpath linkpath')
+	for name, helptext in (('check', 'tell what kind of link each path is'), ('read', 'read the targets of links'),
+	                       ('unlink', 'remove links')):
+		command = commands.add_parser(name, parents = [inputs], help = helptext,
+			description = helptext.capitalize() + '.')
+		command.add_argument('-t', '--type', choices = ['any'] + linktypes, default = 'any',
+			help = 'only accept links of this type (default: any junction or symbolic link)')
+		command.add_argument('paths', nargs = '*', metavar = 'path')
+	scanner = commands.add_parser('scan', parents = [inputs], help = 'find the links under directories',
+		description = 'Find the links under directories, reading their targets in parallel.')
+	scanner.add_argument('paths', nargs = '*', metavar = 'root')
+	scanner.add_argument('--all', action = 'store_true', help = 'report every file and directory, not only links')
+	scanner.add_argument('--max-depth', type = int, default = None)
+	scanner.add_argument('--follow-junctions', action = 'store_true')
+	scanner.add_argument('--follow-symlinks', action = 'store_true')
+	scanner.add_argument('--no-targets', action = 'store_true', help = "don't read the targets of links")
+	manifest = commands.add_parser('apply-manifest', parents = [common], help = 'make links match a manifest',
+		description = 'Create, replace or remove links to match JSON manifests. (See python -m ntfslink --help)')
+	manifest.add_argument('manifests', nargs = '*', metavar = 'manifest', help = 'manifest files (default: stdin)')
+	manifest.add_argument('--replace', action = 'store_true', help = 'replace links that lead somewhere else')
+	return parser
+
+def main(argv = None):
+	parser = build_parser()
+	args = parser.parse_args(argv)
+	if args.jobs < 1:
+		parser.error('--jobs has to be at least 1')
+	if args.command == 'create' and len(args.paths) % 2:
+		parser.error('create takes pairs of srcpath linkpath')
+	func, items = COMMANDS[args.command]
+	stats = Stats()
+	try:
+		for result in iter_many(_timed(func, args), enumerate(items(args)), args.jobs, ordered = args.ordered):
+			record = result.value
+			stats.add(record)
+			sys.stdout.write(json.dumps(record, sort_keys = True) + '\n')
+			sys.stdout.flush()
+	except IOError as e:
+		# Piped into something that stopped reading. (head, etc)
+		if e.errno != errno.EPIPE:
+			raise
+	if args.stats:
+		print(stats.summary(args.command), file = sys.stderr)
+	return 1 if stats.failed else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
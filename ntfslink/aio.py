@@ -0,0 +1,175 @@
+# encoding: utf-8
+"""
+aio.py
+asyncio versions of the link functions. (Python 3.7 and up)
+
+Every call runs on a shared thread pool, and the number of calls in flight on any one volume is capped, so a
+coroutine that fires off thousands of link operations doesn't bury a single disk (or the pool) under all of them at
+once. The event loop itself never touches the file system.
+
+	from ntfslink import aio, junctions
+
+	async def main():
+		await aio.junction.create('C:\\\\Projects', 'C:\\\\p')
+		async for result in aio.as_completed(junctions.read, linkpaths):
+			print(result.item, result.value)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import asyncio, functools, threading, weakref
+from concurrent.futures import ThreadPoolExecutor
+from . import junctions, symlinks, hardlinks, cyglinks
+from .common import BatchResult, DEFAULT_BATCH_WORKERS
+from .internals import GetBackend
+
+__all__ = [
+	'LinkExecutor', 'AsyncLinks', 'default_executor', 'set_default_executor', 'as_completed',
+	'junction', 'symlink', 'hardlink', 'cyglink',
+]
+
+# Calls allowed in flight on one volume at a time, by default.
+DEFAULT_VOLUME_LIMIT = 8
+
+class LinkExecutor(object):
+	"""
+	A thread pool for link calls, with at most volume_limit of them running against any one volume. (Volumes are told
+	apart by drive letter or UNC share, once paths are made absolute.) Pass a
+	concurrent.futures.Executor as executor to run the calls on that instead of a pool of workers threads.
+	"""
+
+	def __init__(self, workers = None, volume_limit = DEFAULT_VOLUME_LIMIT, executor = None):
+		self.workers = workers or DEFAULT_BATCH_WORKERS
+		self.volume_limit = volume_limit
+		self.executor = executor if executor is not None else ThreadPoolExecutor(self.workers)
+		# Semaphores belong to an event loop, so there's one set per loop.
+		self._semaphores = weakref.WeakKeyDictionary()
+		self._lock = threading.Lock()
+
+	def volume(self, fpath):
+		""" The key of the volume that fpath is on. Only works on the path itself, so it never blocks the event loop. """
+		backend = GetBackend()
+		fullpath = backend.GetFullPathName(str(fpath))
+		# \\?\C:\x and C:/x are both on C:.
+		if fullpath[:8].upper() == '\\\\?\\UNC\\':
+			fullpath = '\\\\' + fullpath[8:]
+		elif fullpath[:4] == '\\\\?\\':
+			fullpath = fullpath[4:]
+		return backend.path.splitdrive(fullpath)[0].upper()
+
+	def _semaphore(self, loop, volume):
+		with self._lock:
+			semaphores = self._semaphores.setdefault(loop, {})
+			semaphore = semaphores.get(volume)
+			if semaphore is None:
+				semaphore = semaphores[volume] = asyncio.Semaphore(self.volume_limit)
+		return semaphore
+
+	async def run(self, func, fpath, *args, **kwargs):
+		"""
+		Call func(*args, **kwargs) on the pool once fpath's volume has room for it, and return its result. Cancelling
+		the caller takes the call out of the queue if it hasn't been handed to the pool yet; one that has can't be
+		interrupted, and finishes in the background, still counting towards its volume until it does.
+		"""
+		loop = asyncio.get_running_loop()
+		semaphore = self._semaphore(loop, self.volume(fpath))
+		await semaphore.acquire()
+		try:
+			future = loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+		except:
+			semaphore.release()
+			raise
+
+		def release(future):
+			semaphore.release()
+			# Nobody's waiting on a call that was left to finish in the background, so its exception goes nowhere.
+			if not future.cancelled():
+				future.exception()
+		future.add_done_callback(release)
+		return await asyncio.shield(future)
+
+	def shutdown(self, wait = True):
+		self.executor.shutdown(wait)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def default_executor():
+	""" The LinkExecutor used when none is passed in, created on first use. """
+	global _executor
+	with _executor_lock:
+		if _executor is None:
+			_executor = LinkExecutor()
+		return _executor
+
+def set_default_executor(executor):
+	""" Replace the default LinkExecutor. Returns the previous one. (or None) """
+	global _executor
+	with _executor_lock:
+		previous, _executor = _executor, executor
+	return previous
+
+async def _call(executor, func, item, star):
+	""" Run func on item, the same way common.iter_many does. The path it works on is always the last argument. """
+	try:
+		if star:
+			value = await executor.run(func, item[-1], *item)
+		else:
+			value = await executor.run(func, item, item)
+		return BatchResult(item, value, None)
+	except asyncio.CancelledError:
+		raise
+	except Exception as e:
+		return BatchResult(item, None, e)
+
+async def as_completed(func, items, star = False, limit = None, executor = None):
+	"""
+	Call func on every item of items, yielding a BatchResult for each as soon as it's done. (So not in order) Only limit
+	calls (twice the executor's workers, by default) are queued up at a time, and items is only consumed as they finish.
+	With star set, each item is a tuple of arguments for func. Closing the generator early cancels whatever's left.
+
+	See: common.iter_many
+	"""
+	executor = executor or default_executor()
+	limit = limit or executor.workers * 2
+	pending = set()
+	try:
+		for item in items:
+			pending.add(asyncio.ensure_future(_call(executor, func, item, star)))
+			if len(pending) >= limit:
+				done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+				for task in done:
+					yield task.result()
+		while pending:
+			done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+			for task in done:
+				yield task.result()
+	finally:
+		for task in pending:
+			task.cancel()
+
+class AsyncLinks(object):
+	""" Coroutine versions of create, check, read and unlink from one of the link modules. """
+
+	def __init__(self, realmod):
+		self._real_ = realmod
+
+	async def create(self, srcpath, linkpath, executor = None):
+		return await (executor or default_executor()).run(self._real_.create, linkpath, srcpath, linkpath)
+
+	async def check(self, linkpath, executor = None):
+		return await (executor or default_executor()).run(self._real_.check, linkpath, linkpath)
+
+	async def read(self, linkpath, executor = None):
+		return await (executor or default_executor()).run(self._real_.read, linkpath, linkpath)
+
+	async def unlink(self, linkpath, executor = None):
+		return await (executor or default_executor()).run(self._real_.unlink, linkpath, linkpath)
+
+junction = AsyncLinks(junctions)
+symlink = AsyncLinks(symlinks)
+hardlink = AsyncLinks(hardlinks)
+cyglink = AsyncLinks(cyglinks)
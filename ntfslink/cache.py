@@ -0,0 +1,200 @@
+# encoding: utf-8
+"""
+cache.py
+An opt-in cache of link targets, for services that read the same links over and over.
+
+Entries are dropped when they get too old (ttl), when the cache gets too big (least recently used first), and when a
+watched directory reports a change to the link or anything above it. Links outside of every watched directory only
+have the ttl to keep them honest.
+
+	cache = LinkCache(junctions.read, maxsize = 4096, ttl = 60)
+	cache.watch('C:\\\\Build')
+	target = cache.read('C:\\\\Build\\\\deps\\\\zlib')
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import threading, time
+from .common import *
+
+__all__ = ['DirectoryWatcher', 'LinkCache']
+
+# time.monotonic isn't around before Python 3.3.
+_clock = getattr(time, 'monotonic', time.time)
+
+class DirectoryWatcher(threading.Thread):
+	"""
+	A thread that waits on changes to the directory at dirpath (and under it, with subtree set) and passes each one on
+	as callback(path, action), with action being one of FILE_ACTION_*. When it loses track of what changed, whether it's
+	because too much happened at once or because the directory can't be watched (anymore), it calls callback(dirpath,
+	None) instead, meaning anything under dirpath may have changed.
+	"""
+
+	def __init__(self, dirpath, callback, subtree = True, filter = FILE_NOTIFY_CHANGE_LINKS):
+		threading.Thread.__init__(self, name = 'DirectoryWatcher(%s)' % dirpath)
+		self.daemon = True
+		self.backend = GetBackend()
+		self.dirpath = dirpath
+		self.callback = callback
+		self.subtree = subtree
+		self.filter = filter
+		self._handle = None
+		self._stopping = False
+		# Set once the watch is armed, and changes from then on will get reported. (Or once it's given up.)
+		self.ready = threading.Event()
+
+	def run(self):
+		try:
+			self._watch()
+		finally:
+			self.ready.set()
+
+	def _watch(self):
+		backend = self.backend
+		self._handle = backend.CreateFile(
+			self.dirpath, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, OPEN_EXISTING,
+			FILE_FLAG_BACKUP_SEMANTICS | FILE_FLAG_OVERLAPPED
+		)
+		if self._handle is None:
+			self.callback(self.dirpath, None)
+			return
+		try:
+			while not self._stopping:
+				changes = backend.ReadDirectoryChanges(self._handle, self.subtree, self.filter, self.ready.set)
+				if changes is None:
+					if not self._stopping:
+						self.callback(self.dirpath, None)
+					break
+				if not changes:
+					self.callback(self.dirpath, None)
+				for action, name in changes:
+					self.callback(backend.path.join(self.dirpath, name), action)
+		finally:
+			backend.CloseHandle(self._handle)
+
+	def stop(self, timeout = 0.05):
+		""" Stop watching, and wait for the thread to finish. """
+		self._stopping = True
+		while self.is_alive():
+			# The thread could be anywhere between its checks and the call it's blocked in, so keep at it.
+			if self._handle is not None:
+				self.backend.CancelIo(self._handle)
+			self.join(timeout)
+
+class LinkCache(object):
+	"""
+	Caches what read (one of the link modules' read functions, or anything else taking a path) returns for each path,
+	for up to ttl seconds (forever, when it's None), and for up to maxsize paths. Exceptions aren't cached.
+
+	A read that's racing with a change only gets cached if nothing was invalidated while it ran, so a change that's been
+	reported is never undone by an older read.
+	"""
+
+	def __init__(self, read, maxsize = 1024, ttl = None, clock = _clock):
+		self.backend = GetBackend()
+		self._read = read
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.clock = clock
+		self.hits = self.misses = 0
+		self._entries = OrderedDict()
+		# Every directory above a cached path, mapped to the cached paths under it, so invalidate doesn't have to look
+		# at every entry.
+		self._under = {}
+		self._generation = 0
+		self._watchers = []
+		self._lock = threading.Lock()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def _key(self, fpath):
+		return self.backend.path.normcase(self.backend.GetFullPathName(str_cleanup(fpath)))
+
+	def _directories(self, key):
+		""" Every directory above key. """
+		dirname = self.backend.path.dirname
+		parent = dirname(key)
+		while parent != key:
+			yield parent
+			key, parent = parent, dirname(parent)
+
+	def _add(self, key, entry):
+		if self._entries.pop(key, None) is None:
+			for directory in self._directories(key):
+				self._under.setdefault(directory, set()).add(key)
+		self._entries[key] = entry
+
+	def _remove(self, key):
+		del self._entries[key]
+		for directory in self._directories(key):
+			keys = self._under[directory]
+			keys.discard(key)
+			if not keys:
+				del self._under[directory]
+
+	def read(self, linkpath):
+		""" Same as read(linkpath), from the cache when possible. """
+		key = self._key(linkpath)
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				if self.ttl is None or self.clock() - entry[1] < self.ttl:
+					# Move it to the end of the LRU order.
+					self._entries[key] = self._entries.pop(key)
+					self.hits += 1
+					return entry[0]
+				self._remove(key)
+			self.misses += 1
+			generation = self._generation
+
+		stamp = self.clock()
+		target = self._read(linkpath)
+		with self._lock:
+			if self._generation == generation:
+				self._add(key, (target, stamp))
+				while len(self._entries) > self.maxsize:
+					self._remove(next(iter(self._entries)))
+		return target
+
+	def invalidate(self, fpath = None):
+		""" Drop the cached targets of fpath and everything under it. Without fpath, drop everything. """
+		with self._lock:
+			self._generation += 1
+			if fpath is None:
+				self._entries.clear()
+				self._under.clear()
+				return
+			key = self._key(fpath)
+			keys = list(self._under.get(key, ()))
+			if key in self._entries:
+				keys.append(key)
+			for cached in keys:
+				self._remove(cached)
+
+	def _changed(self, fpath, action):
+		self.invalidate(fpath)
+
+	def watch(self, dirpath, subtree = True):
+		""" Start invalidating the links under dirpath (or only the ones directly in it) as they change. """
+		watcher = DirectoryWatcher(self.backend.GetFullPathName(str_cleanup(dirpath)), self._changed, subtree)
+		watcher.start()
+		watcher.ready.wait()
+		self._watchers.append(watcher)
+		# Whatever was cached before the watcher got going can't be trusted.
+		self.invalidate(watcher.dirpath)
+		return watcher
+
+	def close(self):
+		""" Stop every watcher. """
+		while self._watchers:
+			self._watchers.pop().stop()
@@ -9,8 +9,15 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-import os
-from internals import *
+import itertools
+from collections import namedtuple, OrderedDict
+from .internals import *
+
+# Worker threads used by the batch functions when the caller doesn't say. Link calls spend nearly all of their time in
+# the file system with the GIL released, so this is well past the number of CPUs.
+DEFAULT_BATCH_WORKERS = 16
+# Items taken from the input of iter_many at a time.
+DEFAULT_BATCH_CHUNKSIZE = 1024
 
 class InvalidSourceException(Exception):
 	""" Raised when an invalid path is specified for srcpath in a create function. """
@@ -18,22 +25,22 @@ class InvalidSourceException(Exception):
 class InvalidLinkException(Exception):
 	""" Raised when an invalid path is given for linkpath in a read function. """
 
-class Handle(HANDLE):
-	""" Wrapper around handle"""
+class Handle(object):
+	""" Wrapper around a backend file handle that closes it on the way out of a with block. """
 
-	def __init__(self):
-		pass
+	def __init__(self, handle):
+		self.handle = handle
 
 	@staticmethod
 	def open(filepath):
 		fpath = str_cleanup(filepath)
-		return cast(OpenFileForAll(fpath, os.path.isdir(fpath)), Handle)
+		return Handle(OpenFileForAll(fpath, IsFolder(fpath)))
 
 	def __enter__(self):
-		return self
+		return self.handle
 
 	def __exit__(self, exc_type, exc_val, exc_tb):
-		CloseHandle(self)
+		GetBackend().CloseHandle(self.handle)
 
 class PassThru(object):
 	""" A class created for the purpose of passing function calls through to the underlying module. """
@@ -56,86 +63,336 @@ class PassThru(object):
 	@property
 	def check(self): return self._real_.check
 
+	@property
+	def create_many(self): return self._real_.create_many
+
+	@property
+	def read_many(self): return self._real_.read_many
+
+	@property
+	def unlink_many(self): return self._real_.unlink_many
+
+	@property
+	def iter_create_many(self): return self._real_.iter_create_many
+
+	@property
+	def iter_read_many(self): return self._real_.iter_read_many
+
+	@property
+	def iter_unlink_many(self): return self._real_.iter_unlink_many
+
 def passthru(cls, realmod):
 	""" Construct a PassThru derived class. """
 	return type(cls, (PassThru,), { })(realmod)
 
+class BatchResult(namedtuple('BatchResult', 'item value error')):
+	"""
+	The outcome of one item of a batch call. item is what was passed in, value is what the function returned, and error
+	is the exception it raised instead. (or None)
+	"""
+	__slots__ = ()
+
+	@property
+	def ok(self):
+		return self.error is None
+
+def _batch_call(func, star):
+	""" Wrap func so that it returns a BatchResult instead of raising. """
+	def call(item):
+		try:
+			return BatchResult(item, func(*item) if star else func(item), None)
+		except Exception as e:
+			return BatchResult(item, None, e)
+	return call
+
+def iter_many(func, items, workers = None, chunksize = DEFAULT_BATCH_CHUNKSIZE, star = False, pool = None,
+              ordered = True):
+	"""
+	Call func on every item of items from a pool of worker threads, yielding a BatchResult for each, in order. An item
+	that fails doesn't stop the rest. items is consumed chunksize at a time, so it can be a generator of any length and
+	only one chunk of it is held in memory. With star set, each item is a tuple of arguments for func. With ordered
+	unset, the results of each chunk are yielded as soon as they're done instead, in whatever order that is.
+
+	The pool has workers threads (DEFAULT_BATCH_WORKERS by default) and goes away with the generator. Pass a
+	multiprocessing.pool.ThreadPool as pool to use that one instead.
+	"""
+	call = _batch_call(func, star)
+	owned = pool is None
+	if owned:
+		# multiprocessing takes longer to import than the rest of the package, so it waits until it's needed.
+		from multiprocessing.pool import ThreadPool
+		pool = ThreadPool(workers or DEFAULT_BATCH_WORKERS)
+	try:
+		items = iter(items)
+		while True:
+			chunk = list(itertools.islice(items, chunksize))
+			if not chunk:
+				break
+			for result in pool.map(call, chunk) if ordered else pool.imap_unordered(call, chunk):
+				yield result
+	finally:
+		if owned:
+			pool.terminate()
+
+def run_many(func, items, workers = None, star = False, pool = None, ordered = True):
+	"""
+	Same as iter_many, but returns every BatchResult at once, as a list.
+
+	See: iter_many for details
+	"""
+	return list(iter_many(func, items, workers, DEFAULT_BATCH_CHUNKSIZE, star, pool, ordered))
+
+def batch_helpers(noun, create, read, unlink):
+	"""
+	Build the batch helpers of a link module out of its create, read and unlink. Returns create_many, read_many,
+	unlink_many, iter_create_many, iter_read_many and iter_unlink_many, in that order. noun is what their docstrings
+	call the links.
+	"""
+	def create_many(pairs, workers = None):
+		return run_many(create, pairs, workers, star = True)
+
+	def read_many(linkpaths, workers = None):
+		return run_many(read, linkpaths, workers)
+
+	def unlink_many(linkpaths, workers = None):
+		return run_many(unlink, linkpaths, workers)
+
+	def iter_create_many(pairs, workers = None, ordered = True):
+		return iter_many(create, pairs, workers, star = True, ordered = ordered)
+
+	def iter_read_many(linkpaths, workers = None, ordered = True):
+		return iter_many(read, linkpaths, workers, ordered = ordered)
+
+	def iter_unlink_many(linkpaths, workers = None, ordered = True):
+		return iter_many(unlink, linkpaths, workers, ordered = ordered)
+
+	create_many.__doc__ = """
+	Create a %s for every (srcpath, linkpath) in pairs. Returns a BatchResult per pair, in order.
+
+	See: run_many
+	""" % noun
+	read_many.__doc__ = """
+	Read every %s in linkpaths. Returns a BatchResult per path, in order.
+
+	See: run_many
+	""" % noun
+	unlink_many.__doc__ = """
+	Remove every %s in linkpaths. Returns a BatchResult per path, in order.
+
+	See: run_many
+	""" % noun
+	iter_create_many.__doc__ = """
+	Same as create_many, but yields each BatchResult as it's done, and only takes pairs a chunk at a time. With ordered
+	unset, they come in whatever order the calls finish.
+
+	See: iter_many
+	"""
+	iter_read_many.__doc__ = """
+	Same as read_many, but yields each BatchResult as it's done.
+
+	See: iter_create_many
+	"""
+	iter_unlink_many.__doc__ = """
+	Same as unlink_many, but yields each BatchResult as it's done.
+
+	See: iter_create_many
+	"""
+	helpers = create_many, read_many, unlink_many, iter_create_many, iter_read_many, iter_unlink_many
+	for helper in helpers:
+		helper.__module__ = create.__module__
+	return helpers
+
 def str_cleanup(s):
 	""" Helper for cleaning a string prior to creating a reparse point. """
 	return str(s).strip('\0 ')
 
-def create_reparse_point(source, link_name, prefill, isabs = True):
+def create_reparse_point(source, link_name, tag, isabs = True):
 	"""
-	Create a reparse point at link_name pointing to source.
+	Create a reparse point at link_name pointing to source. Returns False on failure, with the reason left in
+	GetLastError().
 
+	tag: Either IO_REPARSE_TAG_MOUNT_POINT or IO_REPARSE_TAG_SYMBOLIC_LINK
 	"""
 	# SubstituteName
 	substlink = source
 	if isabs:
 		substlink = TranslatePath(source)
-	hFile = OpenFileForAll(link_name, os.path.isdir(link_name))
-
-	# Construct our structure. Note: We have enter the fields one by one due tot he fact that we still need
-	# to resize the PathBuffer field.
-	reparseInfo = ReparsePoint()
-	pReparseInfo = prefill(reparseInfo, source, substlink, link_name, isabs)
-	returnedLength = DWORD(0)
-	dwCode = DeviceIoControl(
-		hFile, FSCTL_SET_REPARSE_POINT, pReparseInfo,
-		reparseInfo.ReparseDataLength + REPARSE_POINT_HEADER_SIZE,
-		None, 0, byref(returnedLength), None
-	)
-	result = dwCode != FALSE
-	if not result:
-		print dwCode
-	CloseHandle(hFile)
-	return result
+	flags = SYMBOLIC_LINK_FLAG_RELATIVE if tag == IO_REPARSE_TAG_SYMBOLIC_LINK and not isabs else 0
+
+	return write_reparse_point(link_name, ReparseData(tag, flags, substlink, source))
+
+def write_reparse_point(link_name, reparseData):
+	"""
+	Set the reparse point at link_name to reparseData, a ReparseData record, exactly as it is. Returns False on failure,
+	with the reason left in GetLastError().
+
+	See: read_reparse_point
+	"""
+	# The encoder sizes the buffer exactly, so we only ship the bytes the reparse point actually needs.
+	reparseBuffer = EncodeReparseBuffer(reparseData)
+	backend = GetBackend()
+	hFile = OpenFileForAll(link_name, IsFolder(link_name))
+	try:
+		return backend.DeviceIoControl(hFile, FSCTL_SET_REPARSE_POINT, reparseBuffer) is not None
+	finally:
+		backend.CloseHandle(hFile)
 
 def deviceioctl(fpath, code, inbuf, insize, outbuf, outsize, hFile = INVALID_HANDLE_VALUE):
 	"""
-	Open a file and run it through DeviceIoControl with a specific code.
+	Open a file and run it through DeviceIoControl with a specific code. inbuf and outbuf are buffers (or None), of
+	which only the first insize and outsize bytes are used.
 	"""
+	backend = GetBackend()
 	close_handle = True
 	if hFile == INVALID_HANDLE_VALUE:
-		hFile = OpenFileForAll(fpath, os.path.isdir(fpath))
+		hFile = OpenFileForAll(fpath, IsFolder(fpath))
 	else:
 		close_handle = False
 
-	dwRet = DWORD(0)
-	result = DeviceIoControl(
-		hFile, code, inbuf, insize,
-		outbuf, outsize, byref(dwRet), None
-	) != FALSE
+	if inbuf is not None:
+		inbuf = memoryview(inbuf)[:insize]
+	if outbuf is not None:
+		outbuf = memoryview(outbuf)[:outsize]
+	returned = backend.DeviceIoControl(hFile, code, inbuf, outbuf)
 
 	if close_handle:
-		CloseHandle(hFile)
-	return result, dwRet
+		backend.CloseHandle(hFile)
+	return returned is not None, DWORD(returned or 0)
+
+# Output buffers for FSCTL_GET_REPARSE_POINT, one per thread.
+reparse_pool = ReparseBufferPool()
+
+def _get_reparse_point(hFile, buf):
+	"""
+	Run FSCTL_GET_REPARSE_POINT on an open handle, writing the result into buf.
+
+	It returns a tuple containing (bytes returned or None on failure, GetLastError() on failure or 0).
+	"""
+	backend = GetBackend()
+	length = backend.DeviceIoControl(hFile, FSCTL_GET_REPARSE_POINT, None, buf)
+	if length is not None:
+		return length, 0
+	return None, backend.GetLastError()
+
+def readinto(fpath, buf, check = None, hFile = INVALID_HANDLE_VALUE):
+	"""
+	Read the raw reparse buffer at fpath into buf, a writable buffer (bytearray, ctypes array, etc) supplied by the
+	caller. Returns the number of bytes written into buf. Raises WinError if buf is too small or the read failed.
+
+	See: get_buffer for details
+	"""
+	if check is not None and not check(fpath):
+		raise InvalidLinkException("%s is not a reparse point." % fpath)
+
+	close_handle = True
+	if hFile == INVALID_HANDLE_VALUE:
+		hFile = OpenFileForRead(fpath, IsFolder(fpath))
+	else:
+		close_handle = False
+
+	try:
+		length, error = _get_reparse_point(hFile, buf)
+	finally:
+		if close_handle:
+			GetBackend().CloseHandle(hFile)
+	if length is None:
+		raise WinError(error)
+	return length
 
-def get_buffer(fpath, cls, check, hFile = INVALID_HANDLE_VALUE):
+def get_buffer(fpath, check, hFile = INVALID_HANDLE_VALUE):
 	"""
 	Get a reparse buffer.
-	cls: The class we'll be using (either ReparsePoint or ReparseGuidDataBuffer)
 	check: Function to check validity of a reparse point. (usually IsReparseDir, IsReparsePoint, etc)
+
+	Returns a memoryview over the bytes returned by the kernel, or None if the read failed. The view points into this
+	thread's pooled buffer, so it's only valid until the next get_buffer call on the same thread.
 	"""
 	if check is not None and not check(fpath):
 		raise InvalidLinkException("%s is not a reparse point." % fpath)
 
 	close_handle = True
 	if hFile == INVALID_HANDLE_VALUE:
-		hFile = OpenFileForRead(fpath, os.path.isdir(fpath))
+		hFile = OpenFileForRead(fpath, IsFolder(fpath))
 	else:
 		close_handle = False
 
-	dwRet = DWORD(0)
-	reparseInfo = cls()
-	result = DeviceIoControl(
-		hFile, FSCTL_GET_REPARSE_POINT, None, 0L,
-		byref(reparseInfo), MAX_REPARSE_BUFFER, byref(dwRet), None
-	) != FALSE
+	try:
+		buf = reparse_pool.buffer
+		length, error = _get_reparse_point(hFile, buf)
+		while length is None:
+			# Start with a small probe and only grow when the reparse point doesn't fit. On ERROR_MORE_DATA, the header
+			# has been filled in, so we know exactly how much room it needs.
+			if error == ERROR_MORE_DATA:
+				needed = REPARSE_GUID_DATA_BUFFER_HEADER_SIZE + ReparseHeader(buf)[1]
+			elif error == ERROR_INSUFFICIENT_BUFFER:
+				needed = MAX_REPARSE_BUFFER
+			else:
+				return None
+			if needed <= len(buf):
+				return None
+			buf = reparse_pool.grow(needed)
+			length, error = _get_reparse_point(hFile, buf)
+	finally:
+		if close_handle:
+			GetBackend().CloseHandle(hFile)
+	return memoryview(buf)[:length]
+
+def _decode_pooled(decode, reparseBuffer):
+	"""
+	decode(reparseBuffer), for a view into the pooled buffer from get_buffer. A GenericReparseData keeps its data as a
+	view over what it was decoded from, which the next read on this thread would write over, so it gets its own copy.
+	"""
+	reparse = decode(reparseBuffer)
+	if isinstance(reparse, GenericReparseData) and isinstance(reparse.data, memoryview):
+		reparse = reparse._replace(data = reparse.data.tobytes())
+	return reparse
 
-	if close_handle:
-		CloseHandle(hFile)
-	return reparseInfo if result else None
+def read_reparse_point(fpath, check, decode = DecodeReparseBuffer):
+	"""
+	Read and decode the reparse point at fpath. By default, it returns a ReparseData record holding both the
+	SubstituteName and PrintName of a mount point or symbolic link. Pass DecodeReparsePoint as decode to dispatch on
+	the tag through the decoder registry instead. Returns None if the reparse point couldn't be read.
+
+	See: get_buffer for details
+	"""
+	reparseBuffer = get_buffer(fpath, check)
+	if reparseBuffer is None:
+		return None
+	return _decode_pooled(decode, reparseBuffer)
+
+def decode_reparse_point(fpath, isdir, decode = DecodeReparsePoint):
+	"""
+	Same as read_reparse_point, for when fpath is already known to be a reparse point, and whether it's a directory.
+	(From a directory listing, for instance) That skips the check and the attribute lookup before opening it.
+	"""
+	hFile = OpenFileForRead(fpath, isdir)
+	try:
+		reparseBuffer = get_buffer(None, None, hFile)
+	finally:
+		GetBackend().CloseHandle(hFile)
+	if reparseBuffer is None:
+		return None
+	return _decode_pooled(decode, reparseBuffer)
+
+def _delete_reparse_point(hFile, reparseHeader):
+	""" Run FSCTL_DELETE_REPARSE_POINT on an open handle. Returns (whether it worked, bytes returned) """
+	returned = GetBackend().DeviceIoControl(hFile, FSCTL_DELETE_REPARSE_POINT, reparseHeader)
+	return returned is not None, returned or 0
+
+def _remove_reparse_point(hFile, tag):
+	""" Delete the reparse point on an open handle, with its GUID if the tag needs one. Raises WinError on failure. """
+	# Try to delete it first without the reparse GUID
+	result, dwRet = _delete_reparse_point(hFile, EncodeReparseHeader(tag))
+
+	if not result:
+	# If the first try fails, we'll set the GUID and try again
+		buf = get_buffer(None, None, hFile)
+		if buf is None:
+			raise WinError(GetBackend().GetLastError())
+		result, dwRet = _delete_reparse_point(hFile, EncodeReparseHeader(ReparseHeader(buf)[0], ReparseGuid(buf)))
+		if not result:
+			raise WinError(GetBackend().GetLastError())
+	return result, dwRet
 
 def delete_reparse_point(fpath, tag, check):
 	"""
@@ -146,36 +403,138 @@ def delete_reparse_point(fpath, tag, check):
 	if not check(fpath):
 		raise InvalidLinkException("%s is not a reparse point." % fpath)
 
-	hFile = OpenFileForAll(fpath, os.path.isdir(fpath))
-	dwRet = DWORD()
+	hFile = OpenFileForAll(fpath, IsFolder(fpath))
+	try:
+		return _remove_reparse_point(hFile, tag)
+	finally:
+		GetBackend().CloseHandle(hFile)
 
-	# Try to delete it first without the reparse GUID
-	reparseInfo = ReparseGuidDataBuffer()
-	reparseInfo.ReparseTag = tag
-	result = DeviceIoControl(
-		hFile,
-		FSCTL_DELETE_REPARSE_POINT,
-		byref(reparseInfo),
-		REPARSE_GUID_DATA_BUFFER_HEADER_SIZE,
-		None, 0L, byref(dwRet), None
-	) != FALSE
-
-	if not result:
-	# If the first try fails, we'll set the GUID and try again
-		buf = get_buffer(fpath, ReparseGuidDataBuffer, None, hFile)
-		reparseInfo.ReparseTag = buf.ReparseTag
-		reparseInfo.ReparseGuid = buf.ReparseGuid
-		result = DeviceIoControl(
-			hFile,
-			FSCTL_DELETE_REPARSE_POINT,
-			byref(reparseInfo),
-			REPARSE_GUID_DATA_BUFFER_HEADER_SIZE,
-			None, 0L, byref(dwRet), None
-		) != FALSE
-		if not result:
-			raise WinError()
+class LinkSession(object):
+	"""
+	Keeps handles open across calls, for checking, reading and removing lots of links in a row. Parent directories are
+	opened once and kept around (up to max_directories of them), links are opened relative to them with only the access
+	each call needs (FILE_READ_ATTRIBUTES to check and read, FILE_WRITE_ATTRIBUTES to unlink), and the handle of the
+	last link is reused, so check -> read -> unlink on one path only opens it once for reading and once for writing.
+
+		with LinkSession() as session:
+			for linkpath in paths:
+				if junctions.check(linkpath, session):
+					junctions.unlink(linkpath, session)
+	"""
 
-	CloseHandle(hFile)
-	return result, dwRet
+	def __init__(self, max_directories = 64):
+		self.backend = GetBackend()
+		self.max_directories = max_directories
+		self._directories = OrderedDict()
+		self._path = None
+		self._file = None
+		self._access = 0
+		self._attributes = None
 
+	def __enter__(self):
+		return self
 
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+	def close(self):
+		""" Close every handle held by the session. """
+		self._release()
+		while self._directories:
+			self.backend.CloseHandle(self._directories.popitem()[1])
+
+	def _release(self):
+		""" Close the handle of the last link. """
+		if self._file is not None:
+			self.backend.CloseHandle(self._file)
+			self._path = self._file = self._attributes = None
+			self._access = 0
+
+	def _directory(self, dirpath):
+		""" The handle of the directory at dirpath, opened once and then moved to the end of the LRU order. """
+		hDir = self._directories.pop(dirpath, None)
+		if hDir is None:
+			hDir = self.backend.CreateFile(dirpath, FILE_TRAVERSE, FILE_SHARE_ALL, OPEN_EXISTING,
+				FILE_FLAG_BACKUP_SEMANTICS)
+			if hDir is None:
+				raise InvalidHandleException('Failed to open directory: %s' % dirpath)
+			while len(self._directories) >= self.max_directories:
+				self.backend.CloseHandle(self._directories.popitem(last = False)[1])
+		self._directories[dirpath] = hDir
+		return hDir
+
+	def open(self, fpath, access = FILE_READ_ATTRIBUTES):
+		"""
+		Get a handle to the file or directory at fpath (never following reparse points) that has at least access. The
+		session owns the handle: it stays valid until the next call on a different path, or one that needs more access.
+		"""
+		fullpath = self.backend.GetFullPathName(fpath)
+		attributes = None
+		if fullpath == self._path:
+			if self._access & access == access:
+				return self._file
+			access |= self._access
+			attributes = self._attributes
+		self._release()
+
+		dirpath, name = self.backend.path.split(fullpath)
+		if name:
+			hFile = self.backend.CreateFile(
+				name, access, FILE_SHARE_ALL, OPEN_EXISTING, FILE_FLAG_REPARSE_BACKUP, self._directory(dirpath)
+			)
+		else:
+			hFile = self.backend.CreateFile(fullpath, access, FILE_SHARE_ALL, OPEN_EXISTING, FILE_FLAG_REPARSE_BACKUP)
+		if hFile is None:
+			raise InvalidHandleException('Failed to open path: %s' % fpath)
+		self._path, self._file, self._access, self._attributes = fullpath, hFile, access, attributes
+		return hFile
+
+	def attributes(self, fpath):
+		""" Same as GetFileAttributes, through the session's handles. Asked once per handle. """
+		try:
+			hFile = self.open(fpath)
+		except InvalidHandleException:
+			return INVALID_FILE_ATTRIBUTES
+		if self._attributes is None:
+			info = self.backend.GetFileInformationByHandle(hFile)
+			if info is None:
+				return INVALID_FILE_ATTRIBUTES
+			self._attributes = info.dwFileAttributes
+		return self._attributes
+
+	def check(self, fpath, attributes = FILE_ATTRIBUTE_REPARSE_POINT):
+		""" Checks whether fpath exists and has all of attributes set. (See IsReparsePoint, IsReparseDir) """
+		found = self.attributes(fpath)
+		return found != INVALID_FILE_ATTRIBUTES and found & attributes == attributes
+
+	def read(self, fpath, attributes = FILE_ATTRIBUTE_REPARSE_POINT, decode = DecodeReparseBuffer):
+		"""
+		Read and decode the reparse point at fpath, after checking it for attributes.
+
+		See: read_reparse_point for details
+		"""
+		if not self.check(fpath, attributes):
+			raise InvalidLinkException("%s is not a reparse point." % fpath)
+		reparseBuffer = get_buffer(fpath, None, self.open(fpath))
+		if reparseBuffer is None:
+			return None
+		return _decode_pooled(decode, reparseBuffer)
+
+	def unlink(self, fpath, tag, attributes = FILE_ATTRIBUTE_REPARSE_POINT):
+		"""
+		Remove the reparse point at fpath, after checking it for attributes, followed by the directory or file that's
+		left behind.
+
+		See: delete_reparse_point for details
+		"""
+		found = self.attributes(fpath)
+		if found == INVALID_FILE_ATTRIBUTES or found & attributes != attributes:
+			raise InvalidLinkException("%s is not a reparse point." % fpath)
+		result, dwRet = _remove_reparse_point(self.open(fpath, FILE_READ_ATTRIBUTES | FILE_WRITE_ATTRIBUTES), tag)
+		fullpath = self._path
+		self._release()
+		if found & FILE_ATTRIBUTE_DIRECTORY:
+			self.backend.RemoveDirectory(fullpath)
+		else:
+			self.backend.DeleteFile(fullpath)
+		return result, dwRet
@@ -0,0 +1,179 @@
+# encoding: utf-8
+"""
+copier.py
+Copies directory trees without losing their links: junctions stay junctions, symbolic links stay symbolic links, and
+files that are hard links of each other are copied once and linked together again at the destination.
+
+	copytree('C:\\\\Build\\\\out', 'D:\\\\Staging\\\\out')
+
+Links that lead somewhere inside the tree being copied are pointed at the same place in the copy. Everything else is
+left pointing where it did, and nothing is followed. (Unlike shutil.copytree, which either copies whatever a junction
+leads to, or turns it into a symbolic link.)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+from collections import OrderedDict
+from .common import *
+from .scanner import scan
+from .hardlinks import _file_information
+from . import junctions, symlinks
+
+__all__ = ['copytree', 'CopyTreeException']
+
+class CopyTreeException(Exception):
+	"""
+	Raised by copytree once it's done, when any part of the tree couldn't be copied. errors holds a
+	(srcpath, dstpath, exception) for each.
+	"""
+
+	def __init__(self, errors):
+		Exception.__init__(self, '%d item(s) could not be copied, starting with %s: %s' % (
+			len(errors), errors[0][0], errors[0][2]
+		))
+		self.errors = errors
+
+def _rebase(backend, target, src, dst):
+	""" target, moved from under src to under dst when it's inside src. Relative targets are left as they are. """
+	pathmod = backend.path
+	if not pathmod.isabs(target):
+		return target
+	fulltarget = backend.GetFullPathName(target)
+	folded, prefix = pathmod.normcase(fulltarget), pathmod.normcase(src)
+	if folded == prefix:
+		return dst
+	if folded.startswith(prefix.rstrip(pathmod.sep) + pathmod.sep):
+		return pathmod.join(dst, fulltarget[len(src):].lstrip(pathmod.sep))
+	return target
+
+def _copy_file(paths):
+	"""
+	Copy a file that isn't linked anywhere else, or return its identity when it is, so it can be grouped with its other
+	links first.
+	"""
+	srcpath, dstpath = paths
+	fileInfo = _file_information(srcpath)
+	if fileInfo.nNumberOfLinks > 1:
+		return fileInfo.dwVolumeSerialNumber, (fileInfo.nFileIndexHigh << 32) | fileInfo.nFileIndexLow
+	backend = GetBackend()
+	if not backend.CopyFile(srcpath, dstpath):
+		raise WinError(backend.GetLastError())
+	return None
+
+def _copy_group(group):
+	"""
+	Copy the first of a group of hard links, and link the rest to the copy. Returns a (srcpath, dstpath, exception) for
+	each one that failed.
+	"""
+	backend = GetBackend()
+	srcpath, first = group[0]
+	if not backend.CopyFile(srcpath, first):
+		error = WinError(backend.GetLastError())
+		return [item + (error,) for item in group]
+	errors = []
+	for srcpath, dstpath in group[1:]:
+		if not backend.CreateHardLink(dstpath, first):
+			errors.append((srcpath, dstpath, WinError(backend.GetLastError())))
+	return errors
+
+def _copy_link(link):
+	""" Recreate a junction or symbolic link, pointed at the copy when it leads inside the tree. """
+	srcpath, dstpath, isjunction, isdir, src, dst = link
+	backend = GetBackend()
+	if isjunction:
+		reparseData = read_reparse_point(srcpath, junctions.check)
+		target = ReparseTarget(reparseData)
+	else:
+		target = symlinks.read(srcpath)
+	if target is None:
+		raise WinError(backend.GetLastError())
+
+	# Not through junctions.create and symlinks.create: those won't link to anything that doesn't exist (yet), and the
+	# copy has to keep dangling links and links to links that haven't been copied yet as much as the rest.
+	if isjunction:
+		# A volume GUID path has no drive to rebase or translate, and leads to the same volume from anywhere, so that's
+		# copied as it is.
+		if reparseData.substitute_name[:11].lower() != '\\??\\volume{':
+			target = _rebase(backend, target, src, dst)
+			reparseData = ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, TranslatePath(target), target)
+		if not backend.CreateDirectory(dstpath):
+			raise WinError(backend.GetLastError())
+		if not write_reparse_point(dstpath, reparseData):
+			error = backend.GetLastError()
+			backend.RemoveDirectory(dstpath)
+			raise WinError(error)
+	else:
+		target = _rebase(backend, target, src, dst)
+		flags = SYMBOLIC_LINK_FLAG_DIRECTORY if isdir else SYMBOLIC_LINK_FLAG_FILE
+		if not backend.CreateSymbolicLink(dstpath, target, flags):
+			raise WinError(backend.GetLastError())
+	return target
+
+def copytree(src, dst, workers = None, pool = None):
+	"""
+	Copy the directory tree at src to dst, which mustn't exist yet, keeping its junctions, symbolic links and hard
+	links. The directories are created first, then files are copied by a pool of workers threads (DEFAULT_BATCH_WORKERS
+	by default, or pool, a multiprocessing.pool.ThreadPool), hard link groups are copied once each, and the links go
+	in last. An item that fails doesn't stop the rest: they're all reported at the end, in a CopyTreeException.
+
+	Returns dst.
+
+	See: shutil.copytree
+	"""
+	backend = GetBackend()
+	src = GetFullPathName(str_cleanup(src))
+	dst = GetFullPathName(str_cleanup(dst))
+	if not IsFolder(src):
+		raise InvalidSourceException('Non-existent source path, "{0}"'.format(src))
+	pathmod = backend.path
+	folded = pathmod.normcase(dst)
+	if folded == pathmod.normcase(src) or folded.startswith(pathmod.normcase(src).rstrip(pathmod.sep) + pathmod.sep):
+		raise InvalidSourceException('Cannot copy "{0}" into itself.'.format(src))
+	if not backend.CreateDirectory(dst):
+		raise WinError(backend.GetLastError())
+
+	errors = []
+	def listing_error(dirpath, code):
+		errors.append((dirpath, pathmod.join(dst, dirpath[len(src):].lstrip(pathmod.sep)), WinError(code)))
+
+	# scan yields parents before their children, so every directory can be created as it comes.
+	files, links = [], []
+	for entry in scan(src, onerror = listing_error):
+		dstpath = pathmod.join(dst, entry.path[len(src):].lstrip(pathmod.sep))
+		if entry.is_junction or entry.is_symlink:
+			links.append((entry.path, dstpath, entry.is_junction, entry.is_dir, src, dst))
+		elif not entry.is_dir:
+			files.append((entry.path, dstpath))
+		elif not backend.CreateDirectory(dstpath):
+			errors.append((entry.path, dstpath, WinError(backend.GetLastError())))
+
+	owned = pool is None
+	if owned:
+		from multiprocessing.pool import ThreadPool
+		pool = ThreadPool(workers or DEFAULT_BATCH_WORKERS)
+	try:
+		# Files with more than one link are set aside by identity, in the order they were found.
+		groups = OrderedDict()
+		for result in iter_many(_copy_file, files, pool = pool):
+			if not result.ok:
+				errors.append(result.item + (result.error,))
+			elif result.value is not None:
+				groups.setdefault(result.value, []).append(result.item)
+		for result in iter_many(_copy_group, groups.values(), pool = pool):
+			if not result.ok:
+				errors.extend(item + (result.error,) for item in result.item)
+			else:
+				errors.extend(result.value)
+		for result in iter_many(_copy_link, links, pool = pool):
+			if not result.ok:
+				errors.append(result.item[:2] + (result.error,))
+	finally:
+		if owned:
+			pool.terminate()
+
+	if errors:
+		raise CopyTreeException(errors)
+	return dst
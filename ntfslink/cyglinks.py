@@ -9,38 +9,45 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
+import codecs
 from .common import *
 
-__all__ = [ 'create', 'check', 'read', 'unlink' ]
+__all__ = [
+	'create', 'check', 'read', 'unlink', 'create_many', 'read_many', 'unlink_many',
+	'iter_create_many', 'iter_read_many', 'iter_unlink_many',
+]
+
+try:
+	unicode
+except NameError:
+	unicode = str
 
 # Cygwin symbolic links start with:
-cyglink_tag = '!<symlink>'
+cyglink_tag = b'!<symlink>'
 
 def utf8str(data):
+	""" Decode the target stored in a cygwin symbolic link. (UTF-16 with a BOM, or UTF-8 from older versions) """
 	databuf = data
-	if isinstance(data, unicode):
-		databuf = data.encode('utf8')
-	elif data[:2] == '\xff\xfe':
-		databuf = data.decode('utf16')
-	return databuf.rstrip('\0')
+	if not isinstance(data, unicode):
+		if data[:2] == codecs.BOM_UTF16_LE:
+			databuf = data.decode('utf16')
+		else:
+			databuf = data.decode('utf8')
+	return databuf.rstrip(u'\0')
 
 def utf16str(data):
-	databuf = data
-	if isinstance(data, unicode):
-		databuf = data.decode('utf8').encode('utf16')
-	elif data[:2] != '\xff\xfe':
-		databuf = data.encode('utf16')
-	return databuf.rstrip('\0') + '\0\0'
+	""" Encode a target the way cygwin stores it: UTF-16 with a BOM and a terminating NUL. """
+	return codecs.BOM_UTF16_LE + (utf8str(data) + u'\0').encode('utf-16-le')
 
 def verify_filepath(filepath):
 	""" Verify that a filepath has the proper attributes to be a cygwin symlink. """
-	return os.path.isfile(filepath) and \
-		(GetFileAttributesW(filepath) & FILE_ATTRIBUTE_SYSTEM) == FILE_ATTRIBUTE_SYSTEM
+	return IsFile(filepath) and \
+		(GetBackend().GetFileAttributes(filepath) & FILE_ATTRIBUTE_SYSTEM) == FILE_ATTRIBUTE_SYSTEM
 
 def verify_data(data):
 	""" Verify that data contains a valid cygwin symlink """
 	databuf = data
-	if isinstance(data, file):
+	if hasattr(data, 'read'):
 		pos = data.tell()
 		data.seek(0)
 		databuf = data.read()
@@ -53,11 +60,12 @@ def create(srcpath, linkpath):
 
 	See: os.symlink
 	"""
+	backend = GetBackend()
 	src = utf16str(srcpath)
-	with open(linkpath, 'wb') as f:
+	with backend.open(linkpath, 'wb') as f:
 		f.write(cyglink_tag)
 		f.write(src)
-	return SetFileAttributesW(srcpath, FILE_ATTRIBUTE_SYSTEM) != FALSE
+	return backend.SetFileAttributes(linkpath, FILE_ATTRIBUTE_SYSTEM)
 
 def check(linkpath):
 	"""
@@ -66,7 +74,7 @@ def check(linkpath):
 	See: os.path.islink
 	"""
 	if verify_filepath(linkpath):
-		with open(linkpath, 'rb') as f:
+		with GetBackend().open(linkpath, 'rb') as f:
 			return verify_data(f)
 	return False
 
@@ -77,7 +85,7 @@ def read(linkpath):
 	See: os.readlink
 	"""
 	if not verify_filepath(linkpath): raise InvalidLinkException(linkpath)
-	with open(linkpath, 'rb') as f: databuf = f.read()
+	with GetBackend().open(linkpath, 'rb') as f: databuf = f.read()
 	if not verify_data(databuf): raise InvalidLinkException(linkpath)
 	return utf8str(databuf[10:])
 
@@ -88,7 +96,13 @@ def unlink(linkpath):
 	See: os.rmdir
 	"""
 	if not verify_filepath(linkpath): raise InvalidLinkException(linkpath)
-	if SetFileAttributesW(linkpath, FILE_ATTRIBUTE_NORMAL) == FALSE:
-		raise WinError()
-	os.unlink(linkpath)
+	backend = GetBackend()
+	if not backend.SetFileAttributes(linkpath, FILE_ATTRIBUTE_NORMAL):
+		raise WinError(backend.GetLastError())
+	if not backend.DeleteFile(linkpath):
+		raise WinError(backend.GetLastError())
 	return True, 0
+
+create_many, read_many, unlink_many, iter_create_many, iter_read_many, iter_unlink_many = batch_helpers(
+	'cygwin symbolic link', create, read, unlink
+)
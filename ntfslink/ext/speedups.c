@@ -0,0 +1,478 @@
+/**
+ * speedups.c
+ * Optional C versions of the hot paths in ntfslink/internals/_reparse.py: pulling UTF-16 names out of reparse buffers,
+ * decoding and encoding mount points and symbolic links, and classifying reparse tags in bulk.
+ *
+ * Unlike the rest of ntfslink/ext, nothing in here touches the Win32 API, so it builds (and gets used) anywhere. Every
+ * function takes the same arguments and gives the same results as the pure-Python version it stands in for, which
+ * _reparse.py falls back on whenever this isn't built.
+ *
+ * This program is free software. It comes without any warranty, to
+ * the extent permitted by applicable law. You can redistribute it
+ * and/or modify it under the terms of the Do What The Fuck You Want
+ * To Public License, Version 2, as published by Sam Hocevar. See
+ * http://sam.zoy.org/wtfpl/COPYING for more details.
+ */
+#define PY_SSIZE_T_CLEAN
+#include "Python.h"
+#include <string.h>
+
+#if PY_MAJOR_VERSION >= 3
+	#define BUFFER_FORMAT "y*"
+	#define INT_FROM_ULONG(x) PyLong_FromUnsignedLong(x)
+	#define INT_FROM_SSIZE(x) PyLong_FromSsize_t(x)
+	#define STR_FROM_STRING(x) PyUnicode_FromString(x)
+#else
+	#define BUFFER_FORMAT "s*"
+	#define INT_FROM_ULONG(x) PyInt_FromSize_t((size_t)(x))
+	#define INT_FROM_SSIZE(x) PyInt_FromSsize_t(x)
+	#define STR_FROM_STRING(x) PyString_FromString(x)
+#endif
+
+// Same values as _winioctl.py
+#define IO_REPARSE_TAG_MOUNT_POINT 0xA0000003UL
+#define IO_REPARSE_TAG_SYMBOLIC_LINK 0xA000000CUL
+#define REPARSE_TAG_NAME_SURROGATE 0x20000000UL
+#define MAX_REPARSE_TAG 0xFFFFFFFFUL
+#define REPARSE_POINT_HEADER_SIZE 8
+#define MAX_REPARSE_BUFFER (16 * 1024)
+
+// SubstituteNameOffset, SubstituteNameLength, PrintNameOffset, PrintNameLength, then the Flags of symbolic links.
+#define REPARSE_NAMES_SIZE 8
+#define REPARSE_FLAGS_SIZE 4
+#define MOUNT_POINT_PATH_OFFSET (REPARSE_POINT_HEADER_SIZE + REPARSE_NAMES_SIZE)
+#define SYMBOLIC_LINK_PATH_OFFSET (MOUNT_POINT_PATH_OFFSET + REPARSE_FLAGS_SIZE)
+
+// Same values as the REPARSE_KIND_* constants in _reparse.py
+#define REPARSE_KIND_NONE 0
+#define REPARSE_KIND_JUNCTION 1
+#define REPARSE_KIND_SYMLINK 2
+#define REPARSE_KIND_SURROGATE 3
+#define REPARSE_KIND_OTHER 4
+
+/* Handed over by _reparse.py through configure(). Until then, errors are ValueErrors and records are plain tuples. */
+static PyObject* InvalidReparseBuffer = NULL;
+static PyObject* ReparseDataType = NULL;
+
+/** Little-endian helpers, so nothing depends on the byte order or alignment of the machine. **/
+
+static unsigned long Read16(const unsigned char* p)
+{
+	return (unsigned long)p[0] | ((unsigned long)p[1] << 8);
+}
+
+static unsigned long Read32(const unsigned char* p)
+{
+	return (unsigned long)p[0] | ((unsigned long)p[1] << 8) | ((unsigned long)p[2] << 16) | ((unsigned long)p[3] << 24);
+}
+
+static void Write16(unsigned char* p, unsigned long value)
+{
+	p[0] = (unsigned char)(value & 0xFF);
+	p[1] = (unsigned char)((value >> 8) & 0xFF);
+}
+
+static void Write32(unsigned char* p, unsigned long value)
+{
+	Write16(p, value & 0xFFFF);
+	Write16(p + 2, (value >> 16) & 0xFFFF);
+}
+
+/**
+ *@brief Raise InvalidReparseBufferException (or ValueError, if configure() hasn't been called) with message.
+ *@return NULL, for returning straight out of the caller.
+ */
+static PyObject* Invalid(const char* message)
+{
+	PyErr_SetString(InvalidReparseBuffer != NULL ? InvalidReparseBuffer : PyExc_ValueError, message);
+	return NULL;
+}
+
+/**
+ *@brief Raise InvalidReparseBufferException for a tag that isn't a mount point or symbolic link, formatting it the
+ * same way as _reparse.py does, whatever its size.
+ *@return NULL, for returning straight out of the caller.
+ */
+static PyObject* UnsupportedTag(PyObject* tag)
+{
+	PyObject *format, *message;
+	format = STR_FROM_STRING("Unsupported reparse tag: 0x%08X");
+	message = format != NULL ? PyNumber_Remainder(format, tag) : NULL;
+	Py_XDECREF(format);
+	if (message != NULL) {
+		PyErr_SetObject(InvalidReparseBuffer != NULL ? InvalidReparseBuffer : PyExc_ValueError, message);
+		Py_DECREF(message);
+	}
+	return NULL;
+}
+
+/**
+ *@brief Convert a reparse tag passed in as an integer. Tags are ULONGs: nothing gets masked down to 32 bits, since
+ * _reparse.py compares them whole.
+ *@return 1 with value set, 0 for integers outside of 0 to MAX_REPARSE_TAG (which are no tag at all), or -1 with an
+ * exception set.
+ */
+static int TagValue(PyObject* tag, unsigned long* value)
+{
+	int overflow;
+	PY_LONG_LONG wide = PyLong_AsLongLongAndOverflow(tag, &overflow);
+	if (wide == -1 && !overflow && PyErr_Occurred())
+		return -1;
+	if (overflow || wide < 0 || wide > (PY_LONG_LONG)MAX_REPARSE_TAG)
+		return 0;
+	*value = (unsigned long)wide;
+	return 1;
+}
+
+/**
+ *@brief Decode length bytes of UTF-16LE at begin in the size bytes at data, after checking they're inside of them.
+ *@param [in] offset Offset of the name from the start of the PathBuffer, for the error message.
+ */
+static PyObject* DecodeName(const unsigned char* data, Py_ssize_t size, Py_ssize_t begin, Py_ssize_t offset,
+	Py_ssize_t length)
+{
+	char message[96];
+	int byteorder = -1;
+	if (begin < 0 || length < 0 || begin + length > size) {
+		PyOS_snprintf(message, sizeof(message), "Name at offset %ld runs past the end of the reparse buffer.", (long)offset);
+		return Invalid(message);
+	}
+	return PyUnicode_DecodeUTF16((const char*)data + begin, length, "strict", &byteorder);
+}
+
+/**
+ *@brief Decode the size bytes of mount point or symbolic link data (what follows the header) at data.
+ *@param [in] tag The reparse tag, as passed in, which ends up in the record as is.
+ *@return A ReparseData record (or tuple), or NULL with an exception set.
+ */
+static PyObject* DecodeLink(PyObject* tag, unsigned long tagValue, const unsigned char* data, Py_ssize_t size)
+{
+	PyObject *fields, *newargs, *result = NULL;
+	PyObject *flags = NULL, *substituteName = NULL, *printName = NULL;
+	Py_ssize_t start = REPARSE_NAMES_SIZE;
+
+	if (tagValue == IO_REPARSE_TAG_SYMBOLIC_LINK)
+		start += REPARSE_FLAGS_SIZE;
+	if (size < start)
+		return Invalid("Reparse buffer is too small to hold its name offsets.");
+
+	flags = INT_FROM_ULONG(start > REPARSE_NAMES_SIZE ? Read32(data + REPARSE_NAMES_SIZE) : 0);
+	if (flags == NULL) goto done;
+	substituteName = DecodeName(data, size, start + Read16(data), Read16(data), Read16(data + 2));
+	if (substituteName == NULL) goto done;
+	printName = DecodeName(data, size, start + Read16(data + 4), Read16(data + 4), Read16(data + 6));
+	if (printName == NULL) goto done;
+
+	fields = PyTuple_Pack(4, tag, flags, substituteName, printName);
+	if (fields == NULL || ReparseDataType == NULL) {
+		result = fields;
+	} else {
+		// Same as tuple.__new__(ReparseData, fields), skipping the namedtuple's own __new__.
+		newargs = PyTuple_Pack(1, fields);
+		Py_DECREF(fields);
+		if (newargs != NULL) {
+			result = PyTuple_Type.tp_new((PyTypeObject*)ReparseDataType, newargs, NULL);
+			Py_DECREF(newargs);
+		}
+	}
+
+done:
+	Py_XDECREF(flags);
+	Py_XDECREF(substituteName);
+	Py_XDECREF(printName);
+	return result;
+}
+
+PyDoc_STRVAR(decode_name_doc,
+"decode_name(data, start, offset, length)\n\nPull a single UTF-16 name out of a PathBuffer that starts at start."
+);
+static PyObject* speedups_decode_name(PyObject* self, PyObject* args)
+{
+	Py_buffer data; Py_ssize_t start, offset, length;
+	PyObject* result;
+	if (!PyArg_ParseTuple(args, BUFFER_FORMAT "nnn:decode_name", &data, &start, &offset, &length))
+		return NULL;
+	result = DecodeName((const unsigned char*)data.buf, data.len, start + offset, offset, length);
+	PyBuffer_Release(&data);
+	return result;
+}
+
+PyDoc_STRVAR(decode_link_doc,
+"decode_link(tag, guid, data)\n\nDecoder for IO_REPARSE_TAG_MOUNT_POINT and IO_REPARSE_TAG_SYMBOLIC_LINK."
+);
+static PyObject* speedups_decode_link(PyObject* self, PyObject* args)
+{
+	PyObject *tag, *guid, *result = NULL;
+	unsigned long tagValue;
+	int valid;
+	Py_buffer data;
+
+	if (!PyArg_ParseTuple(args, "OO" BUFFER_FORMAT ":decode_link", &tag, &guid, &data))
+		return NULL;
+	valid = TagValue(tag, &tagValue);
+	// Anything that isn't a tag isn't a symbolic link either, so it gets read as a mount point, like in _reparse.py.
+	if (valid >= 0)
+		result = DecodeLink(tag, valid ? tagValue : 0, (const unsigned char*)data.buf, data.len);
+	PyBuffer_Release(&data);
+	return result;
+}
+
+PyDoc_STRVAR(decode_buffer_doc,
+"decode_buffer(buf, offset)\n\nSee: DecodeReparseBuffer"
+);
+static PyObject* speedups_decode_buffer(PyObject* self, PyObject* args)
+{
+	Py_buffer buf; Py_ssize_t offset, datalen;
+	unsigned long tagValue;
+	const unsigned char* p;
+	char message[64];
+	PyObject *tag, *result = NULL;
+
+	if (!PyArg_ParseTuple(args, BUFFER_FORMAT "n:decode_buffer", &buf, &offset))
+		return NULL;
+	if (offset < 0 || buf.len - offset < REPARSE_POINT_HEADER_SIZE) {
+		Invalid("Buffer is too small to hold a reparse point header.");
+		goto done;
+	}
+	p = (const unsigned char*)buf.buf + offset;
+	tagValue = Read32(p);
+	datalen = (Py_ssize_t)Read16(p + 4);
+	if (buf.len - offset - REPARSE_POINT_HEADER_SIZE < datalen) {
+		PyOS_snprintf(message, sizeof(message), "Reparse buffer is truncated: expected %ld bytes of data.", (long)datalen);
+		Invalid(message);
+		goto done;
+	}
+	if (tagValue != IO_REPARSE_TAG_MOUNT_POINT && tagValue != IO_REPARSE_TAG_SYMBOLIC_LINK) {
+		PyOS_snprintf(message, sizeof(message), "Unsupported reparse tag: 0x%08lX", tagValue);
+		Invalid(message);
+		goto done;
+	}
+	tag = INT_FROM_ULONG(tagValue);
+	if (tag != NULL) {
+		result = DecodeLink(tag, tagValue, p + REPARSE_POINT_HEADER_SIZE, datalen);
+		Py_DECREF(tag);
+	}
+
+done:
+	PyBuffer_Release(&buf);
+	return result;
+}
+
+PyDoc_STRVAR(encode_into_doc,
+"encode_into(buf, offset, tag, flags, subst, prnt)\n\nWrites an already UTF-16 encoded mount point or symbolic link at\n"
+"offset. Returns the number of bytes written."
+);
+static PyObject* speedups_encode_into(PyObject* self, PyObject* args)
+{
+	Py_buffer buf, subst, prnt;
+	Py_ssize_t offset, datalen, total;
+	unsigned long tag = 0, flags;
+	unsigned char* p;
+	char message[64];
+	PyObject *tagObject, *result = NULL;
+
+	if (!PyArg_ParseTuple(args, "w*nOk" BUFFER_FORMAT BUFFER_FORMAT ":encode_into",
+			&buf, &offset, &tagObject, &flags, &subst, &prnt))
+		return NULL;
+
+	if (TagValue(tagObject, &tag) < 0)
+		goto done;
+	if (tag == IO_REPARSE_TAG_MOUNT_POINT) {
+		datalen = REPARSE_NAMES_SIZE + subst.len + prnt.len + 4;
+	} else if (tag == IO_REPARSE_TAG_SYMBOLIC_LINK) {
+		datalen = REPARSE_NAMES_SIZE + REPARSE_FLAGS_SIZE + subst.len + prnt.len;
+	} else {
+		UnsupportedTag(tagObject);
+		goto done;
+	}
+	total = REPARSE_POINT_HEADER_SIZE + datalen;
+	if (total > MAX_REPARSE_BUFFER) {
+		PyOS_snprintf(message, sizeof(message), "Reparse data is too large: %ld bytes.", (long)total);
+		Invalid(message);
+		goto done;
+	}
+	if (offset < 0 || buf.len - offset < total) {
+		Invalid("Buffer is too small to hold the reparse data.");
+		goto done;
+	}
+
+	p = (unsigned char*)buf.buf + offset;
+	Write32(p, tag);
+	Write16(p + 4, (unsigned long)datalen);
+	Write16(p + 6, 0);
+	if (tag == IO_REPARSE_TAG_MOUNT_POINT) {
+		// SubstituteName\0PrintName\0
+		Write16(p + 8, 0);
+		Write16(p + 10, (unsigned long)subst.len);
+		Write16(p + 12, (unsigned long)(subst.len + 2));
+		Write16(p + 14, (unsigned long)prnt.len);
+		p += MOUNT_POINT_PATH_OFFSET;
+		memcpy(p, subst.buf, subst.len);
+		p += subst.len;
+		p[0] = p[1] = 0;
+		p += 2;
+		memcpy(p, prnt.buf, prnt.len);
+		p += prnt.len;
+		p[0] = p[1] = 0;
+	} else {
+		// PrintNameSubstituteName, matching what CreateSymbolicLink writes.
+		Write16(p + 8, (unsigned long)prnt.len);
+		Write16(p + 10, (unsigned long)subst.len);
+		Write16(p + 12, 0);
+		Write16(p + 14, (unsigned long)prnt.len);
+		Write32(p + 16, flags);
+		p += SYMBOLIC_LINK_PATH_OFFSET;
+		memcpy(p, prnt.buf, prnt.len);
+		memcpy(p + prnt.len, subst.buf, subst.len);
+	}
+	result = INT_FROM_SSIZE(total);
+
+done:
+	PyBuffer_Release(&buf);
+	PyBuffer_Release(&subst);
+	PyBuffer_Release(&prnt);
+	return result;
+}
+
+static char ClassifyTag(unsigned long tag)
+{
+	if (tag == 0) return REPARSE_KIND_NONE;
+	if (tag == IO_REPARSE_TAG_MOUNT_POINT) return REPARSE_KIND_JUNCTION;
+	if (tag == IO_REPARSE_TAG_SYMBOLIC_LINK) return REPARSE_KIND_SYMLINK;
+	if (tag & REPARSE_TAG_NAME_SURROGATE) return REPARSE_KIND_SURROGATE;
+	return REPARSE_KIND_OTHER;
+}
+
+/**
+ *@brief Classify the unsigned integers of a buffer (array('L'), etc) in place of iterating over them.
+ *@return The bytearray, NULL with an exception set, or NULL without one for anything that isn't such a buffer.
+ */
+static PyObject* ClassifyBuffer(PyObject* tags)
+{
+	Py_buffer view;
+	const char* format;
+	Py_ssize_t count, i;
+	PyObject* result = NULL;
+	char* kinds;
+
+	if (!PyObject_CheckBuffer(tags) || PyObject_GetBuffer(tags, &view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) < 0) {
+		PyErr_Clear();
+		return NULL;
+	}
+	format = view.format != NULL ? view.format : "B";
+	if (format[0] == '@' || format[0] == '=' || format[0] == '<')
+		format++;
+	if (view.ndim > 1 || (strcmp(format, "I") && strcmp(format, "L") && strcmp(format, "Q")) ||
+			(view.itemsize != 4 && view.itemsize != 8)) {
+		PyBuffer_Release(&view);
+		return NULL;
+	}
+
+	count = view.len / view.itemsize;
+	result = PyByteArray_FromStringAndSize(NULL, count);
+	if (result != NULL) {
+		kinds = PyByteArray_AS_STRING(result);
+		if (view.itemsize == 4) {
+			const unsigned int* values = (const unsigned int*)view.buf;
+			for (i = 0; i < count; i++)
+				kinds[i] = ClassifyTag(values[i]);
+		} else {
+			const unsigned long long* values = (const unsigned long long*)view.buf;
+			for (i = 0; i < count; i++)
+				kinds[i] = values[i] > MAX_REPARSE_TAG ? REPARSE_KIND_OTHER : ClassifyTag((unsigned long)values[i]);
+		}
+	}
+	PyBuffer_Release(&view);
+	return result;
+}
+
+PyDoc_STRVAR(classify_tags_doc,
+"classify_tags(tags)\n\nSee: ClassifyReparseTags"
+);
+static PyObject* speedups_classify_tags(PyObject* self, PyObject* tags)
+{
+	PyObject *result, *iterator, *item;
+	unsigned long tag;
+	int valid;
+	char kind;
+
+	result = ClassifyBuffer(tags);
+	if (result != NULL || PyErr_Occurred())
+		return result;
+
+	result = PyByteArray_FromStringAndSize(NULL, 0);
+	iterator = PyObject_GetIter(tags);
+	if (result == NULL || iterator == NULL)
+		goto fail;
+	while ((item = PyIter_Next(iterator)) != NULL) {
+		valid = TagValue(item, &tag);
+		Py_DECREF(item);
+		if (valid < 0)
+			goto fail;
+		kind = valid ? ClassifyTag(tag) : REPARSE_KIND_OTHER;
+		if (PyByteArray_Resize(result, PyByteArray_GET_SIZE(result) + 1) < 0)
+			goto fail;
+		PyByteArray_AS_STRING(result)[PyByteArray_GET_SIZE(result) - 1] = kind;
+	}
+	if (PyErr_Occurred())
+		goto fail;
+	Py_DECREF(iterator);
+	return result;
+
+fail:
+	Py_XDECREF(iterator);
+	Py_XDECREF(result);
+	return NULL;
+}
+
+PyDoc_STRVAR(configure_doc,
+"configure(exception, record)\n\nSet the exception class raised for invalid buffers, and the record type decode_link\n"
+"returns. (A tuple subclass, like the ReparseData namedtuple)"
+);
+static PyObject* speedups_configure(PyObject* self, PyObject* args)
+{
+	PyObject *exception, *record;
+	if (!PyArg_ParseTuple(args, "OO!:configure", &exception, &PyType_Type, &record))
+		return NULL;
+	if (!PyType_IsSubtype((PyTypeObject*)record, &PyTuple_Type)) {
+		PyErr_SetString(PyExc_TypeError, "record must be a tuple subclass");
+		return NULL;
+	}
+	Py_INCREF(exception);
+	Py_XDECREF(InvalidReparseBuffer);
+	InvalidReparseBuffer = exception;
+	Py_INCREF(record);
+	Py_XDECREF(ReparseDataType);
+	ReparseDataType = record;
+	Py_RETURN_NONE;
+}
+
+static struct PyMethodDef speedups_methods[] = {
+	{"decode_name", (PyCFunction)speedups_decode_name, METH_VARARGS, decode_name_doc},
+	{"decode_link", (PyCFunction)speedups_decode_link, METH_VARARGS, decode_link_doc},
+	{"decode_buffer", (PyCFunction)speedups_decode_buffer, METH_VARARGS, decode_buffer_doc},
+	{"encode_into", (PyCFunction)speedups_encode_into, METH_VARARGS, encode_into_doc},
+	{"classify_tags", (PyCFunction)speedups_classify_tags, METH_O, classify_tags_doc},
+	{"configure", (PyCFunction)speedups_configure, METH_VARARGS, configure_doc},
+	{NULL, NULL}
+};
+
+PyDoc_STRVAR(speedups_doc,
+" C versions of the hot paths in ntfslink.internals._reparse. (Only ever used through that module)"
+);
+
+#if PY_MAJOR_VERSION >= 3
+static struct PyModuleDef speedups_module = {
+	PyModuleDef_HEAD_INIT, "_speedups", speedups_doc, -1, speedups_methods
+};
+
+PyMODINIT_FUNC PyInit__speedups(void)
+{
+	return PyModule_Create(&speedups_module);
+}
+#else
+PyMODINIT_FUNC init_speedups(void)
+{
+	Py_InitModule3("_speedups", speedups_methods, speedups_doc);
+}
+#endif
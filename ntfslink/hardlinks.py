@@ -9,33 +9,298 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-from common import *
+from __future__ import print_function
+import hashlib, random
+from collections import namedtuple
+from .common import *
+from .scanner import scan
 
-__all__ = ['example']
+__all__ = [
+	'create', 'check', 'read', 'unlink', 'create_many', 'read_many', 'unlink_many',
+	'iter_create_many', 'iter_read_many', 'iter_unlink_many', 'identity', 'dedupe', 'DedupeResult',
+	'example'
+]
+
+# dedupe leaves every file with at most this many links, one short of the 1024 that NTFS allows.
+DEDUPE_MAX_LINKS = 1023
+# Bytes hashed from the start of every candidate by dedupe, before any file gets hashed in full.
+DEDUPE_PARTIAL_SIZE = 4096
+# Bytes read at a time when hashing whole files.
+DEDUPE_BLOCK_SIZE = 1 << 20
+
+# BLAKE2 is quicker than SHA-256 in software, where there's a choice. (Python 3.6+)
+_dedupe_hash = getattr(hashlib, 'blake2b', hashlib.sha256)
+
+def create(srcpath, linkpath):
+	"""
+	Create a hard link at linkpath to the file at srcpath. Both have to be on the same volume.
+
+	See: os.link
+	"""
+	srcpath = str_cleanup(srcpath)
+	linkpath = str_cleanup(linkpath)
+	if not IsFile(srcpath):
+		raise InvalidSourceException('Non-existent source file, "{0}"'.format(srcpath))
+
+	linkpath = GetFullPathName(linkpath)
+	if PathExists(linkpath):
+		raise InvalidSourceException('Filepath for new hard link already exists.')
+
+	return GetBackend().CreateHardLink(linkpath, srcpath)
+
+def _file_information(filepath):
+	""" BY_HANDLE_FILE_INFORMATION of the file at filepath. """
+	backend = GetBackend()
+	with Handle(OpenFileForRead(filepath)) as hFile:
+		fileInfo = backend.GetFileInformationByHandle(hFile)
+		if fileInfo is None:
+			raise WinError(backend.GetLastError())
+	return fileInfo
+
+def check(linkpath):
+	"""
+	Checks if linkpath is a file with more than one hard link to it.
+
+	See: os.path.islink
+	"""
+	return IsFile(linkpath) and _file_information(linkpath).nNumberOfLinks > 1
+
+def read(linkpath):
+	"""
+	A hard link doesn't point anywhere: every link is the file. This returns the number of links to it, instead.
+
+	See: os.stat
+	"""
+	if not IsFile(linkpath): raise InvalidLinkException(linkpath)
+	return _file_information(linkpath).nNumberOfLinks
+
+def unlink(linkpath):
+	"""
+	Remove the hard link at linkpath. The file itself stays around for as long as it has links left.
+
+	See: os.unlink
+	"""
+	if not IsFile(linkpath): raise InvalidLinkException(linkpath)
+	backend = GetBackend()
+	if not backend.DeleteFile(linkpath):
+		raise WinError(backend.GetLastError())
+	return True, 0
+
+create_many, read_many, unlink_many, iter_create_many, iter_read_many, iter_unlink_many = batch_helpers(
+	'hard link', create, read, unlink
+)
+
+def identity(filepath):
+	"""
+	Returns (volume serial number, file index) for the file at filepath. Every hard link to a file shares it. (On POSIX,
+	that's (st_dev, st_ino).)
+	"""
+	fileInfo = _file_information(filepath)
+	return fileInfo.dwVolumeSerialNumber, (fileInfo.nFileIndexHigh << 32) | fileInfo.nFileIndexLow
+
+class DedupeResult(namedtuple('DedupeResult', 'path original freed error')):
+	"""
+	A duplicate found by dedupe. path has been replaced by a hard link to original (or would have been, for a dry run),
+	which freed freed bytes. That's 0 until the last link to the duplicate is gone. error is the exception that kept
+	path from being replaced, or None.
+	"""
+	__slots__ = ()
+
+	@property
+	def ok(self):
+		return self.error is None
+
+class _Inode(object):
+	""" A file seen by dedupe, with how many links it has and the paths it was found at. """
+	__slots__ = ('key', 'index', 'size', 'links', 'paths')
+
+	def __init__(self, key, index, links, fpath):
+		self.key = key
+		self.index = index
+		self.size = key[1]
+		self.links = links
+		self.paths = [fpath]
+
+def _dedupe_stat(fpath):
+	""" ((volume serial number, size), file index, number of links) of the file at fpath. """
+	fileInfo = _file_information(fpath)
+	size = (fileInfo.nFileSizeHigh << 32) | fileInfo.nFileSizeLow
+	index = (fileInfo.nFileIndexHigh << 32) | fileInfo.nFileIndexLow
+	return (fileInfo.dwVolumeSerialNumber, size), index, fileInfo.nNumberOfLinks
+
+def _digest(fpath, limit = None):
+	""" Hash of the contents of fpath, or of only its first limit bytes. """
+	digest = _dedupe_hash()
+	with GetBackend().open(fpath, 'rb') as f:
+		if limit is not None:
+			digest.update(f.read(limit))
+		else:
+			for block in iter(lambda: f.read(DEDUPE_BLOCK_SIZE), b''):
+				digest.update(block)
+	return digest.digest()
+
+def _split(groups, digest, pool, onerror):
+	"""
+	Hash one path of every inode in groups with digest, in parallel, and split the groups up by the result. Only the
+	groups that still have more than one inode are returned.
+	"""
+	split = {}
+	for result in iter_many(digest, (inode for group in groups for inode in group), pool = pool):
+		inode = result.item
+		if not result.ok:
+			if onerror is not None:
+				onerror(inode.paths[0], result.error)
+			continue
+		inode.key = (inode.key, result.value)
+		split.setdefault(inode.key, []).append(inode)
+	return [group for group in split.values() if len(group) > 1]
+
+def _relink(fpath, original):
+	"""
+	Replace the file at fpath with a hard link to original. The link is created next to it first, and renamed over it,
+	so that fpath is never missing. Returns the exception if that failed, or None.
+	"""
+	backend = GetBackend()
+	temppath = '%s.%08x~' % (fpath, random.getrandbits(32))
+	if not backend.CreateHardLink(temppath, original):
+		return WinError(backend.GetLastError())
+	if not backend.MoveFile(temppath, fpath):
+		error = WinError(backend.GetLastError())
+		backend.DeleteFile(temppath)
+		return error
+	return None
+
+def _link_group(group, dry_run):
+	"""
+	Link every path of a group of identical inodes to the one with the most links already, moving on to the next one
+	whenever that one runs out of links. Returns a DedupeResult per path.
+	"""
+	group.sort(key = lambda inode: (-inode.links, inode.paths[0]))
+	original, target = group[0], group[0].paths[0]
+	results = []
+	for inode in group[1:]:
+		for fpath in inode.paths:
+			if original.links >= DEDUPE_MAX_LINKS:
+				# The rest of the group gets linked to this inode instead, through the first of its paths that's still its
+				# own. (The ones before it have just been linked elsewhere.)
+				original, target = inode, fpath
+				if not dry_run:
+					inode.links = _file_information(fpath).nNumberOfLinks
+				break
+			error = None if dry_run else _relink(fpath, target)
+			freed = 0
+			if error is None:
+				original.links += 1
+				inode.links -= 1
+				if inode.links == 0:
+					freed = inode.size
+			results.append(DedupeResult(fpath, target, freed, error))
+	return results
+
+def dedupe(roots, dry_run = False, min_size = 1, workers = None, pool = None, onerror = None):
+	"""
+	Find the files under roots (a path, or a list of them) with identical contents, and replace every duplicate with a
+	hard link to a single copy, yielding a DedupeResult for each as it goes. With dry_run set, nothing is changed, but
+	the results are the same. Links are never followed, and files smaller than min_size are left alone.
+
+	Files are only compared to others of the same size on the same volume. Those are hashed DEDUPE_PARTIAL_SIZE bytes
+	in first, and only the ones that still match are hashed in full. Files that are already hard links of each other
+	count as one, and no file is given more than DEDUPE_MAX_LINKS links. The hashing and linking are done by a pool of
+	workers threads (DEFAULT_BATCH_WORKERS by default, or pool, a multiprocessing.pool.ThreadPool). When a file or
+	directory can't be looked at, onerror is called with its path and the exception, if given.
+
+	A path that's been replaced takes on the attributes and timestamps of the copy it's linked to, which is shared by
+	all of its links from then on. Nothing under roots should be changing while this runs.
+
+	roots are walked twice: once only to count the files of each size, and again to gather up the ones whose size is
+	shared. Memory grows with the number of different sizes and with those candidates, not with every file under roots.
+	"""
+	if isinstance(roots, (str, type(u''))):
+		roots = [roots]
+	def listing_error(dirpath, code):
+		if onerror is not None:
+			onerror(dirpath, WinError(code))
+
+	def files(report):
+		""" (path, _dedupe_stat) of every file under roots of at least min_size. Errors only go to onerror with report. """
+		found = (
+			entry.path for root in roots for entry in scan(root, onerror = listing_error if report else None)
+			if not entry.is_dir and not entry.is_reparse_point
+		)
+		for result in iter_many(_dedupe_stat, found, pool = pool):
+			if not result.ok:
+				if report and onerror is not None:
+					onerror(result.item, result.error)
+			elif result.value[0][1] >= min_size:
+				yield result.item, result.value
+
+	owned = pool is None
+	if owned:
+		from multiprocessing.pool import ThreadPool
+		pool = ThreadPool(workers or DEFAULT_BATCH_WORKERS)
+	try:
+		# Whether more than one file has each (volume, size).
+		shared = {}
+		for fpath, (key, index, links) in files(False):
+			shared[key] = key in shared
+		# Inodes by (volume, size), and then by file index, for the sizes that are shared.
+		buckets = {}
+		for fpath, (key, index, links) in files(True):
+			if not shared.get(key):
+				continue
+			found = buckets.setdefault(key, {})
+			inode = found.get(index)
+			if inode is None:
+				found[index] = _Inode(key, index, links, fpath)
+			elif fpath not in inode.paths:
+				inode.paths.append(fpath)
+		del shared
+		groups = [list(found.values()) for found in buckets.values() if len(found) > 1]
+		del buckets
+
+		groups = _split(groups, lambda inode: _digest(inode.paths[0], DEDUPE_PARTIAL_SIZE), pool, onerror)
+		def identical():
+			# What fits in DEDUPE_PARTIAL_SIZE has been hashed in full already, and can be linked while the rest is hashed.
+			for group in groups:
+				if group[0].size <= DEDUPE_PARTIAL_SIZE:
+					yield group
+			larger = [group for group in groups if group[0].size > DEDUPE_PARTIAL_SIZE]
+			for group in _split(larger, lambda inode: _digest(inode.paths[0]), pool, onerror):
+				yield group
+
+		for result in iter_many(lambda group: _link_group(group, dry_run), identical(), pool = pool, ordered = False):
+			if not result.ok:
+				if onerror is not None:
+					onerror(result.item[0].paths[0], result.error)
+				continue
+			for linked in result.value:
+				yield linked
+	finally:
+		if owned:
+			pool.terminate()
 
 def timeval(fi, attr):
-	print '  %s:' % attr
+	print('  %s:' % attr)
 	val = getattr(fi, attr)
-	print '    dwLowDateTime      => 0x%X' % val.dwLowDateTime
-	print '    dwHighDateTime     => 0x%X' % val.dwHighDateTime
+	print('    dwLowDateTime      => 0x%X' % val.dwLowDateTime)
+	print('    dwHighDateTime     => 0x%X' % val.dwHighDateTime)
 
 def example(filepath):
 	fileInfo = None
 	with Handle.open(filepath) as hFile:
-		fileInfo = BY_HANDLE_FILE_INFORMATION()
-		result = GetFileInformationByHandle(hFile, byref(fileInfo)) != FALSE
-		if not result:
-			raise WinError()
-
-	print filepath
-	print 'File Information'
-	print '  dwFileAttributes     => 0x%X' % fileInfo.dwFileAttributes
+		fileInfo = GetBackend().GetFileInformationByHandle(hFile)
+		if fileInfo is None:
+			raise WinError(GetBackend().GetLastError())
+
+	print(filepath)
+	print('File Information')
+	print('  dwFileAttributes     => 0x%X' % fileInfo.dwFileAttributes)
 	timeval(fileInfo, 'ftCreationTime')
 	timeval(fileInfo, 'ftLastAccessTime')
 	timeval(fileInfo, 'ftLastWriteTime')
-	print '  dwVolumeSerialNumber => 0x%X' % fileInfo.dwVolumeSerialNumber
-	print '  nFileSizeHigh        => 0x%X' % fileInfo.nFileSizeHigh
-	print '  nFileSizeLow         => 0x%X' % fileInfo.nFileSizeLow
-	print '  nNumberOfLinks       => 0x%X' % fileInfo.nNumberOfLinks
-	print '  nFileIndexHigh       => 0x%X' % fileInfo.nFileIndexHigh
-	print '  nFileIndexLow        => 0x%X' % fileInfo.nFileIndexLow
+	print('  dwVolumeSerialNumber => 0x%X' % fileInfo.dwVolumeSerialNumber)
+	print('  nFileSizeHigh        => 0x%X' % fileInfo.nFileSizeHigh)
+	print('  nFileSizeLow         => 0x%X' % fileInfo.nFileSizeLow)
+	print('  nNumberOfLinks       => 0x%X' % fileInfo.nNumberOfLinks)
+	print('  nFileIndexHigh       => 0x%X' % fileInfo.nFileIndexHigh)
+	print('  nFileIndexLow        => 0x%X' % fileInfo.nFileIndexLow)
@@ -0,0 +1,698 @@
+# encoding: utf-8
+"""
+image.py
+Module for reading links and reparse points straight out of a raw NTFS volume image, without mounting it.
+
+The image is mapped into memory copy-on-write, so the update sequence fixups can be applied in place without ever
+writing back to the image file.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import mmap, struct, bisect
+from array import array
+from collections import namedtuple
+from .internals._mft import *
+from .internals._reparse import DecodeReparsePoint, ReparseTarget
+from .internals._usn import UsnReader, USN_REASON_LINK_CHANGES, USN_READ_CHUNK
+
+__all__ = ['NtfsImage', 'ReparsePointEntry', 'HardLinkGroup', 'InvalidImageException']
+
+# Well-known MFT record numbers
+MFT_RECORD_MFT = 0
+MFT_RECORD_ROOT = 5
+MFT_RECORD_EXTEND = 11
+MFT_FIRST_USER_RECORD = 16
+
+# OEM ID, BytesPerSector, SectorsPerCluster, (reserved fields), TotalSectors, MftLcn, MftMirrLcn,
+# ClustersPerMftRecord, ClustersPerIndexRecord, VolumeSerialNumber
+_BOOT_SECTOR = struct.Struct('<3x8sHB26xQQQb3xb3xQ')
+_NTFS_OEM_ID = b'NTFS    '
+
+# Names of the directory index, and of the reparse point index in $Extend\$Reparse.
+INDEX_FILE_NAMES = u'$I30'
+REPARSE_INDEX_FILE = u'$Reparse'
+REPARSE_INDEX_NAME = u'$R'
+
+# The change journal lives in the $J stream of $Extend\$UsnJrnl.
+USN_JOURNAL_FILE = u'$UsnJrnl'
+USN_JOURNAL_STREAM = u'$J'
+
+# Prefix used for files whose parent directory no longer exists.
+ORPHAN_ROOT = u'\\$Orphan'
+
+# Number of MFT records handed to each worker by NtfsImage.parallel_reparse_points.
+PARALLEL_CHUNK_RECORDS = 65536
+
+# Record numbers are 48 bits. Python 2's array module has no 64-bit integer type, but a double holds 48 bits exactly.
+try:
+	_RECORD_TYPECODE = 'Q'
+	array(_RECORD_TYPECODE)
+except ValueError:
+	_RECORD_TYPECODE = 'd'
+
+class InvalidImageException(Exception):
+	""" Raised when a file does not contain a readable NTFS volume. """
+
+class ReparsePointEntry(namedtuple('ReparsePointEntry', 'path tag target file_reference')):
+	"""
+	A reparse point found in an image. target is the link target for mount points, symbolic links, LX symlinks and
+	app execution aliases, and None for everything else.
+	"""
+	__slots__ = ()
+
+class HardLinkGroup(namedtuple('HardLinkGroup', 'file_reference link_count paths')):
+	""" A file with more than one name. paths holds the full path of each of its hard links. """
+	__slots__ = ()
+
+def ResolveDirectoryPath(reference, lookup, cache):
+	"""
+	Build the full path of the directory with the given file reference by walking up its parents.
+
+	lookup(record number) returns a tuple containing (sequence number, parent reference, name) for a directory, or
+	None if it doesn't exist. Resolved paths are stored in cache as (sequence number, path), keyed by record number.
+	Directories whose parent chain is broken, loops, or refers to a record that has since been reused end up under
+	ORPHAN_ROOT.
+	"""
+	# Walk up until we hit the root or a directory we've already resolved, then fill the cache on the way down.
+	chain = []
+	seen = set()
+	while True:
+		number = FileReferenceNumber(reference)
+		if number == MFT_RECORD_ROOT:
+			path = u''
+			break
+		sequence = FileReferenceSequence(reference)
+		entry = cache.get(number)
+		if entry is not None:
+			path = entry[1] if not sequence or entry[0] == sequence else ORPHAN_ROOT
+			break
+		entry = lookup(number) if number not in seen else None
+		if entry is None or (sequence and entry[0] != sequence):
+			path = ORPHAN_ROOT
+			break
+		seen.add(number)
+		chain.append((number, entry[0], entry[2]))
+		reference = entry[1]
+
+	for number, sequence, name in reversed(chain):
+		path = u'%s\\%s' % (path, name)
+		cache[number] = (sequence, path)
+	return path
+
+class NtfsImage(object):
+	"""
+	A raw NTFS volume image. offset is the byte offset of the volume within the file, for images of whole disks.
+
+		>>> with NtfsImage('volume.img') as image:
+		...     for entry in image.reparse_points():
+		...         print(entry.path, entry.target)
+	"""
+
+	def __init__(self, filepath, offset = 0):
+		self._file = open(filepath, 'rb')
+		try:
+			self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_COPY)
+		except Exception:
+			self._file.close()
+			raise
+		try:
+			# Python 2's mmap objects don't support memoryview, in which case records get copied out one at a time.
+			self._view = memoryview(self._map)
+		except TypeError:
+			self._view = None
+		self.filepath = filepath
+		self.offset = offset
+		self._dirnames = {}
+		self._read_boot_sector()
+		self._load_mft()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+	def close(self):
+		self._dirnames = {}
+		if self._view is not None and hasattr(self._view, 'release'):
+			self._view.release()
+		self._view = None
+		self._map.close()
+		self._file.close()
+
+	def _read_boot_sector(self):
+		if len(self._map) < self.offset + 512:
+			raise InvalidImageException('Image is too small to hold an NTFS boot sector.')
+		(oem, self.sector_size, spc, self.total_sectors, self.mft_lcn, mirr, per_record, per_index,
+			self.serial_number) = _BOOT_SECTOR.unpack_from(self._map, self.offset)
+		if oem != _NTFS_OEM_ID:
+			raise InvalidImageException('Not an NTFS volume: OEM ID is %r' % oem)
+		# Values above 0x80 are a negative power of two, for clusters bigger than 64KB.
+		self.cluster_size = self.sector_size * (spc if spc <= 0x80 else 1 << (256 - spc))
+		# Negative values give the record size as a power of two, otherwise it's a number of clusters.
+		self.record_size = 1 << -per_record if per_record < 0 else per_record * self.cluster_size
+		self.index_record_size = 1 << -per_index if per_index < 0 else per_index * self.cluster_size
+
+	def _load_mft(self):
+		""" Map out the $MFT's own data runs, so that any record can be located. """
+		start = self.offset + self.mft_lcn * self.cluster_size
+		self._runs = []
+		mft = FileRecord(self._record_bytes(start), sector_size = self.sector_size)
+		data = mft.attribute(ATTRIBUTE_DATA)
+		if data is None or not data.non_resident:
+			raise InvalidImageException('$MFT has no non-resident $DATA attribute.')
+		self.mft_size = data.data_size
+		self._set_runs(data.runs())
+
+		# Since fixups are applied to the mapping itself, we keep one bit per record to remember which ones have
+		# already been fixed up. Record 0 just was.
+		self._fixed = bytearray((self.record_count + 7) // 8)
+		self._fixed[0] |= 1
+
+		# A badly fragmented $MFT keeps the rest of its runs in extension records, via an $ATTRIBUTE_LIST.
+		entries = mft.attribute_list or []
+		for entry in entries:
+			number = FileReferenceNumber(entry.segment_reference)
+			if entry.type != ATTRIBUTE_DATA or entry.name or number == MFT_RECORD_MFT:
+				continue
+			extent = self.record(number).attribute(ATTRIBUTE_DATA)
+			if extent is not None:
+				self._set_runs(self._runs + extent.runs())
+
+	def _set_runs(self, runs):
+		self._runs = sorted(runs)
+		self._run_vcns = [run.vcn for run in self._runs]
+
+	def _record_bytes(self, start):
+		""" A writable view (or copy, on Python 2) of the record_size bytes at start. """
+		if start + self.record_size > len(self._map):
+			raise InvalidImageException('Record at byte %d lies past the end of the image.' % start)
+		if self._view is not None:
+			return self._view[start:start + self.record_size]
+		return bytearray(self._map[start:start + self.record_size])
+
+	def _cluster_offset(self, vcn, runs, vcns):
+		""" Byte offset in the image of virtual cluster vcn, or None for sparse clusters. """
+		i = bisect.bisect_right(vcns, vcn) - 1
+		if i < 0 or vcn >= runs[i].vcn + runs[i].length:
+			raise InvalidImageException('Cluster %d is not mapped.' % vcn)
+		if runs[i].lcn is None:
+			return None
+		return self.offset + (runs[i].lcn + vcn - runs[i].vcn) * self.cluster_size
+
+	@property
+	def record_count(self):
+		return self.mft_size // self.record_size
+
+	def record_offset(self, number):
+		""" Byte offset of MFT record number within the image. """
+		if number >= self.record_count:
+			raise InvalidImageException('MFT record %d is past the end of the $MFT.' % number)
+		position = number * self.record_size
+		vcn = position // self.cluster_size
+		start = self._cluster_offset(vcn, self._runs, self._run_vcns)
+		if start is None:
+			raise InvalidImageException('MFT record %d lies in a sparse run.' % number)
+		return start + position % self.cluster_size
+
+	def record(self, number):
+		""" Parse MFT record number. The fixup is applied to the (copy-on-write) mapping of the image. """
+		buf = self._record_bytes(self.record_offset(number))
+		if self._view is None:
+			return FileRecord(buf, sector_size = self.sector_size)
+		byte, bit = number >> 3, 1 << (number & 7)
+		fixed = bool(self._fixed[byte] & bit)
+		record = FileRecord(buf, sector_size = self.sector_size, fixup = not fixed)
+		self._fixed[byte] |= bit
+		return record
+
+	def records(self, start = 0, stop = None):
+		"""
+		Yields (record number, FileRecord) for every in-use record between start and stop, in order. Unused, damaged
+		and never-initialized records are skipped.
+		"""
+		stop = self.record_count if stop is None else min(stop, self.record_count)
+		for number in range(start, stop):
+			try:
+				record = self.record(number)
+			except InvalidFileRecordException:
+				continue
+			if record.in_use:
+				yield number, record
+
+	def read_attribute(self, attr):
+		"""
+		Read the full value of an attribute as a memoryview. Resident values are a view of the record itself.
+		Non-resident values are read cluster-run by cluster-run into a new (writable) buffer, with sparse runs
+		zero-filled.
+		"""
+		if not attr.non_resident:
+			return attr.value
+		size = attr.data_size
+		result = bytearray(size)
+		position = 0
+		for run in attr.runs():
+			if position >= size:
+				break
+			length = min(run.length * self.cluster_size, size - position)
+			if run.lcn is not None:
+				start = self.offset + run.lcn * self.cluster_size
+				result[position:position + length] = self._map[start:start + length]
+			position += length
+		return memoryview(result)
+
+	def _best_name(self, record):
+		""" The Win32 (or POSIX) name of a record, falling back on its DOS name. Returns (parent reference, name). """
+		best = None
+		for fname in record.file_names(dos = True):
+			if best is None or (best.namespace == FILE_NAME_DOS and fname.namespace != FILE_NAME_DOS):
+				best = fname
+		if best is None:
+			return None, None
+		return best.parent_reference, best.name
+
+	def _directory_entry(self, number):
+		""" Lookup function for ResolveDirectoryPath, reading the directory's record straight from the image. """
+		try:
+			record = self.record(number)
+		except (InvalidFileRecordException, InvalidImageException):
+			return None
+		if not record.in_use:
+			return None
+		parent, name = self._best_name(record)
+		if name is None:
+			return None
+		return record.sequence, parent, name
+
+	def _directory_path(self, reference):
+		""" Full path of the directory with the given file reference. Results are cached per record number. """
+		return ResolveDirectoryPath(reference, self._directory_entry, self._dirnames)
+
+	def path(self, record):
+		""" Full path of a FileRecord, relative to the root of the volume. (eg: \\Users\\Public) """
+		if record.record_number == MFT_RECORD_ROOT:
+			return u'\\'
+		parent, name = self._best_name(record)
+		if name is None:
+			return None
+		return u'%s\\%s' % (self._directory_path(parent), name)
+
+	def file_reference(self, number, record):
+		""" The 64-bit file reference (record number plus sequence number) for a record. """
+		return number | (record.sequence << 48)
+
+	def attribute(self, record, type, name = u''):
+		"""
+		Find an attribute of a base record, following its $ATTRIBUTE_LIST into extension records when it isn't stored
+		in the base record itself. Returns None if the file has no such attribute.
+		"""
+		attr = record.attribute(type, name)
+		if attr is not None:
+			return attr
+		listattr = record.attribute(ATTRIBUTE_ATTRIBUTE_LIST)
+		if listattr is None:
+			return None
+		for entry in DecodeAttributeList(self.read_attribute(listattr)):
+			if entry.type == type and entry.name == name and \
+					FileReferenceNumber(entry.segment_reference) != record.record_number:
+				try:
+					attr = self.record(FileReferenceNumber(entry.segment_reference)).attribute(type, name)
+				except InvalidFileRecordException:
+					continue
+				if attr is not None:
+					return attr
+		return None
+
+	def attribute_runs(self, record, type, name = u''):
+		"""
+		All the data runs of a non-resident attribute of a base record, including those of the extents that are kept in
+		extension records when it's too fragmented to fit in one. Returns (data size, runs sorted by VCN), or None if
+		the record has no such non-resident attribute.
+		"""
+		extents = [attr for attr in record.attributes(type) if attr.name == name]
+		listattr = record.attribute(ATTRIBUTE_ATTRIBUTE_LIST)
+		if listattr is not None:
+			for entry in DecodeAttributeList(self.read_attribute(listattr)):
+				number = FileReferenceNumber(entry.segment_reference)
+				if entry.type != type or entry.name != name or number == record.record_number:
+					continue
+				try:
+					extents.extend(
+						attr for attr in self.record(number).attributes(type)
+						if attr.name == name and attr.non_resident and attr.nonresident_header[0] == entry.start_vcn
+					)
+				except InvalidFileRecordException:
+					continue
+		size = None
+		runs = []
+		for attr in extents:
+			if not attr.non_resident:
+				continue
+			if attr.nonresident_header[0] == 0:
+				size = attr.data_size
+			runs.extend(attr.runs())
+		if size is None:
+			return None
+		return size, sorted(runs)
+
+	def read_stream(self, record, type, name = u'', start = 0, chunk_size = USN_READ_CHUNK):
+		"""
+		Yields (offset, data) pairs for the value of an attribute of a base record, from offset start onwards and
+		chunk_size bytes at a time. Sparse runs are skipped over rather than zero-filled, which is what makes reading
+		the mostly sparse $UsnJrnl:$J cheap.
+		"""
+		attr = self.attribute(record, type, name)
+		if attr is None:
+			return
+		if not attr.non_resident:
+			if start < attr.data_size:
+				yield start, attr.value[start:].tobytes()
+			return
+		size, runs = self.attribute_runs(record, type, name)
+		for run in runs:
+			begin = run.vcn * self.cluster_size
+			end = min(begin + run.length * self.cluster_size, size)
+			if run.lcn is None or end <= start:
+				continue
+			position = max(begin, start)
+			while position < end:
+				length = min(chunk_size, end - position)
+				disk = self.offset + run.lcn * self.cluster_size + position - begin
+				yield position, self._map[disk:disk + length]
+				position += length
+
+	def usn_journal(self, start_usn = 0, reasons = USN_REASON_LINK_CHANGES, chunk_size = USN_READ_CHUNK):
+		"""
+		Returns a UsnReader over the volume's change journal ($Extend\\$UsnJrnl:$J), starting at start_usn. By default
+		it only yields the records for changes that can affect links: creates, deletes, renames, hard link and reparse
+		point changes. Its next_usn is the USN to pass back in as start_usn next time.
+		"""
+		reference = self.lookup(self.record(MFT_RECORD_EXTEND), USN_JOURNAL_FILE)
+		if reference is None:
+			raise InvalidImageException('The volume has no change journal.')
+		record = self.record(FileReferenceNumber(reference))
+		return UsnReader(
+			self.read_stream(record, ATTRIBUTE_DATA, USN_JOURNAL_STREAM, start_usn, chunk_size), start_usn, reasons
+		)
+
+	def file_names(self, record, dos = False):
+		"""
+		Yields the FileName of every $FILE_NAME of a base record, including those in its extension records. DOS 8.3
+		aliases are skipped unless dos is True.
+		"""
+		for fname in record.file_names(dos):
+			yield fname
+		listattr = record.attribute(ATTRIBUTE_ATTRIBUTE_LIST)
+		if listattr is None:
+			return
+		seen = set([record.record_number])
+		for entry in DecodeAttributeList(self.read_attribute(listattr)):
+			number = FileReferenceNumber(entry.segment_reference)
+			if entry.type != ATTRIBUTE_FILE_NAME or number in seen:
+				continue
+			seen.add(number)
+			try:
+				extension = self.record(number)
+			except InvalidFileRecordException:
+				continue
+			for fname in extension.file_names(dos):
+				yield fname
+
+	def hard_links(self):
+		"""
+		Yields a HardLinkGroup for every file on the volume with more than one hard link, in MFT order. Each non-DOS
+		$FILE_NAME is one link; files with a single name are never kept around.
+		"""
+		for number, record in self.records(MFT_FIRST_USER_RECORD):
+			# The link count in the header also counts DOS names, so it can only rule files out.
+			if record.link_count < 2 or record.is_directory or not record.is_base_record:
+				continue
+			names = list(self.file_names(record))
+			if len(names) < 2:
+				continue
+			paths = [u'%s\\%s' % (self._directory_path(fname.parent_reference), fname.name) for fname in names]
+			yield HardLinkGroup(self.file_reference(number, record), len(paths), paths)
+
+	def reparse_point(self, record):
+		""" Decode a record's $REPARSE_POINT attribute, resident or not. Returns None if it doesn't have one. """
+		attr = self.attribute(record, ATTRIBUTE_REPARSE_POINT)
+		if attr is None:
+			return None
+		# Copy the (small) value out, so that nothing we return pins the mapping of the image.
+		return DecodeReparsePoint(bytearray(self.read_attribute(attr)))
+
+	def reparse_points(self, tags = None):
+		"""
+		Yields a ReparsePointEntry for every reparse point on the volume, in MFT order. Pass a collection of reparse
+		tags in tags to only get those.
+		"""
+		for number, record in self.records(MFT_FIRST_USER_RECORD):
+			if not record.is_base_record:
+				continue
+			reparseData = self.reparse_point(record)
+			if reparseData is None or (tags is not None and reparseData.tag not in tags):
+				continue
+			yield ReparsePointEntry(
+				self.path(record), reparseData.tag, ReparseTarget(reparseData), self.file_reference(number, record)
+			)
+
+	def index_entries(self, record, name = INDEX_FILE_NAMES):
+		"""
+		Yields every IndexEntry with a key in the named index of a base record: first those in its $INDEX_ROOT, then
+		those in each in-use block of its $INDEX_ALLOCATION. Entries come back in on-disk order, not collation order.
+		"""
+		rootattr = self.attribute(record, ATTRIBUTE_INDEX_ROOT, name)
+		if rootattr is None:
+			return
+		root, entries = DecodeIndexRoot(self.read_attribute(rootattr))
+		for entry in entries:
+			if entry.key is not None:
+				yield entry
+		if not root.large:
+			return
+
+		allocation = self.attribute(record, ATTRIBUTE_INDEX_ALLOCATION, name)
+		if allocation is None:
+			raise InvalidImageException('Index %s is missing its $INDEX_ALLOCATION.' % name)
+		blocks = self.read_attribute(allocation)
+		bitmapattr = self.attribute(record, ATTRIBUTE_BITMAP, name)
+		bitmap = bytearray(self.read_attribute(bitmapattr)) if bitmapattr is not None else None
+		for i, offset in enumerate(range(0, len(blocks) - root.block_size + 1, root.block_size)):
+			# Blocks that aren't marked in use can hold stale entries from before the index shrank.
+			if bitmap is not None and (i >> 3 >= len(bitmap) or not bitmap[i >> 3] & (1 << (i & 7))):
+				continue
+			try:
+				entries = DecodeIndexBlock(blocks, offset, self.sector_size)
+			except InvalidFileRecordException:
+				continue
+			for entry in entries:
+				if entry.key is not None:
+					yield entry
+
+	def lookup(self, directory, name):
+		"""
+		Look a name up in a directory record's $I30 index. Returns the file reference of the entry, or None. Names are
+		compared case-insensitively, which is close enough to the volume's $UpCase table for ASCII names.
+		"""
+		name = name.upper()
+		for entry in self.index_entries(directory, INDEX_FILE_NAMES):
+			if DecodeFileName(entry.key).name.upper() == name:
+				return entry.header
+		return None
+
+	def reparse_index(self, tags = None):
+		"""
+		Yields a ReparseIndexKey for every entry in the $R index of $Extend\\$Reparse, which NTFS keeps for every
+		reparse point on the volume, sorted by (tag, file reference). Pass a collection of reparse tags in tags to only
+		get those. Unlike a scan of the whole MFT, this only costs as much as the number of reparse points.
+		"""
+		reference = self.lookup(self.record(MFT_RECORD_EXTEND), REPARSE_INDEX_FILE)
+		if reference is None:
+			raise InvalidImageException('The volume has no $Extend\\$Reparse.')
+		keys = [
+			DecodeReparseIndexKey(entry.key)
+			for entry in self.index_entries(self.record(FileReferenceNumber(reference)), REPARSE_INDEX_NAME)
+		]
+		keys.sort()
+		for key in keys:
+			if tags is None or key.tag in tags:
+				yield key
+
+	def indexed_reparse_points(self, tags = None):
+		"""
+		Same as reparse_points, but driven by the $R index (see reparse_index), so only the records of reparse points
+		get read. Results come back sorted by tag and then file reference. Index entries whose record has since been
+		deleted or reused are skipped.
+		"""
+		for key in self.reparse_index(tags):
+			number = FileReferenceNumber(key.file_reference)
+			try:
+				record = self.record(number)
+			except (InvalidFileRecordException, InvalidImageException):
+				continue
+			if not record.in_use or record.sequence != FileReferenceSequence(key.file_reference):
+				continue
+			reparseData = self.reparse_point(record)
+			if reparseData is None:
+				continue
+			yield ReparsePointEntry(
+				self.path(record), reparseData.tag, ReparseTarget(reparseData), self.file_reference(number, record)
+			)
+
+	def parallel_reparse_points(self, processes = None, chunk_records = PARALLEL_CHUNK_RECORDS, tags = None):
+		"""
+		Same as reparse_points, but the MFT is split into ranges of chunk_records records and parsed by a pool of
+		processes (os.cpu_count() by default; pass 1 to do everything in this process). Each worker sends back compact,
+		array-based directory and reparse point tables, which are merged here once every directory is known. Results
+		come back in MFT order, exactly as reparse_points would return them.
+		"""
+		tags = frozenset(tags) if tags is not None else None
+		chunks = [
+			(self.filepath, self.offset, start, min(start + chunk_records, self.record_count), tags)
+			for start in range(0, self.record_count, chunk_records)
+		]
+		pool = None
+		if processes == 1:
+			results = (_scan_range(chunk) for chunk in chunks)
+		else:
+			import multiprocessing
+			pool = multiprocessing.Pool(processes)
+			results = pool.imap(_scan_range, chunks)
+
+		directories = _DirectoryTable()
+		links = []
+		try:
+			for dirtable, linktable in results:
+				directories.extend(dirtable)
+				if linktable is not None:
+					links.append(linktable)
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+
+		cache = {}
+		while links:
+			numbers, sequences, parents, parentseqs, names, nameends, linktags, targets, targetends, present = \
+				links.pop(0)
+			for i in range(len(numbers)):
+				path = target = None
+				if present[i] & _HAS_NAME:
+					parent = int(parents[i]) | (parentseqs[i] << 48)
+					path = u'%s\\%s' % (
+						ResolveDirectoryPath(parent, directories.lookup, cache), _table_string(names, nameends, i)
+					)
+				if present[i] & _HAS_TARGET:
+					target = _table_string(targets, targetends, i)
+				yield ReparsePointEntry(path, linktags[i], target, int(numbers[i]) | (sequences[i] << 48))
+
+# Flags for the entries of a worker's reparse point table.
+_HAS_NAME = 1
+_HAS_TARGET = 2
+
+def _table_string(strings, ends, i):
+	""" The i'th string out of a \\0 separated table, given the array of where each one ends. """
+	start = ends[i - 1] + 1 if i else 0
+	return strings[start:ends[i]]
+
+def _string_table(strings):
+	""" Pack a list of strings into a single \\0 separated string, plus an array of where each one ends. """
+	ends = array('L')
+	position = -1
+	for string in strings:
+		position += len(string) + 1
+		ends.append(position)
+	return u'\0'.join(strings), ends
+
+def _scan_range(args):
+	"""
+	Worker for NtfsImage.parallel_reparse_points. Scans one range of MFT records, returning a tuple of
+	(directory table, reparse point table). Everything in them is either an array or one big string, so they're cheap
+	to send back to the parent process.
+	"""
+	filepath, offset, start, stop, tags = args
+	with NtfsImage(filepath, offset) as image:
+		return _scan_records(image, start, stop, tags)
+
+def _scan_records(image, start, stop, tags):
+	"""
+	Body of _scan_range. Kept separate so the last FileRecord (and its view of the mapping) is gone before the image
+	gets closed.
+	"""
+	dirnumbers, dirsequences = array(_RECORD_TYPECODE), array('H')
+	dirparents, dirparentseqs = array(_RECORD_TYPECODE), array('H')
+	dirnames = []
+	numbers, sequences = array(_RECORD_TYPECODE), array('H')
+	parents, parentseqs = array(_RECORD_TYPECODE), array('H')
+	names, linktags, targets, present = [], array('L'), [], array('B')
+
+	for number, record in image.records(start, stop):
+		if not record.is_base_record:
+			continue
+		parent, name = image._best_name(record)
+		if record.is_directory and name is not None:
+			dirnumbers.append(number)
+			dirsequences.append(record.sequence)
+			dirparents.append(FileReferenceNumber(parent))
+			dirparentseqs.append(FileReferenceSequence(parent))
+			dirnames.append(name)
+		if number < MFT_FIRST_USER_RECORD:
+			continue
+		reparseData = image.reparse_point(record)
+		if reparseData is None or (tags is not None and reparseData.tag not in tags):
+			continue
+		target = ReparseTarget(reparseData)
+		numbers.append(number)
+		sequences.append(record.sequence)
+		parents.append(FileReferenceNumber(parent or 0))
+		parentseqs.append(FileReferenceSequence(parent or 0))
+		names.append(name or u'')
+		linktags.append(reparseData.tag)
+		targets.append(target or u'')
+		present.append((_HAS_NAME if name is not None else 0) | (_HAS_TARGET if target is not None else 0))
+
+	dirtable = (dirnumbers, dirsequences, dirparents, dirparentseqs) + _string_table(dirnames)
+	linktable = None
+	if numbers:
+		linktable = (numbers, sequences, parents, parentseqs) + _string_table(names) + (linktags,) + \
+			_string_table(targets) + (present,)
+	return dirtable, linktable
+
+class _DirectoryTable(object):
+	"""
+	Every directory on the volume, merged from the workers' tables. The tables arrive in MFT order, so the record
+	numbers stay sorted and lookups are a binary search rather than a dict of Python objects.
+	"""
+
+	def __init__(self):
+		self.numbers = array(_RECORD_TYPECODE)
+		self.sequences = array('H')
+		self.parents = array(_RECORD_TYPECODE)
+		self.parentseqs = array('H')
+		self._firsts = []
+		self._names = []
+
+	def extend(self, table):
+		numbers, sequences, parents, parentseqs, names, ends = table
+		if not numbers:
+			return
+		self._firsts.append(len(self.numbers))
+		self._names.append((names, ends))
+		self.numbers.extend(numbers)
+		self.sequences.extend(sequences)
+		self.parents.extend(parents)
+		self.parentseqs.extend(parentseqs)
+
+	def lookup(self, number):
+		""" Lookup function for ResolveDirectoryPath. """
+		i = bisect.bisect_left(self.numbers, number)
+		if i == len(self.numbers) or self.numbers[i] != number:
+			return None
+		chunk = bisect.bisect_right(self._firsts, i) - 1
+		names, ends = self._names[chunk]
+		parent = int(self.parents[i]) | (self.parentseqs[i] << 48)
+		return self.sequences[i], parent, _table_string(names, ends, i - self._firsts[chunk])
@@ -8,26 +8,50 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-from os import path
-from _kernel32 import *
-from _advapi32 import *
+import threading
+from contextlib import contextmanager
+
+from ._kernel32 import *
+from ._advapi32 import *
+from ._reparse import *
+from ._bufpool import *
+from ._mft import *
+from ._usn import *
+from ._ntdll import *
+from ._backend import *
+from ._simulator import *
+from ._posix import *
 
 class InvalidHandleException(Exception):
 	""" Exception class for when a call to CreateFile returns INVALID_HANDLE (-1). """
 
+def _GetFileAttributes(fpath):
+	""" The attributes of fpath, or 0 if there's nothing there. """
+	attributes = GetBackend().GetFileAttributes(fpath)
+	return 0 if attributes == INVALID_FILE_ATTRIBUTES else attributes
+
+def PathExists(fpath):
+	""" Checks whether anything at all exists at a given path. Unlike os.path.exists, reparse points aren't followed. """
+	return GetBackend().GetFileAttributes(fpath) != INVALID_FILE_ATTRIBUTES
+
 def IsFolder(fpath):
 	"""
 	Checks whether a given path is a folder by using the GetFileAttributes call and testing the result against the
 	FILE_ATTRIBUTE_DIRECTORY flag.
 	"""
-	return bool(GetFileAttributesW(fpath) & FILE_ATTRIBUTE_DIRECTORY)
+	return bool(_GetFileAttributes(fpath) & FILE_ATTRIBUTE_DIRECTORY)
+
+def IsFile(fpath):
+	""" Checks whether a given path exists and isn't a folder. """
+	attributes = GetBackend().GetFileAttributes(fpath)
+	return attributes != INVALID_FILE_ATTRIBUTES and not attributes & FILE_ATTRIBUTE_DIRECTORY
 
 def IsReparsePoint(fpath):
 	"""
 	Checks whether a given path is a reparse point by using the GetFileAttributes call and testing the result against
 	the FILE_ATTRIBUTE_REPARSE_POINT flag.
 	"""
-	return bool(GetFileAttributesW(fpath) & FILE_ATTRIBUTE_REPARSE_POINT)
+	return bool(_GetFileAttributes(fpath) & FILE_ATTRIBUTE_REPARSE_POINT)
 
 def IsReparseDir(fpath):
 	"""
@@ -36,47 +60,105 @@ def IsReparseDir(fpath):
 		FILE_ATTRIBUTE_DIRECTORY | FILE_ATTRIBUTE_REPARSE_POINT
 	)
 	"""
-	return bool((GetFileAttributesW(fpath) & FILE_ATTRIBUTE_REPARSE_DIRECTORY) == FILE_ATTRIBUTE_REPARSE_DIRECTORY)
+	return bool((_GetFileAttributes(fpath) & FILE_ATTRIBUTE_REPARSE_DIRECTORY) == FILE_ATTRIBUTE_REPARSE_DIRECTORY)
+
+def GetFullPathName(fpath):
+	""" Absolute, normalized version of fpath, as the current backend sees it. """
+	return GetBackend().GetFullPathName(fpath)
 
 def TranslatePath(fpath):
 	"""
 	Builds a filepath for use in absolute symbolic links and junctions. Used for the "SubstituteName" field.
 
 		>>> TranslatePath('test.txt')
-		\??\C:\Temp\test.txt
+		\\??\\C:\\Temp\\test.txt
 	"""
-	fpath = path.abspath(fpath)
+	fpath = GetFullPathName(fpath)
 	if fpath[len(fpath)-1] == '\\' and fpath[len(fpath)-2] == ':':
 		fpath = fpath[:len(fpath)-1]
 	return '\\??\\%s' % fpath
 
+# Privileges are a property of the process token, so once one is enabled there's no point in asking for it again.
+# enabled holds every privilege we've turned on, pinned the ones that stay on for good (see ObtainPrivilege), and
+# scopes counts the privileges() blocks currently relying on each one. All of it belongs to one backend, and starts
+# over when the backend gets swapped out.
+_privilege_lock = threading.Lock()
+_privilege_state = {'backend': None, 'enabled': set(), 'pinned': set(), 'scopes': {}}
+
+def _PrivilegeBackend():
+	""" The current backend, resetting the privilege state if it changed. Call with _privilege_lock held. """
+	backend = GetBackend()
+	if _privilege_state['backend'] is not backend:
+		_privilege_state.update(backend = backend, enabled = set(), pinned = set(), scopes = {})
+	return backend
+
+def _EnablePrivilege(backend, name):
+	if name not in _privilege_state['enabled']:
+		if not backend.ObtainPrivilege(name):
+			raise Exception('Could not obtain the %s privilege.' % name)
+		_privilege_state['enabled'].add(name)
+
+def ObtainPrivilege(name):
+	"""
+	Enables a privilege (SE_*_NAME) for the rest of the process' lifetime. Only the first call for each privilege
+	reaches the backend.
+	"""
+	with _privilege_lock:
+		_EnablePrivilege(_PrivilegeBackend(), name)
+		_privilege_state['pinned'].add(name)
+
 def ObtainRestorePrivilege(readwrite = False):
 	"""
 	Acquires the privileges necessary to open a file with some additional access. For instance, when creating a
 	junction, we'll use this so that we can call CreateFile with the FILE_FLAG_REPARSE_BACKUP flag set.
 	"""
-	hToken = HANDLE()
-	tp = TokenPrivileges()
-	hProcess = GetCurrentProcess()
-	lpName = SE_RESTORE_NAME if readwrite else SE_BACKUP_NAME
-	if OpenProcessToken(hProcess, TOKEN_ADJUST_PRIVILEGES, byref(hToken)) == FALSE:
-		raise Exception('Could not open current process security token.')
-	if LookupPrivilegeValue(None, lpName, byref(tp.Privileges[0].Luid)) == FALSE:
-		CloseHandle(hToken)
-		raise Exception('Could not look up %s privilege.' % lpName)
-	tp.PrivilegeCount = 1
-	tp.Privileges[0].Attributes = SE_PRIVILEGE_ENABLED
-	if AdjustTokenPrivileges(hToken, FALSE, byref(tp), sizeof(TokenPrivileges), None, None) == FALSE:
-		CloseHandle(hToken)
-		raise Exception('Could not adjust current process\'s security privileges.')
-	CloseHandle(hToken)
+	ObtainPrivilege(SE_RESTORE_NAME if readwrite else SE_BACKUP_NAME)
+
+@contextmanager
+def privileges(*names):
+	"""
+	Enables the named privileges (SE_BACKUP_NAME and SE_RESTORE_NAME by default) for the duration of a with block.
+	Blocks can be nested. Privileges that weren't already enabled get disabled again when the last block using them
+	exits, unless something called ObtainPrivilege for them in the meantime.
+	"""
+	names = names or (SE_BACKUP_NAME, SE_RESTORE_NAME)
+	entered = []
+	with _privilege_lock:
+		backend = _PrivilegeBackend()
+		scopes = _privilege_state['scopes']
+		try:
+			for name in names:
+				_EnablePrivilege(backend, name)
+				scopes[name] = scopes.get(name, 0) + 1
+				entered.append(name)
+		except:
+			_LeavePrivileges(backend, entered)
+			raise
+	try:
+		yield
+	finally:
+		with _privilege_lock:
+			_LeavePrivileges(backend, entered)
+
+def _LeavePrivileges(backend, names):
+	if _privilege_state['backend'] is not backend:
+		return
+	scopes = _privilege_state['scopes']
+	for name in names:
+		scopes[name] -= 1
+		if scopes[name]:
+			continue
+		del scopes[name]
+		if name not in _privilege_state['pinned']:
+			backend.ReleasePrivilege(name)
+			_privilege_state['enabled'].discard(name)
 
 def _OpenFileForIO(filepath, generic, share, backup, flag = FILE_FLAG_OPEN_REPARSE_POINT):
 	if backup:
 		ObtainRestorePrivilege()
 		flag |= FILE_FLAG_BACKUP_SEMANTICS
-	hFile = CreateFile(filepath, generic, share, OPEN_EXISTING, flag)
-	if hFile == HANDLE(INVALID_HANDLE_VALUE):
+	hFile = GetBackend().CreateFile(filepath, generic, share, OPEN_EXISTING, flag)
+	if hFile is None:
 		raise InvalidHandleException('Failed to open path: %s' % filepath)
 	return hFile
 
@@ -87,15 +169,3 @@ def OpenFileForRead(filepath, backup = False):
 def OpenFileForAll(filepath, backup = False):
 	""" Opens a file for writing/deleting. """
 	return _OpenFileForIO(filepath, GENERIC_WRITE, FILE_SHARE_ALL, backup)
-
-def CalculateLength(bufferType, pathBuffer):
-	"""
-	Used internally to find the ReparseDataLength and the size of the PathBuffer to allocate.
-
-	It returns a tuple containing (PathBufferLength, ReparseDataLength).
-	"""
-	offset = pathBuffer.SubstituteNameLength \
-			 if pathBuffer.PrintNameOffset == 0 else \
-			 pathBuffer.PrintNameOffset + SZWCHAR
-	pathBufLen = pathBuffer.PrintNameLength + offset # Ending \0
-	return pathBufLen, bufferType.PathBuffer.offset + pathBufLen
@@ -8,33 +8,30 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-from _winioctl import *
-
-# Our DLL object
-advapi32 = WinDLL('advapi32')
+from ._winioctl import *
 
 ## Constants used specifically by our advapi32 functions.
 # Access Types
 # The following are masks for the predefined standard access types
-DELETE = 0x00010000L
-READ_CONTROL = 0x00020000L
-WRITE_DAC = 0x00040000L
-WRITE_OWNER = 0x00080000L
-SYNCHRONIZE = 0x00100000L
+DELETE = 0x00010000
+READ_CONTROL = 0x00020000
+WRITE_DAC = 0x00040000
+WRITE_OWNER = 0x00080000
+SYNCHRONIZE = 0x00100000
 
-STANDARD_RIGHTS_REQUIRED = 0x000F0000L
+STANDARD_RIGHTS_REQUIRED = 0x000F0000
 STANDARD_RIGHTS_READ = READ_CONTROL
 STANDARD_RIGHTS_WRITE = READ_CONTROL
 STANDARD_RIGHTS_EXECUTE = READ_CONTROL
 
-STANDARD_RIGHTS_ALL = 0x001F0000L
-SPECIFIC_RIGHTS_ALL = 0x0000FFFFL
+STANDARD_RIGHTS_ALL = 0x001F0000
+SPECIFIC_RIGHTS_ALL = 0x0000FFFF
 
 # AccessSystemAcl access type
-ACCESS_SYSTEM_SECURITY = 0x01000000L
+ACCESS_SYSTEM_SECURITY = 0x01000000
 
 # MaximumAllowed access type
-MAXIMUM_ALLOWED = 0x02000000L
+MAXIMUM_ALLOWED = 0x02000000
 
 # Security Tokens
 TOKEN_ASSIGN_PRIMARY = 0x0001
@@ -51,10 +48,10 @@ TOKEN_ALL_ACCESS_P = STANDARD_RIGHTS_REQUIRED | TOKEN_ASSIGN_PRIMARY | TOKEN_DUP
 TOKEN_ALL_ACCESS = TOKEN_ALL_ACCESS_P | TOKEN_ADJUST_SESSIONID
 
 # SE Privileges
-SE_PRIVILEGE_ENABLED_BY_DEFAULT = 0x00000001L
-SE_PRIVILEGE_ENABLED = 0x00000002L
-SE_PRIVILEGE_REMOVED = 0X00000004L
-SE_PRIVILEGE_USED_FOR_ACCESS = 0x80000000L
+SE_PRIVILEGE_ENABLED_BY_DEFAULT = 0x00000001
+SE_PRIVILEGE_ENABLED = 0x00000002
+SE_PRIVILEGE_REMOVED = 0X00000004
+SE_PRIVILEGE_USED_FOR_ACCESS = 0x80000000
 
 SE_PRIVILEGE_VALID_ATTRIBUTES = SE_PRIVILEGE_ENABLED_BY_DEFAULT | SE_PRIVILEGE_ENABLED | SE_PRIVILEGE_REMOVED | SE_PRIVILEGE_USED_FOR_ACCESS
 
@@ -123,57 +120,56 @@ class TokenPrivileges(Structure):
 PTokenPrivileges = POINTER(TokenPrivileges)
 
 ## Functions exported from AdvApi32.dll
+class AdvApi32(DLLBinder):
+	""" advapi32.dll, bound as it gets used. """
+
+	OpenProcessToken = DLLFunction(BOOL, [HANDLE, DWORD, PHANDLE],
+		"""
+		The OpenProcessToken function opens the access token associated with a process.
+
+			BOOL WINAPI OpenProcessToken(
+				_In_   HANDLE ProcessHandle,
+				_In_   DWORD DesiredAccess,
+				_Out_  PHANDLE TokenHandle
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa379295(v=vs.85).aspx>`_
+		"""
+	)
+
+	LookupPrivilegeValue = DLLFunction(BOOL, [LPCWSTR, LPCWSTR, PLUID],
+		"""
+		The LookupPrivilegeValue function retrieves the locally unique identifier (LUID) used on a specified system to locally
+		represent the specified privilege name.
+
+			BOOL WINAPI LookupPrivilegeValue(
+				_In_opt_  LPCTSTR lpSystemName,
+				_In_      LPCTSTR lpName,
+				_Out_     PLUID lpLuid
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa379180(v=vs.85).aspx>`_
+		""",
+		export = 'LookupPrivilegeValueW'
+	)
+
+	AdjustTokenPrivileges = DLLFunction(BOOL, [HANDLE, BOOL, PTokenPrivileges, DWORD, PTokenPrivileges, PDWORD],
+		"""
+		The AdjustTokenPrivileges function enables or disables privileges in the specified access token. Enabling or disabling
+		privileges in an access token requires TOKEN_ADJUST_PRIVILEGES access.
+
+			BOOL WINAPI AdjustTokenPrivileges(
+				_In_       HANDLE TokenHandle,
+				_In_       BOOL DisableAllPrivileges,
+				_In_opt_   PTOKEN_PRIVILEGES NewState,
+				_In_       DWORD BufferLength,
+				_Out_opt_  PTOKEN_PRIVILEGES PreviousState,
+				_Out_opt_  PDWORD ReturnLength
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa375202(v=vs.85).aspx>`_
+		"""
+	)
 
-OpenProcessToken = advapi32.OpenProcessToken
-OpenProcessToken.restype = BOOL
-OpenProcessToken.argtypes = [HANDLE, DWORD, PHANDLE]
-OpenProcessToken.__doc__ = \
-"""
-The OpenProcessToken function opens the access token associated with a process.
-
-	BOOL WINAPI OpenProcessToken(
-		_In_   HANDLE ProcessHandle,
-		_In_   DWORD DesiredAccess,
-		_Out_  PHANDLE TokenHandle
-	);
-
-`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa379295(v=vs.85).aspx>`_
-"""
-
-LookupPrivilegeValue = advapi32.LookupPrivilegeValueW
-LookupPrivilegeValue.restype = BOOL
-LookupPrivilegeValue.argtypes = [ LPCWSTR, LPCWSTR, PLUID ]
-LookupPrivilegeValue.__doc__ = \
-"""
-The LookupPrivilegeValue function retrieves the locally unique identifier (LUID) used on a specified system to locally
-represent the specified privilege name.
-
-	BOOL WINAPI LookupPrivilegeValue(
-		_In_opt_  LPCTSTR lpSystemName,
-		_In_      LPCTSTR lpName,
-		_Out_     PLUID lpLuid
-	);
-
-`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa379180(v=vs.85).aspx>`_
-"""
-
-AdjustTokenPrivileges = advapi32.AdjustTokenPrivileges
-AdjustTokenPrivileges.restype = BOOL
-AdjustTokenPrivileges.argtypes = [ HANDLE, BOOL, PTokenPrivileges, DWORD, PTokenPrivileges, PDWORD ]
-AdjustTokenPrivileges.__doc__ = \
-"""
-The AdjustTokenPrivileges function enables or disables privileges in the specified access token. Enabling or disabling
-privileges in an access token requires TOKEN_ADJUST_PRIVILEGES access.
-
-	BOOL WINAPI AdjustTokenPrivileges(
-		_In_       HANDLE TokenHandle,
-		_In_       BOOL DisableAllPrivileges,
-		_In_opt_   PTOKEN_PRIVILEGES NewState,
-		_In_       DWORD BufferLength,
-		_Out_opt_  PTOKEN_PRIVILEGES PreviousState,
-		_Out_opt_  PDWORD ReturnLength
-	);
-
-`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa375202(v=vs.85).aspx>`_
-"""
-
+# Our DLL object
+advapi32 = AdvApi32('advapi32')
@@ -0,0 +1,329 @@
+# encoding: utf-8
+"""
+_backend.py
+The file system calls that the link modules make, gathered behind one interface so that they can be pointed at
+something other than the real Win32 API.
+
+Win32Backend forwards everything to kernel32/advapi32 and is what gets used by default. SetBackend swaps in another
+implementation (such as the SimulatedBackend in _simulator.py) for the whole process.
+
+Backend methods are named after the Win32 calls they stand in for and report errors the same way: a failure value
+(None, False or INVALID_FILE_ATTRIBUTES) with the error code available from GetLastError. Buffers are plain Python
+buffers (bytes, bytearray, memoryview) rather than ctypes pointers and sizes.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import io, ntpath, os, sys, threading
+from ._kernel32 import *
+from ._advapi32 import *
+from ._ntdll import CreateFileRelative
+
+# Access rights that allow FSCTL_SET_REPARSE_POINT and FSCTL_DELETE_REPARSE_POINT on a handle.
+REPARSE_WRITE_ACCESS = GENERIC_WRITE | GENERIC_ALL | FILE_WRITE_DATA | FILE_WRITE_ATTRIBUTES
+
+class Backend(object):
+	"""
+	Interface for the file system calls made by ntfslink. Every method but FindFiles has to be implemented. path is the
+	os.path flavour (ntpath, posixpath) that goes with the paths the backend takes.
+	"""
+	path = ntpath
+
+	def GetLastError(self):
+		""" The error code of the last failed call on this thread. """
+		raise NotImplementedError
+
+	def GetFullPathName(self, filename):
+		""" Absolute, normalized version of filename. """
+		raise NotImplementedError
+
+	def CreateFile(self, filename, access, sharemode, creation, flags, directory = None):
+		"""
+		Open (or create) a file or directory. Returns a handle, or None on failure. If directory is an open directory
+		handle, filename is relative to it, and the directory handle has to stay open for as long as the new one is.
+		"""
+		raise NotImplementedError
+
+	def CloseHandle(self, handle):
+		raise NotImplementedError
+
+	def DeviceIoControl(self, handle, code, inbuf = None, outbuf = None):
+		"""
+		Run an FSCTL on an open handle. inbuf is any buffer, outbuf any writable buffer. Returns the number of bytes
+		written into outbuf, or None on failure. (On ERROR_MORE_DATA, outbuf still gets filled with what fits.)
+		"""
+		raise NotImplementedError
+
+	def GetFileInformationByHandle(self, handle):
+		""" Returns a BY_HANDLE_FILE_INFORMATION for an open handle, or None on failure. """
+		raise NotImplementedError
+
+	def GetFileAttributes(self, filename):
+		""" Returns the attributes of a file, without following reparse points, or INVALID_FILE_ATTRIBUTES. """
+		raise NotImplementedError
+
+	def SetFileAttributes(self, filename, attributes):
+		raise NotImplementedError
+
+	def CreateDirectory(self, pathname):
+		raise NotImplementedError
+
+	def RemoveDirectory(self, pathname):
+		raise NotImplementedError
+
+	def DeleteFile(self, filename):
+		raise NotImplementedError
+
+	def CreateHardLink(self, filename, existingname):
+		raise NotImplementedError
+
+	def CopyFile(self, existingname, newname):
+		""" Copy the contents and attributes of a file to newname, which mustn't exist yet. Returns whether it worked. """
+		raise NotImplementedError
+
+	def MoveFile(self, existingname, newname):
+		"""
+		Rename a file or directory to newname, on the same volume. A file already at newname is replaced in the same step.
+		Returns whether it worked.
+		"""
+		raise NotImplementedError
+
+	def CreateSymbolicLink(self, linkname, target, flags):
+		raise NotImplementedError
+
+	def GetVolumePathName(self, filename):
+		"""
+		Returns the root of the volume that filename is on, or None on failure. That's the folder a volume is mounted on,
+		for volumes mounted in a folder, rather than the drive.
+		"""
+		raise NotImplementedError
+
+	def GetVolumeInformation(self, rootpath):
+		""" Returns (file system name, file system flags, serial number) for the volume at rootpath, or None. """
+		raise NotImplementedError
+
+	def GetWindowsVersion(self):
+		""" Returns (major, minor) of the Windows version in use, or None when this isn't Windows at all. """
+		raise NotImplementedError
+
+	def ObtainPrivilege(self, name):
+		""" Enable a privilege (SE_*_NAME) in the current process token. Returns whether it worked. """
+		raise NotImplementedError
+
+	def ReleasePrivilege(self, name):
+		""" Disable a privilege that was enabled by ObtainPrivilege. Returns whether it worked. """
+		raise NotImplementedError
+
+	def ReadDirectoryChanges(self, handle, subtree, filter = FILE_NOTIFY_CHANGE_LINKS, armed = None):
+		"""
+		Wait for something matching filter (FILE_NOTIFY_CHANGE_*) to change in the directory opened as handle, or under
+		it with subtree set. Returns [(FILE_ACTION_*, path relative to the directory), ...], or None on failure. An empty
+		list means too much changed to keep track of. Changes made between calls are kept for the next one, but only
+		from the first call on: armed() gets called once it's waiting, and nothing that changes after that is missed.
+		(The handle has to be opened with FILE_FLAG_OVERLAPPED for that to happen before the call returns.)
+		"""
+		raise NotImplementedError
+
+	def CancelIo(self, handle):
+		""" Make a ReadDirectoryChanges call on handle that's blocked in another thread fail. Returns whether it worked. """
+		raise NotImplementedError
+
+	def FindFiles(self, pathname):
+		"""
+		Lists the directory at pathname as [(name, attributes, reparse tag), ...], or returns None on failure. The tag is
+		0 for anything that isn't a reparse point, and also when the listing doesn't say. Implementations should take all
+		of it from the directory listing itself; this fallback makes a GetFileAttributes call per entry.
+		"""
+		try:
+			names = os.listdir(pathname)
+		except OSError:
+			return None
+		return [(name, self.GetFileAttributes(self.path.join(pathname, name)), 0) for name in names]
+
+	def open(self, filename, mode = 'rb'):
+		""" Same as the builtin open, for reading and writing file contents. Binary modes only. """
+		raise NotImplementedError
+
+class Win32Backend(Backend):
+	""" The real thing: every call goes straight through to kernel32.dll and advapi32.dll. """
+
+	def __init__(self):
+		# The process token stays open, and privilege LUIDs are looked up once.
+		self._token = None
+		self._luids = {}
+		self._token_lock = threading.Lock()
+
+	def GetLastError(self):
+		return GetLastError()
+
+	def GetFullPathName(self, filename):
+		return os.path.abspath(filename)
+
+	def CreateFile(self, filename, access, sharemode, creation, flags, directory = None):
+		if directory is not None:
+			return CreateFileRelative(directory, filename, access, sharemode, creation, flags)
+		handle = CreateFile(filename, access, sharemode, creation, flags)
+		if handle is None or handle == HANDLE(INVALID_HANDLE_VALUE).value:
+			return None
+		return handle
+
+	def CloseHandle(self, handle):
+		return kernel32.CloseHandle(handle) != FALSE
+
+	def DeviceIoControl(self, handle, code, inbuf = None, outbuf = None):
+		insize = len(inbuf) if inbuf is not None else 0
+		outsize = len(outbuf) if outbuf is not None else 0
+		inptr = outptr = None
+		if insize:
+			inptr = (c_char * insize).from_buffer_copy(inbuf)
+		if outsize:
+			outptr = (c_char * outsize).from_buffer(outbuf)
+		dwRet = DWORD(0)
+		if kernel32.DeviceIoControl(handle, code, inptr, insize, outptr, outsize, byref(dwRet), None) == FALSE:
+			return None
+		return dwRet.value
+
+	def GetFileInformationByHandle(self, handle):
+		info = BY_HANDLE_FILE_INFORMATION()
+		if kernel32.GetFileInformationByHandle(handle, byref(info)) == FALSE:
+			return None
+		return info
+
+	def GetFileAttributes(self, filename):
+		return kernel32.GetFileAttributesW(filename)
+
+	def SetFileAttributes(self, filename, attributes):
+		return kernel32.SetFileAttributesW(filename, attributes) != FALSE
+
+	def CreateDirectory(self, pathname):
+		return CreateDirectory(pathname)
+
+	def RemoveDirectory(self, pathname):
+		return RemoveDirectory(pathname) != FALSE
+
+	def DeleteFile(self, filename):
+		return kernel32.DeleteFileW(filename) != FALSE
+
+	def CreateHardLink(self, filename, existingname):
+		if kernel32.CreateHardLinkW is None:
+			kernel32.SetLastError(ERROR_INVALID_FUNCTION)
+			return False
+		return kernel32.CreateHardLinkW(filename, existingname, None) != FALSE
+
+	def CopyFile(self, existingname, newname):
+		return kernel32.CopyFileW(existingname, newname, TRUE) != FALSE
+
+	def MoveFile(self, existingname, newname):
+		return kernel32.MoveFileExW(existingname, newname, MOVEFILE_REPLACE_EXISTING) != FALSE
+
+	def CreateSymbolicLink(self, linkname, target, flags):
+		if kernel32.CreateSymbolicLinkW is None:
+			kernel32.SetLastError(ERROR_INVALID_FUNCTION)
+			return False
+		return kernel32.CreateSymbolicLinkW(linkname, target, flags) != FALSE
+
+	def GetVolumePathName(self, filename):
+		return GetVolumePathName(filename)
+
+	def GetVolumeInformation(self, rootpath):
+		fsname = create_unicode_buffer(MAX_PATH + 1)
+		fsflags = DWORD(0)
+		serial = DWORD(0)
+		if kernel32.GetVolumeInformationW(rootpath, None, 0, byref(serial), None, byref(fsflags), fsname, len(fsname)) == FALSE:
+			return None
+		return fsname.value, fsflags.value, serial.value
+
+	def GetWindowsVersion(self):
+		return tuple(sys.getwindowsversion()[:2])
+
+	def _adjust_privilege(self, name, attributes):
+		with self._token_lock:
+			if self._token is None:
+				hToken = HANDLE()
+				if advapi32.OpenProcessToken(kernel32.GetCurrentProcess(), TOKEN_ADJUST_PRIVILEGES, byref(hToken)) == FALSE:
+					return False
+				self._token = hToken
+			luid = self._luids.get(name)
+			if luid is None:
+				luid = LUID()
+				if advapi32.LookupPrivilegeValue(None, name, byref(luid)) == FALSE:
+					return False
+				self._luids[name] = luid
+		tp = TokenPrivileges()
+		tp.PrivilegeCount = 1
+		tp.Privileges[0].Luid = luid
+		tp.Privileges[0].Attributes = attributes
+		if advapi32.AdjustTokenPrivileges(self._token, FALSE, byref(tp), sizeof(TokenPrivileges), None, None) == FALSE:
+			return False
+		# AdjustTokenPrivileges also succeeds when the token doesn't hold the privilege at all.
+		return GetLastError() != ERROR_NOT_ALL_ASSIGNED
+
+	def ObtainPrivilege(self, name):
+		return self._adjust_privilege(name, SE_PRIVILEGE_ENABLED)
+
+	def ReleasePrivilege(self, name):
+		return self._adjust_privilege(name, 0)
+
+	def FindFiles(self, pathname):
+		return FindFiles(pathname)
+
+	def ReadDirectoryChanges(self, handle, subtree, filter = FILE_NOTIFY_CHANGE_LINKS, armed = None):
+		buf = create_string_buffer(NOTIFY_BUFFER_SIZE)
+		dwRet = DWORD(0)
+		# Overlapped, so that there's a point between the call being queued and it completing to call armed at. On a
+		# handle opened without FILE_FLAG_OVERLAPPED, ReadDirectoryChangesW just blocks until it's done.
+		overlapped = OVERLAPPED()
+		overlapped.hEvent = kernel32.CreateEventW(None, TRUE, FALSE, None)
+		if not overlapped.hEvent:
+			return None
+		try:
+			if kernel32.ReadDirectoryChangesW(handle, buf, sizeof(buf), subtree, filter, None, byref(overlapped), None) \
+					== FALSE and GetLastError() != ERROR_IO_PENDING:
+				return None
+			if armed is not None:
+				armed()
+			if kernel32.GetOverlappedResult(handle, byref(overlapped), byref(dwRet), TRUE) == FALSE:
+				return None
+		finally:
+			error = GetLastError()
+			kernel32.CloseHandle(overlapped.hEvent)
+			kernel32.SetLastError(error)
+		return DecodeNotifyInformation(buf, dwRet.value)
+
+	def CancelIo(self, handle):
+		return kernel32.CancelIoEx is not None and kernel32.CancelIoEx(handle, None) != FALSE
+
+	def open(self, filename, mode = 'rb'):
+		return io.open(filename, mode)
+
+# Change records buffered by ReadDirectoryChanges. (64KB is the most that works over the network.)
+NOTIFY_BUFFER_SIZE = 0x10000
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def GetBackend():
+	"""
+	The backend currently in use. If none was set, a Win32Backend (or a PosixBackend, anywhere but Windows) is created
+	the first time this is called.
+	"""
+	global _backend
+	if _backend is None:
+		with _backend_lock:
+			if _backend is None:
+				if os.name == 'nt':
+					_backend = Win32Backend()
+				else:
+					from ._posix import PosixBackend
+					_backend = PosixBackend()
+	return _backend
+
+def SetBackend(backend):
+	""" Use backend for every file system call from now on. Returns the backend that was in use before. """
+	global _backend
+	with _backend_lock:
+		previous, _backend = _backend, backend
+	return previous
@@ -0,0 +1,51 @@
+# encoding: utf-8
+"""
+_bufpool.py
+Thread-local pool of output buffers for FSCTL_GET_REPARSE_POINT.
+
+Rather than allocating a MAX_REPARSE_BUFFER sized structure for every read, each thread keeps one bytearray around.
+It starts out as a small probe buffer and only grows when the kernel tells us a reparse point didn't fit, so its size
+ends up tracking the largest reparse point that thread has actually seen.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import threading
+from ._winioctl import MAX_REPARSE_BUFFER
+
+# Big enough for a mount point or symbolic link with ~100 character names on both sides.
+MIN_REPARSE_PROBE = 512
+
+class ReparseBufferPool(threading.local):
+	"""
+	A per-thread reparse output buffer. The buffer handed out by a pool is reused by the next read on the same thread,
+	so anything that needs to outlive that read has to be decoded or copied out first.
+	"""
+
+	def __init__(self, minimum = MIN_REPARSE_PROBE):
+		self.minimum = minimum
+		self.buffer = bytearray(minimum)
+
+	@property
+	def size(self):
+		return len(self.buffer)
+
+	def grow(self, needed):
+		"""
+		Make sure this thread's buffer can hold at least needed bytes. Sizes are rounded up to the next power of two,
+		capped at MAX_REPARSE_BUFFER. Returns the (possibly new) buffer.
+		"""
+		if needed > len(self.buffer):
+			size = len(self.buffer)
+			while size < needed:
+				size <<= 1
+			# We never resize in place, since callers may still be holding a memoryview over the old buffer.
+			self.buffer = bytearray(min(size, MAX_REPARSE_BUFFER))
+		return self.buffer
+
+	def reset(self):
+		""" Drop this thread's buffer back down to the initial probe size. """
+		self.buffer = bytearray(self.minimum)
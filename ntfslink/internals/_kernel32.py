@@ -8,10 +8,8 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-from _winioctl import *
-
-# Our DLL object
-kernel32 = WinDLL('kernel32.dll')
+import struct
+from ._winioctl import *
 
 ## Constants used specifically by our kernel32 functions.
 FILE_ATTRIBUTE_READONLY = 0x00000001
@@ -30,6 +28,7 @@ FILE_ATTRIBUTE_NOT_CONTENT_INDEXED = 0x00002000
 FILE_ATTRIBUTE_ENCRYPTED = 0x00004000
 FILE_ATTRIBUTE_VIRTUAL = 0x00010000
 FILE_ATTRIBUTE_REPARSE_DIRECTORY = (FILE_ATTRIBUTE_DIRECTORY | FILE_ATTRIBUTE_REPARSE_POINT)
+INVALID_FILE_ATTRIBUTES = 0xFFFFFFFF
 
 FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
 FILE_NOTIFY_CHANGE_DIR_NAME = 0x00000002
@@ -93,14 +92,42 @@ class FILE_NOTIFY_INFORMATION(Structure):
 	DWORD Action;
 	DWORD FileNameLength;
 	WCHAR FileName[1];
+
+	FileName is stored inline, and runs for FileNameLength bytes. (Without a terminating \\0) See: DecodeNotifyInformation
 	"""
 	_fields_ = [
 		('NextEntryOffset', DWORD),
 		('Action', DWORD),
 		('FileNameLength', DWORD),
-		('FileName', LPTSTR),
+		('FileName', WCHAR * 1),
 	]
 
+# NextEntryOffset, Action, FileNameLength
+_NOTIFY_HEADER = struct.Struct('<LLL')
+
+# What ReadDirectoryChanges gets by default: anything that can create, remove, retarget or rename a link.
+FILE_NOTIFY_CHANGE_LINKS = FILE_NOTIFY_CHANGE_FILE_NAME | FILE_NOTIFY_CHANGE_DIR_NAME | FILE_NOTIFY_CHANGE_ATTRIBUTES | \
+	FILE_NOTIFY_CHANGE_LAST_WRITE | FILE_NOTIFY_CHANGE_CREATION
+
+def DecodeNotifyInformation(buf, length = None):
+	"""
+	Unpacks the chain of FILE_NOTIFY_INFORMATION records in the first length bytes of buf, as filled in by
+	ReadDirectoryChangesW, into a list of (Action, FileName) tuples.
+	"""
+	view = memoryview(buf)
+	if length is not None:
+		view = view[:length]
+	changes = []
+	offset = 0
+	while offset + _NOTIFY_HEADER.size <= len(view):
+		nextoffset, action, namelen = _NOTIFY_HEADER.unpack_from(view, offset)
+		start = offset + _NOTIFY_HEADER.size
+		changes.append((action, view[start:start + namelen].tobytes().decode('utf-16-le')))
+		if not nextoffset:
+			break
+		offset += nextoffset
+	return changes
+
 class BY_HANDLE_FILE_INFORMATION(Structure):
 	"""
 		typedef struct _BY_HANDLE_FILE_INFORMATION {
@@ -131,10 +158,219 @@ class BY_HANDLE_FILE_INFORMATION(Structure):
 
 LPBY_HANDLE_FILE_INFORMATION = POINTER(BY_HANDLE_FILE_INFORMATION)
 
+class WIN32_FIND_DATAW(Structure):
+	"""
+		typedef struct _WIN32_FIND_DATAW {
+			DWORD    dwFileAttributes;
+			FILETIME ftCreationTime;
+			FILETIME ftLastAccessTime;
+			FILETIME ftLastWriteTime;
+			DWORD    nFileSizeHigh;
+			DWORD    nFileSizeLow;
+			DWORD    dwReserved0;
+			DWORD    dwReserved1;
+			WCHAR    cFileName[MAX_PATH];
+			WCHAR    cAlternateFileName[14];
+		} WIN32_FIND_DATAW, *PWIN32_FIND_DATAW, *LPWIN32_FIND_DATAW;
+
+	dwReserved0 holds the reparse tag when dwFileAttributes has FILE_ATTRIBUTE_REPARSE_POINT set.
+	"""
+	_fields_ = [
+		('dwFileAttributes', DWORD),
+		('ftCreationTime', FILETIME),
+		('ftLastAccessTime', FILETIME),
+		('ftLastWriteTime', FILETIME),
+		('nFileSizeHigh', DWORD),
+		('nFileSizeLow', DWORD),
+		('dwReserved0', DWORD),
+		('dwReserved1', DWORD),
+		('cFileName', WCHAR * MAX_PATH),
+		('cAlternateFileName', WCHAR * 14),
+	]
+
+LPWIN32_FIND_DATAW = POINTER(WIN32_FIND_DATAW)
+
+# FINDEX_INFO_LEVELS
+FindExInfoStandard = 0
+FindExInfoBasic = 1
+
+# FINDEX_SEARCH_OPS
+FindExSearchNameMatch = 0
+
+# MoveFileEx flags
+MOVEFILE_REPLACE_EXISTING = 0x00000001
+MOVEFILE_COPY_ALLOWED = 0x00000002
+MOVEFILE_WRITE_THROUGH = 0x00000008
+
+# FindFirstFileEx's dwAdditionalFlags
+FIND_FIRST_EX_CASE_SENSITIVE = 0x00000001
+FIND_FIRST_EX_LARGE_FETCH = 0x00000002
+
 ## Functions exported from kernel32.dll
-CreateFileW = kernel32.CreateFileW
-CreateFileW.restype = HANDLE
-CreateFileW.argtypes = [ LPCWSTR, DWORD, DWORD, LPSECURITY_ATTRIBUTES, DWORD, DWORD, HANDLE ]
+class Kernel32(DLLBinder):
+	""" kernel32.dll, bound as it gets used. """
+
+	CreateFileW = DLLFunction(HANDLE, [LPCWSTR, DWORD, DWORD, LPSECURITY_ATTRIBUTES, DWORD, DWORD, HANDLE])
+	CreateDirectoryW = DLLFunction(BOOL, [LPCWSTR, LPSECURITY_ATTRIBUTES])
+	RemoveDirectoryW = DLLFunction(BOOL, [LPCWSTR])
+	DeleteFileW = DLLFunction(BOOL, [LPCWSTR])
+	CopyFileW = DLLFunction(BOOL, [LPCWSTR, LPCWSTR, BOOL])
+	MoveFileExW = DLLFunction(BOOL, [LPCWSTR, LPCWSTR, DWORD])
+	GetVolumePathNameW = DLLFunction(BOOL, [LPCWSTR, LPWSTR, DWORD])
+	GetVolumePathNamesForVolumeNameW = DLLFunction(BOOL, [LPCWSTR, LPVOID, DWORD, PDWORD])
+
+	GetFileAttributesW = DLLFunction(DWORD, [LPCWSTR],
+		"""
+		Used pretty heavily for a number of different tests, but it should be self-explanatory to people who've done
+		any Win32 API stuff.
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa364944(v=vs.85).aspx>`_
+		"""
+	)
+	GetFileAttributesA = DLLFunction(DWORD, [LPCSTR], GetFileAttributesW.doc)
+
+	SetFileAttributesW = DLLFunction(BOOL, [LPCWSTR, DWORD],
+		"""
+		Sets the attributes for a file or directory.
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa365535%28v=vs.85%29.aspx>`_
+		"""
+	)
+	SetFileAttributesA = DLLFunction(BOOL, [LPCSTR, DWORD], SetFileAttributesW.doc)
+
+	GetCurrentProcess = DLLFunction(HANDLE, [], """ Gets a handle to the current process. """)
+	CloseHandle = DLLFunction(BOOL, [HANDLE], """ Closes a previously opened handle.. """)
+	SetLastError = DLLFunction(None, [DWORD], """ Sets the last-error code for the calling thread. """)
+
+	DeviceIoControl = DLLFunction(BOOL, [HANDLE, DWORD, LPVOID, DWORD, LPVOID, DWORD, LPDWORD, LPOVERLAPPED],
+		"""
+		Sends a control code directly to a specified device driver, causing the corresponding device to perform the corresponding operation.
+
+			BOOL WINAPI DeviceIoControl(
+				_In_         HANDLE hDevice,
+				_In_         DWORD dwIoControlCode,
+				_In_opt_     LPVOID lpInBuffer,
+				_In_         DWORD nInBufferSize,
+				_Out_opt_    LPVOID lpOutBuffer,
+				_In_         DWORD nOutBufferSize,
+				_Out_opt_    LPDWORD lpBytesReturned,
+				_Inout_opt_  LPOVERLAPPED lpOverlapped
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa363216(v=vs.85).aspx>`_
+		"""
+	)
+
+	GetSystemDirectoryW = DLLFunction(UINT, [LPWSTR, UINT],
+		"""
+		Retrieves the path of the system directory. The system directory contains system files such as dynamic-link libraries and drivers.
+
+			UINT WINAPI GetSystemDirectory(
+				_Out_  LPTSTR lpBuffer,
+				_In_   UINT uSize
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/ms724373(v=vs.85).aspx>`_
+		"""
+	)
+
+	GetVolumeInformationW = DLLFunction(BOOL, [LPCWSTR, LPWSTR, DWORD, LPDWORD, LPDWORD, LPDWORD, LPWSTR, DWORD],
+		"""
+		Retrieves information about the file system and volume associated with the specified root directory.
+
+			BOOL WINAPI GetVolumeInformation(
+				_In_opt_   LPCTSTR lpRootPathName,
+				_Out_opt_  LPTSTR lpVolumeNameBuffer,
+				_In_       DWORD nVolumeNameSize,
+				_Out_opt_  LPDWORD lpVolumeSerialNumber,
+				_Out_opt_  LPDWORD lpMaximumComponentLength,
+				_Out_opt_  LPDWORD lpFileSystemFlags,
+				_Out_opt_  LPTSTR lpFileSystemNameBuffer,
+				_In_       DWORD nFileSystemNameSize
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa364993(v=vs.85).aspx>`_
+		"""
+	)
+
+	GetFileInformationByHandle = DLLFunction(BOOL, [HANDLE, LPBY_HANDLE_FILE_INFORMATION],
+		"""
+		Retrieves file information for the specified file.
+
+			BOOL WINAPI GetFileInformationByHandle(
+				_In_   HANDLE hFile,
+				_Out_  LPBY_HANDLE_FILE_INFORMATION lpFileInformation
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/aa364952%28v=vs.85%29.aspx>`_
+		"""
+	)
+
+	FindFirstFileExW = DLLFunction(HANDLE, [LPCWSTR, INT, LPWIN32_FIND_DATAW, INT, LPVOID, DWORD],
+		"""
+		Searches a directory for a file or subdirectory with a name and attributes that match those specified.
+
+			HANDLE WINAPI FindFirstFileEx(
+				_In_        LPCTSTR lpFileName,
+				_In_        FINDEX_INFO_LEVELS fInfoLevelId,
+				_Out_       LPVOID lpFindFileData,
+				_In_        FINDEX_SEARCH_OPS fSearchOp,
+				_Reserved_  LPVOID lpSearchFilter,
+				_In_        DWORD dwAdditionalFlags
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa364419(v=vs.85).aspx>`_
+		"""
+	)
+	FindNextFileW = DLLFunction(BOOL, [HANDLE, LPWIN32_FIND_DATAW],
+		""" Continues a file search from a previous call to FindFirstFileEx. """
+	)
+	FindClose = DLLFunction(BOOL, [HANDLE], """ Closes a file search handle opened by FindFirstFileEx. """)
+
+	# Neither of these are around before Vista.
+	CreateHardLinkW = DLLFunction(BOOLEAN, [LPWSTR, LPWSTR, LPSECURITY_ATTRIBUTES],
+		""" BOOLEAN CreateHardLinkW(LPWSTR lpFileName, LPWSTR lpExistingFileName, LPSECURITY_ATTRIBUTES lpSecurityAttributes) """,
+		optional = True
+	)
+	CreateSymbolicLinkW = DLLFunction(BOOLEAN, [LPWSTR, LPWSTR, DWORD],
+		""" BOOLEAN CreateSymbolicLinkW(LPWSTR lpSymlinkFileName, LPWSTR lpTargetFileName, DWORD dwFlags) """,
+		optional = True
+	)
+
+	ReadDirectoryChangesW = DLLFunction(BOOL, [HANDLE, LPVOID, DWORD, BOOL, DWORD, LPDWORD, LPOVERLAPPED, LPVOID],
+		"""
+		Retrieves information that describes the changes within the specified directory.
+
+			BOOL WINAPI ReadDirectoryChangesW(
+				_In_         HANDLE hDirectory,
+				_Out_        LPVOID lpBuffer,
+				_In_         DWORD nBufferLength,
+				_In_         BOOL bWatchSubtree,
+				_In_         DWORD dwNotifyFilter,
+				_Out_opt_    LPDWORD lpBytesReturned,
+				_Inout_opt_  LPOVERLAPPED lpOverlapped,
+				_In_opt_     LPOVERLAPPED_COMPLETION_ROUTINE lpCompletionRoutine
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa365465(v=vs.85).aspx>`_
+		"""
+	)
+	GetOverlappedResult = DLLFunction(BOOL, [HANDLE, LPOVERLAPPED, LPDWORD, BOOL],
+		"""
+		BOOL GetOverlappedResult(HANDLE hFile, LPOVERLAPPED lpOverlapped, LPDWORD lpNumberOfBytesTransferred, BOOL bWait)
+		- Gets (or with bWait set, waits for) the result of an overlapped operation.
+		"""
+	)
+	CreateEventW = DLLFunction(HANDLE, [LPSECURITY_ATTRIBUTES, BOOL, BOOL, LPCWSTR],
+		""" HANDLE CreateEventW(LPSECURITY_ATTRIBUTES lpEventAttributes, BOOL bManualReset, BOOL bInitialState, LPCWSTR lpName) """
+	)
+	CancelIoEx = DLLFunction(BOOL, [HANDLE, LPOVERLAPPED],
+		""" BOOL CancelIoEx(HANDLE hFile, LPOVERLAPPED lpOverlapped) - Cancels I/O on hFile, from any thread. """,
+		optional = True
+	)
+
+# Our DLL object
+kernel32 = Kernel32('kernel32.dll')
 
 def CreateFile(filename, access, sharemode, creation, flags):
 	"""
@@ -154,13 +390,9 @@ def CreateFile(filename, access, sharemode, creation, flags):
 	More information can be found at the function's
 	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa363858(v=vs.85).aspx>`_.
 	"""
-	hresult = CreateFileW(filename, access, sharemode, None, creation, flags, None)
+	hresult = kernel32.CreateFileW(filename, access, sharemode, None, creation, flags, None)
 	return None if hresult == INVALID_HANDLE_VALUE else hresult
 
-CreateDirectoryW = kernel32.CreateDirectoryW
-CreateDirectoryW.restype = BOOL
-CreateDirectoryW.argtypes = [LPCWSTR, LPSECURITY_ATTRIBUTES]
-
 def CreateDirectory(fpath):
 	"""
 	Simple wrapper around the CreateDirectory API call. CreateFile is exported from kernel32.dll and is called with the
@@ -178,153 +410,46 @@ def CreateDirectory(fpath):
 	More information can be found at the function's
 	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa363855(v=vs.85).aspx>`_.
 	"""
-	return CreateDirectoryW(fpath, None) != FALSE
+	return kernel32.CreateDirectoryW(fpath, None) != FALSE
 
-RemoveDirectory = kernel32.RemoveDirectoryW
-RemoveDirectory.restype = BOOL
-RemoveDirectory.argtypes = [LPCWSTR]
-
-GetVolumePathNameW = kernel32.GetVolumePathNameW
-GetVolumePathNameW.argtypes = [LPCWSTR, LPWSTR, DWORD]
-GetVolumePathNameW.restype = BOOL
+def RemoveDirectory(fpath):
+	""" Removes the empty directory at fpath. Returns a C BOOL. """
+	return kernel32.RemoveDirectoryW(fpath)
 
 def GetVolumePathName(filename):
-	""" Retrieves the volume mount point where the specified path is mounted. """
-	szbuf = len(filename) + 2
+	"""
+	Retrieves the volume mount point where the specified path is mounted. (With a trailing backslash) Returns None on
+	failure, with the error code available from GetLastError.
+	"""
+	szbuf = max(len(filename) + 2, MAX_PATH + 1)
 	volbuf = create_unicode_buffer(szbuf)
-	if GetVolumePathNameW(filename, volbuf, szbuf):
-		raise WinError()
-	return volbuf
-
-GetVolumePathNamesForVolumeNameW = kernel32.GetVolumePathNamesForVolumeNameW
-GetVolumePathNamesForVolumeNameW.argtypes = [LPCWSTR, LPVOID, DWORD, PDWORD]
-GetVolumePathNamesForVolumeNameW.restype = BOOL
+	if kernel32.GetVolumePathNameW(filename, volbuf, szbuf) == FALSE:
+		return None
+	return volbuf.value
 
 def GetVolumePathNamesForVolumeName(volumeguid):
 	""" Retrieves a list of drive letters and mounted folder paths for the specified volume. """
 	dwsize = DWORD(0)
-	GetVolumePathNamesForVolumeNameW(volumeguid, NULL, 0, byref(dwsize))
+	kernel32.GetVolumePathNamesForVolumeNameW(volumeguid, NULL, 0, byref(dwsize))
 	if dwsize.value == 0: raise WinError()
 	namesbuf = cast(create_unicode_buffer('', dwsize + 1), c_void_p)
-	if GetVolumePathNamesForVolumeNameW(volumeguid, namesbuf, dwsize, byref(dwsize)):
+	if kernel32.GetVolumePathNamesForVolumeNameW(volumeguid, namesbuf, dwsize, byref(dwsize)):
 		raise WinError()
 	bufend = namesbuf.value + dwsize.value
 	currname = namesbuf.value
 	lresults = []
 	while (currname + 2) < bufend:
 		name = wstring_at(currname)
-		print name
+		print(name)
 		lresults.append(name)
 	return lresults
 
-GetFileAttributesW = kernel32.GetFileAttributesW
-GetFileAttributesW.restype = DWORD
-GetFileAttributesW.argtypes = [ LPCWSTR ]
-
-GetFileAttributesA = kernel32.GetFileAttributesA
-GetFileAttributesA.restype = DWORD
-GetFileAttributesA.argtypes = [ LPCSTR ]
-
-GetFileAttributesW.__doc__ = \
-GetFileAttributesA.__doc__ = \
-	"""
-	Used pretty heavily for a number of different tests, but it should be self-explanatory to people who've done
-	any Win32 API stuff.
-
-	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa364944(v=vs.85).aspx>`_
-	"""
-
-SetFileAttributesW = kernel32.SetFileAttributesW
-SetFileAttributesW.restype = BOOL
-SetFileAttributesW.argtypes = [ LPCWSTR, DWORD ]
-
-SetFileAttributesA = kernel32.SetFileAttributesA
-SetFileAttributesA.restype = BOOL
-SetFileAttributesA.argtypes = [ LPCSTR, DWORD ]
-
-SetFileAttributesW.__doc__ = \
-SetFileAttributesA.__doc__ = \
-	"""
-	Sets the attributes for a file or directory.
-
-	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa365535%28v=vs.85%29.aspx>`_
-	"""
-
-GetCurrentProcess = kernel32.GetCurrentProcess
-GetCurrentProcess.restype = HANDLE
-GetCurrentProcess.argtypes = []
-GetCurrentProcess.__doc__ = \
-	""" Gets a handle to the current process. """
-
-CloseHandle = kernel32.CloseHandle
-CloseHandle.restype = BOOL
-CloseHandle.argtypes = [HANDLE]
-CloseHandle.__doc__ = \
-	""" Closes a previously opened handle.. """
-
-DeviceIoControl = kernel32.DeviceIoControl
-DeviceIoControl.restype = BOOL
-DeviceIoControl.argtypes = [HANDLE, DWORD, LPVOID, DWORD, LPVOID, DWORD, LPDWORD, LPOVERLAPPED]
-DeviceIoControl.__doc__ = \
-	"""
-	Sends a control code directly to a specified device driver, causing the corresponding device to perform the corresponding operation.
-
-		BOOL WINAPI DeviceIoControl(
-			_In_         HANDLE hDevice,
-			_In_         DWORD dwIoControlCode,
-			_In_opt_     LPVOID lpInBuffer,
-			_In_         DWORD nInBufferSize,
-			_Out_opt_    LPVOID lpOutBuffer,
-			_In_         DWORD nOutBufferSize,
-			_Out_opt_    LPDWORD lpBytesReturned,
-			_Inout_opt_  LPOVERLAPPED lpOverlapped
-		);
-
-	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa363216(v=vs.85).aspx>`_
-	"""
-
-GetSystemDirectoryW = kernel32.GetSystemDirectoryW
-GetSystemDirectoryW.restype = UINT
-GetSystemDirectoryW.argtypes = [LPWSTR, UINT]
-GetSystemDirectoryW.__doc__ = \
-	"""
-	Retrieves the path of the system directory. The system directory contains system files such as dynamic-link libraries and drivers.
-
-		UINT WINAPI GetSystemDirectory(
-			_Out_  LPTSTR lpBuffer,
-			_In_   UINT uSize
-		);
-
-	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/ms724373(v=vs.85).aspx>`_
-	"""
-
 def GetSystemDirectory():
 	""" Just a wrapper around the C API to provide a parameter-less function."""
 	usysbuf = create_unicode_buffer(MAX_PATH + 1)
-	if GetSystemDirectoryW(usysbuf, MAX_PATH) == 0: raise WindowsError()
+	if kernel32.GetSystemDirectoryW(usysbuf, MAX_PATH) == 0: raise WindowsError()
 	return usysbuf.value
 
-GetVolumeInformationW = kernel32.GetVolumeInformationW
-GetVolumeInformationW.restype = BOOL
-GetVolumeInformationW.argtypes = [LPCWSTR, LPWSTR, DWORD, LPDWORD, LPDWORD, LPDWORD, LPWSTR, DWORD]
-GetVolumeInformationW.__doc__ = \
-	"""
-	Retrieves information about the file system and volume associated with the specified root directory.
-
-		BOOL WINAPI GetVolumeInformation(
-			_In_opt_   LPCTSTR lpRootPathName,
-			_Out_opt_  LPTSTR lpVolumeNameBuffer,
-			_In_       DWORD nVolumeNameSize,
-			_Out_opt_  LPDWORD lpVolumeSerialNumber,
-			_Out_opt_  LPDWORD lpMaximumComponentLength,
-			_Out_opt_  LPDWORD lpFileSystemFlags,
-			_Out_opt_  LPTSTR lpFileSystemNameBuffer,
-			_In_       DWORD nFileSystemNameSize
-		);
-
-	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/desktop/aa364993(v=vs.85).aspx>`_
-	"""
-
 def GetVolumeInfo(filepath):
 	"""
 	Return information for the volume containing the given path. This is going
@@ -334,28 +459,15 @@ def GetVolumeInfo(filepath):
 	# Add 1 for a trailing backslash if necessary, and 1 for the terminating
 	# null character.
 	volpath = GetVolumePathName(filepath)
+	if volpath is None:
+		raise WinError()
 	fsnamebuf = create_unicode_buffer(MAX_PATH + 1)
 	fsflags = DWORD(0)
-	if not GetVolumeInformationW(volpath, None, 0, None, None, byref(fsflags),
+	if not kernel32.GetVolumeInformationW(volpath, None, 0, None, None, byref(fsflags),
 			fsnamebuf, len(fsnamebuf)):
 		raise WinError()
 	return fsnamebuf.value, fsflags.value
 
-GetFileInformationByHandle = kernel32.GetFileInformationByHandle
-GetFileInformationByHandle.restype = BOOL
-GetFileInformationByHandle.argtypes = [HANDLE, LPBY_HANDLE_FILE_INFORMATION]
-GetFileInformationByHandle.__doc__ = \
-	"""
-	Retrieves file information for the specified file.
-
-		BOOL WINAPI GetFileInformationByHandle(
-			_In_   HANDLE hFile,
-			_Out_  LPBY_HANDLE_FILE_INFORMATION lpFileInformation
-		);
-
-	`MSDN Documentation <http://msdn.microsoft.com/en-us/library/aa364952%28v=vs.85%29.aspx>`_
-	"""
-
 def getfileinfo(path):
 	"""
 	Return information for the file at the given path. This is going to be a
@@ -364,28 +476,41 @@ def getfileinfo(path):
 	hfile = CreateFile(path, GENERIC_READ, FILE_SHARE_READ, OPEN_EXISTING, 0)
 	if hfile is None: raise WinError()
 	info = BY_HANDLE_FILE_INFORMATION()
-	rv = GetFileInformationByHandle(hfile, byref(info))
-	CloseHandle(hfile)
+	rv = kernel32.GetFileInformationByHandle(hfile, byref(info))
+	kernel32.CloseHandle(hfile)
 	if rv == 0: raise WinError()
 	return info
 
-try:
-	CreateHardLinkW = kernel32.CreateHardLinkW
-	CreateHardLinkW.restype = BOOLEAN
-	CreateHardLinkW.argtypes = [LPWSTR, LPWSTR, LPSECURITY_ATTRIBUTES]
-	CreateHardLinkW.__doc__ = \
-		""" BOOLEAN CreateHardLinkW(LPWSTR lpFileName, LPWSTR lpExistingFileName, LPSECURITY_ATTRIBUTES lpSecurityAttributes) """
-except:
-	CreateHardLinkW = None
-
-try:
-	CreateSymbolicLinkW = kernel32.CreateSymbolicLinkW
-	CreateSymbolicLinkW.restype = BOOLEAN
-	CreateSymbolicLinkW.argtypes = [LPWSTR, LPWSTR, DWORD]
-	CreateSymbolicLinkW.__doc__ = \
-		""" BOOLEAN CreateSymbolicLinkW(LPWSTR lpSymlinkFileName, LPWSTR lpTargetFileName, DWORD dwFlags) """
-except:
-	CreateSymbolicLinkW = lambda x, y, z: None
+def FindFiles(pathname):
+	"""
+	Lists the directory at pathname as [(name, attributes, reparse tag), ...], leaving out . and .., with a single
+	FindFirstFileEx search. (No short names, and large fetches, where the system supports them.) Returns None on
+	failure, with the error code available from GetLastError.
+	"""
+	data = WIN32_FIND_DATAW()
+	pattern = pathname.rstrip(u'\\/') + u'\\*'
+	hFind = kernel32.FindFirstFileExW(pattern, FindExInfoBasic, byref(data), FindExSearchNameMatch, None, FIND_FIRST_EX_LARGE_FETCH)
+	if hFind is None or hFind == HANDLE(INVALID_HANDLE_VALUE).value:
+		# Before Windows 7, neither FindExInfoBasic nor FIND_FIRST_EX_LARGE_FETCH are understood.
+		if GetLastError() != ERROR_INVALID_PARAMETER:
+			return None
+		hFind = kernel32.FindFirstFileExW(pattern, FindExInfoStandard, byref(data), FindExSearchNameMatch, None, 0)
+		if hFind is None or hFind == HANDLE(INVALID_HANDLE_VALUE).value:
+			return None
+	results = []
+	try:
+		while True:
+			name = data.cFileName
+			if name != u'.' and name != u'..':
+				attributes = data.dwFileAttributes
+				tag = data.dwReserved0 if attributes & FILE_ATTRIBUTE_REPARSE_POINT else 0
+				results.append((name, attributes, tag))
+			if kernel32.FindNextFileW(hFind, byref(data)) == FALSE:
+				if GetLastError() != ERROR_NO_MORE_FILES:
+					return None
+				return results
+	finally:
+		kernel32.FindClose(hFind)
 
 ## CTypes Function Call Wrappers
 
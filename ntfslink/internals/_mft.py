@@ -0,0 +1,470 @@
+# encoding: utf-8
+"""
+_mft.py
+Pure-Python parsing of NTFS MFT FILE records, as returned by FSCTL_GET_NTFS_FILE_RECORD or read straight off a volume.
+
+A FileRecord applies the update sequence fixup to the record in place and then walks its attributes lazily, so
+nothing beyond the names and values that are actually asked for gets copied out of the underlying buffer.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import struct
+from collections import namedtuple
+from ._reparse import ReparseView, DecodeReparsePoint
+
+## Constants
+FILE_RECORD_SIGNATURE = b'FILE'
+INDEX_BLOCK_SIGNATURE = b'INDX'
+NTFS_SECTOR_SIZE = 512
+
+# FILE record header flags
+FILE_RECORD_IN_USE = 0x0001
+FILE_RECORD_IS_DIRECTORY = 0x0002
+
+# Attribute types
+ATTRIBUTE_STANDARD_INFORMATION = 0x10
+ATTRIBUTE_ATTRIBUTE_LIST = 0x20
+ATTRIBUTE_FILE_NAME = 0x30
+ATTRIBUTE_OBJECT_ID = 0x40
+ATTRIBUTE_SECURITY_DESCRIPTOR = 0x50
+ATTRIBUTE_VOLUME_NAME = 0x60
+ATTRIBUTE_VOLUME_INFORMATION = 0x70
+ATTRIBUTE_DATA = 0x80
+ATTRIBUTE_INDEX_ROOT = 0x90
+ATTRIBUTE_INDEX_ALLOCATION = 0xA0
+ATTRIBUTE_BITMAP = 0xB0
+ATTRIBUTE_REPARSE_POINT = 0xC0
+ATTRIBUTE_EA_INFORMATION = 0xD0
+ATTRIBUTE_EA = 0xE0
+ATTRIBUTE_LOGGED_UTILITY_STREAM = 0x100
+ATTRIBUTE_END = 0xFFFFFFFF
+
+# Attribute header flags
+ATTRIBUTE_FLAG_COMPRESSED = 0x0001
+ATTRIBUTE_FLAG_ENCRYPTED = 0x4000
+ATTRIBUTE_FLAG_SPARSE = 0x8000
+
+# $FILE_NAME namespaces
+FILE_NAME_POSIX = 0
+FILE_NAME_WIN32 = 1
+FILE_NAME_DOS = 2
+FILE_NAME_WIN32_AND_DOS = 3
+
+# Index header flags
+INDEX_HEADER_LARGE = 0x01
+
+# Index entry flags
+INDEX_ENTRY_NODE = 0x0001
+INDEX_ENTRY_END = 0x0002
+
+# File references are a 48-bit record number followed by a 16-bit sequence number.
+FILE_REFERENCE_MASK = 0x0000FFFFFFFFFFFF
+
+def FileReferenceNumber(reference): return reference & FILE_REFERENCE_MASK
+def FileReferenceSequence(reference): return reference >> 48
+
+## Structures
+# Signature, UpdateSequenceOffset, UpdateSequenceSize, LogFileSequenceNumber, SequenceNumber, HardLinkCount,
+# FirstAttributeOffset, Flags, UsedSize, AllocatedSize, BaseFileRecord, NextAttributeId
+_FILE_RECORD_HEADER = struct.Struct('<4sHHQHHHHLLQH')
+# NTFS 3.1 also stores the record's own number, after 2 bytes of padding.
+_FILE_RECORD_NUMBER = struct.Struct('<L')
+_FILE_RECORD_NUMBER_OFFSET = 44
+
+# Type, Length, NonResident, NameLength, NameOffset, Flags, AttributeId
+_ATTRIBUTE_HEADER = struct.Struct('<LLBBHHH')
+# ValueLength, ValueOffset
+_RESIDENT_HEADER = struct.Struct('<LH')
+# StartVcn, LastVcn, RunArrayOffset, CompressionUnit, (padding), AllocatedSize, DataSize, InitializedSize
+_NONRESIDENT_HEADER = struct.Struct('<QQHH4xQQQ')
+
+_UCHAR = struct.Struct('<B')
+_USHORT = struct.Struct('<H')
+_ULONG = struct.Struct('<L')
+_ULONGLONG = struct.Struct('<Q')
+_LONGLONG = struct.Struct('<q')
+
+# Created, Modified, MftModified, Accessed, FileAttributes, MaxVersions, VersionNumber, ClassId
+_STANDARD_INFORMATION = struct.Struct('<QQQQLLLL')
+# OwnerId, SecurityId, QuotaCharged, Usn (NTFS 3.0+)
+_STANDARD_INFORMATION_EX = struct.Struct('<LLQQ')
+
+# ParentDirectory, Created, Modified, MftModified, Accessed, AllocatedSize, DataSize, FileAttributes,
+# EaSize/ReparseTag, NameLength, Namespace
+_FILE_NAME = struct.Struct('<QQQQQQQLLBB')
+
+# Type, RecordLength, NameLength, NameOffset, StartVcn, SegmentReference, AttributeId
+_ATTRIBUTE_LIST_ENTRY = struct.Struct('<LHBBQQH')
+
+# AttributeType, CollationRule, BytesPerIndexBlock, ClustersPerIndexBlock. The INDEX_HEADER follows.
+_INDEX_ROOT = struct.Struct('<LLLB3x')
+# FirstEntryOffset, TotalSize, AllocatedSize, Flags. Entry offsets are relative to the INDEX_HEADER itself.
+_INDEX_HEADER = struct.Struct('<LLLB3x')
+# Signature, UpdateSequenceOffset, UpdateSequenceSize, LogFileSequenceNumber, Vcn. The INDEX_HEADER follows.
+_INDEX_BLOCK_HEADER = struct.Struct('<4sHHQQ')
+# FileReference (or DataOffset, DataLength, Reserved for view indexes), Length, KeyLength, Flags. The key follows.
+_INDEX_ENTRY = struct.Struct('<QHHH2x')
+
+# The key of the $R index in $Extend\$Reparse: ReparseTag, FileReference
+_REPARSE_INDEX_KEY = struct.Struct('<LQ')
+
+class InvalidFileRecordException(Exception):
+	""" Raised when a buffer does not hold a valid FILE record. """
+
+class StandardInformation(namedtuple('StandardInformation', 'created modified mft_modified accessed file_attributes '
+                                                            'owner_id security_id quota_charged usn')):
+	""" Decoded $STANDARD_INFORMATION. Times are raw FILETIMEs. The NTFS 3.0 fields are None on older volumes. """
+	__slots__ = ()
+
+class FileName(namedtuple('FileName', 'parent_reference created modified mft_modified accessed allocated_size '
+                                      'data_size file_attributes reparse_tag namespace name')):
+	"""
+	Decoded $FILE_NAME. Every $FILE_NAME in a record (other than the DOS 8.3 alias) is one hard link to the file. For
+	reparse points, reparse_tag holds the tag, otherwise it holds the size of the extended attributes.
+	"""
+	__slots__ = ()
+
+class AttributeListEntry(namedtuple('AttributeListEntry', 'type name start_vcn segment_reference attribute_id')):
+	""" One entry of an $ATTRIBUTE_LIST, pointing at the record segment that holds the attribute. """
+	__slots__ = ()
+
+class DataRun(namedtuple('DataRun', 'vcn lcn length')):
+	""" A run of clusters. lcn is None for sparse runs. """
+	__slots__ = ()
+
+class IndexRoot(namedtuple('IndexRoot', 'attribute_type collation_rule block_size block_clusters flags')):
+	""" Decoded $INDEX_ROOT header. attribute_type is 0 for view indexes ($R, $O, $Q, ...) that don't index on one. """
+	__slots__ = ()
+
+	@property
+	def large(self):
+		""" Whether the index has spilled out into $INDEX_ALLOCATION. """
+		return bool(self.flags & INDEX_HEADER_LARGE)
+
+class IndexEntry(namedtuple('IndexEntry', 'header key subnode')):
+	"""
+	One entry of an index node. For filename ($I30) indexes, header is the file reference of the entry and key holds
+	its $FILE_NAME. For view indexes, header packs the offset and length of the entry's data instead. subnode is the
+	VCN of the index block holding the entries that sort before this one, or None.
+	"""
+	__slots__ = ()
+
+class ReparseIndexKey(namedtuple('ReparseIndexKey', 'tag file_reference')):
+	""" A key of the $R index in $Extend\\$Reparse, which lists every reparse point on the volume. """
+	__slots__ = ()
+
+def ApplyFixup(view, offset = 0, sector_size = NTFS_SECTOR_SIZE):
+	"""
+	Apply the update sequence array of the multi-sector record (FILE or INDX) at offset, in place. The last two bytes
+	of every sector are checked against the update sequence number and replaced with the saved values.
+	"""
+	usaoff, = _USHORT.unpack_from(view, offset + 4)
+	usacount, = _USHORT.unpack_from(view, offset + 6)
+	if usacount == 0:
+		return
+	if offset + usaoff + usacount * 2 > len(view) or offset + (usacount - 1) * sector_size > len(view):
+		raise InvalidFileRecordException('Update sequence array runs past the end of the record.')
+	usn = view[offset + usaoff:offset + usaoff + 2].tobytes()
+	for i in range(1, usacount):
+		end = offset + i * sector_size - 2
+		if view[end:end + 2].tobytes() != usn:
+			raise InvalidFileRecordException('Update sequence mismatch in sector %d; the record is torn.' % (i - 1))
+		saved = offset + usaoff + i * 2
+		_USHORT.pack_into(view, end, _USHORT.unpack_from(view, saved)[0])
+
+def DecodeDataRuns(view, offset, end, start_vcn = 0):
+	""" Decode the mapping pairs between offset and end into a list of DataRun records. """
+	runs = []
+	vcn = start_vcn
+	lcn = 0
+	while offset < end:
+		header, = _UCHAR.unpack_from(view, offset)
+		if header == 0:
+			break
+		lensize = header & 0x0F
+		offsize = header >> 4
+		offset += 1
+		if offset + lensize + offsize > end:
+			raise InvalidFileRecordException('Data run runs past the end of the attribute.')
+		length = _unpack_varint(view, offset, lensize, False)
+		offset += lensize
+		if offsize:
+			lcn += _unpack_varint(view, offset, offsize, True)
+			runs.append(DataRun(vcn, lcn, length))
+		else:
+			runs.append(DataRun(vcn, None, length))
+		offset += offsize
+		vcn += length
+	return runs
+
+def _unpack_varint(view, offset, size, signed):
+	""" Little-endian integer of 1-8 bytes, as used by the data run encoding. """
+	raw = view[offset:offset + size].tobytes()
+	if signed:
+		# Sign-extend out to 8 bytes.
+		pad = b'\xff' if _UCHAR.unpack_from(raw, size - 1)[0] & 0x80 else b'\0'
+		return _LONGLONG.unpack(raw + pad * (8 - size))[0]
+	return _ULONGLONG.unpack(raw + b'\0' * (8 - size))[0]
+
+def _decode_standard_information(value):
+	if len(value) < _STANDARD_INFORMATION.size:
+		raise InvalidFileRecordException('$STANDARD_INFORMATION is too small.')
+	fields = _STANDARD_INFORMATION.unpack_from(value, 0)[:5]
+	if len(value) >= _STANDARD_INFORMATION.size + _STANDARD_INFORMATION_EX.size:
+		fields += _STANDARD_INFORMATION_EX.unpack_from(value, _STANDARD_INFORMATION.size)
+	else:
+		fields += (None, None, None, None)
+	return StandardInformation(*fields)
+
+def DecodeFileName(value):
+	""" Decode a $FILE_NAME, either the attribute's value or the key of an $I30 index entry, into a FileName. """
+	if len(value) < _FILE_NAME.size:
+		raise InvalidFileRecordException('$FILE_NAME is too small.')
+	fields = _FILE_NAME.unpack_from(value, 0)
+	namelen = fields[9] * 2
+	name = value[_FILE_NAME.size:_FILE_NAME.size + namelen].tobytes().decode('utf-16-le')
+	return FileName(*(fields[:9] + (fields[10], name)))
+
+def DecodeAttributeList(value):
+	""" Decode the value of an $ATTRIBUTE_LIST, resident or not, into AttributeListEntry records. """
+	entries = []
+	offset = 0
+	while offset + _ATTRIBUTE_LIST_ENTRY.size <= len(value):
+		atype, reclen, namelen, nameoff, vcn, segment, attrid = _ATTRIBUTE_LIST_ENTRY.unpack_from(value, offset)
+		if reclen == 0:
+			break
+		name = value[offset + nameoff:offset + nameoff + namelen * 2].tobytes().decode('utf-16-le')
+		entries.append(AttributeListEntry(atype, name, vcn, segment, attrid))
+		offset += reclen
+	return entries
+
+def DecodeIndexRoot(value):
+	""" Decode the value of an $INDEX_ROOT. Returns (IndexRoot, list of IndexEntry) for the entries stored in it. """
+	if len(value) < _INDEX_ROOT.size + _INDEX_HEADER.size:
+		raise InvalidFileRecordException('$INDEX_ROOT is too small.')
+	root = IndexRoot(*(_INDEX_ROOT.unpack_from(value, 0) + _INDEX_HEADER.unpack_from(value, _INDEX_ROOT.size)[3:]))
+	return root, DecodeIndexEntries(value, _INDEX_ROOT.size)
+
+def DecodeIndexBlock(view, offset = 0, sector_size = NTFS_SECTOR_SIZE):
+	"""
+	Decode the INDX block at offset in a writable view, applying its update sequence fixup in place. Returns the list
+	of IndexEntry records in it.
+	"""
+	if len(view) - offset < _INDEX_BLOCK_HEADER.size + _INDEX_HEADER.size:
+		raise InvalidFileRecordException('Buffer is too small to hold an INDX block.')
+	if view[offset:offset + 4].tobytes() != INDEX_BLOCK_SIGNATURE:
+		raise InvalidFileRecordException('Bad INDX block signature: %r' % view[offset:offset + 4].tobytes())
+	ApplyFixup(view, offset, sector_size)
+	return DecodeIndexEntries(view, offset + _INDEX_BLOCK_HEADER.size)
+
+def DecodeIndexEntries(view, offset):
+	"""
+	Decode the entries of the index node whose INDEX_HEADER is at offset into a list of IndexEntry records. The
+	terminating entry only carries a subnode pointer; it's returned with a key of None when it has one.
+	"""
+	first, size = _INDEX_HEADER.unpack_from(view, offset)[:2]
+	end = offset + size
+	if end > len(view):
+		raise InvalidFileRecordException('Index node runs past the end of its buffer.')
+	entries = []
+	position = offset + first
+	while position + _INDEX_ENTRY.size <= end:
+		header, length, keylen, flags = _INDEX_ENTRY.unpack_from(view, position)
+		if length < _INDEX_ENTRY.size or position + length > end:
+			raise InvalidFileRecordException('Index entry at offset %d has an invalid length.' % position)
+		subnode = None
+		if flags & INDEX_ENTRY_NODE:
+			subnode, = _LONGLONG.unpack_from(view, position + length - _LONGLONG.size)
+		if flags & INDEX_ENTRY_END:
+			if subnode is not None:
+				entries.append(IndexEntry(header, None, subnode))
+			break
+		start = position + _INDEX_ENTRY.size
+		entries.append(IndexEntry(header, view[start:start + keylen], subnode))
+		position += length
+	return entries
+
+def DecodeReparseIndexKey(key):
+	""" Decode the key of an $R index entry into a ReparseIndexKey. """
+	if len(key) < _REPARSE_INDEX_KEY.size:
+		raise InvalidFileRecordException('$R index key is too small.')
+	return ReparseIndexKey(*_REPARSE_INDEX_KEY.unpack_from(key, 0))
+
+class Attribute(object):
+	"""
+	A single attribute within a FILE record. The header is unpacked up front, but names, values and data runs are only
+	decoded when asked for.
+	"""
+	__slots__ = (
+		'view', 'offset', 'type', 'length', 'non_resident', 'flags', 'attribute_id',
+		'_namelen', '_nameoff',
+	)
+
+	def __init__(self, view, offset):
+		self.view = view
+		self.offset = offset
+		(self.type, self.length, self.non_resident, self._namelen, self._nameoff, self.flags,
+			self.attribute_id) = _ATTRIBUTE_HEADER.unpack_from(view, offset)
+
+	@property
+	def name(self):
+		""" The attribute's name, u'' for unnamed attributes. (Alternate data streams are named $DATA attributes) """
+		if not self._namelen:
+			return u''
+		start = self.offset + self._nameoff
+		return self.view[start:start + self._namelen * 2].tobytes().decode('utf-16-le')
+
+	@property
+	def value(self):
+		""" memoryview over the value of a resident attribute. None for non-resident attributes. """
+		if self.non_resident:
+			return None
+		valuelen, valueoff = _RESIDENT_HEADER.unpack_from(self.view, self.offset + _ATTRIBUTE_HEADER.size)
+		start = self.offset + valueoff
+		if valueoff + valuelen > self.length:
+			raise InvalidFileRecordException('Resident value runs past the end of attribute 0x%X.' % self.type)
+		return self.view[start:start + valuelen]
+
+	@property
+	def nonresident_header(self):
+		"""
+		For non-resident attributes, a tuple containing (StartVcn, LastVcn, AllocatedSize, DataSize, InitializedSize).
+		None for resident attributes.
+		"""
+		if not self.non_resident:
+			return None
+		fields = _NONRESIDENT_HEADER.unpack_from(self.view, self.offset + _ATTRIBUTE_HEADER.size)
+		return fields[0], fields[1], fields[4], fields[5], fields[6]
+
+	@property
+	def data_size(self):
+		""" The size of the attribute's data, resident or not. """
+		if self.non_resident:
+			return _NONRESIDENT_HEADER.unpack_from(self.view, self.offset + _ATTRIBUTE_HEADER.size)[5]
+		return _RESIDENT_HEADER.unpack_from(self.view, self.offset + _ATTRIBUTE_HEADER.size)[0]
+
+	def runs(self):
+		""" Decode the data runs of a non-resident attribute. Returns an empty list for resident attributes. """
+		if not self.non_resident:
+			return []
+		fields = _NONRESIDENT_HEADER.unpack_from(self.view, self.offset + _ATTRIBUTE_HEADER.size)
+		return DecodeDataRuns(self.view, self.offset + fields[2], self.offset + self.length, fields[0])
+
+	def decode(self):
+		"""
+		Decode a resident attribute's value into the matching record type: StandardInformation, FileName, a list of
+		AttributeListEntry records, or whatever the reparse decoder registry returns for $REPARSE_POINT. Other types
+		(and non-resident attributes) come back as their raw value.
+		"""
+		value = self.value
+		if value is None:
+			return None
+		decoder = _attribute_decoders.get(self.type)
+		return decoder(value) if decoder is not None else value
+
+_attribute_decoders = {
+	ATTRIBUTE_STANDARD_INFORMATION: _decode_standard_information,
+	ATTRIBUTE_FILE_NAME: DecodeFileName,
+	ATTRIBUTE_ATTRIBUTE_LIST: DecodeAttributeList,
+	ATTRIBUTE_REPARSE_POINT: DecodeReparsePoint,
+}
+
+class FileRecord(object):
+	"""
+	A parsed FILE record. buf can be anything memoryview accepts. The update sequence fixup is applied in place when
+	buf is writable. For read-only buffers, only the record itself is copied before applying it. Pass fixup=False if
+	the fixup has already been applied.
+	"""
+	__slots__ = (
+		'view', 'offset', 'lsn', 'sequence', 'link_count', 'first_attribute', 'flags', 'used_size', 'allocated_size',
+		'base_reference', 'record_number',
+	)
+
+	def __init__(self, buf, offset = 0, sector_size = NTFS_SECTOR_SIZE, fixup = True):
+		view = ReparseView(buf)
+		if len(view) - offset < _FILE_RECORD_HEADER.size:
+			raise InvalidFileRecordException('Buffer is too small to hold a FILE record header.')
+		(signature, usaoff, usacount, self.lsn, self.sequence, self.link_count, self.first_attribute, self.flags,
+			self.used_size, self.allocated_size, self.base_reference, nextid) = _FILE_RECORD_HEADER.unpack_from(view, offset)
+		if signature != FILE_RECORD_SIGNATURE:
+			raise InvalidFileRecordException('Bad FILE record signature: %r' % signature)
+		if self.used_size > self.allocated_size or offset + self.allocated_size > len(view):
+			raise InvalidFileRecordException('FILE record sizes are inconsistent with the buffer.')
+		# Pre-3.1 records put the update sequence array where the record number would be.
+		self.record_number = None
+		if usaoff >= _FILE_RECORD_NUMBER_OFFSET + _FILE_RECORD_NUMBER.size:
+			self.record_number, = _FILE_RECORD_NUMBER.unpack_from(view, offset + _FILE_RECORD_NUMBER_OFFSET)
+
+		self.view = view[offset:offset + self.allocated_size]
+		self.offset = offset
+		if fixup:
+			if self.view.readonly:
+				self.view = memoryview(bytearray(self.view.tobytes()))
+			ApplyFixup(self.view, 0, sector_size)
+
+	@property
+	def in_use(self): return bool(self.flags & FILE_RECORD_IN_USE)
+
+	@property
+	def is_directory(self): return bool(self.flags & FILE_RECORD_IS_DIRECTORY)
+
+	@property
+	def is_base_record(self): return FileReferenceNumber(self.base_reference) == 0
+
+	def attributes(self, type = None):
+		""" Lazily iterate over the record's attributes, optionally only those of the given type. """
+		view = self.view
+		offset = self.first_attribute
+		end = self.used_size
+		while offset + _ULONG.size <= end:
+			atype, = _ULONG.unpack_from(view, offset)
+			if atype == ATTRIBUTE_END:
+				return
+			length, = _ULONG.unpack_from(view, offset + 4)
+			if length < _ATTRIBUTE_HEADER.size or offset + length > end:
+				raise InvalidFileRecordException('Attribute at offset %d has an invalid length.' % offset)
+			if type is None or atype == type:
+				yield Attribute(view, offset)
+			elif atype > type:
+				# Attributes are sorted by type.
+				return
+			offset += length
+
+	def attribute(self, type, name = u''):
+		""" Returns the first attribute of the given type and name, or None. """
+		for attr in self.attributes(type):
+			if attr.name == name:
+				return attr
+		return None
+
+	@property
+	def standard_information(self):
+		attr = self.attribute(ATTRIBUTE_STANDARD_INFORMATION)
+		return attr.decode() if attr is not None else None
+
+	def file_names(self, dos = False):
+		""" Yields the FileName of every $FILE_NAME in the record. DOS 8.3 aliases are skipped unless dos is True. """
+		for attr in self.attributes(ATTRIBUTE_FILE_NAME):
+			fname = attr.decode()
+			if dos or fname.namespace != FILE_NAME_DOS:
+				yield fname
+
+	@property
+	def reparse_point(self):
+		""" The decoded $REPARSE_POINT, or None if there isn't one (or it's non-resident). """
+		attr = self.attribute(ATTRIBUTE_REPARSE_POINT)
+		return attr.decode() if attr is not None else None
+
+	@property
+	def attribute_list(self):
+		""" The entries of a resident $ATTRIBUTE_LIST, or None. """
+		attr = self.attribute(ATTRIBUTE_ATTRIBUTE_LIST)
+		return attr.decode() if attr is not None else None
+
+	def data_streams(self):
+		""" Yields the $DATA attributes: the unnamed stream first, followed by any alternate data streams. """
+		return self.attributes(ATTRIBUTE_DATA)
@@ -0,0 +1,151 @@
+"""
+_ntdll.py
+Declarations and wrapper for the few ntdll.dll exports that have no kernel32 equivalent. (Namely, opening a file
+relative to an already open directory handle.)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+from ._kernel32 import *
+from ._advapi32 import SYNCHRONIZE
+
+## Constants used specifically by our ntdll functions.
+NTSTATUS = LONG
+
+# CreateDisposition
+FILE_SUPERSEDE = 0
+FILE_OPEN = 1
+FILE_CREATE = 2
+FILE_OPEN_IF = 3
+FILE_OVERWRITE = 4
+FILE_OVERWRITE_IF = 5
+
+# CreateOptions
+FILE_DIRECTORY_FILE = 0x00000001
+FILE_SYNCHRONOUS_IO_NONALERT = 0x00000020
+FILE_NON_DIRECTORY_FILE = 0x00000040
+FILE_OPEN_FOR_BACKUP_INTENT = 0x00004000
+FILE_OPEN_REPARSE_POINT = 0x00200000
+
+# ObjectAttributes.Attributes
+OBJ_CASE_INSENSITIVE = 0x00000040
+
+# CreateFile's dwCreationDisposition, as NtCreateFile's CreateDisposition.
+CREATION_DISPOSITIONS = {
+	CREATE_NEW: FILE_CREATE,
+	CREATE_ALWAYS: FILE_OVERWRITE_IF,
+	OPEN_EXISTING: FILE_OPEN,
+	OPEN_ALWAYS: FILE_OPEN_IF,
+	TRUNCATE_EXISTING: FILE_OVERWRITE,
+}
+
+class UNICODE_STRING(Structure):
+	"""
+	USHORT Length;
+	USHORT MaximumLength;
+	PWSTR  Buffer;
+	"""
+	_fields_ = [
+		('Length', USHORT),
+		('MaximumLength', USHORT),
+		('Buffer', LPWSTR),
+	]
+
+class OBJECT_ATTRIBUTES(Structure):
+	"""
+	ULONG           Length;
+	HANDLE          RootDirectory;
+	PUNICODE_STRING ObjectName;
+	ULONG           Attributes;
+	PVOID           SecurityDescriptor;
+	PVOID           SecurityQualityOfService;
+	"""
+	_fields_ = [
+		('Length', ULONG),
+		('RootDirectory', HANDLE),
+		('ObjectName', POINTER(UNICODE_STRING)),
+		('Attributes', ULONG),
+		('SecurityDescriptor', LPVOID),
+		('SecurityQualityOfService', LPVOID),
+	]
+
+class IO_STATUS_BLOCK(Structure):
+	"""
+	union { NTSTATUS Status; PVOID Pointer; };
+	ULONG_PTR Information;
+	"""
+	_fields_ = [
+		('Status', c_void_p),
+		('Information', c_size_t),
+	]
+
+class NtDll(DLLBinder):
+	""" ntdll.dll, bound as it gets used. """
+
+	NtCreateFile = DLLFunction(NTSTATUS, [
+			POINTER(HANDLE), DWORD, POINTER(OBJECT_ATTRIBUTES), POINTER(IO_STATUS_BLOCK), c_void_p,
+			ULONG, ULONG, ULONG, ULONG, LPVOID, ULONG
+		],
+		"""
+		Creates a new file or directory, or opens an existing file, device, directory, or volume.
+
+			NTSTATUS NtCreateFile(
+				_Out_     PHANDLE FileHandle,
+				_In_      ACCESS_MASK DesiredAccess,
+				_In_      POBJECT_ATTRIBUTES ObjectAttributes,
+				_Out_     PIO_STATUS_BLOCK IoStatusBlock,
+				_In_opt_  PLARGE_INTEGER AllocationSize,
+				_In_      ULONG FileAttributes,
+				_In_      ULONG ShareAccess,
+				_In_      ULONG CreateDisposition,
+				_In_      ULONG CreateOptions,
+				_In_      PVOID EaBuffer,
+				_In_      ULONG EaLength
+			);
+
+		`MSDN Documentation <http://msdn.microsoft.com/en-us/library/windows/hardware/ff566424(v=vs.85).aspx>`_
+		"""
+	)
+
+	RtlNtStatusToDosError = DLLFunction(ULONG, [NTSTATUS],
+		""" Converts an NTSTATUS code to its equivalent system error code. """
+	)
+
+# Our DLL object
+ntdll = NtDll('ntdll.dll')
+
+def CreateFileRelative(directory, filename, access, sharemode, creation, flags):
+	"""
+	Same as CreateFile, with filename relative to an open directory handle instead of the current directory. The
+	directory only gets looked up once, no matter how many files are opened under it.
+
+	Returns the new handle, or None on failure, with the error code available from GetLastError.
+	"""
+	options = FILE_SYNCHRONOUS_IO_NONALERT
+	if flags & FILE_FLAG_OPEN_REPARSE_POINT:
+		options |= FILE_OPEN_REPARSE_POINT
+	if flags & FILE_FLAG_BACKUP_SEMANTICS:
+		options |= FILE_OPEN_FOR_BACKUP_INTENT
+	else:
+		# Same as CreateFile: directories can only be opened with backup semantics.
+		options |= FILE_NON_DIRECTORY_FILE
+
+	name = create_unicode_buffer(filename)
+	length = len(filename) * sizeof(WCHAR)
+	objectName = UNICODE_STRING(length, length + sizeof(WCHAR), cast(name, LPWSTR))
+	objectAttributes = OBJECT_ATTRIBUTES(
+		sizeof(OBJECT_ATTRIBUTES), directory, pointer(objectName), OBJ_CASE_INSENSITIVE, None, None
+	)
+	ioStatus = IO_STATUS_BLOCK()
+	hFile = HANDLE()
+	status = ntdll.NtCreateFile(
+		byref(hFile), access | SYNCHRONIZE, byref(objectAttributes), byref(ioStatus), None,
+		FILE_ATTRIBUTE_NORMAL, sharemode, CREATION_DISPOSITIONS[creation], options, None, 0
+	)
+	if status < 0:
+		kernel32.SetLastError(ntdll.RtlNtStatusToDosError(status))
+		return None
+	return hFile.value
@@ -0,0 +1,410 @@
+# encoding: utf-8
+"""
+_posix.py
+A Backend for POSIX systems, so that the same create/read/check/unlink calls work on Linux and friends.
+
+Junctions and symbolic links both become native symbolic links: FSCTL_SET_REPARSE_POINT replaces the placeholder
+directory (or file) with one, FSCTL_GET_REPARSE_POINT hands back a symbolic link reparse buffer built from readlink,
+and FSCTL_DELETE_REPARSE_POINT swaps the link back for an empty directory or file, the way NTFS leaves one behind, for
+the RemoveDirectory or DeleteFile that follows it. Hard links map to os.link and file identity to (st_dev, st_ino).
+
+Handles keep the parent directory open, and everything done through a handle is relative to that directory (dir_fd),
+so a path is only parsed once per handle. File attributes are limited to what POSIX can express: the directory, reparse
+point and read-only bits. In particular, there's nowhere to keep FILE_ATTRIBUTE_SYSTEM, so cygwin links can't be
+created here.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import errno, io, itertools, os, posixpath, shutil, stat, threading
+from ._backend import Backend, REPARSE_WRITE_ACCESS
+from ._kernel32 import *
+from ._reparse import ReparseHeader, DecodeReparseBuffer, EncodeSymbolicLink, InvalidReparseBufferException
+
+# Win32 equivalents of the errno values the os module raises.
+_ERRNO_ERRORS = {
+	errno.ENOENT: ERROR_FILE_NOT_FOUND,
+	errno.EEXIST: ERROR_ALREADY_EXISTS,
+	errno.EACCES: ERROR_ACCESS_DENIED,
+	errno.EPERM: ERROR_ACCESS_DENIED,
+	errno.EISDIR: ERROR_ACCESS_DENIED,
+	errno.EROFS: ERROR_ACCESS_DENIED,
+	errno.ENOTEMPTY: ERROR_DIR_NOT_EMPTY,
+	errno.ENOTDIR: ERROR_DIRECTORY,
+	errno.EXDEV: ERROR_NOT_SAME_DEVICE,
+	errno.EMLINK: ERROR_TOO_MANY_LINKS,
+	errno.EINVAL: ERROR_INVALID_PARAMETER,
+	errno.EBADF: ERROR_INVALID_HANDLE,
+	errno.ENAMETOOLONG: ERROR_FILENAME_EXCED_RANGE,
+}
+
+# What GetVolumeInformation reports. Every POSIX file system worth linking on has symbolic and hard links.
+POSIX_FILESYSTEM_FLAGS = (
+	FILE_CASE_SENSITIVE_SEARCH | FILE_CASE_PRESERVED_NAMES | FILE_SUPPORTS_REPARSE_POINTS | FILE_SUPPORTS_HARD_LINKS
+)
+
+# The tags that can be stored as a symbolic link.
+_LINK_TAGS = (IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK)
+
+_O_DIRECTORY = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+
+# Everything done through a handle is relative to its directory, where the os module supports it. (Python 3.3+)
+_DIR_FD = hasattr(os, 'supports_dir_fd') and \
+	set([os.open, os.lstat, os.readlink, os.symlink, os.unlink, os.rmdir, os.mkdir]) <= os.supports_dir_fd
+
+class _PosixHandle(object):
+	"""
+	An open parent directory and the name of a file in it. at holds the keyword arguments to pass to the os calls. With
+	parent (another _PosixHandle), name is relative to it and the parent's directory is used instead of opening one.
+	"""
+	__slots__ = ('path', 'name', 'dirfd', 'at', 'access', 'owned', 'fd')
+
+	def __init__(self, path, access, parent = None, name = None):
+		self.path = path
+		self.access = access
+		self.fd = None
+		self.owned = parent is None
+		if not _DIR_FD:
+			self.dirfd = None
+			self.name = path
+			self.at = {}
+			return
+		if parent is not None:
+			self.dirfd = parent.directory()
+			self.name = name
+		else:
+			self.dirfd = os.open(posixpath.dirname(path) or u'/', _O_DIRECTORY)
+			self.name = posixpath.basename(path) or u'.'
+		self.at = {'dir_fd': self.dirfd}
+
+	def directory(self):
+		""" A descriptor for this file itself, for when it's used as the parent of other handles. """
+		if self.fd is None:
+			self.fd = os.open(self.name, _O_DIRECTORY, **self.at)
+		return self.fd
+
+	def close(self):
+		if self.fd is not None:
+			os.close(self.fd)
+			self.fd = None
+		if self.dirfd is not None and self.owned:
+			os.close(self.dirfd)
+		self.dirfd = None
+
+def _attributes(mode, target_mode = None):
+	""" Win32 file attributes from an lstat st_mode (and, for symbolic links, the st_mode of the target) """
+	attributes = 0
+	if stat.S_ISLNK(mode):
+		attributes |= FILE_ATTRIBUTE_REPARSE_POINT
+		mode = target_mode if target_mode is not None else mode
+	if stat.S_ISDIR(mode):
+		attributes |= FILE_ATTRIBUTE_DIRECTORY
+	if not mode & stat.S_IWUSR:
+		attributes |= FILE_ATTRIBUTE_READONLY
+	return attributes or FILE_ATTRIBUTE_NORMAL
+
+def _link_attributes(st, name, at):
+	""" _attributes for an lstat result, with the target looked up (following the link) only if it's a link. """
+	target_mode = None
+	if stat.S_ISLNK(st.st_mode):
+		try:
+			target_mode = os.stat(name, **at).st_mode
+		except OSError:
+			pass
+	return _attributes(st.st_mode, target_mode)
+
+def _mount_type(fpath):
+	""" File system type of the mount that fpath is on, from /proc/self/mounts, if there is one. """
+	best, fstype = u'', None
+	try:
+		with io.open('/proc/self/mounts', 'r') as mounts:
+			for line in mounts:
+				fields = line.split()
+				if len(fields) < 3:
+					continue
+				mountpoint = fields[1].replace('\\040', ' ')
+				inside = fpath == mountpoint or fpath.startswith(mountpoint.rstrip('/') + '/')
+				if inside and len(mountpoint) >= len(best):
+					best, fstype = mountpoint, fields[2]
+	except (IOError, OSError):
+		pass
+	return fstype
+
+class PosixBackend(Backend):
+	""" Backend for POSIX systems, built on the os module. The default everywhere but Windows. """
+	path = posixpath
+
+	def __init__(self):
+		self._errors = threading.local()
+		self._handle_ids = itertools.count(4, 4)
+		self._handles = {}
+		self._lock = threading.Lock()
+
+	## Helpers
+	def _fail(self, error, result = None):
+		if isinstance(error, EnvironmentError):
+			error = _ERRNO_ERRORS.get(error.errno, ERROR_INVALID_FUNCTION)
+		self._errors.code = error
+		return result
+
+	def _handle(self, handle):
+		with self._lock:
+			return self._handles.get(handle)
+
+	## Backend implementation
+	def GetLastError(self):
+		return getattr(self._errors, 'code', ERROR_SUCCESS)
+
+	def GetFullPathName(self, filename):
+		return posixpath.abspath(filename)
+
+	def CreateFile(self, filename, access, sharemode, creation, flags, directory = None):
+		try:
+			if directory is not None:
+				parent = self._handle(directory)
+				if parent is None:
+					return self._fail(ERROR_INVALID_HANDLE)
+				opened = _PosixHandle(posixpath.join(parent.path, filename), access, parent, filename)
+			else:
+				opened = _PosixHandle(self.GetFullPathName(filename), access)
+		except OSError as e:
+			return self._fail(e)
+		try:
+			try:
+				st = os.lstat(opened.name, **opened.at)
+			except OSError as e:
+				if e.errno != errno.ENOENT or creation in (OPEN_EXISTING, TRUNCATE_EXISTING):
+					raise
+				fd = os.open(opened.name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666, **opened.at)
+				os.close(fd)
+			else:
+				if creation == CREATE_NEW:
+					opened.close()
+					return self._fail(ERROR_FILE_EXISTS)
+				if stat.S_ISDIR(st.st_mode) and not flags & FILE_FLAG_BACKUP_SEMANTICS:
+					opened.close()
+					return self._fail(ERROR_ACCESS_DENIED)
+				if creation in (CREATE_ALWAYS, TRUNCATE_EXISTING) and stat.S_ISREG(st.st_mode):
+					fd = os.open(opened.name, os.O_WRONLY | os.O_TRUNC, **opened.at)
+					os.close(fd)
+		except OSError as e:
+			opened.close()
+			return self._fail(e)
+		with self._lock:
+			handle = next(self._handle_ids)
+			self._handles[handle] = opened
+		return handle
+
+	def CloseHandle(self, handle):
+		with self._lock:
+			opened = self._handles.pop(handle, None)
+		if opened is None:
+			return self._fail(ERROR_INVALID_HANDLE, False)
+		opened.close()
+		return True
+
+	def DeviceIoControl(self, handle, code, inbuf = None, outbuf = None):
+		opened = self._handle(handle)
+		if opened is None:
+			return self._fail(ERROR_INVALID_HANDLE)
+		try:
+			if code == FSCTL_GET_REPARSE_POINT:
+				return self._get_reparse_point(opened, outbuf)
+			if code in (FSCTL_SET_REPARSE_POINT, FSCTL_DELETE_REPARSE_POINT):
+				if not opened.access & REPARSE_WRITE_ACCESS:
+					return self._fail(ERROR_ACCESS_DENIED)
+				if code == FSCTL_SET_REPARSE_POINT:
+					return self._set_reparse_point(opened, inbuf)
+				return self._delete_reparse_point(opened, inbuf)
+		except OSError as e:
+			return self._fail(e)
+		return self._fail(ERROR_INVALID_FUNCTION)
+
+	def _get_reparse_point(self, opened, outbuf):
+		try:
+			target = os.readlink(opened.name, **opened.at)
+		except OSError as e:
+			if e.errno == errno.EINVAL:
+				return self._fail(ERROR_NOT_A_REPARSE_POINT)
+			raise
+		flags = 0 if posixpath.isabs(target) else SYMBOLIC_LINK_FLAG_RELATIVE
+		reparse = EncodeSymbolicLink(target, target, flags)
+		if outbuf is None or len(outbuf) < REPARSE_POINT_HEADER_SIZE:
+			return self._fail(ERROR_INSUFFICIENT_BUFFER)
+		length = min(len(outbuf), len(reparse))
+		memoryview(outbuf)[:length] = reparse[:length]
+		if length < len(reparse):
+			return self._fail(ERROR_MORE_DATA)
+		return length
+
+	def _set_reparse_point(self, opened, inbuf):
+		try:
+			reparseData = DecodeReparseBuffer(inbuf)
+		except InvalidReparseBufferException:
+			return self._fail(ERROR_INVALID_REPARSE_DATA)
+		target = reparseData.substitute_name
+		if target[:4] == u'\\??\\':
+			target = target[4:]
+		# Swap the placeholder that was created for the link (an empty directory or file) for the link itself.
+		st = os.lstat(opened.name, **opened.at)
+		if stat.S_ISLNK(st.st_mode):
+			os.unlink(opened.name, **opened.at)
+		elif stat.S_ISDIR(st.st_mode):
+			os.rmdir(opened.name, **opened.at)
+		elif st.st_size:
+			return self._fail(ERROR_ACCESS_DENIED)
+		else:
+			os.unlink(opened.name, **opened.at)
+		os.symlink(target, opened.name, **opened.at)
+		return 0
+
+	def _delete_reparse_point(self, opened, inbuf):
+		if inbuf is None or len(inbuf) < REPARSE_POINT_HEADER_SIZE:
+			return self._fail(ERROR_INVALID_REPARSE_DATA)
+		st = os.lstat(opened.name, **opened.at)
+		if not stat.S_ISLNK(st.st_mode):
+			return self._fail(ERROR_NOT_A_REPARSE_POINT)
+		if ReparseHeader(inbuf)[0] not in _LINK_TAGS:
+			return self._fail(ERROR_REPARSE_TAG_MISMATCH)
+		# The placeholder is whatever the link's attributes said it was: a directory if its target is one.
+		isdir = _link_attributes(st, opened.name, opened.at) & FILE_ATTRIBUTE_DIRECTORY
+		os.unlink(opened.name, **opened.at)
+		if isdir:
+			os.mkdir(opened.name, 0o777, **opened.at)
+		else:
+			os.close(os.open(opened.name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666, **opened.at))
+		return 0
+
+	def GetFileInformationByHandle(self, handle):
+		opened = self._handle(handle)
+		if opened is None:
+			return self._fail(ERROR_INVALID_HANDLE)
+		try:
+			st = os.lstat(opened.name, **opened.at)
+		except OSError as e:
+			return self._fail(e)
+		info = BY_HANDLE_FILE_INFORMATION()
+		info.dwFileAttributes = _link_attributes(st, opened.name, opened.at)
+		info.dwVolumeSerialNumber = st.st_dev & 0xFFFFFFFF
+		info.nFileSizeHigh, info.nFileSizeLow = (st.st_size >> 32) & 0xFFFFFFFF, st.st_size & 0xFFFFFFFF
+		info.nNumberOfLinks = st.st_nlink
+		info.nFileIndexHigh, info.nFileIndexLow = (st.st_ino >> 32) & 0xFFFFFFFF, st.st_ino & 0xFFFFFFFF
+		return info
+
+	def GetFileAttributes(self, filename):
+		try:
+			st = os.lstat(filename)
+		except OSError as e:
+			return self._fail(e, INVALID_FILE_ATTRIBUTES)
+		return _link_attributes(st, filename, {})
+
+	def SetFileAttributes(self, filename, attributes):
+		# Only FILE_ATTRIBUTE_READONLY has a POSIX equivalent: the write permission bits.
+		try:
+			mode = stat.S_IMODE(os.stat(filename).st_mode)
+			if attributes & FILE_ATTRIBUTE_READONLY:
+				mode &= ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+			else:
+				mode |= stat.S_IWUSR
+			os.chmod(filename, mode)
+		except OSError as e:
+			return self._fail(e, False)
+		return True
+
+	def _call(self, func, *args):
+		try:
+			func(*args)
+		except OSError as e:
+			return self._fail(e, False)
+		return True
+
+	def CreateDirectory(self, pathname):
+		return self._call(os.mkdir, pathname)
+
+	def RemoveDirectory(self, pathname):
+		return self._call(os.rmdir, pathname)
+
+	def DeleteFile(self, filename):
+		return self._call(os.unlink, filename)
+
+	def CreateHardLink(self, filename, existingname):
+		return self._call(os.link, existingname, filename)
+
+	def CreateSymbolicLink(self, linkname, target, flags):
+		return self._call(os.symlink, target, linkname)
+
+	def CopyFile(self, existingname, newname):
+		# Claim newname first, so that an existing file fails instead of getting overwritten. copy2 then takes the
+		# fastest way the os module has to copy it. (sendfile, etc)
+		try:
+			os.close(os.open(newname, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+		except OSError as e:
+			return self._fail(e, False)
+		try:
+			shutil.copy2(existingname, newname)
+		except (IOError, OSError) as e:
+			self._call(os.unlink, newname)
+			return self._fail(e, False)
+		return True
+
+	def MoveFile(self, existingname, newname):
+		return self._call(os.rename, existingname, newname)
+
+	def GetVolumePathName(self, filename):
+		fullpath = self.GetFullPathName(filename)
+		while not posixpath.ismount(fullpath):
+			fullpath = posixpath.dirname(fullpath)
+		return fullpath
+
+	def GetVolumeInformation(self, rootpath):
+		try:
+			st = os.stat(rootpath)
+		except OSError as e:
+			return self._fail(e)
+		return _mount_type(self.GetFullPathName(rootpath)) or u'', POSIX_FILESYSTEM_FLAGS, st.st_dev & 0xFFFFFFFF
+
+	def GetWindowsVersion(self):
+		return None
+
+	def ObtainPrivilege(self, name):
+		# Nothing needs extra privileges to create or read links here.
+		return True
+
+	def ReleasePrivilege(self, name):
+		return True
+
+	def FindFiles(self, pathname):
+		if not hasattr(os, 'scandir'):
+			return Backend.FindFiles(self, pathname)
+		try:
+			entries = list(os.scandir(pathname))
+		except OSError as e:
+			return self._fail(e)
+		# DirEntry answers is_dir/is_symlink from the d_type returned with the listing. Only links cost a stat.
+		results = []
+		for entry in entries:
+			tag = 0
+			if entry.is_symlink():
+				attributes = FILE_ATTRIBUTE_REPARSE_POINT
+				tag = IO_REPARSE_TAG_SYMBOLIC_LINK
+				if entry.is_dir():
+					attributes |= FILE_ATTRIBUTE_DIRECTORY
+			elif entry.is_dir(follow_symlinks = False):
+				attributes = FILE_ATTRIBUTE_DIRECTORY
+			else:
+				attributes = FILE_ATTRIBUTE_NORMAL
+			results.append((entry.name, attributes, tag))
+		return results
+
+	def ReadDirectoryChanges(self, handle, subtree, filter = FILE_NOTIFY_CHANGE_LINKS, armed = None):
+		# Neither inotify nor kqueue are reachable through the os module.
+		return self._fail(ERROR_INVALID_FUNCTION)
+
+	def CancelIo(self, handle):
+		return self._fail(ERROR_INVALID_FUNCTION, False)
+
+	def open(self, filename, mode = 'rb'):
+		return io.open(filename, mode)
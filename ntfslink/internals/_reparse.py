@@ -0,0 +1,476 @@
+# encoding: utf-8
+"""
+_reparse.py
+Pure-Python encoding and decoding of raw REPARSE_DATA_BUFFER bytes, along with a per-tag registry of decoders.
+
+Everything in here works on plain byte buffers (str, bytearray, memoryview, mmap, etc) through memoryview and
+struct.unpack_from, so none of it needs to touch kernel32 and the only data copied out of the buffer are the names
+themselves. When the optional C accelerator (ntfslink/ext/speedups.c) is built, it takes over the hottest of these.
+(See UseSpeedups)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import struct
+import os as _os
+from collections import namedtuple
+from ._winioctl import *
+
+# ReparseTag, ReparseDataLength, Reserved
+_REPARSE_HEADER = struct.Struct('<LHH')
+
+# SubstituteNameOffset, SubstituteNameLength, PrintNameOffset, PrintNameLength
+_REPARSE_NAMES = struct.Struct('<HHHH')
+
+# SymbolicLinkReparseBuffer.Flags
+_REPARSE_FLAGS = struct.Struct('<L')
+
+# Everything that precedes the PathBuffer, so the encoder can write it in a single pack_into call.
+_MOUNT_POINT_HEADER = struct.Struct('<LHHHHHH')
+_SYMBOLIC_LINK_HEADER = struct.Struct('<LHHHHHHL')
+
+# ReparseTag, ReparseDataLength, Reserved, ReparseGuid
+_GUID_HEADER = struct.Struct('<LHH16s')
+
+# Mount point names are each followed by a terminating \0.
+_NUL = u'\0'.encode('utf-16-le')
+
+# Batches are laid out so that every buffer in the arena starts on an 8-byte boundary.
+_ARENA_ALIGNMENT = 8
+
+# Offsets of the PathBuffer fields, relative to the start of the REPARSE_DATA_BUFFER.
+MOUNT_POINT_PATH_OFFSET = REPARSE_POINT_HEADER_SIZE + _REPARSE_NAMES.size
+SYMBOLIC_LINK_PATH_OFFSET = MOUNT_POINT_PATH_OFFSET + _REPARSE_FLAGS.size
+
+class InvalidReparseBufferException(Exception):
+	""" Raised when a buffer handed to the decoder does not contain a valid reparse point. """
+
+class ReparseData(namedtuple('ReparseData', 'tag flags substitute_name print_name')):
+	"""
+	Immutable record holding the decoded contents of a mount point or symbolic link reparse buffer. Mount points always
+	have flags set to 0. The same record is accepted by the encoder.
+	"""
+	__slots__ = ()
+
+def ReparseView(buf):
+	""" Returns a flat, byte-addressed memoryview over buf without copying it. """
+	view = buf if isinstance(buf, memoryview) else memoryview(buf)
+	if view.ndim != 1 or view.itemsize != 1:
+		# ctypes structures export themselves as a single item. Python 3 can recast those in place.
+		view = view.cast('B')
+	return view
+
+def ReparseHeader(buf, offset = 0):
+	"""
+	Unpacks the fixed REPARSE_DATA_BUFFER header at offset.
+
+	It returns a tuple containing (ReparseTag, ReparseDataLength, Reserved).
+	"""
+	if len(buf) - offset < REPARSE_POINT_HEADER_SIZE:
+		raise InvalidReparseBufferException('Buffer is too small to hold a reparse point header.')
+	return _REPARSE_HEADER.unpack_from(buf, offset)
+
+def ReparseGuid(buf, offset = 0):
+	""" Returns the ReparseGuid of the REPARSE_GUID_DATA_BUFFER at offset as a uuid.UUID. """
+	if len(buf) - offset < REPARSE_GUID_DATA_BUFFER_HEADER_SIZE:
+		raise InvalidReparseBufferException('Buffer is too small to hold a reparse GUID header.')
+	import uuid
+	return uuid.UUID(bytes_le = _GUID_HEADER.unpack_from(buf, offset)[3])
+
+def _decode_name(view, start, offset, length):
+	""" Pull a single UTF-16 name out of a PathBuffer that starts at start. """
+	begin = start + offset
+	end = begin + length
+	if end > len(view):
+		raise InvalidReparseBufferException('Name at offset %d runs past the end of the reparse buffer.' % offset)
+	return view[begin:end].tobytes().decode('utf-16-le')
+
+def _reparse_data(view, offset):
+	""" Validate the header at offset and return (tag, view over the ReparseDataLength bytes that follow it). """
+	tag, datalen, reserved = ReparseHeader(view, offset)
+	start = offset + REPARSE_POINT_HEADER_SIZE
+	if len(view) - start < datalen:
+		raise InvalidReparseBufferException('Reparse buffer is truncated: expected %d bytes of data.' % datalen)
+	return tag, view[start:start + datalen]
+
+def _decode_link(tag, guid, data):
+	""" Decoder for IO_REPARSE_TAG_MOUNT_POINT and IO_REPARSE_TAG_SYMBOLIC_LINK. """
+	start = _REPARSE_NAMES.size
+	if tag == IO_REPARSE_TAG_SYMBOLIC_LINK:
+		start += _REPARSE_FLAGS.size
+	if len(data) < start:
+		raise InvalidReparseBufferException('Reparse buffer is too small to hold its name offsets.')
+	substoff, substlen, printoff, printlen = _REPARSE_NAMES.unpack_from(data, 0)
+	flags = _REPARSE_FLAGS.unpack_from(data, _REPARSE_NAMES.size)[0] if tag == IO_REPARSE_TAG_SYMBOLIC_LINK else 0
+	return ReparseData(
+		tag, flags,
+		_decode_name(data, start, substoff, substlen),
+		_decode_name(data, start, printoff, printlen)
+	)
+
+def DecodeReparseBuffer(buf, offset = 0):
+	"""
+	Decode the mount point or symbolic link REPARSE_DATA_BUFFER found at offset in buf, returning a ReparseData record
+	containing both the SubstituteName and the PrintName.
+	"""
+	return _decode_buffer(buf, offset)
+
+def _decode_buffer(buf, offset):
+	tag, data = _reparse_data(ReparseView(buf), offset)
+	if tag != IO_REPARSE_TAG_MOUNT_POINT and tag != IO_REPARSE_TAG_SYMBOLIC_LINK:
+		raise InvalidReparseBufferException('Unsupported reparse tag: 0x%08X' % tag)
+	return _decode_link(tag, None, data)
+
+## Decoder registry
+# Every decoder is called as decoder(tag, guid, data), where data is a memoryview over the tag-specific data and guid
+# is the ReparseGuid for non-Microsoft tags (None otherwise). Decoders should avoid holding on to data, since it's
+# usually a view into a pooled buffer.
+_tag_decoders = {}
+_guid_decoders = {}
+
+class GenericReparseData(namedtuple('GenericReparseData', 'tag guid data')):
+	"""
+	Returned for tags that have no registered decoder. That includes the tags whose data is either empty (AF_UNIX, the
+	LX special files) or not publicly documented (WIM, DFS, DFSR, HSM, cloud files, etc). data is a memoryview over the
+	original buffer, so copy it with data.tobytes() if it needs to outlive that buffer. (read_reparse_point and the
+	rest of common hand out bytes instead, since theirs is pooled.)
+	"""
+	__slots__ = ()
+
+class LxSymlinkData(namedtuple('LxSymlinkData', 'tag version target')):
+	""" WSL symbolic link (IO_REPARSE_TAG_LX_SYMLINK). The target is stored as UTF-8 in POSIX form. """
+	__slots__ = ()
+
+class AppExecLinkData(namedtuple('AppExecLinkData', 'tag version package_id app_user_model_id target_path extra')):
+	"""
+	App execution alias (IO_REPARSE_TAG_APPEXECLINK), as found in %LOCALAPPDATA%\\Microsoft\\WindowsApps. Any strings
+	following the target path end up in extra.
+	"""
+	__slots__ = ()
+
+class SisData(namedtuple('SisData', 'tag version common_store_id link_index link_file_id common_store_file_id '
+                                    'common_store_checksum checksum')):
+	""" Single Instance Storage link (IO_REPARSE_TAG_SIS), from SI_REPARSE_BUFFER. """
+	__slots__ = ()
+
+class WofData(namedtuple('WofData', 'tag provider provider_version flags algorithm data_source_id resource_hash')):
+	"""
+	Windows Overlay Filter file (IO_REPARSE_TAG_WOF). algorithm is only set for WOF_PROVIDER_FILE (compressed) files,
+	and data_source_id/resource_hash are only set for WOF_PROVIDER_WIM backed files.
+	"""
+	__slots__ = ()
+
+# ULONG Version, followed by the data for LX_SYMLINK and APPEXECLINK
+_VERSION = struct.Struct('<L')
+
+# ReparsePointFormatVersion, Reserved, CSid, LinkIndex, LinkFileNtfsId, CSFileNtfsId, CSChecksum, Checksum
+_SIS_BUFFER = struct.Struct('<LL16sqqqqq')
+
+# WOF_EXTERNAL_INFO: Version, Provider
+_WOF_EXTERNAL_INFO = struct.Struct('<LL')
+# FILE_PROVIDER_EXTERNAL_INFO_V1: Version, Algorithm, Flags
+_WOF_FILE_PROVIDER_INFO = struct.Struct('<LLL')
+# WIM_PROVIDER_EXTERNAL_INFO: Version, Flags, DataSourceId, ResourceHash
+_WOF_WIM_PROVIDER_INFO = struct.Struct('<LLq20s')
+
+def _decode_lx_symlink(tag, guid, data):
+	""" Decoder for IO_REPARSE_TAG_LX_SYMLINK. """
+	if len(data) < _VERSION.size:
+		raise InvalidReparseBufferException('LX symlink reparse buffer is too small.')
+	version, = _VERSION.unpack_from(data, 0)
+	return LxSymlinkData(tag, version, data[_VERSION.size:].tobytes().decode('utf-8'))
+
+def _decode_appexeclink(tag, guid, data):
+	""" Decoder for IO_REPARSE_TAG_APPEXECLINK: a version followed by a list of \\0 terminated UTF-16 strings. """
+	if len(data) < _VERSION.size:
+		raise InvalidReparseBufferException('AppExecLink reparse buffer is too small.')
+	version, = _VERSION.unpack_from(data, 0)
+	strings = data[_VERSION.size:].tobytes().decode('utf-16-le').split(u'\0')
+	if strings and not strings[-1]:
+		strings.pop()
+	strings += [u''] * (3 - len(strings))
+	return AppExecLinkData(tag, version, strings[0], strings[1], strings[2], tuple(strings[3:]))
+
+def _decode_sis(tag, guid, data):
+	""" Decoder for IO_REPARSE_TAG_SIS. """
+	if len(data) < _SIS_BUFFER.size:
+		raise InvalidReparseBufferException('SIS reparse buffer is too small.')
+	fields = _SIS_BUFFER.unpack_from(data, 0)
+	import uuid
+	return SisData(tag, fields[0], uuid.UUID(bytes_le = fields[2]), *fields[3:])
+
+def _decode_wof(tag, guid, data):
+	""" Decoder for IO_REPARSE_TAG_WOF. """
+	if len(data) < _WOF_EXTERNAL_INFO.size:
+		raise InvalidReparseBufferException('WOF reparse buffer is too small.')
+	version, provider = _WOF_EXTERNAL_INFO.unpack_from(data, 0)
+	info = data[_WOF_EXTERNAL_INFO.size:]
+	if provider == WOF_PROVIDER_FILE and len(info) >= _WOF_FILE_PROVIDER_INFO.size:
+		pversion, algorithm, flags = _WOF_FILE_PROVIDER_INFO.unpack_from(info, 0)
+		return WofData(tag, provider, pversion, flags, algorithm, None, None)
+	elif provider == WOF_PROVIDER_WIM and len(info) >= _WOF_WIM_PROVIDER_INFO.size:
+		pversion, flags, source, rhash = _WOF_WIM_PROVIDER_INFO.unpack_from(info, 0)
+		return WofData(tag, provider, pversion, flags, None, source, rhash)
+	return WofData(tag, provider, None, None, None, None, None)
+
+def _decode_generic(tag, guid, data):
+	""" Decoder for tags whose data is either empty or undocumented. """
+	return GenericReparseData(tag, guid, data)
+
+def RegisterReparseDecoder(tag, decoder):
+	"""
+	Register decoder(tag, guid, data) for a reparse tag, replacing any existing decoder for that tag. Works for both
+	Microsoft and third-party tags. Passing None removes the decoder.
+	"""
+	if decoder is None:
+		_tag_decoders.pop(tag, None)
+	else:
+		_tag_decoders[tag] = decoder
+
+def RegisterGuidDecoder(guid, decoder):
+	"""
+	Register decoder(tag, guid, data) for a third-party REPARSE_GUID_DATA_BUFFER whose ReparseGuid is guid (a
+	uuid.UUID). It's only consulted for non-Microsoft tags with no decoder registered by tag. Passing None removes the
+	decoder.
+	"""
+	if decoder is None:
+		_guid_decoders.pop(guid, None)
+	else:
+		_guid_decoders[guid] = decoder
+
+def DecodeReparsePoint(buf, offset = 0):
+	"""
+	Decode the reparse buffer at offset in buf with whichever decoder is registered for its tag. Third-party tags are
+	parsed as a REPARSE_GUID_DATA_BUFFER and dispatched on their GUID. Anything without a decoder comes back as a
+	GenericReparseData record.
+	"""
+	view = ReparseView(buf)
+	tag, data = _reparse_data(view, offset)
+	guid = None
+	if not IsReparseTagMicrosoft(tag):
+		# For REPARSE_GUID_DATA_BUFFER, ReparseDataLength doesn't include the GUID.
+		guid = ReparseGuid(view, offset)
+		start = offset + REPARSE_GUID_DATA_BUFFER_HEADER_SIZE
+		if len(view) - start < len(data):
+			raise InvalidReparseBufferException('Reparse buffer is truncated: expected %d bytes of data.' % len(data))
+		data = view[start:start + len(data)]
+
+	decoder = _tag_decoders.get(tag)
+	if decoder is None and guid is not None:
+		decoder = _guid_decoders.get(guid)
+	if decoder is None:
+		decoder = _decode_generic
+	return decoder(tag, guid, data)
+
+RegisterReparseDecoder(IO_REPARSE_TAG_MOUNT_POINT, _decode_link)
+RegisterReparseDecoder(IO_REPARSE_TAG_SYMBOLIC_LINK, _decode_link)
+RegisterReparseDecoder(IO_REPARSE_TAG_LX_SYMLINK, _decode_lx_symlink)
+RegisterReparseDecoder(IO_REPARSE_TAG_APPEXECLINK, _decode_appexeclink)
+RegisterReparseDecoder(IO_REPARSE_TAG_SIS, _decode_sis)
+RegisterReparseDecoder(IO_REPARSE_TAG_WOF, _decode_wof)
+
+def ReparseTarget(reparseData):
+	"""
+	Where a decoded reparse point leads, for junctions, symbolic links, WSL symbolic links and app execution aliases.
+	Returns None for anything else (None included).
+	"""
+	if isinstance(reparseData, ReparseData):
+		# Prefer the PrintName, but fall back to the SubstituteName minus its \??\ prefix for links created by tools
+		# that leave the PrintName empty.
+		if reparseData.print_name:
+			return reparseData.print_name
+		target = reparseData.substitute_name
+		return target[4:] if target[:4] == u'\\??\\' else target
+	elif isinstance(reparseData, LxSymlinkData):
+		return reparseData.target
+	elif isinstance(reparseData, AppExecLinkData):
+		return reparseData.target_path
+	return None
+
+def _encode_name(name):
+	""" Names are stored as UTF-16LE. Encoding up front gives us the exact byte length, surrogates included. """
+	return name.encode('utf-16-le')
+
+def ReparseDataLength(tag, substlen, printlen):
+	"""
+	Exact ReparseDataLength for a mount point or symbolic link whose encoded names are substlen and printlen bytes
+	long. Mount points carry a terminating \\0 after each name, symbolic links don't.
+	"""
+	if tag == IO_REPARSE_TAG_MOUNT_POINT:
+		return _REPARSE_NAMES.size + substlen + printlen + 2 * len(_NUL)
+	elif tag == IO_REPARSE_TAG_SYMBOLIC_LINK:
+		return _REPARSE_NAMES.size + _REPARSE_FLAGS.size + substlen + printlen
+	raise InvalidReparseBufferException('Unsupported reparse tag: 0x%08X' % tag)
+
+def _encode_into(buf, offset, tag, flags, subst, prnt):
+	""" Writes an already UTF-16 encoded mount point or symbolic link at offset. Returns the number of bytes written. """
+	datalen = ReparseDataLength(tag, len(subst), len(prnt))
+	total = REPARSE_POINT_HEADER_SIZE + datalen
+	if total > MAX_REPARSE_BUFFER:
+		raise InvalidReparseBufferException('Reparse data is too large: %d bytes.' % total)
+
+	if tag == IO_REPARSE_TAG_MOUNT_POINT:
+		# SubstituteName\0PrintName\0
+		printoff = len(subst) + len(_NUL)
+		_MOUNT_POINT_HEADER.pack_into(buf, offset, tag, datalen, 0, 0, len(subst), printoff, len(prnt))
+		start = offset + MOUNT_POINT_PATH_OFFSET
+		buf[start:start + len(subst)] = subst
+		buf[start + len(subst):start + printoff] = _NUL
+		start += printoff
+		buf[start:start + len(prnt)] = prnt
+		buf[start + len(prnt):start + len(prnt) + len(_NUL)] = _NUL
+	else:
+		# PrintNameSubstituteName, matching what CreateSymbolicLink writes.
+		_SYMBOLIC_LINK_HEADER.pack_into(buf, offset, tag, datalen, 0, len(prnt), len(subst), 0, len(prnt), flags)
+		start = offset + SYMBOLIC_LINK_PATH_OFFSET
+		buf[start:start + len(prnt)] = prnt
+		start += len(prnt)
+		buf[start:start + len(subst)] = subst
+	return total
+
+def EncodeReparseBuffer(reparseData):
+	"""
+	Encode a ReparseData record for a mount point or symbolic link into an exactly sized bytearray that can be handed
+	straight to FSCTL_SET_REPARSE_POINT.
+	"""
+	subst = _encode_name(reparseData.substitute_name)
+	prnt = _encode_name(reparseData.print_name)
+	buf = bytearray(REPARSE_POINT_HEADER_SIZE + ReparseDataLength(reparseData.tag, len(subst), len(prnt)))
+	_encode_into(buf, 0, reparseData.tag, reparseData.flags, subst, prnt)
+	return buf
+
+def EncodeMountPoint(substitute_name, print_name):
+	""" Shortcut for encoding a mount point (junction) reparse buffer. """
+	return EncodeReparseBuffer(ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, substitute_name, print_name))
+
+def EncodeSymbolicLink(substitute_name, print_name, flags = 0):
+	"""
+	Shortcut for encoding a symbolic link reparse buffer. Pass SYMBOLIC_LINK_FLAG_RELATIVE in flags for relative
+	links.
+	"""
+	return EncodeReparseBuffer(ReparseData(IO_REPARSE_TAG_SYMBOLIC_LINK, flags, substitute_name, print_name))
+
+def EncodeGuidBuffer(tag, guid, data = b''):
+	"""
+	Encode a REPARSE_GUID_DATA_BUFFER for a third-party (non-Microsoft) tag. guid may be a uuid.UUID or the 16 raw
+	bytes of a GUID structure.
+	"""
+	if IsReparseTagMicrosoft(tag):
+		raise InvalidReparseBufferException('Microsoft tag 0x%08X does not use a REPARSE_GUID_DATA_BUFFER.' % tag)
+	if not isinstance(guid, (bytes, bytearray)):
+		# A uuid.UUID, which is slow enough to import that it only gets imported where one is made.
+		guid = guid.bytes_le
+	total = REPARSE_GUID_DATA_BUFFER_HEADER_SIZE + len(data)
+	if total > MAX_REPARSE_BUFFER:
+		raise InvalidReparseBufferException('Reparse data is too large: %d bytes.' % total)
+	buf = bytearray(total)
+	_GUID_HEADER.pack_into(buf, 0, tag, len(data), 0, guid)
+	buf[REPARSE_GUID_DATA_BUFFER_HEADER_SIZE:] = data
+	return buf
+
+def EncodeReparseHeader(tag, guid = None):
+	"""
+	Encode a bare REPARSE_GUID_DATA_BUFFER header with no data, as used for FSCTL_DELETE_REPARSE_POINT. The GUID is
+	left zeroed unless one is given.
+	"""
+	buf = bytearray(REPARSE_GUID_DATA_BUFFER_HEADER_SIZE)
+	_GUID_HEADER.pack_into(buf, 0, tag, 0, 0, guid.bytes_le if guid is not None else b'')
+	return buf
+
+def EncodeReparseBuffers(records):
+	"""
+	Batch form of EncodeReparseBuffer. Every record is encoded into one preallocated arena.
+
+	It returns a tuple containing (arena, [(offset, length), ...]), with one (offset, length) pair per record, in
+	order. memoryview(arena)[offset:offset + length] is the buffer for that record.
+	"""
+	encoded = []
+	size = 0
+	for record in records:
+		subst = _encode_name(record.substitute_name)
+		prnt = _encode_name(record.print_name)
+		length = REPARSE_POINT_HEADER_SIZE + ReparseDataLength(record.tag, len(subst), len(prnt))
+		encoded.append((size, record.tag, record.flags, subst, prnt))
+		size += (length + _ARENA_ALIGNMENT - 1) & ~(_ARENA_ALIGNMENT - 1)
+
+	arena = bytearray(size)
+	spans = []
+	for offset, tag, flags, subst, prnt in encoded:
+		spans.append((offset, _encode_into(arena, offset, tag, flags, subst, prnt)))
+	return arena, spans
+
+## Batch classification
+# What ClassifyReparseTags turns each tag into.
+REPARSE_KIND_NONE = 0       # Not a reparse point. (A tag of 0)
+REPARSE_KIND_JUNCTION = 1   # IO_REPARSE_TAG_MOUNT_POINT
+REPARSE_KIND_SYMLINK = 2    # IO_REPARSE_TAG_SYMBOLIC_LINK
+REPARSE_KIND_SURROGATE = 3  # Any other name surrogate. (LX symlinks, WCI links, etc)
+REPARSE_KIND_OTHER = 4      # Everything else, including integers too wide to be a tag at all.
+
+# Reparse tags are ULONGs.
+MAX_REPARSE_TAG = 0xFFFFFFFF
+
+_TAG_KINDS = {
+	0: REPARSE_KIND_NONE,
+	IO_REPARSE_TAG_MOUNT_POINT: REPARSE_KIND_JUNCTION,
+	IO_REPARSE_TAG_SYMBOLIC_LINK: REPARSE_KIND_SYMLINK,
+}
+
+def _classify_tags(tags):
+	kinds = _TAG_KINDS
+	return bytearray(
+		kinds.get(tag, REPARSE_KIND_SURROGATE if 0 <= tag <= MAX_REPARSE_TAG and IsReparseTagNameSurrogate(tag)
+			else REPARSE_KIND_OTHER) for tag in tags
+	)
+
+def ClassifyReparseTags(tags):
+	"""
+	Sort a batch of reparse tags (any iterable, or an array of them, as found in scan results and MFT tables) into
+	REPARSE_KIND_* values, returned as a bytearray with one per tag, in order.
+	"""
+	return _classify_tags(tags)
+
+## C accelerator
+# The pure-Python versions of everything the accelerator can stand in for.
+_python_functions = {
+	'_decode_name': _decode_name,
+	'_decode_link': _decode_link,
+	'_decode_buffer': _decode_buffer,
+	'_encode_into': _encode_into,
+	'_classify_tags': _classify_tags,
+}
+
+try:
+	from . import _speedups
+except ImportError:
+	_speedups = None
+else:
+	_speedups.configure(InvalidReparseBufferException, ReparseData)
+
+def UseSpeedups(enabled = True):
+	"""
+	Switch between the C accelerator and the pure-Python implementation, which give identical results. Returns whether
+	the accelerator is now in use, which it can't be if it wasn't built. It's switched on at import, unless the
+	NTFSLINK_NO_SPEEDUPS environment variable is set.
+	"""
+	functions = _python_functions
+	if enabled and _speedups is not None:
+		functions = {
+			'_decode_name': _speedups.decode_name,
+			'_decode_link': _speedups.decode_link,
+			'_decode_buffer': _speedups.decode_buffer,
+			'_encode_into': _speedups.encode_into,
+			'_classify_tags': _speedups.classify_tags,
+		}
+	previous = globals()['_decode_link']
+	globals().update(functions)
+	for tag in (IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK):
+		# Leave any decoder that was registered over ours alone.
+		if _tag_decoders.get(tag) is previous:
+			RegisterReparseDecoder(tag, functions['_decode_link'])
+	return functions is not _python_functions
+
+UseSpeedups(not _os.environ.get('NTFSLINK_NO_SPEEDUPS'))
@@ -0,0 +1,600 @@
+# encoding: utf-8
+"""
+_simulator.py
+An in-memory NTFS volume implementing the Backend interface, for running and benchmarking ntfslink where there's no
+Windows (or no NTFS) to run it against.
+
+Reparse points are stored as the raw buffers that FSCTL_SET_REPARSE_POINT was given, and handed back byte for byte by
+FSCTL_GET_REPARSE_POINT, so the encoding and decoding code paths are exactly the ones used against a real volume. Each
+call can be charged a latency from a LatencyModel, to see how the library behaves on slow (network) volumes.
+
+Paths are case-insensitive and never resolved through reparse points, so nothing can be looked up *through* a junction
+or symbolic link; the links themselves behave like they do on NTFS.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import errno, functools, io, itertools, ntpath, random, threading, time
+from ._backend import Backend, REPARSE_WRITE_ACCESS
+from ._kernel32 import *
+from ._reparse import ReparseHeader, ReparseGuid, EncodeSymbolicLink
+
+# NTFS limits
+MAX_HARD_LINKS = 1024
+
+# MFT records below this are reserved for the file system's own metadata files.
+FIRST_USER_FILE_INDEX = 24
+
+# Allows CreateSymbolicLink without SeCreateSymbolicLinkPrivilege in developer mode. (Windows 10 1703+)
+SYMBOLIC_LINK_FLAG_ALLOW_UNPRIVILEGED_CREATE = 0x2
+
+# The attributes that SetFileAttributes is allowed to change.
+_SETTABLE_ATTRIBUTES = (
+	FILE_ATTRIBUTE_READONLY | FILE_ATTRIBUTE_HIDDEN | FILE_ATTRIBUTE_SYSTEM | FILE_ATTRIBUTE_ARCHIVE |
+	FILE_ATTRIBUTE_TEMPORARY | FILE_ATTRIBUTE_OFFLINE | FILE_ATTRIBUTE_NOT_CONTENT_INDEXED
+)
+
+# What GetVolumeInformation reports for a simulated NTFS volume.
+SIMULATED_NTFS_FLAGS = (
+	FILE_CASE_SENSITIVE_SEARCH | FILE_CASE_PRESERVED_NAMES | FILE_UNICODE_ON_DISK | FILE_PERSISTENT_ACLS |
+	FILE_FILE_COMPRESSION | FILE_VOLUME_QUOTAS | FILE_SUPPORTS_SPARSE_FILES | FILE_SUPPORTS_REPARSE_POINTS |
+	FILE_SUPPORTS_OBJECT_IDS | FILE_SUPPORTS_ENCRYPTION | FILE_NAMED_STREAMS | FILE_SUPPORTS_TRANSACTIONS |
+	FILE_SUPPORTS_HARD_LINKS | FILE_SUPPORTS_EXTENDED_ATTRIBUTES | FILE_SUPPORTS_OPEN_BY_FILE_ID |
+	FILE_SUPPORTS_USN_JOURNAL
+)
+
+class LatencyModel(object):
+	"""
+	How long each call to a SimulatedBackend takes, in seconds. default applies to every call, and calls maps backend
+	method names to latencies of their own. (eg: {'DeviceIoControl': 0.002}) jitter adds up to that fraction of the
+	latency again, picked at random.
+
+	Calls are counted in counts and their latencies added up in elapsed. With sleep=None, that's all that happens, which
+	is enough to model a slow volume in a benchmark without actually slowing it down.
+	"""
+
+	def __init__(self, default = 0.0, calls = None, jitter = 0.0, sleep = time.sleep, seed = None):
+		self.default = default
+		self.calls = dict(calls or {})
+		self.jitter = jitter
+		self.sleep = sleep
+		self.random = random.Random(seed)
+		self._lock = threading.Lock()
+		self.reset()
+
+	def delay(self, call):
+		""" The latency of one call to the backend method named call. """
+		latency = self.calls.get(call, self.default)
+		if latency and self.jitter:
+			latency += latency * self.jitter * self.random.random()
+		return latency
+
+	def reset(self):
+		""" Zero out counts and elapsed. """
+		with self._lock:
+			self.counts = {}
+			self.elapsed = 0.0
+
+	def __call__(self, call):
+		latency = self.delay(call)
+		with self._lock:
+			self.counts[call] = self.counts.get(call, 0) + 1
+			self.elapsed += latency
+		if latency > 0 and self.sleep is not None:
+			self.sleep(latency)
+
+class _Node(object):
+	""" A file or directory. Hard links are several paths sharing one node. """
+	__slots__ = ('attributes', 'data', 'reparse', 'links', 'index', 'volume', 'children')
+
+	def __init__(self, attributes, index, volume):
+		self.attributes = attributes
+		self.data = b''
+		self.reparse = None
+		self.links = 1
+		self.index = index
+		self.volume = volume
+		# Upper-cased name -> name, for directories.
+		self.children = {} if attributes & FILE_ATTRIBUTE_DIRECTORY else None
+
+	@property
+	def is_directory(self): return self.children is not None
+
+class _OpenFile(object):
+	__slots__ = ('node', 'path', 'access')
+
+	def __init__(self, node, path, access):
+		self.node = node
+		self.path = path
+		self.access = access
+
+class _Watch(object):
+	""" A directory handle that ReadDirectoryChanges has been called on, and the changes it hasn't returned yet. """
+	__slots__ = ('key', 'subtree', 'filter', 'changes', 'waiting', 'cancelled')
+
+	def __init__(self, key):
+		self.key = key
+		self.subtree = False
+		self.filter = 0
+		self.changes = []
+		self.waiting = 0
+		self.cancelled = False
+
+class _SimulatedFile(io.BytesIO):
+	""" What SimulatedBackend.open returns. The contents get written back to the file when it's closed. """
+
+	def __init__(self, node, data, writable):
+		io.BytesIO.__init__(self, data)
+		self._node = node
+		self._writable = writable
+
+	def close(self):
+		if not self.closed and self._writable:
+			self._node.data = self.getvalue()
+		io.BytesIO.close(self)
+
+def _simulated(method):
+	""" Charge a backend method's latency, then run it with the volume locked. """
+	name = method.__name__
+
+	@functools.wraps(method)
+	def call(self, *args, **kwargs):
+		self.latency(name)
+		with self._lock:
+			return method(self, *args, **kwargs)
+	return call
+
+class SimulatedBackend(Backend):
+	"""
+	A Backend holding one or more empty NTFS volumes in memory, named by drive letter in drives. Relative paths are
+	resolved against cwd. latency is a LatencyModel (or None for no latency). Set symlink_privilege to False to have
+	CreateSymbolicLink fail like it does for non-elevated users. held_privileges limits which privileges ObtainPrivilege
+	can enable (any of them, by default); the enabled ones are kept in privileges.
+	"""
+
+	def __init__(self, drives = ('C:',), cwd = None, latency = None, filesystem = u'NTFS',
+	             filesystem_flags = SIMULATED_NTFS_FLAGS, version = (10, 0), symlink_privilege = True,
+	             held_privileges = None):
+		self.latency = latency if latency is not None else LatencyModel()
+		self.filesystem = filesystem
+		self.filesystem_flags = filesystem_flags
+		self.version = tuple(version)
+		self.symlink_privilege = symlink_privilege
+		self.held_privileges = held_privileges
+		self.privileges = set()
+		self._lock = threading.RLock()
+		self._errors = threading.local()
+		self._indexes = itertools.count(FIRST_USER_FILE_INDEX)
+		self._handle_ids = itertools.count(4, 4)
+		self._handles = {}
+		self._watches = {}
+		self._changed = threading.Condition(self._lock)
+		self._paths = {}
+		self._volumes = {}
+		for serial, drive in enumerate(drives, 0x1000):
+			drive = drive.rstrip(u'\\').upper()
+			self._volumes[drive] = serial
+			self._paths[drive + u'\\'] = _Node(FILE_ATTRIBUTE_DIRECTORY, next(self._indexes), serial)
+		self.cwd = cwd or drives[0].rstrip(u'\\') + u'\\'
+
+	## Helpers
+	def _fail(self, error, result = None):
+		self._errors.code = error
+		return result
+
+	def _lookup(self, filename):
+		""" Returns (path, key, node) for a path, where node is None if nothing is there. """
+		fullpath = self.GetFullPathName(filename)
+		key = fullpath.upper()
+		return fullpath, key, self._paths.get(key)
+
+	def _parent(self, key):
+		""" The node of the directory that contains key, or None. """
+		parent = self._paths.get(ntpath.dirname(key))
+		return parent if parent is not None and parent.is_directory else None
+
+	def _add(self, fullpath, key, node):
+		self._paths[key] = node
+		name = ntpath.basename(fullpath)
+		self._parent(key).children[name.upper()] = name
+		self._notify(fullpath, FILE_ACTION_ADDED,
+			FILE_NOTIFY_CHANGE_DIR_NAME if node.is_directory else FILE_NOTIFY_CHANGE_FILE_NAME)
+		return node
+
+	def _remove(self, key):
+		node = self._paths.pop(key)
+		name = self._parent(key).children.pop(ntpath.basename(key))
+		node.links -= 1
+		self._notify(ntpath.join(ntpath.dirname(key), name), FILE_ACTION_REMOVED,
+			FILE_NOTIFY_CHANGE_DIR_NAME if node.is_directory else FILE_NOTIFY_CHANGE_FILE_NAME)
+		return node
+
+	def _notify(self, fullpath, action, change):
+		""" Hand a change to every watch it falls under, and wake up whoever's waiting on them. """
+		if not self._watches:
+			return
+		key = fullpath.upper()
+		for watch in self._watches.values():
+			if not watch.filter & change:
+				continue
+			prefix = watch.key.rstrip(u'\\') + u'\\'
+			if key.startswith(prefix) and (watch.subtree or u'\\' not in key[len(prefix):]):
+				watch.changes.append((action, fullpath[len(prefix):]))
+		self._changed.notify_all()
+
+	def _new_node(self, fullpath, key, attributes):
+		""" Create a new file or directory, failing the same way Win32 does if it can't. """
+		if key in self._paths:
+			return self._fail(ERROR_ALREADY_EXISTS)
+		if self._parent(key) is None:
+			return self._fail(ERROR_PATH_NOT_FOUND)
+		volume = self._volumes[ntpath.splitdrive(key)[0]]
+		return self._add(fullpath, key, _Node(attributes, next(self._indexes), volume))
+
+	## Backend implementation
+	def GetLastError(self):
+		return getattr(self._errors, 'code', ERROR_SUCCESS)
+
+	def GetFullPathName(self, filename):
+		filename = filename.replace(u'/', u'\\')
+		if filename.startswith(u'\\\\?\\'):
+			filename = filename[4:]
+		if not ntpath.isabs(filename) or not ntpath.splitdrive(filename)[0]:
+			filename = ntpath.join(self.cwd, filename)
+		filename = ntpath.normpath(filename)
+		drive, rest = ntpath.splitdrive(filename)
+		return drive + (rest.rstrip(u'\\') or u'\\')
+
+	@_simulated
+	def CreateFile(self, filename, access, sharemode, creation, flags, directory = None):
+		if directory is not None:
+			parent = self._handles.get(directory)
+			if parent is None:
+				return self._fail(ERROR_INVALID_HANDLE)
+			if not parent.node.is_directory:
+				return self._fail(ERROR_DIRECTORY)
+			filename = ntpath.join(parent.path, filename)
+		fullpath, key, node = self._lookup(filename)
+		if node is None:
+			if creation in (OPEN_EXISTING, TRUNCATE_EXISTING):
+				return self._fail(ERROR_FILE_NOT_FOUND if self._parent(key) is not None else ERROR_PATH_NOT_FOUND)
+			node = self._new_node(fullpath, key, FILE_ATTRIBUTE_ARCHIVE)
+			if node is None:
+				return None
+		else:
+			if creation == CREATE_NEW:
+				return self._fail(ERROR_FILE_EXISTS)
+			if node.is_directory and not flags & FILE_FLAG_BACKUP_SEMANTICS:
+				return self._fail(ERROR_ACCESS_DENIED)
+			if access & (GENERIC_WRITE | GENERIC_ALL) and node.attributes & FILE_ATTRIBUTE_READONLY:
+				return self._fail(ERROR_ACCESS_DENIED)
+			if creation in (CREATE_ALWAYS, TRUNCATE_EXISTING) and not node.is_directory:
+				node.data = b''
+		handle = next(self._handle_ids)
+		self._handles[handle] = _OpenFile(node, fullpath, access)
+		return handle
+
+	@_simulated
+	def CloseHandle(self, handle):
+		if self._handles.pop(handle, None) is None:
+			return self._fail(ERROR_INVALID_HANDLE, False)
+		if self._watches.pop(handle, None) is not None:
+			self._changed.notify_all()
+		return True
+
+	@_simulated
+	def DeviceIoControl(self, handle, code, inbuf = None, outbuf = None):
+		opened = self._handles.get(handle)
+		if opened is None:
+			return self._fail(ERROR_INVALID_HANDLE)
+		if code == FSCTL_GET_REPARSE_POINT:
+			return self._get_reparse_point(opened.node, outbuf)
+		if code in (FSCTL_SET_REPARSE_POINT, FSCTL_DELETE_REPARSE_POINT):
+			if not opened.access & REPARSE_WRITE_ACCESS:
+				return self._fail(ERROR_ACCESS_DENIED)
+			if code == FSCTL_SET_REPARSE_POINT:
+				result = self._set_reparse_point(opened.node, inbuf)
+			else:
+				result = self._delete_reparse_point(opened.node, inbuf)
+			if result is not None:
+				self._notify(opened.path, FILE_ACTION_MODIFIED, FILE_NOTIFY_CHANGE_ATTRIBUTES)
+			return result
+		return self._fail(ERROR_INVALID_FUNCTION)
+
+	def _get_reparse_point(self, node, outbuf):
+		if node.reparse is None:
+			return self._fail(ERROR_NOT_A_REPARSE_POINT)
+		if outbuf is None or len(outbuf) < REPARSE_POINT_HEADER_SIZE:
+			return self._fail(ERROR_INSUFFICIENT_BUFFER)
+		length = min(len(outbuf), len(node.reparse))
+		memoryview(outbuf)[:length] = node.reparse[:length]
+		if length < len(node.reparse):
+			return self._fail(ERROR_MORE_DATA)
+		return length
+
+	def _set_reparse_point(self, node, inbuf):
+		if inbuf is None or not REPARSE_POINT_HEADER_SIZE <= len(inbuf) <= MAX_REPARSE_BUFFER:
+			return self._fail(ERROR_INVALID_REPARSE_DATA)
+		tag, datalen = ReparseHeader(inbuf)[:2]
+		headerlen = REPARSE_POINT_HEADER_SIZE if IsReparseTagMicrosoft(tag) else REPARSE_GUID_DATA_BUFFER_HEADER_SIZE
+		if len(inbuf) != headerlen + datalen:
+			return self._fail(ERROR_INVALID_REPARSE_DATA)
+		if tag in (IO_REPARSE_TAG_RESERVED_ZERO, IO_REPARSE_TAG_RESERVED_ONE):
+			return self._fail(ERROR_REPARSE_TAG_INVALID)
+		if node.reparse is not None:
+			if ReparseHeader(node.reparse)[0] != tag:
+				return self._fail(ERROR_REPARSE_TAG_MISMATCH)
+			if not IsReparseTagMicrosoft(tag) and ReparseGuid(node.reparse) != ReparseGuid(inbuf):
+				return self._fail(ERROR_REPARSE_ATTRIBUTE_CONFLICT)
+		if tag == IO_REPARSE_TAG_MOUNT_POINT and not node.is_directory:
+			return self._fail(ERROR_DIRECTORY)
+		if node.is_directory and node.children:
+			return self._fail(ERROR_DIR_NOT_EMPTY)
+		node.reparse = bytes(inbuf)
+		node.attributes |= FILE_ATTRIBUTE_REPARSE_POINT
+		return 0
+
+	def _delete_reparse_point(self, node, inbuf):
+		if node.reparse is None:
+			return self._fail(ERROR_NOT_A_REPARSE_POINT)
+		if inbuf is None or len(inbuf) < REPARSE_POINT_HEADER_SIZE:
+			return self._fail(ERROR_INVALID_REPARSE_DATA)
+		tag, datalen = ReparseHeader(inbuf)[:2]
+		if datalen != 0:
+			return self._fail(ERROR_INVALID_REPARSE_DATA)
+		if ReparseHeader(node.reparse)[0] != tag:
+			return self._fail(ERROR_REPARSE_TAG_MISMATCH)
+		if not IsReparseTagMicrosoft(tag):
+			if len(inbuf) < REPARSE_GUID_DATA_BUFFER_HEADER_SIZE:
+				return self._fail(ERROR_INVALID_REPARSE_DATA)
+			if ReparseGuid(node.reparse) != ReparseGuid(inbuf):
+				return self._fail(ERROR_REPARSE_ATTRIBUTE_CONFLICT)
+		node.reparse = None
+		node.attributes &= ~FILE_ATTRIBUTE_REPARSE_POINT
+		return 0
+
+	@_simulated
+	def GetFileInformationByHandle(self, handle):
+		opened = self._handles.get(handle)
+		if opened is None:
+			return self._fail(ERROR_INVALID_HANDLE)
+		node = opened.node
+		info = BY_HANDLE_FILE_INFORMATION()
+		info.dwFileAttributes = node.attributes
+		info.nFileSizeHigh, info.nFileSizeLow = len(node.data) >> 32, len(node.data) & 0xFFFFFFFF
+		info.nNumberOfLinks = node.links
+		info.nFileIndexHigh, info.nFileIndexLow = node.index >> 32, node.index & 0xFFFFFFFF
+		info.dwVolumeSerialNumber = node.volume
+		return info
+
+	@_simulated
+	def GetFileAttributes(self, filename):
+		node = self._lookup(filename)[2]
+		if node is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, INVALID_FILE_ATTRIBUTES)
+		return node.attributes
+
+	@_simulated
+	def SetFileAttributes(self, filename, attributes):
+		node = self._lookup(filename)[2]
+		if node is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, False)
+		node.attributes = (node.attributes & ~_SETTABLE_ATTRIBUTES) | (attributes & _SETTABLE_ATTRIBUTES)
+		self._notify(self.GetFullPathName(filename), FILE_ACTION_MODIFIED, FILE_NOTIFY_CHANGE_ATTRIBUTES)
+		return True
+
+	@_simulated
+	def CreateDirectory(self, pathname):
+		fullpath, key, node = self._lookup(pathname)
+		return self._new_node(fullpath, key, FILE_ATTRIBUTE_DIRECTORY) is not None
+
+	@_simulated
+	def RemoveDirectory(self, pathname):
+		key, node = self._lookup(pathname)[1:]
+		if node is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, False)
+		if not node.is_directory:
+			return self._fail(ERROR_DIRECTORY, False)
+		if node.children:
+			return self._fail(ERROR_DIR_NOT_EMPTY, False)
+		if node.attributes & FILE_ATTRIBUTE_READONLY or self._parent(key) is None:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		self._remove(key)
+		return True
+
+	@_simulated
+	def DeleteFile(self, filename):
+		key, node = self._lookup(filename)[1:]
+		if node is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, False)
+		if node.is_directory or node.attributes & FILE_ATTRIBUTE_READONLY:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		self._remove(key)
+		return True
+
+	@_simulated
+	def CreateHardLink(self, filename, existingname):
+		existing = self._lookup(existingname)
+		fullpath, key, node = self._lookup(filename)
+		if existing[2] is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, False)
+		if existing[2].is_directory:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		if self._volumes.get(ntpath.splitdrive(key)[0]) != existing[2].volume:
+			return self._fail(ERROR_NOT_SAME_DEVICE, False)
+		if node is not None:
+			return self._fail(ERROR_ALREADY_EXISTS, False)
+		if self._parent(key) is None:
+			return self._fail(ERROR_PATH_NOT_FOUND, False)
+		if existing[2].links >= MAX_HARD_LINKS:
+			return self._fail(ERROR_TOO_MANY_LINKS, False)
+		existing[2].links += 1
+		self._add(fullpath, key, existing[2])
+		return True
+
+	@_simulated
+	def CopyFile(self, existingname, newname):
+		existing = self._lookup(existingname)[2]
+		fullpath, key, node = self._lookup(newname)
+		if existing is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, False)
+		if existing.is_directory:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		if node is not None:
+			return self._fail(ERROR_FILE_EXISTS, False)
+		node = self._new_node(fullpath, key, existing.attributes & ~FILE_ATTRIBUTE_REPARSE_POINT)
+		if node is None:
+			return False
+		node.data = existing.data
+		return True
+
+	@_simulated
+	def MoveFile(self, existingname, newname):
+		oldkey, node = self._lookup(existingname)[1:]
+		fullpath, key, existing = self._lookup(newname)
+		if node is None:
+			return self._fail(ERROR_FILE_NOT_FOUND, False)
+		if self._parent(key) is None:
+			return self._fail(ERROR_PATH_NOT_FOUND, False)
+		if self._volumes.get(ntpath.splitdrive(key)[0]) != node.volume:
+			return self._fail(ERROR_NOT_SAME_DEVICE, False)
+		if node.is_directory and key.startswith(oldkey + u'\\'):
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		if existing is not None and key != oldkey:
+			if node.is_directory or existing.is_directory or existing.attributes & FILE_ATTRIBUTE_READONLY:
+				return self._fail(ERROR_ACCESS_DENIED, False)
+			self._remove(key)
+		self._remove(oldkey)
+		node.links += 1
+		self._add(fullpath, key, node)
+		if node.is_directory:
+			# Everything under it is kept by full path, too.
+			prefix = oldkey + u'\\'
+			for child in [child for child in self._paths if child.startswith(prefix)]:
+				self._paths[key + child[len(oldkey):]] = self._paths.pop(child)
+		return True
+
+	@_simulated
+	def CreateSymbolicLink(self, linkname, target, flags):
+		if not self.symlink_privilege and not flags & SYMBOLIC_LINK_FLAG_ALLOW_UNPRIVILEGED_CREATE:
+			return self._fail(ERROR_PRIVILEGE_NOT_HELD, False)
+		fullpath, key, node = self._lookup(linkname)
+		isdir = flags & SYMBOLIC_LINK_FLAG_DIRECTORY
+		node = self._new_node(fullpath, key, FILE_ATTRIBUTE_DIRECTORY if isdir else FILE_ATTRIBUTE_ARCHIVE)
+		if node is None:
+			return False
+		target = target.replace(u'/', u'\\')
+		if ntpath.isabs(target) and ntpath.splitdrive(target)[0]:
+			reparse = EncodeSymbolicLink(u'\\??\\' + target, target)
+		else:
+			reparse = EncodeSymbolicLink(target, target, SYMBOLIC_LINK_FLAG_RELATIVE)
+		node.reparse = bytes(reparse)
+		node.attributes |= FILE_ATTRIBUTE_REPARSE_POINT
+		return True
+
+	@_simulated
+	def GetVolumePathName(self, filename):
+		drive = ntpath.splitdrive(self.GetFullPathName(filename))[0].upper()
+		if drive not in self._volumes:
+			return self._fail(ERROR_PATH_NOT_FOUND)
+		return drive + u'\\'
+
+	@_simulated
+	def GetVolumeInformation(self, rootpath):
+		drive = ntpath.splitdrive(self.GetFullPathName(rootpath))[0].upper()
+		if drive not in self._volumes:
+			return self._fail(ERROR_PATH_NOT_FOUND)
+		return self.filesystem, self.filesystem_flags, self._volumes[drive]
+
+	@_simulated
+	def GetWindowsVersion(self):
+		return self.version
+
+	@_simulated
+	def ObtainPrivilege(self, name):
+		if self.held_privileges is not None and name not in self.held_privileges:
+			return self._fail(ERROR_NOT_ALL_ASSIGNED, False)
+		self.privileges.add(name)
+		return True
+
+	@_simulated
+	def ReleasePrivilege(self, name):
+		self.privileges.discard(name)
+		return True
+
+	@_simulated
+	def FindFiles(self, pathname):
+		node = self._lookup(pathname)[2]
+		if node is None:
+			return self._fail(ERROR_PATH_NOT_FOUND)
+		if not node.is_directory or node.reparse is not None:
+			return self._fail(ERROR_DIRECTORY)
+		key = self.GetFullPathName(pathname).upper()
+		results = []
+		for upper, name in node.children.items():
+			child = self._paths[ntpath.join(key, upper)]
+			results.append((name, child.attributes, ReparseHeader(child.reparse)[0] if child.reparse is not None else 0))
+		return results
+
+	@_simulated
+	def ReadDirectoryChanges(self, handle, subtree, filter = FILE_NOTIFY_CHANGE_LINKS, armed = None):
+		opened = self._handles.get(handle)
+		if opened is None:
+			return self._fail(ERROR_INVALID_HANDLE)
+		if not opened.node.is_directory:
+			return self._fail(ERROR_INVALID_PARAMETER)
+		watch = self._watches.get(handle)
+		if watch is None:
+			# Like the real thing, changes only get recorded from the first call on.
+			watch = self._watches[handle] = _Watch(opened.path.upper())
+		watch.subtree, watch.filter = subtree, filter
+		if armed is not None:
+			armed()
+		watch.waiting += 1
+		try:
+			while not watch.changes and not watch.cancelled and self._watches.get(handle) is watch:
+				self._changed.wait()
+		finally:
+			watch.waiting -= 1
+		if watch.cancelled or self._watches.get(handle) is not watch:
+			watch.cancelled = False
+			return self._fail(ERROR_OPERATION_ABORTED)
+		changes, watch.changes = watch.changes, []
+		return changes
+
+	@_simulated
+	def CancelIo(self, handle):
+		if handle not in self._handles:
+			return self._fail(ERROR_INVALID_HANDLE, False)
+		watch = self._watches.get(handle)
+		if watch is None or not watch.waiting:
+			return self._fail(ERROR_NOT_FOUND, False)
+		watch.cancelled = True
+		self._changed.notify_all()
+		return True
+
+	@_simulated
+	def open(self, filename, mode = 'rb'):
+		fullpath, key, node = self._lookup(filename)
+		if node is not None and node.is_directory:
+			raise IOError(errno.EISDIR, 'Is a directory', filename)
+		if 'r' in mode:
+			if node is None:
+				raise IOError(errno.ENOENT, 'No such file or directory', filename)
+		elif node is None:
+			node = self._new_node(fullpath, key, FILE_ATTRIBUTE_ARCHIVE)
+			if node is None:
+				raise IOError(errno.ENOENT, 'No such file or directory', filename)
+		elif 'x' in mode:
+			raise IOError(errno.EEXIST, 'File exists', filename)
+		writable = 'r' not in mode or '+' in mode
+		if writable and node.attributes & FILE_ATTRIBUTE_READONLY:
+			raise IOError(errno.EACCES, 'Permission denied', filename)
+		data = b'' if 'w' in mode else node.data
+		f = _SimulatedFile(node, data, writable)
+		if 'a' in mode:
+			f.seek(0, io.SEEK_END)
+		return f
@@ -0,0 +1,140 @@
+# encoding: utf-8
+"""
+_usn.py
+Streaming parser for USN change journal records (USN_RECORD_V2 and USN_RECORD_V3), either as stored in the
+$Extend\$UsnJrnl:$J stream of a volume or as returned by FSCTL_READ_USN_JOURNAL.
+
+Records are decoded one at a time as their bytes come in, so the memory used doesn't depend on the size of the journal,
+and a UsnReader keeps track of the USN to resume from next time.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import struct
+from collections import namedtuple
+from ._winioctl import *
+
+## Constants
+# The journal is written a page at a time. Records never straddle a page; the rest of a page that can't fit the next
+# record is zero-filled.
+USN_PAGE_SIZE = 0x1000
+USN_READ_CHUNK = 0x10000
+
+## Structures
+# RecordLength, MajorVersion, MinorVersion
+_USN_RECORD_HEADER = struct.Struct('<LHH')
+# (header), FileReferenceNumber, ParentFileReferenceNumber, Usn, TimeStamp, Reason, SourceInfo, SecurityId,
+# FileAttributes, FileNameLength, FileNameOffset
+_USN_RECORD_V2 = struct.Struct('<LHHQQqqLLLLHH')
+# Same as V2, but with 128-bit file IDs, stored as (low, high) pairs here.
+_USN_RECORD_V3 = struct.Struct('<LHHQQQQqqLLLLHH')
+_ULONG = struct.Struct('<L')
+
+class InvalidUsnRecordException(Exception):
+	""" Raised when a journal stream holds something that can't be a USN record. """
+
+class UsnRecord(namedtuple('UsnRecord', 'usn timestamp reason file_reference parent_reference file_attributes name '
+                                        'source_info security_id version')):
+	"""
+	A decoded USN_RECORD_V2 or V3. timestamp is a raw FILETIME, reason is a combination of the USN_REASON_* flags, and
+	the references are file references on NTFS (and 128-bit file IDs on ReFS).
+	"""
+	__slots__ = ()
+
+def DecodeUsnRecord(buf, offset = 0):
+	"""
+	Decode the USN record at offset in buf. Returns None for versions that aren't understood (such as the V4 range
+	records), which can be skipped using their RecordLength.
+	"""
+	view = memoryview(buf)
+	length, major, minor = _USN_RECORD_HEADER.unpack_from(view, offset)
+	if major == 2 and length >= _USN_RECORD_V2.size:
+		fields = _USN_RECORD_V2.unpack_from(view, offset)
+		reference, parent = fields[3], fields[4]
+		fields = fields[5:]
+	elif major == 3 and length >= _USN_RECORD_V3.size:
+		fields = _USN_RECORD_V3.unpack_from(view, offset)
+		reference, parent = fields[3] | (fields[4] << 64), fields[5] | (fields[6] << 64)
+		fields = fields[7:]
+	else:
+		return None
+	usn, timestamp, reason, source, security, attributes, namelen, nameoff = fields
+	if nameoff + namelen > length:
+		raise InvalidUsnRecordException('File name runs past the end of the USN record at %d.' % usn)
+	name = view[offset + nameoff:offset + nameoff + namelen].tobytes().decode('utf-16-le')
+	return UsnRecord(usn, timestamp, reason, reference, parent, attributes, name, source, security, major)
+
+class UsnReader(object):
+	"""
+	Iterates over the USN records in a journal stream, one at a time. chunks is an iterable of (USN, data) pairs giving
+	the stream's contents in order; a USN that doesn't follow on from the end of the previous chunk is treated as a gap
+	(like the sparse, already-purged start of $J). Only records with any of the reasons in reasons are yielded (pass
+	None for every record), and records before start_usn are skipped.
+
+	next_usn is the cursor: after (or during) iteration it holds the USN just past the last record read. Save it, and
+	pass it back in as start_usn to pick up where this reader left off.
+	"""
+
+	def __init__(self, chunks, start_usn = 0, reasons = USN_REASON_LINK_CHANGES):
+		self.chunks = chunks
+		self.next_usn = start_usn
+		self.reasons = reasons
+
+	def __iter__(self):
+		reasons = self.reasons
+		pending = bytearray()
+		position = None
+		for start, data in self.chunks:
+			if position is None or start != position + len(pending):
+				pending = bytearray()
+				position = start
+			pending += data
+			offset = 0
+			while len(pending) - offset >= _USN_RECORD_HEADER.size:
+				length, = _ULONG.unpack_from(pending, offset)
+				if length == 0:
+					# Padding up to the next page. If it runs on into the next chunk, that chunk starts with more zeros
+					# and we'll come right back here.
+					offset = min(len(pending), USN_PAGE_SIZE - (position + offset) % USN_PAGE_SIZE + offset)
+					continue
+				if length < _USN_RECORD_HEADER.size or length & 7:
+					raise InvalidUsnRecordException('Bad USN record length %d at %d.' % (length, position + offset))
+				if len(pending) - offset < length:
+					break
+				record = DecodeUsnRecord(pending, offset)
+				offset += length
+				if record is None or record.usn < self.next_usn:
+					continue
+				self.next_usn = record.usn + length
+				if reasons is None or record.reason & reasons:
+					yield record
+			del pending[:offset]
+			position += offset
+
+def ReadUsnJournal(stream, start_usn = 0, reasons = USN_REASON_LINK_CHANGES, position = 0,
+                   chunk_size = USN_READ_CHUNK):
+	"""
+	Returns a UsnReader over a file-like object holding journal records, such as a copy of $UsnJrnl:$J (in which case
+	the default position of 0 is right: the offset of a record in $J is its USN). position is the USN of the stream's
+	current offset. Seekable streams skip straight ahead to start_usn.
+
+	For the output of FSCTL_READ_USN_JOURNAL, skip the leading 8 byte USN first and pass in the start USN of the read
+	as position.
+	"""
+	def chunks(position):
+		if start_usn > position:
+			try:
+				stream.seek(start_usn - position, 1)
+				position = start_usn
+			except (AttributeError, IOError, OSError, ValueError):
+				pass
+		while True:
+			data = stream.read(chunk_size)
+			if not data:
+				return
+			yield position, data
+			position += len(data)
+	return UsnReader(chunks(position), start_usn, reasons)
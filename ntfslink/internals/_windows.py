@@ -13,9 +13,130 @@ _sys.getfilesystemencoding()
 
 from ctypes import *
 from ctypes.wintypes import *
-from ctypes64 import POINTER
+from .ctypes64 import POINTER
 
+# ctypes.wintypes builds its 32-bit types out of c_long, which is 64 bits wide on LP64 platforms. Pin them back down so
+# that structure layouts (and sizes like REPARSE_POINT_HEADER_SIZE) match Windows wherever this gets imported.
+if sizeof(c_long) != 4:
+	BOOL = LONG = c_int32
+	DWORD = ULONG = c_uint32
 
+	class FILETIME(Structure):
+		_fields_ = [('dwLowDateTime', DWORD), ('dwHighDateTime', DWORD)]
+
+# ctypes only provides these on Windows. The fallbacks let everything import elsewhere (to run against a simulated
+# backend, for instance), with the DLL functions themselves failing if they ever get called.
+try:
+	WinDLL
+except NameError:
+	WinDLL = None
+
+try:
+	WinError
+except NameError:
+	def WinError(code = None, descr = None):
+		""" Stand-in for ctypes.WinError on platforms without it. """
+		return OSError(code, descr or 'Windows error %s' % code)
+
+try:
+	WindowsError
+except NameError:
+	WindowsError = OSError
+
+class UnavailableFunction(object):
+	""" Placeholder for an export of a DLL that can't be loaded on this platform. """
+
+	def __init__(self, dllname, name):
+		self.dllname = dllname
+		self.__name__ = name
+
+	def __call__(self, *args):
+		raise OSError('%s!%s is not available on this platform.' % (self.dllname, self.__name__))
+
+class UnavailableDLL(object):
+	"""
+	Placeholder for a DLL that can't be loaded on this platform. Functions can still be looked up and declared (restype,
+	argtypes, etc), but raise OSError when called.
+	"""
+
+	def __init__(self, name):
+		self._name = name
+
+	def __getattr__(self, name):
+		if name.startswith('__'):
+			raise AttributeError(name)
+		func = UnavailableFunction(self._name, name)
+		setattr(self, name, func)
+		return func
+
+def LoadDLL(name):
+	""" Load a DLL with the stdcall calling convention, or return an UnavailableDLL in its place. """
+	if WinDLL is None:
+		return UnavailableDLL(name)
+	try:
+		return WinDLL(name)
+	except OSError:
+		return UnavailableDLL(name)
+
+class DLLFunction(object):
+	"""
+	Declares an export (and its prototype) on a DLLBinder subclass. Nothing is loaded or bound until it's first looked up
+	on the binder, which replaces it there with the real ctypes function, so every later lookup is a plain instance
+	attribute. Exports that are optional and missing from the DLL come out as None.
+	"""
+
+	def __init__(self, restype, argtypes, doc = None, export = None, optional = False):
+		self.restype = restype
+		self.argtypes = argtypes
+		self.doc = doc
+		self.export = export
+		self.optional = optional
+		self.name = None
+
+	def __set_name__(self, owner, name):
+		self.name = name
+
+	def __get__(self, binder, owner):
+		if binder is None:
+			return self
+		if self.name is None:
+			# No __set_name__ before Python 3.6.
+			self.name = next(name for cls in owner.__mro__ for name, value in vars(cls).items() if value is self)
+		try:
+			func = getattr(binder.dll, self.export or self.name)
+		except AttributeError:
+			if not self.optional:
+				raise
+			func = None
+		else:
+			func.restype = self.restype
+			func.argtypes = self.argtypes
+			if self.doc is not None:
+				func.__doc__ = self.doc
+		binder.__dict__[self.name] = func
+		return func
+
+class DLLBinder(object):
+	"""
+	A DLL whose exports are declared as DLLFunction class attributes, and bound one at a time as they're first used. The
+	DLL itself is only loaded (with LoadDLL) when the first of them is. Anything that wasn't declared is looked up on the
+	DLL as is.
+	"""
+
+	def __init__(self, name):
+		self.name = name
+		self._dll = None
+
+	@property
+	def dll(self):
+		if self._dll is None:
+			self._dll = LoadDLL(self.name)
+		return self._dll
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		return getattr(self.dll, name)
 
 ## Constants
 # Windows definitions
@@ -28,6 +149,36 @@ TRUE = 1
 NULL = c_void_p(0)
 INVALID_HANDLE_VALUE = -1
 
+# Error codes
+ERROR_SUCCESS = 0
+ERROR_INVALID_FUNCTION = 1
+ERROR_FILE_NOT_FOUND = 2
+ERROR_PATH_NOT_FOUND = 3
+ERROR_ACCESS_DENIED = 5
+ERROR_INVALID_HANDLE = 6
+ERROR_NOT_SAME_DEVICE = 17
+ERROR_NO_MORE_FILES = 18
+ERROR_FILE_EXISTS = 80
+ERROR_INVALID_PARAMETER = 87
+ERROR_INSUFFICIENT_BUFFER = 122
+ERROR_DIR_NOT_EMPTY = 145
+ERROR_ALREADY_EXISTS = 183
+ERROR_FILENAME_EXCED_RANGE = 206
+ERROR_MORE_DATA = 234
+ERROR_OPERATION_ABORTED = 995
+ERROR_IO_PENDING = 997
+ERROR_NOTIFY_ENUM_DIR = 1022
+ERROR_DIRECTORY = 267
+ERROR_TOO_MANY_LINKS = 1142
+ERROR_NOT_FOUND = 1168
+ERROR_NOT_ALL_ASSIGNED = 1300
+ERROR_PRIVILEGE_NOT_HELD = 1314
+ERROR_NOT_A_REPARSE_POINT = 4390
+ERROR_REPARSE_ATTRIBUTE_CONFLICT = 4391
+ERROR_INVALID_REPARSE_DATA = 4392
+ERROR_REPARSE_TAG_INVALID = 4393
+ERROR_REPARSE_TAG_MISMATCH = 4394
+
 # Access
 FILE_ANY_ACCESS = 0
 FILE_SPECIAL_ACCESS = FILE_ANY_ACCESS
@@ -54,10 +205,10 @@ FILE_FLAG_REPARSE_BACKUP = FILE_FLAG_OPEN_REPARSE_POINT | FILE_FLAG_BACKUP_SEMAN
 # consistency.
 
 # Generic access
-GENERIC_READ = 0x80000000L
-GENERIC_WRITE = 0x40000000L
-GENERIC_EXECUTE = 0x20000000L
-GENERIC_ALL = 0x10000000L
+GENERIC_READ = 0x80000000
+GENERIC_WRITE = 0x40000000
+GENERIC_EXECUTE = 0x20000000
+GENERIC_ALL = 0x10000000
 
 # File shared access
 FILE_SHARE_READ = 0x00000001
@@ -130,3 +281,25 @@ class GUID(Structure):
 		("Data4", (BYTE * 8)),
 	]
 
+class OVERLAPPED(Structure):
+	"""
+	CTypes implementation of:
+
+		typedef struct _OVERLAPPED {
+			ULONG_PTR Internal;
+			ULONG_PTR InternalHigh;
+			DWORD     Offset;
+			DWORD     OffsetHigh;
+			HANDLE    hEvent;
+		} OVERLAPPED;
+
+	(Without the union around Offset/OffsetHigh, which nothing here uses.)
+	"""
+	_fields_ = [
+		("Internal", c_void_p),
+		("InternalHigh", c_void_p),
+		("Offset", DWORD),
+		("OffsetHigh", DWORD),
+		("hEvent", HANDLE),
+	]
+
@@ -9,7 +9,7 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-from _windows import *
+from ._windows import *
 
 ## Macros
 def CTL_CODE(DeviceType, Function, Method, Access): return (DeviceType << 16) | (Access << 14) | (Function << 2) | Method
@@ -109,20 +109,82 @@ SYMBOLIC_LINK_FLAG_DIRECTORY = 0x1
 # Reparse Tags
 def IsReparseTagMicrosoft(reparse_tag): return (reparse_tag & 0x80000000) == 0x80000000
 def IsReparseTagNameSurrogate(reparse_tag): return (reparse_tag & 0x20000000) == 0x20000000
+def IsReparseTagDirectory(reparse_tag): return (reparse_tag & 0x10000000) == 0x10000000
 
 IO_REPARSE_TAG_RESERVED_ZERO   = 0x00000000
 IO_REPARSE_TAG_RESERVED_ONE    = 0x00000001
 IO_REPARSE_TAG_RESERVED_RANGE  = IO_REPARSE_TAG_RESERVED_ONE
 
-IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003L
-IO_REPARSE_TAG_HSM = 0xC0000004L
-IO_REPARSE_TAG_HSM2 = 0x80000006L
-IO_REPARSE_TAG_SIS = 0x80000007L
-IO_REPARSE_TAG_WIM = 0x80000008L
-IO_REPARSE_TAG_CSV = 0x80000009L
-IO_REPARSE_TAG_DFS = 0x8000000AL
-IO_REPARSE_TAG_DFSR = 0x80000012L
-IO_REPARSE_TAG_SYMBOLIC_LINK = 0xA000000CL
+IO_REPARSE_TAG_MOUNT_POINT = 0xA0000003
+IO_REPARSE_TAG_HSM = 0xC0000004
+IO_REPARSE_TAG_HSM2 = 0x80000006
+IO_REPARSE_TAG_SIS = 0x80000007
+IO_REPARSE_TAG_WIM = 0x80000008
+IO_REPARSE_TAG_CSV = 0x80000009
+IO_REPARSE_TAG_DFS = 0x8000000A
+IO_REPARSE_TAG_DFSR = 0x80000012
+IO_REPARSE_TAG_SYMBOLIC_LINK = 0xA000000C
+IO_REPARSE_TAG_DRIVE_EXTENDER = 0x80000005
+IO_REPARSE_TAG_FILTER_MANAGER = 0x8000000B
+IO_REPARSE_TAG_DEDUP = 0x80000013
+IO_REPARSE_TAG_NFS = 0x80000014
+IO_REPARSE_TAG_FILE_PLACEHOLDER = 0x80000015
+IO_REPARSE_TAG_WOF = 0x80000017
+IO_REPARSE_TAG_WCI = 0x80000018
+IO_REPARSE_TAG_GLOBAL_REPARSE = 0xA0000019
+IO_REPARSE_TAG_CLOUD = 0x9000001A
+IO_REPARSE_TAG_APPEXECLINK = 0x8000001B
+IO_REPARSE_TAG_PROJFS = 0x9000001C
+IO_REPARSE_TAG_LX_SYMLINK = 0xA000001D
+IO_REPARSE_TAG_STORAGE_SYNC = 0x8000001E
+IO_REPARSE_TAG_WCI_TOMBSTONE = 0xA000001F
+IO_REPARSE_TAG_UNHANDLED = 0x80000020
+IO_REPARSE_TAG_ONEDRIVE = 0x80000021
+IO_REPARSE_TAG_PROJFS_TOMBSTONE = 0xA0000022
+IO_REPARSE_TAG_AF_UNIX = 0x80000023
+IO_REPARSE_TAG_LX_FIFO = 0x80000024
+IO_REPARSE_TAG_LX_CHR = 0x80000025
+IO_REPARSE_TAG_LX_BLK = 0x80000026
+IO_REPARSE_TAG_WCI_LINK = 0xA0000027
+
+# The cloud files tags use bits 12-15 as a provider-defined subtype. IO_REPARSE_TAG_CLOUD_1 through _F.
+IO_REPARSE_TAG_CLOUD_MASK = 0x0000F000
+IO_REPARSE_TAG_CLOUD_TAGS = [IO_REPARSE_TAG_CLOUD | (i << 12) for i in range(16)]
+
+# Windows Overlay Filter providers (IO_REPARSE_TAG_WOF)
+WOF_PROVIDER_WIM = 1
+WOF_PROVIDER_FILE = 2
+
+# USN change journal reason flags
+USN_REASON_DATA_OVERWRITE = 0x00000001
+USN_REASON_DATA_EXTEND = 0x00000002
+USN_REASON_DATA_TRUNCATION = 0x00000004
+USN_REASON_NAMED_DATA_OVERWRITE = 0x00000010
+USN_REASON_NAMED_DATA_EXTEND = 0x00000020
+USN_REASON_NAMED_DATA_TRUNCATION = 0x00000040
+USN_REASON_FILE_CREATE = 0x00000100
+USN_REASON_FILE_DELETE = 0x00000200
+USN_REASON_EA_CHANGE = 0x00000400
+USN_REASON_SECURITY_CHANGE = 0x00000800
+USN_REASON_RENAME_OLD_NAME = 0x00001000
+USN_REASON_RENAME_NEW_NAME = 0x00002000
+USN_REASON_INDEXABLE_CHANGE = 0x00004000
+USN_REASON_BASIC_INFO_CHANGE = 0x00008000
+USN_REASON_HARD_LINK_CHANGE = 0x00010000
+USN_REASON_COMPRESSION_CHANGE = 0x00020000
+USN_REASON_ENCRYPTION_CHANGE = 0x00040000
+USN_REASON_OBJECT_ID_CHANGE = 0x00080000
+USN_REASON_REPARSE_POINT_CHANGE = 0x00100000
+USN_REASON_STREAM_CHANGE = 0x00200000
+USN_REASON_TRANSACTED_CHANGE = 0x00400000
+USN_REASON_INTEGRITY_CHANGE = 0x00800000
+USN_REASON_CLOSE = 0x80000000
+
+# Everything that can create, remove, rename or retarget a link.
+USN_REASON_LINK_CHANGES = (
+	USN_REASON_FILE_CREATE | USN_REASON_FILE_DELETE | USN_REASON_RENAME_OLD_NAME | USN_REASON_RENAME_NEW_NAME |
+	USN_REASON_HARD_LINK_CHANGE | USN_REASON_REPARSE_POINT_CHANGE
+)
 
 FSCTL_FILESYSTEM_GET_STATISTICS = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 24, METHOD_BUFFERED, FILE_ANY_ACCESS) # FILESYSTEM_STATISTICS
 FSCTL_GET_NTFS_VOLUME_DATA = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 25, METHOD_BUFFERED, FILE_ANY_ACCESS)
@@ -139,6 +201,9 @@ FSCTL_SET_COMPRESSION = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 16, METHOD_BUFFERED, F
 FSCTL_SET_REPARSE_POINT = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 41, METHOD_BUFFERED, FILE_SPECIAL_ACCESS)
 FSCTL_GET_REPARSE_POINT = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 42, METHOD_BUFFERED, FILE_ANY_ACCESS)
 FSCTL_DELETE_REPARSE_POINT = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 43, METHOD_BUFFERED, FILE_SPECIAL_ACCESS)
+FSCTL_ENUM_USN_DATA = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 44, METHOD_NEITHER, FILE_ANY_ACCESS) # MFT_ENUM_DATA
+FSCTL_READ_USN_JOURNAL = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 46, METHOD_NEITHER, FILE_ANY_ACCESS) # READ_USN_JOURNAL_DATA
+FSCTL_QUERY_USN_JOURNAL = CTL_CODE(FILE_DEVICE_FILE_SYSTEM, 61, METHOD_BUFFERED, FILE_ANY_ACCESS) # USN_JOURNAL_DATA
 
 # Unfortunately, I can't set this to c_wchar * 1 because it will be too small
 # for our buffer when I call this structure's constructor. Instead, I have to
@@ -298,12 +363,16 @@ class NTFS_FILE_RECORD_OUTPUT_BUFFER(Structure):
 
 	@property
 	def bytes(self):
-		res = []
-		for b in self.FileRecordBuffer:
-			res.append(b)
-		return res
+		return bytearray(self.raw)
 
 	@property
 	def raw(self):
-		return ''.join(map(chr, self.bytes))
+		return string_at(addressof(self.FileRecordBuffer), self.FileRecordLength)
+
+	@property
+	def record(self):
+		""" Parse the returned record in place, without copying it out of this structure. """
+		from ._mft import FileRecord
+		offset = NTFS_FILE_RECORD_OUTPUT_BUFFER.FileRecordBuffer.offset
+		return FileRecord((UCHAR * self.FileRecordLength).from_buffer(self, offset))
 
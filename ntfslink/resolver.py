@@ -0,0 +1,190 @@
+# encoding: utf-8
+"""
+resolver.py
+Resolves paths through any number of junctions and symbolic links, remembering what it finds along the way.
+
+Every directory and link that gets looked at ends up in a trie, links along with their fully resolved targets. A later
+path that shares a prefix with one already resolved gets rewritten from the trie, and only the components nobody has
+looked at yet cost a call. The last component of a path is only kept if it's a link or has something under it in the
+trie, so the trie grows with the directories and links looked at rather than with every file resolved. Nothing in it
+expires on its own, so anything that changes links has to tell the resolver about it. (See Resolver.invalidate)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import threading
+from .common import *
+
+__all__ = ['LinkLoopException', 'Resolver', 'resolve', 'resolve_many', 'invalidate']
+
+# Links followed while resolving a single path before giving up. (Same as the limit on reparse points in a path.)
+MAX_LINK_HOPS = 63
+
+class LinkLoopException(Exception):
+	""" Raised when a path runs into a link that leads back to itself, or through more than max_hops links. """
+
+class _Node(object):
+	""" A path component in the trie. target is None until it's looked at, then False for non-links. """
+	__slots__ = ('children', 'target')
+
+	def __init__(self):
+		self.children = {}
+		self.target = None
+
+class Resolver(object):
+	"""
+	A realpath that remembers. Paths that don't exist are resolved as far as they go, with the rest of their components
+	tacked on as they are, the same as os.path.realpath.
+
+		resolver = Resolver()
+		resolver.resolve('C:\\\\Build\\\\deps\\\\zlib\\\\zlib.h')
+	"""
+
+	def __init__(self, max_hops = MAX_LINK_HOPS):
+		self.backend = GetBackend()
+		self.max_hops = max_hops
+		self._root = _Node()
+		self._lock = threading.RLock()
+
+	def _split(self, fpath):
+		""" Split an absolute path into its root and the rest of its components. """
+		path = self.backend.path
+		drive, rest = path.splitdrive(fpath)
+		return drive + path.sep, [part for part in rest.split(path.sep) if part]
+
+	def _read_target(self, fpath, attributes):
+		""" The target of the link at fpath, or None if it's some other kind of reparse point. """
+		if not attributes & FILE_ATTRIBUTE_REPARSE_POINT:
+			return None
+		reparse = decode_reparse_point(fpath, attributes & FILE_ATTRIBUTE_DIRECTORY)
+		if reparse is None or reparse.tag not in (IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK):
+			return None
+		return ReparseTarget(reparse)
+
+	def _resolve(self, fpath, state, leaf = True):
+		"""
+		Resolve the absolute, normalized path fpath. (So no . or .. left in it, which Windows resolves lexically anyway)
+		state is [hops left, set of the link nodes being resolved], shared with the links it runs into. leaf is False
+		when the caller goes on past fpath, so that its last component is worth keeping in the trie.
+		"""
+		path = self.backend.path
+		root, parts = self._split(fpath)
+		node = self._root.children.setdefault(path.normcase(root), _Node())
+		current = root
+		for index, part in enumerate(parts):
+			child = node.children.get(path.normcase(part))
+			if child is None:
+				child = node.children[path.normcase(part)] = _Node()
+			candidate = path.join(current, part)
+			if child.target is None:
+				attributes = self.backend.GetFileAttributes(candidate)
+				if attributes == INVALID_FILE_ATTRIBUTES:
+					# Nothing there: nothing to remember, and nothing left to resolve.
+					del node.children[path.normcase(part)]
+					return path.join(candidate, *parts[index + 1:])
+				target = self._read_target(candidate, attributes)
+				if target is None:
+					child.target = False
+				else:
+					if not path.isabs(target):
+						target = path.join(current, target)
+					child.target = self._follow(child, candidate, path.normpath(target), state,
+						leaf and index == len(parts) - 1)
+
+			if child.target is False:
+				if leaf and index == len(parts) - 1 and not child.children:
+					# A file, or a directory nothing has been resolved under: it'd only cost another call next time.
+					del node.children[path.normcase(part)]
+				current = candidate
+				node = child
+				continue
+
+			state[0] -= 1
+			if state[0] < 0:
+				raise LinkLoopException('Too many links in %s.' % fpath)
+			current = child.target
+			if leaf and index == len(parts) - 1:
+				break
+			root, resolved = self._split(current)
+			node = self._root.children.setdefault(path.normcase(root), _Node())
+			for name in resolved:
+				node = node.children.setdefault(path.normcase(name), _Node())
+		return current
+
+	def _follow(self, node, fpath, target, state, leaf):
+		""" Resolve the target of the link at node. """
+		visiting = state[1]
+		if node in visiting:
+			raise LinkLoopException('%s leads back to itself.' % fpath)
+		visiting.add(node)
+		try:
+			return self._resolve(target, state, leaf)
+		finally:
+			visiting.discard(node)
+
+	def resolve(self, fpath):
+		""" The real path of fpath, with every link along it followed. Raises LinkLoopException on loops. """
+		fullpath = self.backend.GetFullPathName(str_cleanup(fpath))
+		with self._lock:
+			return self._resolve(fullpath, [self.max_hops, set()])
+
+	def resolve_many(self, fpaths):
+		""" Resolve every path in fpaths. Returns a list of their real paths, in order. """
+		return [self.resolve(fpath) for fpath in fpaths]
+
+	def invalidate(self, fpath = None):
+		"""
+		Forget what's known about fpath and everything under it, along with the targets of every link, since any of
+		them may have gone through fpath. (What's known about everything else stays.) Without fpath, forget it all.
+		"""
+		with self._lock:
+			if fpath is None:
+				self._root = _Node()
+				return
+			path = self.backend.path
+			root, parts = self._split(self.backend.GetFullPathName(str_cleanup(fpath)))
+			parent, key = self._root, path.normcase(root)
+			for part in parts:
+				parent = parent.children.get(key)
+				if parent is None:
+					break
+				key = path.normcase(part)
+			else:
+				parent.children.pop(key, None)
+
+			stack = [self._root]
+			while stack:
+				node = stack.pop()
+				if node.target:
+					node.target = None
+				stack.extend(node.children.values())
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def _default_resolver():
+	""" The shared Resolver, replaced whenever the backend is. """
+	global _resolver
+	with _resolver_lock:
+		if _resolver is None or _resolver.backend is not GetBackend():
+			_resolver = Resolver()
+		return _resolver
+
+def resolve(fpath):
+	"""
+	The real path of fpath, through the shared Resolver.
+
+	See: os.path.realpath
+	"""
+	return _default_resolver().resolve(fpath)
+
+def resolve_many(fpaths):
+	""" Resolve every path in fpaths through the shared Resolver. Returns a list of their real paths, in order. """
+	return _default_resolver().resolve_many(fpaths)
+
+def invalidate(fpath = None):
+	""" Tell the shared Resolver that fpath (or anything, without it) has changed. See: Resolver.invalidate """
+	_default_resolver().invalidate(fpath)
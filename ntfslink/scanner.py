@@ -0,0 +1,121 @@
+# encoding: utf-8
+"""
+scanner.py
+Walks a directory tree looking for links, using nothing but the directory listings for everything that isn't one.
+
+The listing already carries the attributes of every entry, along with the reparse tag of reparse points, so telling
+a junction from a symbolic link from a plain file takes no calls of its own. Targets are only read when asked for.
+
+	for entry in scan('C:\\\\Projects'):
+		if entry.is_junction:
+			print(entry.path, '->', entry.target)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+from .common import *
+
+__all__ = ['ScanEntry', 'scan']
+
+class ScanEntry(object):
+	"""
+	One entry found by scan. path, name, attributes and depth (0 for the entries of the root) come straight from the
+	listing. The reparse point itself is read on first access of reparse or target, and kept from then on.
+	"""
+	__slots__ = ('path', 'name', 'attributes', 'depth', '_tag', '_reparse')
+
+	def __init__(self, path, name, attributes, tag, depth):
+		self.path = path
+		self.name = name
+		self.attributes = attributes
+		self.depth = depth
+		self._tag = tag
+		self._reparse = None
+
+	def __repr__(self):
+		return '<ScanEntry %r>' % self.path
+
+	@property
+	def is_dir(self):
+		return bool(self.attributes & FILE_ATTRIBUTE_DIRECTORY)
+
+	@property
+	def is_reparse_point(self):
+		return bool(self.attributes & FILE_ATTRIBUTE_REPARSE_POINT)
+
+	@property
+	def reparse_tag(self):
+		""" The reparse tag, or 0 for anything that isn't a reparse point. """
+		if not self._tag and self.is_reparse_point:
+			# Only when the listing didn't include it.
+			reparse = self.reparse
+			if reparse is not None:
+				self._tag = reparse.tag
+		return self._tag
+
+	@property
+	def is_junction(self):
+		return self.reparse_tag == IO_REPARSE_TAG_MOUNT_POINT
+
+	@property
+	def is_symlink(self):
+		return self.reparse_tag == IO_REPARSE_TAG_SYMBOLIC_LINK
+
+	@property
+	def reparse(self):
+		"""
+		The reparse point, decoded with DecodeReparsePoint, or None if this isn't one or it couldn't be read.
+
+		See: read_reparse_point for details
+		"""
+		if self._reparse is None and self.is_reparse_point:
+			self._reparse = decode_reparse_point(self.path, self.is_dir)
+		return self._reparse
+
+	@property
+	def target(self):
+		""" Where the link points, for junctions, symbolic links, WSL symbolic links and app execution aliases. """
+		return ReparseTarget(self.reparse)
+
+def scan(root, follow_junctions = False, follow_symlinks = False, max_depth = None, prune_tags = (), onerror = None):
+	"""
+	Walk the tree under root, yielding a ScanEntry for everything in it, parents before their children. Every
+	directory is listed with one FindFiles call, and nothing else is asked of the file system unless an entry's
+	reparse point or target gets looked at.
+
+	Junctions and directory symbolic links are yielded but not descended into, unless follow_junctions or
+	follow_symlinks are set. (Following them can loop forever on a link that points to one of its parents, so pair them
+	with max_depth.) Directories with any other kind of reparse point are walked like the rest. Entries deeper than
+	max_depth aren't listed, and entries whose reparse tag is in prune_tags are left out entirely, children and all.
+	When a directory can't be listed, onerror is called with its path and the error code, if given.
+
+	See: os.walk
+	"""
+	backend = GetBackend()
+	prune_tags = frozenset(prune_tags)
+	stack = [(root, 0)]
+	while stack:
+		dirpath, depth = stack.pop()
+		found = backend.FindFiles(dirpath)
+		if found is None:
+			if onerror is not None:
+				onerror(dirpath, backend.GetLastError())
+			continue
+		children = []
+		for name, attributes, tag in found:
+			entry = ScanEntry(backend.path.join(dirpath, name), name, attributes, tag, depth)
+			if entry.is_reparse_point and prune_tags and entry.reparse_tag in prune_tags:
+				continue
+			yield entry
+			if not entry.is_dir or (max_depth is not None and depth >= max_depth):
+				continue
+			# Other reparse points (cloud files, dedup, etc) are directories like any other.
+			if entry.is_reparse_point:
+				if entry.is_junction and not follow_junctions or entry.is_symlink and not follow_symlinks:
+					continue
+			children.append((entry.path, depth + 1))
+		# Popped off the end, so reversing keeps the listing's order.
+		stack.extend(reversed(children))
@@ -9,8 +9,9 @@ and/or modify it under the terms of the Do What The Fuck You Want
 To Public License, Version 2, as published by Sam Hocevar. See
 http://sam.zoy.org/wtfpl/COPYING for more details.
 """
-import sys
-from common import *
+import os, threading
+from collections import namedtuple
+from .common import *
 
 # The Windows XP Driver can be found at: http://homepage1.nifty.com/emk/
 #	Download (32-bit): http://homepage1.nifty.com/emk/symlink-1.06-x86.cab
@@ -18,65 +19,146 @@ from common import *
 #	English Info: http://schinagl.priv.at/nt/hardlinkshellext/hardlinkshellext.html#symboliclinksforwindowsxp
 _WINXP_DRIVER_FILE = 'symlink.sys'
 
-class FileSystemSupports(object):
-	__slots__ = (
-		'CreationTimestamp',  'LastAccessTimestamp', 'LastChangeTimestamp',
-		'HardLinks', 'SymbolicLinks', 'MountPoints',
-		'SparseFiles', 'NamedStreams', 'AlternateDataStreams',
-		'ExtendedAttributes', 'Compression', 'Encryption',
-		'FileChangeLog', 'FileOwner', 'ACL',
-	)
-
-	def __init__(self, **kw):
-		support = lambda key: setattr(self, key, kw.get(key, True))
-		map(support, self.__slots__)
-
-FSFormats = {
-	'NTFS':  FileSystemSupports(),
-	'UDF':   FileSystemSupports(
-		SymbolicLinks=False, MountPoints=False,
-		Compression=False, Encryption=False,
-		FileChangeLog=False, FileOwner=False, ACL=False
-	),
-	'exFAT': FileSystemSupports(
-		HardLinks=False, SymbolicLinks=False, MountPoints=False,
-		SparseFiles=False, NamedStreams=False, AlternateDataStreams=False,
-		ExtendedAttributes=False, Compression=False, Encryption=False,
-		FileChangeLog=False, FileOwner=False, ACL=False
-	),
-	'FAT32': FileSystemSupports(
-		HardLinks=False, SymbolicLinks=False, MountPoints=False,
-		SparseFiles=False, NamedStreams=False, AlternateDataStreams=False,
-		ExtendedAttributes=False, Compression=False, Encryption=False,
-		FileChangeLog=False, FileOwner=False, ACL=False
-	)
-}
+# Directories we've already looked up the volume of, kept until there are this many of them.
+MAX_CACHED_DIRECTORIES = 4096
+
+class VolumeCapabilities(namedtuple('VolumeCapabilities', 'root serial filesystem flags')):
+	"""
+	What a volume can do, straight from its FILE_SUPPORTS_* (and friends) flags, as reported by GetVolumeInformation.
+	root is where it's mounted, which may be a folder on another volume.
+	"""
+	__slots__ = ()
+
+	def supports(self, flags):
+		""" Checks whether the volume has every one of flags. """
+		return self.flags & flags == flags
+
+	def _flag(mask):
+		return property(lambda self: bool(self.flags & mask))
+
+	reparse_points = _flag(FILE_SUPPORTS_REPARSE_POINTS)
+	hard_links = _flag(FILE_SUPPORTS_HARD_LINKS)
+	sparse_files = _flag(FILE_SUPPORTS_SPARSE_FILES)
+	named_streams = _flag(FILE_NAMED_STREAMS)
+	extended_attributes = _flag(FILE_SUPPORTS_EXTENDED_ATTRIBUTES)
+	compression = _flag(FILE_FILE_COMPRESSION)
+	encryption = _flag(FILE_SUPPORTS_ENCRYPTION)
+	object_ids = _flag(FILE_SUPPORTS_OBJECT_IDS)
+	open_by_file_id = _flag(FILE_SUPPORTS_OPEN_BY_FILE_ID)
+	usn_journal = _flag(FILE_SUPPORTS_USN_JOURNAL)
+	persistent_acls = _flag(FILE_PERSISTENT_ACLS)
+	read_only = _flag(FILE_READ_ONLY_VOLUME)
+	del _flag
+
+# Capabilities by volume serial number, and the serial number of every directory we've been asked about. Both belong
+# to one backend, and start over when it changes.
+_capabilities_lock = threading.Lock()
+_capabilities = {'backend': None, 'volumes': {}, 'directories': {}, 'symlinks': None, 'hardlinks': None}
+
+def _capability_cache():
+	""" The capability cache for the current backend. Call with _capabilities_lock held. """
+	backend = GetBackend()
+	if _capabilities['backend'] is not backend:
+		_capabilities.update(backend = backend, volumes = {}, directories = {}, symlinks = None, hardlinks = None)
+	return _capabilities
+
+def _directory_key(backend, fullpath):
+	"""
+	The directories cache key for fullpath: the path itself when it's a directory (another volume may be mounted on
+	it), or else the directory it's in.
+	"""
+	if not IsFolder(fullpath):
+		fullpath = backend.path.dirname(fullpath) or fullpath
+	return backend.path.normcase(fullpath)
+
+def volume_capabilities(filepath):
+	"""
+	The VolumeCapabilities of the volume filepath is on, following volumes mounted in folders. Only the first call for
+	each directory asks the system anything more than its attributes, and volumes are only probed once. Raises WinError
+	if the volume can't be found.
+	"""
+	backend = GetBackend()
+	fullpath = GetFullPathName(filepath)
+	directory = _directory_key(backend, fullpath)
+	with _capabilities_lock:
+		cache = _capability_cache()
+		serial = cache['directories'].get(directory)
+		if serial is not None:
+			capabilities = cache['volumes'].get(serial)
+			if capabilities is not None:
+				return capabilities
+
+	root = backend.GetVolumePathName(fullpath)
+	volume = backend.GetVolumeInformation(root) if root is not None else None
+	if volume is None:
+		raise WinError(backend.GetLastError())
+	filesystem, flags, serial = volume
+	if filesystem == u'NTFS':
+		# NTFS has always had hard links, but only reports them from Windows 7 on.
+		flags |= FILE_SUPPORTS_HARD_LINKS
+	capabilities = VolumeCapabilities(root, serial, filesystem, flags)
+
+	with _capabilities_lock:
+		cache = _capability_cache()
+		directories = cache['directories']
+		if len(directories) >= MAX_CACHED_DIRECTORIES:
+			directories.clear()
+		directories[directory] = serial
+		return cache['volumes'].setdefault(serial, capabilities)
+
+def refresh(filepath = None):
+	"""
+	Forget the capabilities of the volume filepath is on (as far as they're known), or of every volume without it, so
+	they get probed again. Use it after a volume is reformatted, mounted somewhere else, and so on.
+	"""
+	directory = None if filepath is None else _directory_key(GetBackend(), GetFullPathName(filepath))
+	with _capabilities_lock:
+		cache = _capability_cache()
+		if directory is None:
+			cache.update(volumes = {}, directories = {}, symlinks = None, hardlinks = None)
+			return
+		serial = cache['directories'].get(directory)
+		if serial is not None:
+			cache['volumes'].pop(serial, None)
+			for directory in [d for d, s in cache['directories'].items() if s == serial]:
+				del cache['directories'][directory]
 
 def supports_hardlinks():
-	""" Check whether the current system supports hard links. """
-	# TODO: Implement a real test of this.
-	return CreateHardLinkW is not None
+	""" Check whether the current system supports hard links. The answer is only worked out once. """
+	with _capabilities_lock:
+		cache = _capability_cache()
+		if cache['hardlinks'] is None:
+			version = cache['backend'].GetWindowsVersion()
+			# CreateHardLink came with Windows 2000. Anything that isn't Windows has had hard links all along.
+			cache['hardlinks'] = version is None or version[0] >= 5
+		return cache['hardlinks']
 
 def supports_symlinks():
-	""" Checks whether or not the current system supports symbolic links. """
-	if sys.getwindowsversion()[0] >= 6: return True
-	sysdir = GetSystemDirectory()
-	driver = path.join(sysdir, 'drivers', _WINXP_DRIVER_FILE)
-	return path.isfile(driver)
+	""" Checks whether or not the current system supports symbolic links. The answer is only worked out once. """
+	with _capabilities_lock:
+		cache = _capability_cache()
+		if cache['symlinks'] is None:
+			version = cache['backend'].GetWindowsVersion()
+			# Anything that isn't Windows has had symbolic links all along.
+			if version is None or version[0] >= 6:
+				cache['symlinks'] = True
+			else:
+				sysdir = GetSystemDirectory()
+				driver = os.path.join(sysdir, 'drivers', _WINXP_DRIVER_FILE)
+				cache['symlinks'] = os.path.isfile(driver)
+		return cache['symlinks']
 
 def path_supports_symlinks(filepath):
 	"""
-	Checks if a path is valid for symbolic links.
-
-	Right now, this just verifieds that symbolic links are supported on the machine, and the filepath's volume
-	has an NTFS filesystem.
+	Checks if a path is valid for symbolic links: symbolic links are supported on the machine, and the filepath's volume
+	supports reparse points. (NTFS, ReFS)
 	"""
-	if not supports_symlinks(): return False
-	drive = path.splitdrive(path.abspath(filepath))[0] + '\\'
-	fs = create_unicode_buffer(MAX_PATH+1)
-	if GetVolumeInformationW(drive, None, 0, None, None, None, fs, MAX_PATH+1) == FALSE:
-		raise WindowsError()
-	return fs.value.strip() == 'NTFS'
-
+	return supports_symlinks() and volume_capabilities(filepath).reparse_points
 
+def path_supports_junctions(filepath):
+	""" Checks if the filepath's volume supports junctions. (That is, reparse points) """
+	return volume_capabilities(filepath).reparse_points
 
+def path_supports_hardlinks(filepath):
+	""" Checks if the filepath's volume supports hard links. """
+	return supports_hardlinks() and volume_capabilities(filepath).hard_links
@@ -11,7 +11,10 @@ http://sam.zoy.org/wtfpl/COPYING for more details.
 """
 from .common import *
 
-__all__ = ['create', 'check', 'read', 'unlink']
+__all__ = [
+	'create', 'check', 'read', 'unlink', 'create_many', 'read_many', 'unlink_many',
+	'iter_create_many', 'iter_read_many', 'iter_unlink_many',
+]
 
 def create(srcpath, linkpath):
 	"""
@@ -21,49 +24,18 @@ def create(srcpath, linkpath):
 	"""
 	srcpath = str_cleanup(srcpath)
 	linkpath = str_cleanup(linkpath)
-	if os.path.isabs(srcpath) and not path.exists(srcpath):
+	backend = GetBackend()
+	if backend.path.isabs(srcpath) and not PathExists(srcpath):
 		raise InvalidSourceException('Non-existent source path, "{0}"'.format(srcpath))
 
-	linkpath = path.abspath(linkpath)
-	if path.exists(linkpath):
+	linkpath = GetFullPathName(linkpath)
+	if PathExists(linkpath):
 		raise InvalidSourceException('Filepath for new symbolic link already exists.')
 
-	link_isdir = os.path.isdir(srcpath)
-	if link_isdir:
-		link_isdir = True
-		if not CreateDirectory(linkpath):
-			raise IOError('Failed to create new directory for target symbolic link.')
-
-	dwFlags = DWORD(SYMBOLIC_LINK_FLAG_DIRECTORY if link_isdir else SYMBOLIC_LINK_FLAG_FILE)
-	result = CreateSymbolicLinkW(linkpath, srcpath, dwFlags) != FALSE
-	if link_isdir and not result:
-		RemoveDirectory(linkpath)
-	return result
-
-def _prefill(reparseInfo, source, substlink, link_name, isabs):
-	""" For broken_create """
-	reparseInfo.ReparseTag = IO_REPARSE_TAG_SYMBOLIC_LINK
-
-	# Calculate the lengths of the names.
-	lensubst = len(substlink) * SZWCHAR
-	lenprint = len(source) * SZWCHAR
-
-	# reparseInfo.ReparseDataLength = datalen + 12
-	reparseInfo.Reserved = 0
-	reparseInfo.SymbolicLink = SymbolicLinkBuffer()
-	reparseInfo.SymbolicLink.PrintNameOffset = 0
-	reparseInfo.SymbolicLink.PrintNameLength = lenprint
-	reparseInfo.SymbolicLink.SubstituteNameOffset = lenprint
-	reparseInfo.SymbolicLink.SubstituteNameLength = lensubst
-	reparseInfo.SymbolicLink.Flags = SYMBOLIC_LINK_FLAG_RELATIVE if not isabs else 0
-
-	(bufflen, reparseInfo.ReparseDataLength) = CalculateLength(SymbolicLinkBuffer, reparseInfo.SymbolicLink)
-
-	# Assign the PathBuffer, then resize it, etc.
-	reparseInfo.SymbolicLink.PathBuffer = u'%s%s' % (substlink, source)
-	pReparseInfo = pointer(reparseInfo)
-	reparseInfo.SymbolicLink._fields_[5] = ('PathBuffer', bufflen)
-	return pReparseInfo
+	# CreateSymbolicLink creates the link itself, directory or not. Relative targets are relative to the link.
+	link_isdir = IsFolder(backend.path.join(backend.path.dirname(linkpath), srcpath))
+	dwFlags = SYMBOLIC_LINK_FLAG_DIRECTORY if link_isdir else SYMBOLIC_LINK_FLAG_FILE
+	return backend.CreateSymbolicLink(linkpath, srcpath, dwFlags)
 
 def broken_create(srcpath, linkpath):
 	"""
@@ -71,51 +43,65 @@ def broken_create(srcpath, linkpath):
 	"""
 	srcpath = str_cleanup(srcpath)
 	linkpath = str_cleanup(linkpath)
-	if os.path.isabs(srcpath) and not path.exists(srcpath):
+	backend = GetBackend()
+	if backend.path.isabs(srcpath) and not PathExists(srcpath):
 		raise InvalidSourceException('Symbolic link source does not exist or is not a directory.')
 
-	linkpath = path.abspath(linkpath)
-	if path.exists(linkpath):
+	linkpath = GetFullPathName(linkpath)
+	if PathExists(linkpath):
 		raise InvalidSourceException('Filepath for new symbolic link already exists.')
 
-	link_isdir = os.path.isdir(srcpath)
+	link_isdir = IsFolder(srcpath)
 	if link_isdir:
 		link_isdir = True
-		if not CreateDirectory(linkpath):
+		if not backend.CreateDirectory(linkpath):
 			raise IOError('Failed to create new directory for our target symbolic link.')
 
-	result = create_reparse_point(srcpath, linkpath, _prefill, os.path.isabs(srcpath))
+	result = create_reparse_point(srcpath, linkpath, IO_REPARSE_TAG_SYMBOLIC_LINK, backend.path.isabs(srcpath))
 	if link_isdir and not result:
-		RemoveDirectory(linkpath)
+		backend.RemoveDirectory(linkpath)
 	return result
 
-def check(linkpath):
+def check(linkpath, session = None):
 	"""
-	Checks if linkpath is a symbolic link.
+	Checks if linkpath is a symbolic link. Pass a LinkSession as session to go through its handles.
 
 	See: os.path.islink
 	"""
+	if session is not None:
+		return session.check(linkpath)
 	return IsReparsePoint(linkpath)
 
-def read(linkpath):
+def read(linkpath, session = None):
 	"""
 	Read the target of the symbolic link at linkpath.
 
 	See: os.readlink
 	"""
-	reparseInfo = get_buffer(linkpath, ReparsePoint, check)
-	if reparseInfo is not None:
-		symlink = reparseInfo.SymbolicLink
-		return symlink.PathBuffer[symlink.PrintNameOffset/SZWCHAR:symlink.PrintNameLength/SZWCHAR]
+	if session is not None:
+		reparseData = session.read(linkpath)
+	else:
+		reparseData = read_reparse_point(linkpath, check)
+	if reparseData is not None:
+		return reparseData.print_name
 	return None
 
-def unlink(linkpath):
+def unlink(linkpath, session = None):
 	"""
 	Remove the symbolic link at linkpath.
 
 	See: os.rmdir
 	"""
-	link_isdir = os.path.isdir(linkpath)
+	if session is not None:
+		return session.unlink(linkpath, IO_REPARSE_TAG_SYMBOLIC_LINK)
+	link_isdir = IsFolder(linkpath)
 	result, dwRet = delete_reparse_point(linkpath, IO_REPARSE_TAG_SYMBOLIC_LINK, check)
-	if link_isdir and result: RemoveDirectory(linkpath)
+	if result:
+		# Without its reparse point, what's left is an empty directory or file.
+		if link_isdir: GetBackend().RemoveDirectory(linkpath)
+		else: GetBackend().DeleteFile(linkpath)
 	return result, dwRet
+
+create_many, read_many, unlink_many, iter_create_many, iter_read_many, iter_unlink_many = batch_helpers(
+	'symbolic link', create, read, unlink
+)
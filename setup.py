@@ -1,25 +1,43 @@
 from distutils.extension import Extension
 from distutils.core import setup
+from distutils.command.build_ext import build_ext
+from distutils.errors import CCompilerError, DistutilsExecError, DistutilsPlatformError
 import os, sys
 
-if os.name != 'nt':
-	print 'Sorry, this module is made to support Windows. For non-Windows users, use os and os.path.'
+if os.name == 'nt' and sys.getwindowsversion()[0] < 6:
+	print('Sorry, your version of Windows does not support symbolic links or junctions.')
 	sys.exit(0)
 
-if sys.getwindowsversion()[0] < 6:
-	print 'Sorry, your version of Windows does not support symbolic links or junctions.'
-	sys.exit(0)
+class optional_build_ext(build_ext):
+	"""
+	The C accelerator is optional: without a compiler (or with one that fails), ntfslink installs without it and
+	falls back on its pure-Python code.
+	"""
+
+	def run(self):
+		try:
+			build_ext.run(self)
+		except DistutilsPlatformError as e:
+			self._skip(e)
+
+	def build_extension(self, ext):
+		try:
+			build_ext.build_extension(self, ext)
+		except (CCompilerError, DistutilsExecError, DistutilsPlatformError) as e:
+			self._skip(e)
+
+	def _skip(self, error):
+		print('Not building the optional C accelerator (%s). ntfslink will use its pure-Python code instead.' % error)
 
 setup (name = 'ntfslink',
 	version = '1.2',
 	author = "Charles Grunwald (Juntalis)",
 	author_email = 'cgrunwald@gmail.com',
 	description = """ Simple module wrapping some of the Win32 API to allow support for junctions, hard links, and symbolic links. """,
+	packages = ['ntfslink', 'ntfslink.internals'],
 	ext_modules = [Extension(
-		'ntfslink',
-		['ntfslink/ext/ntfslinkmodule.c','ntfslink/ext/ntfslink.c'],
-		define_macros=[('_CRT_SECURE_NO_WARNINGS', None)],
-		libraries=['advapi32'],
-		include_dirs=['src'],
-	)]
+		'ntfslink.internals._speedups',
+		['ntfslink/ext/speedups.c'],
+	)],
+	cmdclass = {'build_ext': optional_build_ext},
 )
@@ -0,0 +1,26 @@
+# encoding: utf-8
+"""
+tests/__init__.py
+Shared fixtures for the tests.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink.internals import SetBackend, SimulatedBackend
+
+class SimulatedBackendTestCase(unittest.TestCase):
+	"""
+	Runs every test against a fresh backend from make_backend (an empty SimulatedBackend, unless it's overridden),
+	kept in self.backend. Whatever backend was set before is put back afterwards, after tearDown.
+	"""
+
+	def make_backend(self):
+		return SimulatedBackend()
+
+	def setUp(self):
+		self.backend = self.make_backend()
+		self.addCleanup(SetBackend, SetBackend(self.backend))
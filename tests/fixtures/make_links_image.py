@@ -0,0 +1,256 @@
+# encoding: utf-8
+"""
+make_links_image.py
+Builds links.img.gz, the small NTFS image used by test_image.py. Only writes what NtfsImage reads: a boot sector, an
+$MFT in two runs, and records with $STANDARD_INFORMATION, $FILE_NAME and $REPARSE_POINT attributes. The only indexes
+are $Extend's $I30 and the $R index of $Extend\$Reparse. (No bitmaps but $R's, and no other directory indexes.)
+
+	\$Extend                record 11, its $I30 root holding $Reparse and $UsnJrnl
+	\$Extend\$Reparse       record 23, its $R index in its root and two INDX blocks, with a third block not in use
+	\$Extend\$UsnJrnl       record 24, its $J stream a sparse page followed by two pages of records
+	\\Users                 record 16
+	\\Users\\Public          record 17, sequence 1
+	\\Users\\Public\\junction record 18, mount point to C:\\Target, with a DOS name too
+	\\Users\\symlink         record 19, relative symbolic link to ..\\x
+	\\Users\\a.txt           record 20, also \\Users\\Public\\b.txt
+	stale                   record 21, symbolic link whose parent is record 17 with sequence 7
+	orphan                  record 22, mount point whose parent (record 40) doesn't exist
+	\\Users\\Public\\late     record 31, a symbolic link in the last record of the MFT
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import os, sys, gzip, struct
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from ntfslink.internals._mft import *
+from ntfslink.internals._reparse import EncodeMountPoint, EncodeSymbolicLink
+from ntfslink.internals._winioctl import *
+
+CLUSTER_SIZE = 4096
+RECORD_SIZE = 1024
+CLUSTERS = 32
+# (lcn, length) of each $MFT run, for 32 records.
+MFT_RUNS = ((4, 4), (12, 4))
+# Where the INDX blocks of $R go, one cluster each.
+REPARSE_INDEX_LCN = 20
+REPARSE_INDEX_BLOCKS = 3
+# Where the two pages of $UsnJrnl:$J that aren't sparse go.
+USN_JOURNAL_LCN = 24
+# The records in $J, as (version, reason, file reference, name). The last two don't fit in the first page.
+USN_JOURNAL = [(2, USN_REASON_DATA_OVERWRITE, 20, u'%02d' % i + u'x' * 240) for i in range(7)] + [
+	(2, USN_REASON_FILE_CREATE, 18, u'junction'),
+	(2, USN_REASON_REPARSE_POINT_CHANGE | USN_REASON_CLOSE, 18, u'junction'),
+	(2, USN_REASON_DATA_EXTEND, 20, u'a.txt'),
+	(3, USN_REASON_HARD_LINK_CHANGE | USN_REASON_CLOSE, 20, u'b.txt'),
+	(3, USN_REASON_FILE_DELETE | USN_REASON_CLOSE, 25, u'gone'),
+]
+COLLATION_FILE_NAME = 0x01
+COLLATION_NTOFS_ULONGS = 0x10
+
+def _resident(type, value, name = u''):
+	encoded = name.encode('utf-16-le')
+	valueoffset = (24 + len(encoded) + 7) & ~7
+	length = (valueoffset + len(value) + 7) & ~7
+	attr = bytearray(length)
+	struct.pack_into('<LLBBHHHLH', attr, 0, type, length, 0, len(name), 24, 0, 0, len(value), valueoffset)
+	attr[24:24 + len(encoded)] = encoded
+	attr[valueoffset:valueoffset + len(value)] = value
+	return bytes(attr)
+
+def _runs(runs):
+	encoded, previous = bytearray(), 0
+	for lcn, length in runs:
+		# Every run here is under 128 clusters long and starts less than 128 clusters after the last one.
+		if lcn is None:
+			encoded += struct.pack('<BB', 0x01, length)
+			continue
+		encoded += struct.pack('<BBb', 0x11, length, lcn - previous)
+		previous = lcn
+	return bytes(encoded + b'\0')
+
+def _nonresident(type, runs, size, name = u''):
+	encoded, runsoffset = _runs(runs), (64 + len(name) * 2 + 7) & ~7
+	length = (runsoffset + len(encoded) + 7) & ~7
+	clusters = sum(count for _, count in runs)
+	attr = bytearray(length)
+	struct.pack_into('<LLBBHHH', attr, 0, type, length, 1, len(name), 64, 0, 0)
+	struct.pack_into('<QQHH4xQQQ', attr, 16, 0, clusters - 1, runsoffset, 0, clusters * CLUSTER_SIZE, size, size)
+	attr[64:64 + len(name) * 2] = name.encode('utf-16-le')
+	attr[runsoffset:runsoffset + len(encoded)] = encoded
+	return bytes(attr)
+
+def _fixup(block, offset, count):
+	""" Fill in the update sequence array at offset: each sector's last two bytes move there, and become the USN. """
+	struct.pack_into('<H', block, offset, 0x1234)
+	for i in range(1, count):
+		end = i * 512 - 2
+		block[offset + 2 * i:offset + 2 + 2 * i] = block[end:end + 2]
+		struct.pack_into('<H', block, end, 0x1234)
+
+def _standard_information(attributes):
+	return _resident(ATTRIBUTE_STANDARD_INFORMATION, struct.pack('<QQQQLLLLLLQQ', 1, 2, 3, 4, attributes, 0, 0, 0, 0,
+		0x100, 0, 0))
+
+def _file_name_value(parent, name, namespace = FILE_NAME_WIN32, directory = False, sequence = 1):
+	return struct.pack('<QQQQQQQLLBB', parent | (sequence << 48), 1, 2, 3, 4, 0, 0, 0x10000000 if directory else 0x20,
+		0, len(name), namespace) + name.encode('utf-16-le')
+
+def _file_name(parent, name, namespace = FILE_NAME_WIN32, directory = False, sequence = 1):
+	return _resident(ATTRIBUTE_FILE_NAME, _file_name_value(parent, name, namespace, directory, sequence))
+
+def _record(number, attributes, directory = False, links = 1, sequence = 1):
+	record = bytearray(RECORD_SIZE)
+	offset = 56
+	for attr in attributes:
+		record[offset:offset + len(attr)] = attr
+		offset += len(attr)
+	struct.pack_into('<L', record, offset, ATTRIBUTE_END)
+	offset += 8
+	count = RECORD_SIZE // 512 + 1
+	struct.pack_into('<4sHHQHHHHLLQHHL', record, 0, b'FILE', 48, count, 0, sequence, links, 56,
+		3 if directory else 1, offset, RECORD_SIZE, 0, 0, 0, number)
+	_fixup(record, 48, count)
+	return record
+
+def _index_entry(header, key = b'', subnode = None, end = False):
+	flags = (INDEX_ENTRY_NODE if subnode is not None else 0) | (INDEX_ENTRY_END if end else 0)
+	length = (16 + len(key) + 7) & ~7
+	entry = bytearray(length + (8 if subnode is not None else 0))
+	struct.pack_into('<QHHH', entry, 0, header, len(entry), len(key), flags)
+	entry[16:16 + len(key)] = key
+	if subnode is not None:
+		struct.pack_into('<q', entry, len(entry) - 8, subnode)
+	return bytes(entry)
+
+def _index_node(entries, first):
+	""" An INDEX_HEADER with entries starting first bytes in. It's marked large if any of them point to a subnode. """
+	body = b''.join(entries)
+	large = any(struct.unpack_from('<H', entry, 12)[0] & INDEX_ENTRY_NODE for entry in entries)
+	return struct.pack('<LLLB3x', first, first + len(body), first + len(body), INDEX_HEADER_LARGE if large else 0) + \
+		b'\0' * (first - 16) + body
+
+def _index_root(type, collation, entries):
+	return struct.pack('<LLLB3x', type, collation, CLUSTER_SIZE, 1) + _index_node(entries, 16)
+
+def _index_block(vcn, entries):
+	count = CLUSTER_SIZE // 512 + 1
+	block = bytearray(CLUSTER_SIZE)
+	struct.pack_into('<4sHHQQ', block, 0, b'INDX', 40, count, 0, vcn)
+	node = _index_node(entries, (40 + count * 2 + 7 & ~7) - 24)
+	block[24:24 + len(node)] = node
+	_fixup(block, 40, count)
+	return block
+
+def _reparse_key(tag, number, sequence = 1):
+	return _index_entry(0, struct.pack('<LQ', tag, number | (sequence << 48)))
+
+def _usn_record(version, usn, reason, number, name):
+	encoded = name.encode('utf-16-le')
+	if version == 2:
+		fixed = struct.pack('<QQqqLLLLHH', number | (1 << 48), 5 | (1 << 48), usn, 1, reason, 0, 0, 0x20, len(encoded),
+			60)
+	else:
+		fixed = struct.pack('<QQQQqqLLLLHH', number | (1 << 48), 0, 5 | (1 << 48), 0, usn, 1, reason, 0, 0, 0x20,
+			len(encoded), 76)
+	length = (8 + len(fixed) + len(encoded) + 7) & ~7
+	return (struct.pack('<LHH', length, version, 0) + fixed + encoded).ljust(length, b'\0')
+
+def _usn_journal():
+	""" The pages of $J after the sparse first one, with each record moved on to the next page if it doesn't fit. """
+	pages = bytearray()
+	for version, reason, number, name in USN_JOURNAL:
+		usn = CLUSTER_SIZE + len(pages)
+		if len(_usn_record(version, usn, reason, number, name)) > CLUSTER_SIZE - usn % CLUSTER_SIZE:
+			pages += b'\0' * (CLUSTER_SIZE - usn % CLUSTER_SIZE)
+			usn = CLUSTER_SIZE + len(pages)
+		pages += _usn_record(version, usn, reason, number, name)
+	return pages
+
+def _extend():
+	""" $Extend and its files, and the INDX blocks of $R. Returns (records, blocks, the pages of $J). """
+	reparse = _record(23, [_standard_information(0x06), _file_name(11, u'$Reparse'),
+		# Anything below the root's entry for record 22 is in block 0, and everything past it in block 1.
+		_resident(ATTRIBUTE_INDEX_ROOT, _index_root(0, COLLATION_NTOFS_ULONGS, [
+			_index_entry(0, struct.pack('<LQ', IO_REPARSE_TAG_MOUNT_POINT, 22 | (1 << 48)), subnode = 0),
+			_index_entry(0, end = True, subnode = 1),
+		]), u'$R'),
+		_nonresident(ATTRIBUTE_INDEX_ALLOCATION, ((REPARSE_INDEX_LCN, REPARSE_INDEX_BLOCKS),),
+			REPARSE_INDEX_BLOCKS * CLUSTER_SIZE, u'$R'),
+		_resident(ATTRIBUTE_BITMAP, b'\x03' + b'\0' * 7, u'$R'),
+	])
+	blocks = [
+		_index_block(0, [_reparse_key(IO_REPARSE_TAG_MOUNT_POINT, 18), _index_entry(0, end = True)]),
+		_index_block(1, [
+			_reparse_key(IO_REPARSE_TAG_SYMBOLIC_LINK, 19),
+			# Left over from a record that's been reused since, and from one that's gone.
+			_reparse_key(IO_REPARSE_TAG_SYMBOLIC_LINK, 20, sequence = 3),
+			_reparse_key(IO_REPARSE_TAG_SYMBOLIC_LINK, 21),
+			_reparse_key(IO_REPARSE_TAG_SYMBOLIC_LINK, 30),
+			_reparse_key(IO_REPARSE_TAG_SYMBOLIC_LINK, 31),
+			_index_entry(0, end = True),
+		]),
+		# Not in use, so its stale entry mustn't turn up.
+		_index_block(2, [_reparse_key(IO_REPARSE_TAG_MOUNT_POINT, 24), _index_entry(0, end = True)]),
+	]
+	extend = _record(11, [_standard_information(0x06), _file_name(5, u'$Extend', directory = True),
+		_resident(ATTRIBUTE_INDEX_ROOT, _index_root(ATTRIBUTE_FILE_NAME, COLLATION_FILE_NAME, [
+			_index_entry(23 | (1 << 48), _file_name_value(11, u'$Reparse')),
+			_index_entry(24 | (1 << 48), _file_name_value(11, u'$UsnJrnl')),
+			_index_entry(0, end = True),
+		]), u'$I30'),
+	], directory = True)
+	journal = _usn_journal()
+	usnjrnl = _record(24, [_standard_information(0x26), _file_name(11, u'$UsnJrnl'),
+		_nonresident(ATTRIBUTE_DATA, ((None, 1), (USN_JOURNAL_LCN, 2)), CLUSTER_SIZE + len(journal), u'$J'),
+	])
+	return {11: extend, 23: reparse, 24: usnjrnl}, blocks, journal
+
+def _directory(number, parent, name):
+	return _record(number, [_standard_information(0x10), _file_name(parent, name, directory = True)], directory = True)
+
+def _link(number, parent, name, reparse, sequence = 1, extra = ()):
+	return _record(number, [_standard_information(0x420), _file_name(parent, name, sequence = sequence)] +
+		list(extra) + [_resident(ATTRIBUTE_REPARSE_POINT, bytes(reparse))])
+
+def build():
+	records = {
+		0: _record(0, [_standard_information(0x06), _file_name(5, u'$MFT'),
+			_nonresident(ATTRIBUTE_DATA, MFT_RUNS, sum(count for _, count in MFT_RUNS) * CLUSTER_SIZE)]),
+		5: _directory(5, 5, u'.'),
+		16: _directory(16, 5, u'Users'),
+		17: _directory(17, 16, u'Public'),
+		18: _link(18, 17, u'junction', EncodeMountPoint(u'\\??\\C:\\Target', u'C:\\Target'),
+			extra = [_file_name(17, u'JUNCTI~1', FILE_NAME_DOS)]),
+		19: _link(19, 16, u'symlink', EncodeSymbolicLink(u'..\\x', u'..\\x', 1)),
+		20: _record(20, [_standard_information(0x20), _file_name(16, u'a.txt'), _file_name(17, u'b.txt')], links = 2),
+		21: _link(21, 17, u'stale', EncodeSymbolicLink(u'y', u'y', 1), sequence = 7),
+		22: _link(22, 40, u'orphan', EncodeMountPoint(u'\\??\\D:\\x', u'D:\\x')),
+		31: _link(31, 17, u'late', EncodeSymbolicLink(u'z', u'z', 1)),
+	}
+	extend, blocks, journal = _extend()
+	records.update(extend)
+	image = bytearray(CLUSTERS * CLUSTER_SIZE)
+	struct.pack_into('<3s8sHB26xQQQb3xb3xQ', image, 0, b'\xebR\x90', b'NTFS    ', 512, CLUSTER_SIZE // 512,
+		CLUSTERS * CLUSTER_SIZE // 512, MFT_RUNS[0][0], MFT_RUNS[1][0], -10, 1, 0x1234ABCD)
+	per_cluster = CLUSTER_SIZE // RECORD_SIZE
+	for number, record in records.items():
+		vcn, first = number // per_cluster, 0
+		for lcn, length in MFT_RUNS:
+			if vcn < first + length:
+				break
+			first += length
+		offset = (lcn + vcn - first) * CLUSTER_SIZE + number % per_cluster * RECORD_SIZE
+		image[offset:offset + RECORD_SIZE] = record
+	for i, block in enumerate(blocks):
+		offset = (REPARSE_INDEX_LCN + i) * CLUSTER_SIZE
+		image[offset:offset + CLUSTER_SIZE] = block
+	offset = USN_JOURNAL_LCN * CLUSTER_SIZE
+	image[offset:offset + len(journal)] = journal
+	return bytes(image)
+
+if __name__ == '__main__':
+	with gzip.GzipFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'links.img.gz'), 'wb', mtime = 0) as f:
+		f.write(build())
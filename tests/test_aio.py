@@ -0,0 +1,63 @@
+# encoding: utf-8
+"""
+test_aio.py
+Tests for LinkExecutor's volume keys and per-volume limits, on a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import asyncio, threading, unittest
+from ntfslink import aio
+from ntfslink.internals import SimulatedBackend
+from tests import SimulatedBackendTestCase
+
+class LinkExecutorTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		return SimulatedBackend(drives = ('C:', 'D:'), cwd = u'D:\\')
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.executor = aio.LinkExecutor(workers = 4, volume_limit = 1)
+
+	def tearDown(self):
+		self.executor.shutdown()
+
+	def test_volume(self):
+		for fpath in (u'C:\\x', u'c:/x', u'\\\\?\\C:\\x', u'C:\\a\\..\\x'):
+			self.assertEqual(self.executor.volume(fpath), u'C:', fpath)
+		# Relative paths are on the current directory's volume.
+		self.assertEqual(self.executor.volume(u'x\\y'), u'D:')
+
+	def test_cancelled_call_keeps_its_slot(self):
+		started, finish = threading.Event(), threading.Event()
+		order = []
+
+		def slow():
+			started.set()
+			finish.wait(5)
+			order.append('slow')
+
+		async def main():
+			loop = asyncio.get_running_loop()
+			task = asyncio.ensure_future(self.executor.run(slow, u'C:\\x'))
+			await loop.run_in_executor(None, started.wait, 5)
+			task.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await task
+			# slow is still running on C:, so this one has to wait for it, but D: is free.
+			other = asyncio.ensure_future(self.executor.run(order.append, u'C:\\y', 'after'))
+			await self.executor.run(order.append, u'D:\\z', 'elsewhere')
+			await asyncio.sleep(0.05)
+			self.assertFalse(other.done())
+			finish.set()
+			await other
+
+		asyncio.run(main())
+		self.assertEqual(order, ['elsewhere', 'slow', 'after'])
+
+if __name__ == '__main__':
+	unittest.main()
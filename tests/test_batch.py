@@ -0,0 +1,60 @@
+# encoding: utf-8
+"""
+test_batch.py
+Tests for run_many, iter_many and the batch helpers of the link modules, on a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink import junctions, junction, symlinks, run_many
+from tests import SimulatedBackendTestCase
+
+LINKS = 12
+
+class BatchTest(SimulatedBackendTestCase):
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.backend.CreateDirectory(u'C:\\src')
+
+	def pairs(self):
+		taken = []
+		for i in range(LINKS):
+			taken.append(i)
+			yield u'C:\\src', u'C:\\j%d' % i
+		self.taken = taken
+
+	def test_run_many_unordered(self):
+		results = run_many(lambda i: i * 2, range(100), workers = 4, ordered = False)
+		self.assertEqual(sorted(result.value for result in results), list(range(0, 200, 2)))
+
+	def test_iter_many_helpers(self):
+		results = junctions.iter_create_many(self.pairs(), workers = 4)
+		# Nothing happens until the first result is asked for.
+		self.assertFalse(hasattr(self, 'taken'))
+		self.assertTrue(all(result.ok for result in results))
+		linkpaths = [u'C:\\j%d' % i for i in range(LINKS)] + [u'C:\\nope']
+		reads = list(junction.iter_read_many(linkpaths, workers = 4, ordered = False))
+		self.assertEqual(sorted(result.item for result in reads), sorted(linkpaths))
+		self.assertEqual(sum(result.ok for result in reads), LINKS)
+		unlinks = list(junctions.iter_unlink_many(linkpaths, workers = 4))
+		self.assertEqual([result.item for result in unlinks], linkpaths)
+		self.assertEqual([result.value for result in unlinks[:-1]], [(True, 0)] * LINKS)
+		self.assertFalse(unlinks[-1].ok)
+
+	def test_helpers_call_their_own_module(self):
+		junctions.create(u'C:\\src', u'C:\\j')
+		self.assertTrue(symlinks.create_many([(u'C:\\src', u'C:\\s')])[0].ok)
+		self.assertTrue(symlinks.check(u'C:\\s'))
+		for module in (junctions, symlinks):
+			self.assertEqual([result.value for result in module.read_many([u'C:\\j', u'C:\\s'])],
+				[module.read(u'C:\\j'), module.read(u'C:\\s')])
+		self.assertEqual(symlinks.read_many.__module__, 'ntfslink.symlinks')
+		self.assertIn('symbolic link', symlinks.read_many.__doc__)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,103 @@
+# encoding: utf-8
+"""
+test_cache.py
+Tests for LinkCache, with its watchers getting their changes from a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import time, unittest
+from ntfslink import junctions, LinkCache
+from ntfslink.internals import SetBackend, SimulatedBackend, LatencyModel
+from tests import SimulatedBackendTestCase
+
+def wait_until(condition, timeout = 2.0):
+	""" Poll condition() until it's true, for up to timeout seconds. Returns what it last returned. """
+	deadline = time.time() + timeout
+	while not condition() and time.time() < deadline:
+		time.sleep(0.005)
+	return condition()
+
+class LinkCacheTest(SimulatedBackendTestCase):
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.populate()
+
+	def populate(self):
+		for dirpath in (u'C:\\w', u'C:\\w\\sub', u'C:\\w\\sub2', u'C:\\out', u'C:\\t1', u'C:\\t2'):
+			self.backend.CreateDirectory(dirpath)
+		for linkpath in (u'C:\\w\\sub\\j', u'C:\\w\\sub2\\j', u'C:\\out\\j'):
+			junctions.create(u'C:\\t1', linkpath)
+		self.cache = LinkCache(junctions.read)
+
+	def tearDown(self):
+		self.cache.close()
+
+	def retarget(self, linkpath, target):
+		junctions.unlink(linkpath)
+		junctions.create(target, linkpath)
+
+	def test_watched_changes(self):
+		self.cache.watch(u'C:\\w')
+		for linkpath in (u'C:\\w\\sub\\j', u'C:\\w\\sub2\\j', u'C:\\out\\j'):
+			self.assertEqual(self.cache.read(linkpath), u'C:\\t1')
+		self.retarget(u'C:\\w\\sub\\j', u'C:\\t2')
+		self.retarget(u'C:\\out\\j', u'C:\\t2')
+		self.assertTrue(wait_until(lambda: len(self.cache) == 2))
+		self.assertEqual(self.cache.read(u'C:\\w\\sub\\j'), u'C:\\t2')
+		# Nothing's watching C:\out, so it's stale until it's invalidated some other way.
+		self.assertEqual(self.cache.read(u'C:\\out\\j'), u'C:\\t1')
+		self.assertEqual((self.cache.hits, self.cache.misses), (1, 4))
+
+	def test_change_right_after_watch(self):
+		# Have the watcher take its time getting to ReadDirectoryChanges: watch mustn't return before it has.
+		self.cache.close()
+		self.backend = SimulatedBackend(latency = LatencyModel(calls = {'ReadDirectoryChanges': 0.1}))
+		SetBackend(self.backend)
+		self.populate()
+		self.cache.watch(u'C:\\w')
+		self.assertEqual(self.cache.read(u'C:\\w\\sub\\j'), u'C:\\t1')
+		self.retarget(u'C:\\w\\sub\\j', u'C:\\t2')
+		self.assertTrue(wait_until(lambda: len(self.cache) == 0))
+		self.assertEqual(self.cache.read(u'C:\\w\\sub\\j'), u'C:\\t2')
+
+	def test_invalidate(self):
+		for linkpath in (u'C:\\w\\sub\\j', u'C:\\w\\sub2\\j', u'C:\\out\\j'):
+			self.cache.read(linkpath)
+		self.cache.invalidate(u'C:\\W\\SUB')
+		# C:\w\sub2 only starts with the same characters.
+		self.assertEqual(len(self.cache), 2)
+		self.cache.invalidate(u'C:\\out\\j')
+		self.cache.invalidate(u'C:\\out\\j\\nothing')
+		self.assertEqual(len(self.cache), 1)
+		self.cache.invalidate(u'C:\\')
+		self.assertEqual(len(self.cache), 0)
+		self.assertEqual(self.cache._under, {})
+
+	def test_eviction_keeps_index(self):
+		self.cache.maxsize = 2
+		for linkpath in (u'C:\\w\\sub\\j', u'C:\\w\\sub2\\j', u'C:\\out\\j', u'C:\\w\\sub2\\j'):
+			self.cache.read(linkpath)
+		self.assertEqual(len(self.cache), 2)
+		self.assertEqual(sorted(self.cache._under), [u'c:\\', u'c:\\out', u'c:\\w', u'c:\\w\\sub2'])
+		self.cache.invalidate(u'C:\\w')
+		self.assertEqual(sorted(self.cache._under), [u'c:\\', u'c:\\out'])
+
+	def test_ttl(self):
+		now = [0]
+		cache = LinkCache(junctions.read, ttl = 10, clock = lambda: now[0])
+		cache.read(u'C:\\out\\j')
+		now[0] = 5
+		cache.read(u'C:\\out\\j')
+		now[0] = 11
+		self.retarget(u'C:\\out\\j', u'C:\\t2')
+		self.assertEqual(cache.read(u'C:\\out\\j'), u'C:\\t2')
+		self.assertEqual((cache.hits, cache.misses), (1, 2))
+		self.assertEqual(len(cache._under[u'c:\\out']), 1)
+
+if __name__ == '__main__':
+	unittest.main()
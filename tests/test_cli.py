@@ -0,0 +1,144 @@
+# encoding: utf-8
+"""
+test_cli.py
+Tests for the command line interface (python -m ntfslink), run through main() on a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import io, os, sys, json, shutil, tempfile, unittest
+try:
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
+from ntfslink import junctions
+from ntfslink.internals import IsFile
+from ntfslink.__main__ import main
+from tests import SimulatedBackendTestCase
+
+class CommandLineTest(SimulatedBackendTestCase):
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		for dirpath in (u'C:\\r', u'C:\\r\\sub', u'C:\\t', u'C:\\t2'):
+			self.backend.CreateDirectory(dirpath)
+		self.backend.open(u'C:\\r\\file', 'wb').close()
+		junctions.create(u'C:\\t', u'C:\\r\\j')
+		self.directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.directory)
+
+	def run_main(self, argv, stdin = u''):
+		""" Run main(argv) with stdin holding stdin. Returns (exit status, the JSON records written, stderr). """
+		streams = sys.stdin, sys.stdout, sys.stderr
+		sys.stdin, sys.stdout, sys.stderr = StringIO(stdin), StringIO(), StringIO()
+		try:
+			status = main(argv)
+			out, err = sys.stdout.getvalue(), sys.stderr.getvalue()
+		finally:
+			sys.stdin, sys.stdout, sys.stderr = streams
+		records = [json.loads(line) for line in out.splitlines()]
+		for record in records:
+			self.assertIsInstance(record.pop('elapsed_ms'), float)
+		return status, records, err
+
+	def manifest(self, text):
+		fpath = os.path.join(self.directory, 'manifest.json')
+		with io.open(fpath, 'w', encoding = 'utf-8') as f:
+			f.write(text)
+		return fpath
+
+	def test_create(self):
+		status, records, _ = self.run_main(['create', '-t', 'junction', '--ordered', u'C:\\t', u'C:\\r\\a',
+			u'C:\\nope', u'C:\\r\\b', u'C:\\t2', u'C:\\r\\c'])
+		self.assertEqual(status, 1)
+		self.assertEqual([(record['index'], record['path'], record['ok']) for record in records],
+			[(0, u'C:\\r\\a', True), (1, u'C:\\r\\b', False), (2, u'C:\\r\\c', True)])
+		self.assertEqual(records[2]['target'], u'C:\\t2')
+		self.assertTrue(records[1]['error'].startswith('InvalidSourceException: '))
+		# Without any paths, it's stdin that's read, and --from - reads it as well as the paths given.
+		status, records, _ = self.run_main(['create', '-t', 'junction'], u'C:\\t\tC:\\r\\d\n\nC:\\t\n')
+		self.assertEqual((status, [record['ok'] for record in records]), (1, [True, False]))
+		self.assertTrue(records[1]['error'].startswith('ValueError: Expected srcpath<TAB>linkpath'))
+		status, records, _ = self.run_main(['create', '-t', 'junction', '--from', '-', u'C:\\t', u'C:\\r\\e'],
+			u'C:\\t2\tC:\\r\\f\n')
+		self.assertEqual((status, sorted(record['path'] for record in records)), (0, [u'C:\\r\\e', u'C:\\r\\f']))
+		self.assertEqual(junctions.read(u'C:\\r\\f'), u'C:\\t2')
+		self.assertRaises(SystemExit, self.run_main, ['create', '-t', 'junction', u'C:\\t'])
+
+	def test_check_read_unlink(self):
+		paths = [u'C:\\r\\j', u'C:\\r\\file', u'C:\\r\\nope']
+		status, records, _ = self.run_main(['check', '--ordered'] + paths)
+		self.assertEqual((status, [record['type'] for record in records]), (0, ['junction', None, None]))
+		status, records, _ = self.run_main(['read', '--ordered'], u'\n'.join(paths) + u'\n')
+		self.assertEqual(status, 1)
+		self.assertEqual([(record['ok'], record.get('target')) for record in records],
+			[(True, u'C:\\t'), (False, None), (False, None)])
+		self.assertEqual(records[2]['error'], u'InvalidLinkException: C:\\r\\nope is not a reparse point.')
+		status, records, _ = self.run_main(['unlink', '--ordered', u'C:\\r\\j', u'C:\\r\\file'])
+		self.assertEqual((status, [record['ok'] for record in records]), (1, [True, False]))
+		self.assertIn('not a reparse point', records[1]['error'])
+		self.assertFalse(junctions.check(u'C:\\r\\j'))
+		self.assertTrue(IsFile(u'C:\\r\\file'))
+
+	def test_scan(self):
+		junctions.create(u'C:\\t2', u'C:\\r\\sub\\k')
+		status, records, _ = self.run_main(['scan', u'C:\\r'])
+		self.assertEqual(status, 0)
+		self.assertEqual(sorted((record['path'], record['depth'], record['target']) for record in records),
+			[(u'C:\\r\\j', 0, u'C:\\t'), (u'C:\\r\\sub\\k', 1, u'C:\\t2')])
+		_, records, _ = self.run_main(['scan', '--all', '--max-depth', '0', '--no-targets', u'C:\\r'])
+		self.assertEqual(sorted((record['path'], record['type']) for record in records),
+			[(u'C:\\r\\file', 'file'), (u'C:\\r\\j', 'junction'), (u'C:\\r\\sub', 'directory')])
+		self.assertFalse(any('target' in record for record in records))
+
+	def test_apply_manifest(self):
+		lines = [
+			{'type': 'junction', 'path': u'C:\\r\\j', 'target': u'C:\\t'},
+			{'type': 'junction', 'path': u'C:\\r\\k', 'target': u'C:\\t2'},
+			{'type': 'junction', 'path': u'C:\\r\\j', 'target': u'C:\\t2'},
+			{'type': 'junction', 'path': u'C:\\r\\gone', 'state': 'absent'},
+		]
+		text = u'\n'.join(json.dumps(line) for line in lines) + u'\n{not json\n'
+		status, records, _ = self.run_main(['apply-manifest', '--ordered', self.manifest(text)])
+		self.assertEqual(status, 1)
+		self.assertEqual([(record['ok'], record.get('action')) for record in records],
+			[(True, 'none'), (True, 'created'), (False, None), (True, 'none'), (False, None)])
+		self.assertEqual(records[4]['path'], u'{not json')
+		# The same, as a JSON array from stdin, replacing what leads somewhere else.
+		status, records, _ = self.run_main(['apply-manifest', '--ordered', '--replace'], json.dumps(lines[2:3]))
+		self.assertEqual((status, records[0]['action']), (0, 'replaced'))
+		self.assertEqual(junctions.read(u'C:\\r\\j'), u'C:\\t2')
+
+	def test_malformed_manifest(self):
+		fpath = self.manifest(u'[{"type": "junction", "path": "C:\\\\r\\\\x", "target": "C:\\\\t"},')
+		status, records, _ = self.run_main(['apply-manifest', fpath])
+		self.assertEqual(status, 1)
+		self.assertEqual(len(records), 1)
+		self.assertEqual((records[0]['path'], records[0]['ok']), (fpath, False))
+		self.assertTrue(records[0]['error'].startswith('ValueError: Not a JSON manifest: '))
+		self.assertFalse(junctions.check(u'C:\\r\\x'))
+
+	def test_ordered(self):
+		paths = [u'C:\\r\\j', u'C:\\r\\nope'] * 20
+		_, records, _ = self.run_main(['read', '--ordered', '--jobs', '8'] + paths)
+		self.assertEqual([record['index'] for record in records], list(range(len(paths))))
+		self.assertEqual([record['path'] for record in records], paths)
+		_, records, _ = self.run_main(['read', '--jobs', '8'] + paths)
+		self.assertEqual(sorted((record['index'], record['path']) for record in records), list(enumerate(paths)))
+		self.assertRaises(SystemExit, self.run_main, ['read', '--jobs', '0', u'C:\\r\\j'])
+
+	def test_stats(self):
+		_, _, err = self.run_main(['read', u'C:\\r\\j', u'C:\\r\\j', u'C:\\r\\nope'])
+		self.assertEqual(err, u'')
+		_, _, err = self.run_main(['read', '--stats', u'C:\\r\\j', u'C:\\r\\j', u'C:\\r\\nope'])
+		summary, latencies = err.splitlines()
+		self.assertTrue(summary.startswith('read: 3 done, 1 failed in '))
+		self.assertTrue(latencies.startswith('latency (ms): p50 '))
+		self.assertIn(', p99 ', latencies)
+		self.assertIn(', max ', latencies)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,156 @@
+# encoding: utf-8
+"""
+test_copier.py
+Tests for copytree, on a SimulatedBackend: junctions, symbolic links, hard link groups, and the errors it collects.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink import junctions, symlinks, hardlinks, copytree, CopyTreeException
+from ntfslink.common import read_reparse_point, write_reparse_point, InvalidSourceException
+from ntfslink.internals import *
+from tests import SimulatedBackendTestCase
+
+VOLUME = u'\\??\\Volume{01234567-89ab-cdef-0123-456789abcdef}\\'
+
+def winerror(e):
+	""" The Windows error code of a WinError, which only ctypes' version keeps in winerror. """
+	return getattr(e, 'winerror', None) or e.errno
+
+class FailingBackend(SimulatedBackend):
+	""" Fails copying, hard linking or symbolic linking to any of the paths in failing, with ERROR_ACCESS_DENIED. """
+
+	def __init__(self, failing):
+		SimulatedBackend.__init__(self)
+		self.failing = set(failing)
+
+	def CopyFile(self, existingname, newname):
+		if newname in self.failing:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		return SimulatedBackend.CopyFile(self, existingname, newname)
+
+	def CreateHardLink(self, filename, existingname):
+		if filename in self.failing:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		return SimulatedBackend.CreateHardLink(self, filename, existingname)
+
+	def CreateSymbolicLink(self, linkname, target, flags):
+		if linkname in self.failing:
+			return self._fail(ERROR_ACCESS_DENIED, False)
+		return SimulatedBackend.CreateSymbolicLink(self, linkname, target, flags)
+
+class CopyTreeJunctionTest(SimulatedBackendTestCase):
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		for dirpath in (u'C:\\s', u'C:\\s\\in', u'C:\\out'):
+			self.backend.CreateDirectory(dirpath)
+		junctions.create(u'C:\\s\\in', u'C:\\s\\inside')
+		junctions.create(u'C:\\out', u'C:\\s\\outside')
+		# The way mountvol and the disk management tools leave it, with an empty PrintName.
+		self.backend.CreateDirectory(u'C:\\s\\volume')
+		self.assertTrue(write_reparse_point(u'C:\\s\\volume', ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, VOLUME, u'')))
+
+	def test_junctions(self):
+		copytree(u'C:\\s', u'C:\\d')
+		self.assertEqual(junctions.read(u'C:\\d\\inside'), u'C:\\d\\in')
+		self.assertEqual(junctions.read(u'C:\\d\\outside'), u'C:\\out')
+		self.assertEqual(read_reparse_point(u'C:\\d\\volume', junctions.check),
+			ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, VOLUME, u''))
+
+class CopyTreeTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		return FailingBackend([])
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		for dirpath in (u'C:\\s', u'C:\\s\\sub', u'C:\\s\\in', u'C:\\ext', u'C:\\s2'):
+			self.backend.CreateDirectory(dirpath)
+		for fpath in (u'C:\\s\\a.txt', u'C:\\s\\g1.bin', u'C:\\s\\lone.txt', u'C:\\s\\in\\f', u'C:\\s\\only.bin'):
+			with self.backend.open(fpath, 'wb') as f:
+				f.write(fpath.encode('utf-8'))
+		# Two groups of hard links inside the tree, and a file with its only other link outside of it.
+		hardlinks.create(u'C:\\s\\a.txt', u'C:\\s\\sub\\b.txt')
+		hardlinks.create(u'C:\\s\\a.txt', u'C:\\s\\c.txt')
+		hardlinks.create(u'C:\\s\\g1.bin', u'C:\\s\\g2.bin')
+		hardlinks.create(u'C:\\s\\only.bin', u'C:\\ext\\only.bin')
+
+	def data(self, fpath):
+		with self.backend.open(fpath) as f:
+			return f.read()
+
+	def test_hard_link_groups(self):
+		self.assertEqual(copytree(u'C:\\s', u'C:\\d'), u'C:\\d')
+		copied = hardlinks.identity(u'C:\\d\\a.txt')
+		self.assertNotEqual(copied, hardlinks.identity(u'C:\\s\\a.txt'))
+		for fpath in (u'C:\\d\\sub\\b.txt', u'C:\\d\\c.txt'):
+			self.assertEqual(hardlinks.identity(fpath), copied)
+			self.assertEqual(self.data(fpath), b'C:\\s\\a.txt')
+		self.assertEqual(hardlinks.read(u'C:\\d\\a.txt'), 3)
+		self.assertEqual(hardlinks.identity(u'C:\\d\\g1.bin'), hardlinks.identity(u'C:\\d\\g2.bin'))
+		self.assertNotEqual(hardlinks.identity(u'C:\\d\\g1.bin'), copied)
+		# The link outside the tree isn't part of the copy, so that's an ordinary file there.
+		self.assertEqual(hardlinks.read(u'C:\\d\\only.bin'), 1)
+		self.assertEqual(hardlinks.read(u'C:\\d\\lone.txt'), 1)
+		self.assertEqual((hardlinks.read(u'C:\\s\\a.txt'), hardlinks.read(u'C:\\s\\only.bin')), (3, 2))
+
+	def test_symlink_rebasing(self):
+		links = [
+			# (name, target, what it should lead to in the copy)
+			(u'dir', u'C:\\s\\in', u'C:\\d\\in'),
+			(u'file', u'C:\\s\\in\\f', u'C:\\d\\in\\f'),
+			(u'root', u'C:\\s', u'C:\\d'),
+			(u'case', u'C:\\S\\IN\\f', u'C:\\d\\IN\\f'),
+			(u'dangling', u'C:\\s\\gone', u'C:\\d\\gone'),
+			(u'link', u'C:\\s\\dir', u'C:\\d\\dir'),
+			# Outside the tree, even when the name starts the same way, and relative: left as they are.
+			(u'outside', u'C:\\ext', u'C:\\ext'),
+			(u'sibling', u'C:\\s2', u'C:\\s2'),
+			(u'relative', u'in\\f', u'in\\f'),
+			(u'up', u'..\\ext', u'..\\ext'),
+		]
+		for name, target, _ in links:
+			flags = SYMBOLIC_LINK_FLAG_DIRECTORY if name in (u'dir', u'root', u'link', u'outside', u'sibling') else 0
+			self.assertTrue(self.backend.CreateSymbolicLink(u'C:\\s\\' + name, target, flags))
+		copytree(u'C:\\s', u'C:\\d')
+		for name, target, expected in links:
+			self.assertEqual(symlinks.read(u'C:\\d\\' + name), expected)
+			self.assertEqual(symlinks.read(u'C:\\s\\' + name), target)
+		self.assertEqual(IsFolder(u'C:\\d\\dir'), True)
+		self.assertEqual(IsFolder(u'C:\\d\\file'), False)
+
+	def test_errors(self):
+		symlinks.create(u'C:\\s\\in', u'C:\\s\\sym')
+		# The copy of lone.txt fails, then the copy of the first of g1.bin and g2.bin (which takes the other one with
+		# it), one of the two links to the copy of a.txt, and the symbolic link.
+		self.backend.failing.update([u'C:\\d\\lone.txt', u'C:\\d\\g1.bin', u'C:\\d\\g2.bin', u'C:\\d\\sub\\b.txt',
+			u'C:\\d\\sym'])
+		try:
+			copytree(u'C:\\s', u'C:\\d')
+		except CopyTreeException as e:
+			errors = sorted(e.errors, key = lambda error: error[0])
+			self.assertTrue(str(e).startswith('5 item(s) could not be copied, starting with '))
+		else:
+			self.fail('copytree succeeded')
+		self.assertEqual([error[:2] for error in errors], [(u'C:\\s\\' + name, u'C:\\d\\' + name)
+			for name in (u'g1.bin', u'g2.bin', u'lone.txt', u'sub\\b.txt', u'sym')])
+		self.assertEqual([winerror(error[2]) for error in errors], [ERROR_ACCESS_DENIED] * 5)
+		self.assertIs(errors[0][2], errors[1][2])
+		# The rest of the tree made it.
+		self.assertEqual(hardlinks.identity(u'C:\\d\\c.txt'), hardlinks.identity(u'C:\\d\\a.txt'))
+		self.assertEqual(hardlinks.read(u'C:\\d\\a.txt'), 2)
+		self.assertEqual(self.data(u'C:\\d\\in\\f'), b'C:\\s\\in\\f')
+		for fpath in (u'C:\\d\\lone.txt', u'C:\\d\\g1.bin', u'C:\\d\\g2.bin', u'C:\\d\\sym'):
+			self.assertFalse(PathExists(fpath))
+		# Problems with src and dst themselves are raised straight away instead.
+		self.assertRaises(InvalidSourceException, copytree, u'C:\\s', u'C:\\s\\in\\copy')
+		self.assertRaises(InvalidSourceException, copytree, u'C:\\nope', u'C:\\e')
+		self.assertRaises(OSError, copytree, u'C:\\s', u'C:\\d')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,137 @@
+# encoding: utf-8
+"""
+test_dedupe.py
+Tests for hardlinks.dedupe, against a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink import hardlinks
+from ntfslink.internals import SimulatedBackend
+from tests import SimulatedBackendTestCase
+
+class DedupeTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		return SimulatedBackend(drives = ('C:', 'D:'))
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.max_links = hardlinks.DEDUPE_MAX_LINKS
+		for dirpath in (u'C:\\r', u'C:\\r\\a', u'C:\\outside', u'D:\\r'):
+			self.backend.CreateDirectory(dirpath)
+
+	def tearDown(self):
+		hardlinks.DEDUPE_MAX_LINKS = self.max_links
+
+	def write(self, fpath, data):
+		with self.backend.open(fpath, 'wb') as f:
+			f.write(data)
+
+	def links(self, fpath):
+		return hardlinks.read(fpath)
+
+	def same(self, *paths):
+		return len(set(hardlinks.identity(fpath) for fpath in paths)) == 1
+
+	def test_links_duplicates(self):
+		big = b'x' * (hardlinks.DEDUPE_PARTIAL_SIZE * 3)
+		self.write(u'C:\\r\\1', b'hello')
+		self.write(u'C:\\r\\a\\1', b'hello')
+		self.write(u'C:\\r\\2', b'hellp')
+		self.write(u'C:\\r\\big1', big)
+		self.write(u'C:\\r\\big2', big)
+		# Same start, different end: only the full hash tells them apart.
+		self.write(u'C:\\r\\big3', big[:-1] + b'y')
+		self.write(u'C:\\r\\empty1', b'')
+		self.write(u'C:\\r\\empty2', b'')
+		self.write(u'D:\\r\\1', b'hello')
+
+		dry = sorted(hardlinks.dedupe([u'C:\\r', u'D:\\r'], dry_run = True))
+		self.assertEqual(self.links(u'C:\\r\\1'), 1)
+		results = sorted(hardlinks.dedupe([u'C:\\r', u'D:\\r']))
+		self.assertEqual(dry, results)
+		self.assertEqual([(r.path, r.original, r.freed, r.ok) for r in results], [
+			(u'C:\\r\\a\\1', u'C:\\r\\1', 5, True),
+			(u'C:\\r\\big2', u'C:\\r\\big1', len(big), True),
+		])
+		self.assertTrue(self.same(u'C:\\r\\1', u'C:\\r\\a\\1'))
+		self.assertFalse(self.same(u'C:\\r\\big1', u'C:\\r\\big3'))
+		self.assertEqual(self.links(u'D:\\r\\1'), 1)
+		self.assertEqual(self.links(u'C:\\r\\empty1'), 1)
+		# No temporary links left behind, and nothing left to do.
+		self.assertEqual(sorted(name for name, _, _ in self.backend.FindFiles(u'C:\\r')),
+			['1', '2', 'a', 'big1', 'big2', 'big3', 'empty1', 'empty2'])
+		self.assertEqual(list(hardlinks.dedupe(u'C:\\r')), [])
+
+	def test_skips_existing_links(self):
+		self.write(u'C:\\r\\1', b'same')
+		self.backend.CreateHardLink(u'C:\\r\\a\\1', u'C:\\r\\1')
+		self.assertEqual(list(hardlinks.dedupe(u'C:\\r')), [])
+		self.write(u'C:\\r\\2', b'same')
+		results = list(hardlinks.dedupe(u'C:\\r'))
+		self.assertEqual([(r.path, r.original) for r in results], [(u'C:\\r\\2', u'C:\\r\\1')])
+		self.assertEqual(self.links(u'C:\\r\\1'), 3)
+
+	def test_link_limit(self):
+		hardlinks.DEDUPE_MAX_LINKS = 3
+		for i in range(7):
+			self.write(u'C:\\r\\f%d' % i, b'same')
+		results = list(hardlinks.dedupe(u'C:\\r'))
+		self.assertEqual(len(results), 4)
+		self.assertEqual(sorted(self.links(u'C:\\r\\f%d' % i) for i in range(7)), [1, 3, 3, 3, 3, 3, 3])
+
+	def test_rollover_inside_an_inode(self):
+		hardlinks.DEDUPE_MAX_LINKS = 5
+		# A: one path under the root and three more outside of it, for 4 links. B: three paths. C: one.
+		self.write(u'C:\\r\\a\\a', b'same')
+		for i in range(3):
+			self.backend.CreateHardLink(u'C:\\outside\\a%d' % i, u'C:\\r\\a\\a')
+		self.write(u'C:\\r\\b1', b'same')
+		self.backend.CreateHardLink(u'C:\\r\\b2', u'C:\\r\\b1')
+		self.backend.CreateHardLink(u'C:\\r\\b3', u'C:\\r\\b1')
+		self.write(u'C:\\r\\c', b'same')
+
+		expected = [
+			(u'C:\\r\\b1', u'C:\\r\\a\\a', 0),
+			# A is full after b1, so what's left of B takes over, through b2 rather than b1.
+			(u'C:\\r\\c', u'C:\\r\\b2', 4),
+		]
+		dry = list(hardlinks.dedupe(u'C:\\r', dry_run = True))
+		self.assertEqual([(r.path, r.original, r.freed) for r in dry], expected)
+		results = list(hardlinks.dedupe(u'C:\\r'))
+		self.assertEqual([(r.path, r.original, r.freed) for r in results], expected)
+		self.assertTrue(all(r.ok for r in results))
+
+		self.assertTrue(self.same(u'C:\\r\\a\\a', u'C:\\r\\b1'))
+		self.assertTrue(self.same(u'C:\\r\\b2', u'C:\\r\\b3', u'C:\\r\\c'))
+		self.assertEqual(self.links(u'C:\\r\\a\\a'), 5)
+		self.assertEqual(self.links(u'C:\\r\\b2'), 3)
+
+	def test_only_shared_sizes_are_kept(self):
+		created = []
+		original = hardlinks._Inode
+		class CountedInode(original):
+			__slots__ = ()
+			def __init__(self, key, index, links, fpath):
+				created.append(fpath)
+				original.__init__(self, key, index, links, fpath)
+		hardlinks._Inode = CountedInode
+		try:
+			for i in range(1, 50):
+				self.write(u'C:\\r\\u%d' % i, b'u' * i)
+			self.write(u'C:\\r\\a\\u5', b'v' * 5)
+			self.write(u'D:\\r\\u7', b'u' * 7)
+			results = list(hardlinks.dedupe([u'C:\\r', u'D:\\r']))
+		finally:
+			hardlinks._Inode = original
+		# Files whose size nothing else on their volume shares are counted, and then forgotten.
+		self.assertEqual(sorted(created), [u'C:\\r\\a\\u5', u'C:\\r\\u5'])
+		self.assertEqual(results, [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,117 @@
+# encoding: utf-8
+"""
+test_image.py
+Tests for NtfsImage, against fixtures/links.img.gz. (See fixtures/make_links_image.py for what's in it.)
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import os, gzip, shutil, tempfile, unittest
+from ntfslink import image
+from ntfslink.internals._winioctl import *
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'links.img.gz')
+
+def reference(number, sequence = 1):
+	return number | (sequence << 48)
+
+class ImageTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.directory = tempfile.mkdtemp()
+		cls.filepath = os.path.join(cls.directory, 'links.img')
+		with gzip.open(FIXTURE, 'rb') as src:
+			with open(cls.filepath, 'wb') as dst:
+				shutil.copyfileobj(src, dst)
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.directory)
+
+	def setUp(self):
+		self.image = image.NtfsImage(self.filepath)
+
+	def tearDown(self):
+		self.image.close()
+
+	def test_reparse_points(self):
+		self.assertEqual(list(self.image.reparse_points()), [
+			(u'\\Users\\Public\\junction', IO_REPARSE_TAG_MOUNT_POINT, u'C:\\Target', reference(18)),
+			(u'\\Users\\symlink', IO_REPARSE_TAG_SYMBOLIC_LINK, u'..\\x', reference(19)),
+			# Its parent reference is for an older directory that used to be record 17, which is long gone.
+			(u'\\$Orphan\\stale', IO_REPARSE_TAG_SYMBOLIC_LINK, u'y', reference(21)),
+			(u'\\$Orphan\\orphan', IO_REPARSE_TAG_MOUNT_POINT, u'D:\\x', reference(22)),
+			(u'\\Users\\Public\\late', IO_REPARSE_TAG_SYMBOLIC_LINK, u'z', reference(31)),
+		])
+		self.assertEqual([entry.path for entry in self.image.reparse_points(tags = [IO_REPARSE_TAG_MOUNT_POINT])],
+			[u'\\Users\\Public\\junction', u'\\$Orphan\\orphan'])
+
+	def test_parallel_reparse_points(self):
+		serial = list(self.image.reparse_points())
+		for chunk_records in (1, 4, 16, image.PARALLEL_CHUNK_RECORDS):
+			self.assertEqual(list(self.image.parallel_reparse_points(1, chunk_records)), serial)
+		self.assertEqual(list(self.image.parallel_reparse_points(2, 8)), serial)
+		self.assertEqual(
+			list(self.image.parallel_reparse_points(1, 8, tags = [IO_REPARSE_TAG_SYMBOLIC_LINK])),
+			list(self.image.reparse_points(tags = [IO_REPARSE_TAG_SYMBOLIC_LINK]))
+		)
+
+	def test_reparse_index(self):
+		self.assertEqual(self.image.lookup(self.image.record(image.MFT_RECORD_EXTEND), u'$REPARSE'), reference(23))
+		self.assertEqual(self.image.lookup(self.image.record(image.MFT_RECORD_EXTEND), u'$Nothing'), None)
+		# Sorted, from the root and both blocks in use, stale entries and all. Block 2's entry for record 24 isn't.
+		self.assertEqual([(key.tag, key.file_reference) for key in self.image.reparse_index()], [
+			(IO_REPARSE_TAG_MOUNT_POINT, reference(18)), (IO_REPARSE_TAG_MOUNT_POINT, reference(22)),
+			(IO_REPARSE_TAG_SYMBOLIC_LINK, reference(19)), (IO_REPARSE_TAG_SYMBOLIC_LINK, reference(21)),
+			(IO_REPARSE_TAG_SYMBOLIC_LINK, reference(30)), (IO_REPARSE_TAG_SYMBOLIC_LINK, reference(31)),
+			(IO_REPARSE_TAG_SYMBOLIC_LINK, reference(20, 3)),
+		])
+
+	def test_indexed_reparse_points(self):
+		for tags in (None, [IO_REPARSE_TAG_MOUNT_POINT], [IO_REPARSE_TAG_SYMBOLIC_LINK], [0x80000013]):
+			expected = sorted(self.image.reparse_points(tags = tags), key = lambda e: (e.tag, e.file_reference))
+			self.assertEqual(list(self.image.indexed_reparse_points(tags = tags)), expected)
+		self.assertEqual(len(list(self.image.indexed_reparse_points())), 5)
+
+	def test_usn_journal(self):
+		def summary(journal):
+			return [(record.usn, record.reason, record.file_reference, record.name) for record in journal]
+		self.assertEqual(self.image.lookup(self.image.record(image.MFT_RECORD_EXTEND), u'$UsnJrnl'), reference(24))
+		# The first page is sparse, so the records start at 4096, and the last two didn't fit before the second.
+		everything = summary(self.image.usn_journal(reasons = None))
+		self.assertEqual([entry[0] for entry in everything], [4096 + i * 544 for i in range(7)] + [7904, 7984, 8064,
+			8192, 8280])
+		journal = self.image.usn_journal()
+		self.assertEqual(summary(journal), [
+			(7904, USN_REASON_FILE_CREATE, reference(18), u'junction'),
+			(7984, USN_REASON_REPARSE_POINT_CHANGE | USN_REASON_CLOSE, reference(18), u'junction'),
+			(8192, USN_REASON_HARD_LINK_CHANGE | USN_REASON_CLOSE, reference(20), u'b.txt'),
+			(8280, USN_REASON_FILE_DELETE | USN_REASON_CLOSE, reference(25), u'gone'),
+		])
+		self.assertEqual(journal.next_usn, 8368)
+		self.assertEqual(list(self.image.usn_journal(journal.next_usn)), [])
+		for start_usn in (7904, 7984, 8064, 8192, 8280):
+			self.assertEqual(summary(self.image.usn_journal(start_usn, None, chunk_size = 100)),
+				[entry for entry in everything if entry[0] >= start_usn])
+
+	def test_hard_links(self):
+		self.assertEqual(list(self.image.hard_links()), [
+			(reference(20), 2, [u'\\Users\\a.txt', u'\\Users\\Public\\b.txt']),
+		])
+
+	def test_resolve_checks_cached_sequence(self):
+		directories = {16: (1, reference(5), u'Users'), 17: (1, reference(16), u'Public')}
+		for warm in (False, True):
+			cache = {}
+			if warm:
+				self.assertEqual(image.ResolveDirectoryPath(reference(17), directories.get, cache), u'\\Users\\Public')
+			self.assertEqual(image.ResolveDirectoryPath(reference(17, 7), directories.get, cache), image.ORPHAN_ROOT)
+			# Sequence number 0 means the reference doesn't say, and matches anything.
+			self.assertEqual(image.ResolveDirectoryPath(17, directories.get, cache), u'\\Users\\Public')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,116 @@
+# encoding: utf-8
+"""
+test_mft.py
+Tests for FileRecord and ApplyFixup, against FILE records put together by hand.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import struct, unittest
+from ntfslink.internals import *
+
+RECORD_SIZE = 1024
+USA_OFFSET = 48
+USA_COUNT = RECORD_SIZE // 512 + 1
+SEQUENCE_NUMBER = b'\x34\x12'
+
+def file_record(name, number = 42):
+	"""
+	An in-use FILE record with just a $FILE_NAME, for a name long enough to run across the end of the first sector,
+	with its update sequence array filled in the way it is on disk.
+	"""
+	encoded = name.encode('utf-16-le')
+	value = struct.pack('<QQQQQQQLLBB', 5 | (1 << 48), 1, 2, 3, 4, 0, 0, 0x20, 0, len(name), FILE_NAME_WIN32) + encoded
+	length = (24 + len(value) + 7) & ~7
+	attr = bytearray(length)
+	struct.pack_into('<LLBBHHHLH', attr, 0, ATTRIBUTE_FILE_NAME, length, 0, 0, 0, 0, 0, len(value), 24)
+	attr[24:24 + len(value)] = value
+	record = bytearray(RECORD_SIZE)
+	record[56:56 + length] = attr
+	struct.pack_into('<L', record, 56 + length, ATTRIBUTE_END)
+	struct.pack_into('<4sHHQHHHHLLQHHL', record, 0, b'FILE', USA_OFFSET, USA_COUNT, 0, 1, 1, 56, FILE_RECORD_IN_USE,
+		56 + length + 8, RECORD_SIZE, 0, 0, 0, number)
+	raw = bytes(record)
+	record[USA_OFFSET:USA_OFFSET + 2] = SEQUENCE_NUMBER
+	for i in range(1, USA_COUNT):
+		end = i * 512 - 2
+		record[USA_OFFSET + 2 * i:USA_OFFSET + 2 * i + 2] = record[end:end + 2]
+		record[end:end + 2] = SEQUENCE_NUMBER
+	return raw, bytes(record)
+
+class FileRecordTest(unittest.TestCase):
+
+	def setUp(self):
+		self.name = u''.join(chr(ord('a') + i % 26) for i in range(250))
+		self.raw, self.disk = file_record(self.name)
+		# Sector ends that hold part of the name, and so had something other than zeros to save.
+		self.assertNotEqual(self.raw[510:512], b'\0\0')
+
+	def names(self, record):
+		return [fname.name for fname in record.file_names()]
+
+	def test_fixup(self):
+		buf = bytearray(self.disk)
+		record = FileRecord(buf)
+		self.assertEqual((record.record_number, record.in_use, self.names(record)), (42, True, [self.name]))
+		# Fixed up in place, and only the record's sector ends were touched.
+		self.assertEqual(buf[:USA_OFFSET], bytearray(self.raw[:USA_OFFSET]))
+		self.assertEqual(buf[USA_OFFSET + 2 * USA_COUNT:], bytearray(self.raw[USA_OFFSET + 2 * USA_COUNT:]))
+
+	def test_read_only_buffers_are_copied(self):
+		record = FileRecord(self.disk)
+		self.assertEqual(self.names(record), [self.name])
+		self.assertEqual(record.view[510:512].tobytes(), self.raw[510:512])
+		view = memoryview(self.disk)
+		self.assertEqual(self.names(FileRecord(view)), [self.name])
+		self.assertEqual(view[510:512].tobytes(), SEQUENCE_NUMBER)
+
+	def test_offset(self):
+		# The second of two records in a buffer, like a cluster of the MFT.
+		_, other = file_record(u'other', 41)
+		buf = bytearray(other + self.disk)
+		record = FileRecord(buf, RECORD_SIZE)
+		self.assertEqual((record.record_number, self.names(record)), (42, [self.name]))
+		self.assertEqual(buf[:RECORD_SIZE], bytearray(other))
+
+	def test_torn(self):
+		# A sector that was written after (or before) the rest of the record has the wrong sequence number at its end.
+		for end in (510, 1022):
+			buf = bytearray(self.disk)
+			buf[end:end + 2] = b'\x35\x12'
+			try:
+				FileRecord(buf)
+			except InvalidFileRecordException as e:
+				self.assertIn('sector %d' % (end // 512), str(e))
+			else:
+				self.fail('a torn record was read')
+			self.assertRaises(InvalidFileRecordException, ApplyFixup, memoryview(bytearray(self.disk[:end]) +
+				b'\0\0' + bytearray(self.disk[end + 2:])))
+
+	def test_bad_update_sequence_array(self):
+		buf = bytearray(self.disk)
+		struct.pack_into('<H', buf, 6, USA_COUNT + 1)
+		self.assertRaises(InvalidFileRecordException, FileRecord, buf)
+		struct.pack_into('<HH', buf, 4, RECORD_SIZE - 2, USA_COUNT)
+		self.assertRaises(InvalidFileRecordException, FileRecord, buf)
+		# With fixup off, it's taken as it is.
+		record = FileRecord(bytearray(self.disk), fixup = False)
+		self.assertEqual(record.view[510:512].tobytes(), SEQUENCE_NUMBER)
+		# A record without an update sequence array doesn't need fixing up.
+		buf = bytearray(self.raw)
+		struct.pack_into('<H', buf, 6, 0)
+		ApplyFixup(memoryview(buf))
+		self.assertEqual(bytes(buf[8:]), self.raw[8:])
+
+	def test_bad_header(self):
+		buf = bytearray(self.disk)
+		buf[:4] = b'BAAD'
+		self.assertRaises(InvalidFileRecordException, FileRecord, buf)
+		self.assertRaises(InvalidFileRecordException, FileRecord, self.disk[:RECORD_SIZE - 1])
+		self.assertRaises(InvalidFileRecordException, FileRecord, self.disk[:40])
+
+if __name__ == '__main__':
+	unittest.main()
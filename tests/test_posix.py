@@ -0,0 +1,136 @@
+# encoding: utf-8
+"""
+test_posix.py
+Tests for PosixBackend: creating, reading and removing links for real, in a temporary directory.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import os, shutil, tempfile, unittest
+from ntfslink import junctions, symlinks, hardlinks, LinkSession
+from ntfslink.common import delete_reparse_point, InvalidLinkException, InvalidSourceException
+from ntfslink.internals import *
+from tests import SimulatedBackendTestCase
+
+class CheckedPosixBackend(PosixBackend):
+	""" Keeps the paths that RemoveDirectory and DeleteFile failed on. """
+
+	def __init__(self):
+		PosixBackend.__init__(self)
+		self.failed = []
+
+	def RemoveDirectory(self, pathname):
+		result = PosixBackend.RemoveDirectory(self, pathname)
+		if not result: self.failed.append(pathname)
+		return result
+
+	def DeleteFile(self, filename):
+		result = PosixBackend.DeleteFile(self, filename)
+		if not result: self.failed.append(filename)
+		return result
+
+@unittest.skipIf(os.name == 'nt', 'PosixBackend is for POSIX systems')
+class PosixBackendTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		return CheckedPosixBackend()
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.directory = os.path.realpath(tempfile.mkdtemp())
+		self.addCleanup(shutil.rmtree, self.directory)
+		os.mkdir(self.path('src'))
+		os.mkdir(self.path('sub'))
+		with open(self.path('src', 'a.txt'), 'w') as f:
+			f.write('hi')
+
+	def tearDown(self):
+		# Removing a link takes its reparse point off and then removes what's left, which has to still be there.
+		self.assertEqual(self.backend.failed, [])
+
+	def path(self, *parts):
+		return os.path.join(self.directory, *parts)
+
+	def test_junctions(self):
+		linkpath = self.path('jn')
+		self.assertTrue(junctions.create(self.path('src'), linkpath))
+		self.assertTrue(junctions.check(linkpath))
+		self.assertEqual(junctions.read(linkpath), self.path('src'))
+		self.assertEqual(os.readlink(linkpath), self.path('src'))
+		self.assertEqual(os.listdir(linkpath), ['a.txt'])
+		self.assertRaises(InvalidSourceException, junctions.create, self.path('src'), linkpath)
+		self.assertEqual(junctions.unlink(linkpath), (True, 0))
+		self.assertFalse(os.path.lexists(linkpath))
+		self.assertEqual(os.listdir(self.path('src')), ['a.txt'])
+
+	def test_symlinks(self):
+		# Absolute and relative, to a directory and to a file: read gives back what was created.
+		links = [
+			(self.path('src'), self.path('sd'), True),
+			(os.path.join('src', 'a.txt'), self.path('sf'), False),
+			(os.path.join('..', 'src'), self.path('sub', 'up'), True),
+		]
+		for srcpath, linkpath, isdir in links:
+			self.assertTrue(symlinks.create(srcpath, linkpath))
+			self.assertTrue(symlinks.check(linkpath))
+			self.assertEqual(symlinks.read(linkpath), srcpath)
+			self.assertEqual(IsFolder(linkpath), isdir)
+		with open(self.path('sf')) as f:
+			self.assertEqual(f.read(), 'hi')
+		self.assertEqual(os.listdir(self.path('sub', 'up')), ['a.txt'])
+		for srcpath, linkpath, isdir in links:
+			self.assertEqual(symlinks.unlink(linkpath), (True, 0))
+			self.assertFalse(PathExists(linkpath))
+		self.assertEqual(sorted(os.listdir(self.directory)), ['src', 'sub'])
+		self.assertEqual(os.listdir(self.path('src')), ['a.txt'])
+
+	def test_session(self):
+		linkpaths = [self.path('sub', 'j%d' % i) for i in range(3)]
+		for linkpath in linkpaths:
+			junctions.create(self.path('src'), linkpath)
+		with LinkSession() as session:
+			for linkpath in linkpaths:
+				self.assertTrue(junctions.check(linkpath, session))
+				self.assertEqual(junctions.read(linkpath, session), self.path('src'))
+				self.assertEqual(junctions.unlink(linkpath, session), (True, 0))
+		self.assertEqual(os.listdir(self.path('sub')), [])
+
+	def test_placeholder(self):
+		# Like NTFS, taking the reparse point off a link leaves an empty directory or file, depending on the target.
+		junctions.create(self.path('src'), self.path('jn'))
+		symlinks.create(os.path.join('src', 'a.txt'), self.path('sf'))
+		self.assertEqual(delete_reparse_point(self.path('jn'), IO_REPARSE_TAG_MOUNT_POINT, junctions.check), (True, 0))
+		self.assertEqual(delete_reparse_point(self.path('sf'), IO_REPARSE_TAG_SYMBOLIC_LINK, symlinks.check), (True, 0))
+		self.assertFalse(os.path.islink(self.path('jn')))
+		self.assertEqual(os.listdir(self.path('jn')), [])
+		self.assertFalse(os.path.islink(self.path('sf')))
+		self.assertEqual(os.path.getsize(self.path('sf')), 0)
+		self.assertEqual(os.listdir(self.path('src')), ['a.txt'])
+
+	def test_hardlinks(self):
+		srcpath, linkpath = self.path('src', 'a.txt'), self.path('hl')
+		self.assertFalse(hardlinks.check(srcpath))
+		self.assertTrue(hardlinks.create(srcpath, linkpath))
+		self.assertTrue(hardlinks.check(linkpath))
+		self.assertEqual(hardlinks.read(linkpath), 2)
+		st = os.stat(linkpath)
+		self.assertEqual(hardlinks.identity(linkpath), (st.st_dev & 0xFFFFFFFF, st.st_ino))
+		self.assertEqual(hardlinks.identity(srcpath), hardlinks.identity(linkpath))
+		self.assertEqual(hardlinks.unlink(linkpath), (True, 0))
+		self.assertFalse(os.path.lexists(linkpath))
+		self.assertEqual(hardlinks.read(srcpath), 1)
+		self.assertRaises(InvalidSourceException, hardlinks.create, self.path('nothere'), linkpath)
+
+	def test_not_links(self):
+		self.assertFalse(junctions.check(self.path('src')))
+		self.assertFalse(symlinks.check(self.path('src', 'a.txt')))
+		self.assertRaises(InvalidLinkException, junctions.read, self.path('src'))
+		self.assertRaises(InvalidLinkException, symlinks.unlink, self.path('src', 'a.txt'))
+		self.assertRaises(InvalidLinkException, hardlinks.read, self.path('src'))
+		self.assertEqual(sorted(os.listdir(self.directory)), ['src', 'sub'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,138 @@
+# encoding: utf-8
+"""
+test_privileges.py
+Tests for the privilege cache: ObtainPrivilege pinning, privileges() reference counting, and the LUID lookups made by
+Win32Backend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink.internals import *
+from ntfslink.internals import _backend
+from tests import SimulatedBackendTestCase
+
+class PrivilegeCacheTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		self.latency = LatencyModel(sleep = None)
+		return SimulatedBackend(latency = self.latency)
+
+	def calls(self, name):
+		return self.latency.counts.get(name, 0)
+
+	def test_obtain_is_pinned(self):
+		self.backend.CreateDirectory(u'C:\\d')
+		for i in range(5):
+			self.backend.CloseHandle(OpenFileForRead(u'C:\\d', backup = True))
+		ObtainPrivilege(SE_BACKUP_NAME)
+		self.assertEqual(self.calls('ObtainPrivilege'), 1)
+		# A block doesn't take away a privilege that was already enabled for good.
+		with privileges(SE_BACKUP_NAME):
+			pass
+		self.assertEqual(self.backend.privileges, set([SE_BACKUP_NAME]))
+		self.assertEqual(self.calls('ReleasePrivilege'), 0)
+
+	def test_nested_blocks(self):
+		with privileges():
+			with privileges(SE_RESTORE_NAME, SE_CREATE_SYMBOLIC_LINK_NAME):
+				self.assertEqual(self.backend.privileges,
+					set([SE_BACKUP_NAME, SE_RESTORE_NAME, SE_CREATE_SYMBOLIC_LINK_NAME]))
+			# Only the one nothing else is using gets released.
+			self.assertEqual(self.backend.privileges, set([SE_BACKUP_NAME, SE_RESTORE_NAME]))
+			self.assertEqual(self.calls('ReleasePrivilege'), 1)
+		self.assertEqual(self.backend.privileges, set())
+		self.assertEqual(self.calls('ObtainPrivilege'), 3)
+		self.assertEqual(self.calls('ReleasePrivilege'), 3)
+
+	def test_pinned_inside_block(self):
+		with privileges(SE_RESTORE_NAME):
+			ObtainRestorePrivilege(readwrite = True)
+		self.assertEqual(self.backend.privileges, set([SE_RESTORE_NAME]))
+		self.assertEqual(self.calls('ObtainPrivilege'), 1)
+		self.assertEqual(self.calls('ReleasePrivilege'), 0)
+
+	def test_failure(self):
+		SetBackend(SimulatedBackend(latency = self.latency, held_privileges = set([SE_BACKUP_NAME])))
+		backend = GetBackend()
+		# SE_BACKUP_NAME gets enabled first, and has to be released again when SE_RESTORE_NAME can't be.
+		self.assertRaises(Exception, privileges().__enter__)
+		self.assertEqual(backend.privileges, set())
+		with privileges(SE_BACKUP_NAME):
+			self.assertEqual(backend.privileges, set([SE_BACKUP_NAME]))
+		self.assertRaises(Exception, ObtainRestorePrivilege, True)
+		self.assertEqual(backend.privileges, set())
+
+	def test_backend_swap(self):
+		ObtainPrivilege(SE_BACKUP_NAME)
+		other = SimulatedBackend(latency = self.latency)
+		SetBackend(other)
+		# The new backend's token hasn't had anything enabled yet.
+		ObtainPrivilege(SE_BACKUP_NAME)
+		self.assertEqual(other.privileges, set([SE_BACKUP_NAME]))
+		self.assertEqual(self.calls('ObtainPrivilege'), 2)
+
+class FakeAdvApi32(object):
+	""" Just enough of advapi32 for Win32Backend to adjust privileges with. """
+
+	def __init__(self):
+		self.lookups = []
+		self.adjusted = []
+
+	def OpenProcessToken(self, process, access, token):
+		return 1
+
+	def LookupPrivilegeValue(self, system, name, luid):
+		self.lookups.append(name)
+		luid._obj.LowPart = len(self.lookups)
+		return 1
+
+	def AdjustTokenPrivileges(self, token, disable, privileges, size, previous, length):
+		privilege = privileges._obj.Privileges[0]
+		self.adjusted.append((privilege.Luid.LowPart, privilege.Attributes))
+		return 1
+
+class FakeKernel32(object):
+
+	def GetCurrentProcess(self):
+		return -1
+
+class LuidLookupTest(unittest.TestCase):
+
+	def setUp(self):
+		# (GetLastError only comes with ctypes on Windows.)
+		self.saved = _backend.advapi32, _backend.kernel32, getattr(_backend, 'GetLastError', None)
+		_backend.advapi32 = self.advapi32 = FakeAdvApi32()
+		_backend.kernel32 = FakeKernel32()
+		_backend.GetLastError = lambda: 0
+		self.previous = SetBackend(Win32Backend())
+
+	def tearDown(self):
+		SetBackend(self.previous)
+		_backend.advapi32, _backend.kernel32, _backend.GetLastError = self.saved
+		if _backend.GetLastError is None:
+			del _backend.GetLastError
+
+	def test_lookups(self):
+		for i in range(3):
+			with privileges():
+				pass
+		ObtainPrivilege(SE_CREATE_SYMBOLIC_LINK_NAME)
+		ObtainPrivilege(SE_CREATE_SYMBOLIC_LINK_NAME)
+		self.assertEqual(self.advapi32.lookups, [SE_BACKUP_NAME, SE_RESTORE_NAME, SE_CREATE_SYMBOLIC_LINK_NAME])
+		# Enabled and disabled again for each block, but always through the same LUIDs.
+		self.assertEqual(self.advapi32.adjusted,
+			[(1, SE_PRIVILEGE_ENABLED), (2, SE_PRIVILEGE_ENABLED), (1, 0), (2, 0)] * 3 + [(3, SE_PRIVILEGE_ENABLED)])
+
+	def test_not_held(self):
+		_backend.GetLastError = lambda: ERROR_NOT_ALL_ASSIGNED
+		self.assertRaises(Exception, ObtainPrivilege, SE_BACKUP_NAME)
+		_backend.GetLastError = lambda: 0
+		ObtainPrivilege(SE_BACKUP_NAME)
+		self.assertEqual(self.advapi32.lookups, [SE_BACKUP_NAME])
+
+if __name__ == '__main__':
+	unittest.main()
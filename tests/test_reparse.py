@@ -0,0 +1,246 @@
+# encoding: utf-8
+"""
+test_reparse.py
+Tests for decoding and encoding reparse buffers, and for reading reparse points through common: the pooled read
+buffer, and what's decoded from it.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import struct, threading, unittest
+from ntfslink import scan, LinkSession
+from ntfslink.common import deviceioctl, read_reparse_point, readinto, get_buffer, reparse_pool, InvalidLinkException
+from ntfslink.internals import *
+from ntfslink.internals import _reparse
+from tests import SimulatedBackendTestCase
+
+# Names with characters outside the BMP, which take two UTF-16 code units.
+WIDE = u'C:\\\U0001f517\\x'
+
+def dedup_buffer(data):
+	""" A reparse buffer for IO_REPARSE_TAG_DEDUP, which has no decoder, holding data. """
+	return struct.pack('<LHH', IO_REPARSE_TAG_DEDUP, len(data), 0) + data
+
+def winerror(e):
+	""" The Windows error code of a WinError, which only ctypes' version keeps in winerror. """
+	return getattr(e, 'winerror', None) or e.errno
+
+def mount_point(substitute_name, print_name):
+	""" A mount point buffer, put together by hand: SubstituteName\0PrintName\0. """
+	subst, prnt = substitute_name.encode('utf-16-le'), print_name.encode('utf-16-le')
+	names = subst + b'\0\0' + prnt + b'\0\0'
+	return struct.pack('<LHHHHHH', IO_REPARSE_TAG_MOUNT_POINT, 8 + len(names), 0, 0, len(subst), len(subst) + 2,
+		len(prnt)) + names
+
+def symbolic_link(substitute_name, print_name, flags):
+	""" A symbolic link buffer, put together by hand, with the PrintName first like CreateSymbolicLink does it. """
+	subst, prnt = substitute_name.encode('utf-16-le'), print_name.encode('utf-16-le')
+	return struct.pack('<LHHHHHHL', IO_REPARSE_TAG_SYMBOLIC_LINK, 12 + len(prnt) + len(subst), 0, len(prnt),
+		len(subst), 0, len(prnt), flags) + prnt + subst
+
+class SpeedupsTestCase(unittest.TestCase):
+	""" Runs with the C accelerator when it's built, and without it when speedups is unset. """
+	speedups = True
+
+	def setUp(self):
+		_reparse.UseSpeedups(self.speedups)
+		self.addCleanup(_reparse.UseSpeedups, True)
+
+class DecodeTest(SpeedupsTestCase):
+
+	def test_both_names(self):
+		self.assertEqual(DecodeReparseBuffer(mount_point(u'\\??\\C:\\Target', u'C:\\Target')),
+			ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, u'\\??\\C:\\Target', u'C:\\Target'))
+		self.assertEqual(DecodeReparseBuffer(symbolic_link(u'..\\x', u'..\\y', SYMBOLIC_LINK_FLAG_RELATIVE)),
+			ReparseData(IO_REPARSE_TAG_SYMBOLIC_LINK, SYMBOLIC_LINK_FLAG_RELATIVE, u'..\\x', u'..\\y'))
+		self.assertEqual(DecodeReparseBuffer(symbolic_link(u'\\??\\' + WIDE, WIDE, 0)),
+			ReparseData(IO_REPARSE_TAG_SYMBOLIC_LINK, 0, u'\\??\\' + WIDE, WIDE))
+		self.assertEqual(DecodeReparseBuffer(mount_point(u'', u'')),
+			ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, u'', u''))
+
+	def test_offset_and_buffer_types(self):
+		buf = b'\xff' * 12 + mount_point(WIDE, u'') + b'\xff' * 5
+		for wrap in (bytes, bytearray, memoryview):
+			self.assertEqual(DecodeReparseBuffer(wrap(buf), 12), ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, WIDE, u''))
+
+	def test_truncated(self):
+		for buf in (mount_point(u'\\??\\C:\\x', u'C:\\x'), symbolic_link(u'x', u'y', 0)):
+			for end in range(len(buf)):
+				self.assertRaises(InvalidReparseBufferException, DecodeReparseBuffer, buf[:end])
+
+	def test_names_stay_inside_the_data(self):
+		# The PrintName claims two more bytes than ReparseDataLength covers. That they're there after it doesn't help.
+		buf = bytearray(symbolic_link(u'x', u'y', 0) + b'z\0')
+		struct.pack_into('<HH', buf, 12, 2, 4)
+		self.assertRaises(InvalidReparseBufferException, DecodeReparseBuffer, buf)
+
+	def test_other_tags(self):
+		buf = dedup_buffer(b'data')
+		self.assertRaises(InvalidReparseBufferException, DecodeReparseBuffer, buf)
+		self.assertEqual(DecodeReparsePoint(buf).tag, IO_REPARSE_TAG_DEDUP)
+
+class PythonDecodeTest(DecodeTest):
+	speedups = False
+
+class EncodeTest(SpeedupsTestCase):
+	# (SubstituteName, PrintName) pairs.
+	NAMES = [(u'\\??\\C:\\Target', u'C:\\Target'), (u'', u''), (u'\\??\\' + WIDE, WIDE), (u'x' * 300, u'')]
+
+	def test_exact_size(self):
+		for substitute_name, print_name in self.NAMES:
+			for buf, expected in (
+				(EncodeMountPoint(substitute_name, print_name), mount_point(substitute_name, print_name)),
+				(EncodeSymbolicLink(substitute_name, print_name, 1), symbolic_link(substitute_name, print_name, 1)),
+			):
+				self.assertIsInstance(buf, bytearray)
+				self.assertEqual(bytes(buf), expected)
+				self.assertEqual(struct.unpack_from('<H', buf, 4)[0], len(buf) - REPARSE_POINT_HEADER_SIZE)
+
+	def test_round_trip(self):
+		for substitute_name, print_name in self.NAMES:
+			for record in (ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, substitute_name, print_name),
+			               ReparseData(IO_REPARSE_TAG_SYMBOLIC_LINK, SYMBOLIC_LINK_FLAG_RELATIVE, substitute_name,
+			                           print_name)):
+				self.assertEqual(DecodeReparseBuffer(EncodeReparseBuffer(record)), record)
+				self.assertEqual(DecodeReparsePoint(EncodeReparseBuffer(record)), record)
+
+	def test_largest(self):
+		# Header, name offsets, and a \0 after each name: whatever's left of MAX_REPARSE_BUFFER is for the names.
+		room = (MAX_REPARSE_BUFFER - REPARSE_POINT_HEADER_SIZE - 8 - 4) // 2
+		record = ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, u'x' * (room - 1), u'y')
+		self.assertEqual(len(EncodeReparseBuffer(record)), MAX_REPARSE_BUFFER)
+		self.assertEqual(DecodeReparseBuffer(EncodeReparseBuffer(record)), record)
+		self.assertRaises(InvalidReparseBufferException, EncodeReparseBuffer, record._replace(print_name = u'yy'))
+		self.assertRaises(InvalidReparseBufferException, EncodeReparseBuffer,
+			ReparseData(IO_REPARSE_TAG_DEDUP, 0, u'x', u'y'))
+
+	def test_batch(self):
+		records = [ReparseData(tag, 0, substitute_name, print_name) for substitute_name, print_name in self.NAMES
+			for tag in (IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK)]
+		arena, spans = EncodeReparseBuffers(records)
+		self.assertEqual(len(spans), len(records))
+		for record, (offset, length) in zip(records, spans):
+			self.assertEqual(offset % 8, 0)
+			self.assertEqual(memoryview(arena)[offset:offset + length].tobytes(), bytes(EncodeReparseBuffer(record)))
+		self.assertEqual(EncodeReparseBuffers([]), (bytearray(), []))
+
+class PythonEncodeTest(EncodeTest):
+	speedups = False
+
+class ReparseBufferPoolTest(unittest.TestCase):
+
+	def test_grow(self):
+		pool = ReparseBufferPool()
+		first = pool.buffer
+		self.assertEqual(pool.size, MIN_REPARSE_PROBE)
+		self.assertIs(pool.grow(MIN_REPARSE_PROBE), first)
+		view = memoryview(first)
+		# Powers of two, and a new buffer every time, so views over the old one stay as they were.
+		self.assertEqual(len(pool.grow(MIN_REPARSE_PROBE + 1)), MIN_REPARSE_PROBE * 2)
+		self.assertIsNot(pool.buffer, first)
+		self.assertEqual(len(view), MIN_REPARSE_PROBE)
+		self.assertEqual(len(pool.grow(5000)), 8192)
+		self.assertEqual(len(pool.grow(100)), 8192)
+		self.assertEqual(len(pool.grow(MAX_REPARSE_BUFFER * 4)), MAX_REPARSE_BUFFER)
+		pool.reset()
+		self.assertEqual(pool.size, MIN_REPARSE_PROBE)
+		self.assertEqual(len(ReparseBufferPool(24).grow(25)), 48)
+
+	def test_per_thread(self):
+		pool = ReparseBufferPool()
+		pool.grow(4000)
+		sizes = []
+		thread = threading.Thread(target = lambda: sizes.append((pool.size, len(pool.grow(1000)))))
+		thread.start()
+		thread.join()
+		self.assertEqual(sizes, [(MIN_REPARSE_PROBE, 1024)])
+		self.assertEqual(pool.size, 4096)
+
+class ReadIntoTest(SimulatedBackendTestCase):
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		reparse_pool.reset()
+		self.addCleanup(reparse_pool.reset)
+		self.backend.CreateDirectory(u'C:\\t')
+		self.small = EncodeMountPoint(u'\\??\\C:\\t', u'C:\\t')
+		# Too big for the probe buffer.
+		self.large = EncodeMountPoint(u'\\??\\C:\\' + u'x' * 1000, u'C:\\' + u'x' * 1000)
+		for name, buf in ((u'small', self.small), (u'large', self.large)):
+			self.backend.CreateDirectory(u'C:\\' + name)
+			self.assertTrue(deviceioctl(u'C:\\' + name, FSCTL_SET_REPARSE_POINT, buf, len(buf), None, 0)[0])
+
+	def test_readinto(self):
+		buf = bytearray(MAX_REPARSE_BUFFER)
+		self.assertEqual(readinto(u'C:\\large', buf, IsReparsePoint), len(self.large))
+		self.assertEqual(buf[:len(self.large)], self.large)
+		buf = bytearray(len(self.small))
+		self.assertEqual(readinto(u'C:\\small', buf), len(self.small))
+		self.assertEqual(buf, self.small)
+		self.assertRaises(InvalidLinkException, readinto, u'C:\\t', buf, IsReparsePoint)
+
+	def test_readinto_more_data(self):
+		buf = bytearray(MIN_REPARSE_PROBE)
+		try:
+			readinto(u'C:\\large', buf)
+		except OSError as e:
+			self.assertEqual(winerror(e), ERROR_MORE_DATA)
+		else:
+			self.fail('readinto fit %d bytes into %d' % (len(self.large), len(buf)))
+		# What did fit is there, header and all, which is what says how big a buffer it takes.
+		self.assertEqual(buf, self.large[:len(buf)])
+		self.assertEqual(ReparseHeader(buf)[1], len(self.large) - REPARSE_POINT_HEADER_SIZE)
+		try:
+			readinto(u'C:\\small', bytearray(REPARSE_POINT_HEADER_SIZE - 1))
+		except OSError as e:
+			self.assertEqual(winerror(e), ERROR_INSUFFICIENT_BUFFER)
+		else:
+			self.fail('readinto fit a reparse point into less than its header')
+
+	def test_pool_grows_on_more_data(self):
+		self.assertEqual(get_buffer(u'C:\\small', IsReparsePoint).tobytes(), bytes(self.small))
+		self.assertEqual(reparse_pool.size, MIN_REPARSE_PROBE)
+		view = get_buffer(u'C:\\large', IsReparsePoint)
+		self.assertEqual(view.tobytes(), bytes(self.large))
+		self.assertEqual(reparse_pool.size, 4096)
+		# It stays that big for the rest of the reads on this thread.
+		self.assertEqual(get_buffer(u'C:\\small', IsReparsePoint).tobytes(), bytes(self.small))
+		self.assertEqual(reparse_pool.size, 4096)
+		# Failures other than a buffer that's too small don't grow it.
+		self.assertIsNone(get_buffer(u'C:\\t', None))
+		self.assertEqual(reparse_pool.size, 4096)
+
+class PooledReadTest(SimulatedBackendTestCase):
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.backend.CreateDirectory(u'C:\\r')
+		for name, data in ((u'a', b'AAAA'), (u'b', b'BBBB')):
+			fpath = u'C:\\r\\' + name
+			self.backend.CreateDirectory(fpath)
+			buf = dedup_buffer(data)
+			self.assertTrue(deviceioctl(fpath, FSCTL_SET_REPARSE_POINT, buf, len(buf), None, 0)[0])
+
+	def test_generic_data_outlives_the_next_read(self):
+		entries = list(scan(u'C:\\r'))
+		self.assertEqual(entries[0].reparse.data, b'AAAA')
+		self.assertEqual(entries[1].reparse.data, b'BBBB')
+		self.assertEqual(entries[0].reparse.data, b'AAAA')
+		first = read_reparse_point(u'C:\\r\\a', IsReparsePoint, DecodeReparsePoint)
+		with LinkSession() as session:
+			second = session.read(u'C:\\r\\b', decode = DecodeReparsePoint)
+			read_reparse_point(u'C:\\r\\b', IsReparsePoint, DecodeReparsePoint)
+		self.assertEqual((first.tag, first.data, second.data), (IO_REPARSE_TAG_DEDUP, b'AAAA', b'BBBB'))
+
+	def test_caller_buffers_stay_views(self):
+		buf = bytearray(dedup_buffer(b'CCCC'))
+		reparse = DecodeReparsePoint(buf)
+		self.assertIsInstance(reparse.data, memoryview)
+		buf[-4:] = b'DDDD'
+		self.assertEqual(reparse.data.tobytes(), b'DDDD')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,123 @@
+# encoding: utf-8
+"""
+test_resolver.py
+Tests for Resolver, on a SimulatedBackend that counts the calls made.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink import junctions, symlinks, Resolver
+from ntfslink.resolver import LinkLoopException, MAX_LINK_HOPS
+from ntfslink.internals import SimulatedBackend, LatencyModel
+from tests import SimulatedBackendTestCase
+
+class ResolverTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		return SimulatedBackend(latency = LatencyModel())
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		for dirpath in (u'C:\\real', u'C:\\real\\lib', u'C:\\b', u'C:\\b\\deps', u'C:\\other'):
+			self.backend.CreateDirectory(dirpath)
+		for i in range(5):
+			self.backend.open(u'C:\\real\\lib\\f%d.h' % i, 'wb').close()
+		# C:\d\zlib goes through two junctions, the second one inside the target of the first.
+		junctions.create(u'C:\\real', u'C:\\b\\deps\\zlib')
+		junctions.create(u'C:\\b\\deps', u'C:\\d')
+		self.resolver = Resolver()
+		self.backend.latency.reset()
+
+	def node(self, fpath):
+		""" The trie node of fpath, or None if it isn't there. """
+		normcase = self.backend.path.normcase
+		root, parts = self.resolver._split(fpath)
+		node = self.resolver._root.children.get(normcase(root))
+		for part in parts:
+			if node is None:
+				break
+			node = node.children.get(normcase(part))
+		return node
+
+	def test_chained_junctions(self):
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\zlib\\lib\\f0.h'), u'C:\\real\\lib\\f0.h')
+		self.assertEqual(self.backend.latency.counts['DeviceIoControl'], 2)
+		self.backend.latency.reset()
+		paths = [u'C:\\d\\zlib\\lib\\f%d.h' % i for i in range(5)] + [u'C:\\b\\deps\\zlib\\lib\\f1.h']
+		self.assertEqual(self.resolver.resolve_many(paths),
+			[u'C:\\real\\lib\\f%d.h' % i for i in range(5)] + [u'C:\\real\\lib\\f1.h'])
+		# Everything but the files themselves came from the trie.
+		self.assertEqual(dict(self.backend.latency.counts), {'GetFileAttributes': len(paths)})
+		self.assertEqual(self.resolver.resolve(u'c:\\D\\ZLIB'), u'C:\\real')
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\zlib\\nope\\x'), u'C:\\real\\nope\\x')
+
+	def test_files_stay_out_of_the_trie(self):
+		self.resolver.resolve_many([u'C:\\d\\zlib\\lib\\f%d.h' % i for i in range(5)] + [u'C:\\other'])
+		self.assertEqual(self.node(u'C:\\real\\lib').children, {})
+		self.assertIsNone(self.node(u'C:\\other'))
+		self.assertIsNone(self.node(u'C:\\d\\zlib\\nope'))
+		# Links are kept, and so are the directories a path went through.
+		self.assertEqual(self.node(u'C:\\d').target, u'C:\\b\\deps')
+		self.assertEqual(self.node(u'C:\\b\\deps\\zlib').target, u'C:\\real')
+		self.assertIs(self.node(u'C:\\real').target, False)
+
+	def test_relative_symlinks(self):
+		symlinks.create(u'..\\real\\lib', u'C:\\other\\rel')
+		symlinks.create(u'rel\\f2.h', u'C:\\other\\file')
+		self.assertEqual(self.resolver.resolve(u'C:\\other\\rel\\f2.h'), u'C:\\real\\lib\\f2.h')
+		self.assertEqual(self.resolver.resolve(u'C:\\other\\file'), u'C:\\real\\lib\\f2.h')
+		# Relative to where the link is, not to wherever the path that led there came from.
+		junctions.create(u'C:\\other', u'C:\\b\\o')
+		self.assertEqual(self.resolver.resolve(u'C:\\b\\o\\rel\\f3.h'), u'C:\\real\\lib\\f3.h')
+
+	def test_loops(self):
+		# Going through the same junction over and over isn't a loop, until it runs out of hops.
+		self.backend.CreateDirectory(u'C:\\loop')
+		junctions.create(u'C:\\loop', u'C:\\loop\\self')
+		self.assertEqual(self.resolver.resolve(u'C:\\loop\\self\\self\\x'), u'C:\\loop\\x')
+		self.assertRaises(LinkLoopException, self.resolver.resolve, u'C:\\loop' + u'\\self' * (MAX_LINK_HOPS + 1))
+		# Links that lead to each other are.
+		for dirpath in (u'C:\\p', u'C:\\q'):
+			self.backend.CreateDirectory(dirpath)
+		self.backend.CreateSymbolicLink(u'C:\\p\\a', u'C:\\q\\b', 0)
+		self.backend.CreateSymbolicLink(u'C:\\q\\b', u'C:\\p\\a', 0)
+		self.assertRaises(LinkLoopException, self.resolver.resolve, u'C:\\p\\a\\x')
+		self.assertRaises(LinkLoopException, self.resolver.resolve, u'C:\\q\\b')
+		# Neither leaves anything behind that gets in the way of resolving the rest.
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\zlib'), u'C:\\real')
+
+	def test_hop_limit(self):
+		# C:\h0 -> C:\h1 -> ... -> C:\h4 -> C:\real
+		junctions.create(u'C:\\real', u'C:\\h4')
+		for i in range(3, -1, -1):
+			junctions.create(u'C:\\h%d' % (i + 1), u'C:\\h%d' % i)
+		self.assertEqual(Resolver(max_hops = 5).resolve(u'C:\\h0\\lib'), u'C:\\real\\lib')
+		self.assertRaises(LinkLoopException, Resolver(max_hops = 4).resolve, u'C:\\h0\\lib')
+		# The hops are counted for the whole path, however they're split between its components: 3 to get to C:\real,
+		# then 3 more through up, C:\d and C:\b\deps\zlib.
+		junctions.create(u'C:\\d', u'C:\\real\\lib\\up')
+		self.assertEqual(Resolver(max_hops = 6).resolve(u'C:\\h2\\lib\\up\\zlib'), u'C:\\real')
+		self.assertRaises(LinkLoopException, Resolver(max_hops = 5).resolve, u'C:\\h2\\lib\\up\\zlib')
+
+	def test_invalidate(self):
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\zlib\\lib'), u'C:\\real\\lib')
+		junctions.unlink(u'C:\\b\\deps\\zlib')
+		junctions.create(u'C:\\other', u'C:\\b\\deps\\zlib')
+		# Nothing's told it yet.
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\zlib\\lib'), u'C:\\real\\lib')
+		self.resolver.invalidate(u'C:\\b\\deps\\zlib')
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\zlib\\lib'), u'C:\\other\\lib')
+		# Retargeting the first junction: C:\d was resolved through, so it's the one to invalidate.
+		junctions.unlink(u'C:\\d')
+		junctions.create(u'C:\\real', u'C:\\d')
+		self.resolver.invalidate(u'C:\\d')
+		self.assertEqual(self.resolver.resolve(u'C:\\d\\lib\\f1.h'), u'C:\\real\\lib\\f1.h')
+		self.resolver.invalidate()
+		self.assertEqual(self.resolver._root.children, {})
+
+if __name__ == '__main__':
+	unittest.main()
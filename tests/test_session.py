@@ -0,0 +1,84 @@
+# encoding: utf-8
+"""
+test_session.py
+Tests for LinkSession, counting the calls it makes on a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import unittest
+from ntfslink import junctions, symlinks, LinkSession
+from ntfslink.internals import SimulatedBackend, LatencyModel, PathExists
+from tests import SimulatedBackendTestCase
+
+LINKS = 20
+
+class LinkSessionTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		self.latency = LatencyModel(sleep = None)
+		return SimulatedBackend(latency = self.latency)
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		for dirpath in (u'C:\\work', u'C:\\work\\src', u'C:\\work\\links'):
+			self.backend.CreateDirectory(dirpath)
+		for i in range(LINKS):
+			junctions.create(u'C:\\work\\src', self.link(i))
+
+	def link(self, i):
+		return u'C:\\work\\links\\j%d' % i
+
+	def remove_all(self, session):
+		""" check -> read -> unlink every junction, returning the backend calls that took. """
+		self.latency.reset()
+		for i in range(LINKS):
+			self.assertTrue(junctions.check(self.link(i), session))
+			self.assertEqual(junctions.read(self.link(i), session), u'C:\\work\\src')
+			# Whichever way it goes, it's (True, bytes returned) like every other unlink, not a ctypes DWORD.
+			self.assertEqual(junctions.unlink(self.link(i), session), (True, 0))
+		counts = dict(self.latency.counts)
+		for i in range(LINKS):
+			self.assertFalse(PathExists(self.link(i)))
+		return counts
+
+	def test_call_counts(self):
+		self.assertEqual(self.remove_all(None), {
+			'GetFileAttributes': 5 * LINKS,
+			'CreateFile': 2 * LINKS,
+			'DeviceIoControl': 2 * LINKS,
+			'CloseHandle': 2 * LINKS,
+			'RemoveDirectory': LINKS,
+		})
+		for i in range(LINKS):
+			junctions.create(u'C:\\work\\src', self.link(i))
+		with LinkSession() as session:
+			counts = self.remove_all(session)
+		# The links directory is opened once, and each link once to read and once to remove. Attributes come from the
+		# open handle, once per link. (12 calls a link without a session, 8 and change with one.)
+		self.assertEqual(counts, {
+			'GetFileInformationByHandle': LINKS,
+			'CreateFile': 2 * LINKS + 1,
+			'DeviceIoControl': 2 * LINKS,
+			'CloseHandle': 2 * LINKS,
+			'RemoveDirectory': LINKS,
+		})
+		self.assertEqual(self.backend._handles, {})
+
+	def test_max_directories(self):
+		self.backend.CreateDirectory(u'C:\\other')
+		symlinks.create(u'C:\\work\\src', u'C:\\other\\s')
+		with LinkSession(max_directories = 1) as session:
+			self.latency.reset()
+			for fpath in (self.link(0), u'C:\\other\\s', self.link(1), u'C:\\other\\s'):
+				session.attributes(fpath)
+			# Every call changes directory, so each one has to open its directory again.
+			self.assertEqual(self.latency.counts['CreateFile'], 8)
+			self.assertEqual(len(session._directories), 1)
+		self.assertEqual(self.backend._handles, {})
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,97 @@
+# encoding: utf-8
+"""
+test_speedups.py
+Runs the reparse buffer decoders, encoders and tag classifier through both the C accelerator and the pure-Python
+versions in _reparse, and checks they agree. Skipped when the accelerator isn't built.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import struct, unittest
+from array import array
+from ntfslink.internals import _reparse
+from ntfslink.internals._reparse import *
+from ntfslink.internals._winioctl import *
+
+# Values that are too wide (or negative) to be a reparse tag, some of which look like one in their low 32 bits.
+WIDE_TAGS = [
+	1 << 32, (1 << 32) | IO_REPARSE_TAG_MOUNT_POINT, (1 << 40) | IO_REPARSE_TAG_SYMBOLIC_LINK,
+	(1 << 64) | IO_REPARSE_TAG_SYMBOLIC_LINK, (1 << 64) | IO_REPARSE_TAG_LX_SYMLINK, -1, -IO_REPARSE_TAG_MOUNT_POINT,
+]
+
+TAGS = [0, IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK, IO_REPARSE_TAG_LX_SYMLINK, IO_REPARSE_TAG_WOF,
+        IO_REPARSE_TAG_CLOUD, 0xFFFFFFFF]
+
+@unittest.skipIf(_reparse._speedups is None, 'the C accelerator is not built')
+class SpeedupsParityTest(unittest.TestCase):
+
+	def tearDown(self):
+		_reparse.UseSpeedups(True)
+
+	def outcome(self, func, *args):
+		try:
+			return 'returned', func(*args)
+		except InvalidReparseBufferException as e:
+			return 'raised', str(e)
+
+	def assertParity(self, func, *args):
+		""" Checks func(*args) returns (or raises) the same thing both ways, and returns that. """
+		_reparse.UseSpeedups(False)
+		python = self.outcome(func, *args)
+		self.assertTrue(_reparse.UseSpeedups(True))
+		native = self.outcome(func, *args)
+		self.assertEqual(python, native, args)
+		return python
+
+	def test_decode(self):
+		buffers = [
+			bytes(EncodeMountPoint(u'\\??\\C:\\Target', u'C:\\Target')),
+			bytes(EncodeSymbolicLink(u'..\\x', u'..\\x', SYMBOLIC_LINK_FLAG_RELATIVE)),
+			bytes(EncodeGuidBuffer(0x00001234, b'\x01' * 16, b'data')),
+		]
+		for buf in buffers:
+			for end in range(len(buf) + 1):
+				self.assertParity(DecodeReparseBuffer, buf[:end])
+				self.assertParity(DecodeReparsePoint, buf[:end])
+		self.assertEqual(self.assertParity(DecodeReparseBuffer, buffers[1]),
+			('returned', ReparseData(IO_REPARSE_TAG_SYMBOLIC_LINK, SYMBOLIC_LINK_FLAG_RELATIVE, u'..\\x', u'..\\x')))
+
+	def test_decode_link_wide_tags(self):
+		data = memoryview(EncodeSymbolicLink(u'x', u'y', 1))[REPARSE_POINT_HEADER_SIZE:]
+		for tag in TAGS + WIDE_TAGS:
+			result = self.assertParity(lambda tag: _reparse._decode_link(tag, None, data), tag)
+			self.assertEqual(result[1].tag, tag)
+
+	def test_encode(self):
+		for tag in TAGS + WIDE_TAGS:
+			result = self.assertParity(lambda tag: bytes(EncodeReparseBuffer(ReparseData(tag, 0, u'x', u'y'))), tag)
+			if tag not in (IO_REPARSE_TAG_MOUNT_POINT, IO_REPARSE_TAG_SYMBOLIC_LINK):
+				self.assertEqual(result[0], 'raised')
+		self.assertParity(EncodeReparseBuffer, ReparseData(IO_REPARSE_TAG_MOUNT_POINT, 0, u'x' * MAX_REPARSE_BUFFER, u''))
+
+	def test_encode_into_wide_tags(self):
+		# EncodeReparseBuffer sizes the buffer (and so checks the tag) before _encode_into ever sees it.
+		subst, prnt = u'x'.encode('utf-16-le'), u'y'.encode('utf-16-le')
+		for tag in WIDE_TAGS:
+			result = self.assertParity(lambda tag: _reparse._encode_into(bytearray(64), 0, tag, 0, subst, prnt), tag)
+			self.assertEqual(result, ('raised', 'Unsupported reparse tag: 0x%08X' % tag))
+
+	def test_classify(self):
+		tags = TAGS + [tag & 0xFFFFFFFF for tag in WIDE_TAGS]
+		expected = self.assertParity(ClassifyReparseTags, tags)[1]
+		for typecode in 'ILQ':
+			self.assertEqual(self.assertParity(ClassifyReparseTags, array(typecode, tags))[1], expected)
+
+	def test_classify_wide_tags(self):
+		kinds = self.assertParity(ClassifyReparseTags, WIDE_TAGS)[1]
+		self.assertEqual(list(kinds), [REPARSE_KIND_OTHER] * len(WIDE_TAGS))
+		wide = [tag for tag in WIDE_TAGS if 0 <= tag < 1 << 64]
+		if struct.calcsize('Q') == 8:
+			kinds = self.assertParity(ClassifyReparseTags, array('Q', wide))[1]
+			self.assertEqual(list(kinds), [REPARSE_KIND_OTHER] * len(wide))
+
+if __name__ == '__main__':
+	unittest.main()
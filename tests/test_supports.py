@@ -0,0 +1,78 @@
+# encoding: utf-8
+"""
+test_supports.py
+Tests for the volume capability cache in supports, against a SimulatedBackend.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import os, unittest
+from ntfslink import supports
+from ntfslink.internals import SetBackend, SimulatedBackend, PosixBackend
+from tests import SimulatedBackendTestCase
+
+class MountedBackend(SimulatedBackend):
+	""" A SimulatedBackend with a FAT32 volume mounted on C:\\mnt. probes counts GetVolumeInformation calls. """
+	probes = 0
+
+	def GetVolumePathName(self, filename):
+		fullpath = self.GetFullPathName(filename)
+		if fullpath.upper() == u'C:\\MNT' or fullpath.upper().startswith(u'C:\\MNT\\'):
+			return u'C:\\mnt\\'
+		return SimulatedBackend.GetVolumePathName(self, filename)
+
+	def GetVolumeInformation(self, rootpath):
+		self.probes += 1
+		if rootpath.upper() == u'C:\\MNT\\':
+			return u'FAT32', 0, 0x2222
+		return SimulatedBackend.GetVolumeInformation(self, rootpath)
+
+class SupportsTest(SimulatedBackendTestCase):
+
+	def make_backend(self):
+		return MountedBackend()
+
+	def setUp(self):
+		SimulatedBackendTestCase.setUp(self)
+		self.backend.CreateDirectory(u'C:\\mnt')
+		with self.backend.open(u'C:\\file', 'wb'):
+			pass
+		with self.backend.open(u'C:\\mnt\\file', 'wb'):
+			pass
+
+	def test_mounted_folder(self):
+		# The folder itself first: it mustn't get cached as C:\'s volume, which the file next to it is on.
+		for fpath, filesystem in ((u'C:\\mnt', u'FAT32'), (u'C:\\file', u'NTFS'), (u'C:\\mnt', u'FAT32'),
+		                          (u'C:\\mnt\\file', u'FAT32'), (u'C:\\', u'NTFS')):
+			self.assertEqual(supports.volume_capabilities(fpath).filesystem, filesystem, fpath)
+		self.assertTrue(supports.path_supports_hardlinks(u'C:\\file'))
+		self.assertFalse(supports.path_supports_hardlinks(u'C:\\mnt\\file'))
+
+	def test_refresh(self):
+		supports.volume_capabilities(u'C:\\file')
+		supports.volume_capabilities(u'C:\\mnt')
+		self.assertEqual(self.backend.probes, 2)
+		supports.refresh(u'C:\\mnt')
+		self.assertEqual(supports.volume_capabilities(u'C:\\file').filesystem, u'NTFS')
+		self.assertEqual(self.backend.probes, 2)
+		self.assertEqual(supports.volume_capabilities(u'C:\\mnt').filesystem, u'FAT32')
+		self.assertEqual(self.backend.probes, 3)
+
+	def test_supports_hardlinks(self):
+		self.assertTrue(supports.supports_hardlinks())
+		SetBackend(SimulatedBackend(version = (4, 0)))
+		self.assertFalse(supports.supports_hardlinks())
+
+	@unittest.skipUnless(os.name == 'posix' and os.path.ismount('/dev/shm'), 'needs /dev/shm mounted on /dev')
+	def test_posix_mount_point(self):
+		SetBackend(PosixBackend())
+		shm = supports.volume_capabilities('/dev/shm')
+		dev = supports.volume_capabilities('/dev/null')
+		self.assertEqual(shm.root, '/dev/shm')
+		self.assertNotEqual(dev.root, '/dev/shm')
+
+if __name__ == '__main__':
+	unittest.main()
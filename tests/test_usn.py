@@ -0,0 +1,133 @@
+# encoding: utf-8
+"""
+test_usn.py
+Tests for the USN journal parser, against synthesized $UsnJrnl:$J streams.
+
+This program is free software. It comes without any warranty, to
+the extent permitted by applicable law. You can redistribute it
+and/or modify it under the terms of the Do What The Fuck You Want
+To Public License, Version 2, as published by Sam Hocevar. See
+http://sam.zoy.org/wtfpl/COPYING for more details.
+"""
+import io, struct, itertools, unittest
+from ntfslink.internals import *
+
+def usn_record(version, usn, reason, name, reference = 0x1000000000020, parent = 0x1000000000010):
+	""" A USN_RECORD_V2 or V3 (or a V4 header, with nothing after it) for name, padded out to 8 bytes. """
+	encoded = name.encode('utf-16-le')
+	if version == 2:
+		fixed = struct.pack('<QQqqLLLLHH', reference, parent, usn, 1, reason, 0, 0, 0x20, len(encoded), 60)
+	elif version == 3:
+		fixed = struct.pack('<QQQQqqLLLLHH', reference & (2 ** 64 - 1), reference >> 64, parent & (2 ** 64 - 1),
+			parent >> 64, usn, 1, reason, 0, 0, 0x20, len(encoded), 76)
+	else:
+		fixed, encoded = b'\0' * 32, b''
+	length = (8 + len(fixed) + len(encoded) + 7) & ~7
+	return (struct.pack('<LHH', length, version, 0) + fixed + encoded).ljust(length, b'\0')
+
+def journal(entries, start = 0):
+	"""
+	Lays (version, reason, name) entries out the way $J has them, starting at USN start: a record that doesn't fit in
+	what's left of a page goes at the start of the next one. Returns the stream and the (usn, reason, name, version) of
+	each record.
+	"""
+	stream, expected = bytearray(), []
+	for version, reason, name in entries:
+		usn = start + len(stream)
+		record = usn_record(version, usn, reason, name)
+		if usn // USN_PAGE_SIZE != (usn + len(record) - 1) // USN_PAGE_SIZE:
+			stream += b'\0' * (USN_PAGE_SIZE - usn % USN_PAGE_SIZE)
+			usn = start + len(stream)
+			record = usn_record(version, usn, reason, name)
+		stream += record
+		expected.append((usn, reason, name, version))
+	return bytes(stream), expected
+
+# Long names, so that a page only fits a few records and most of them end in padding.
+ENTRIES = [
+	(2 + i % 2, (USN_REASON_DATA_EXTEND, USN_REASON_FILE_CREATE, USN_REASON_REPARSE_POINT_CHANGE | USN_REASON_CLOSE,
+		USN_REASON_BASIC_INFO_CHANGE, USN_REASON_RENAME_NEW_NAME)[i % 5], u'%03d' % i + u'x' * (i * 37 % 250))
+	for i in range(60)
+]
+
+def summary(records):
+	return [(record.usn, record.reason, record.name, record.version) for record in records]
+
+class UnseekableStream(object):
+	""" Only has read, like a pipe. """
+
+	def __init__(self, data):
+		self.stream = io.BytesIO(data)
+
+	def read(self, size):
+		return self.stream.read(size)
+
+class UsnReaderTest(unittest.TestCase):
+
+	def setUp(self):
+		self.stream, self.expected = journal(ENTRIES)
+
+	def test_decode_versions(self):
+		for version, reference, parent in ((2, 0x20, 0x10), (3, (7 << 64) | 0x20, (9 << 64) | 0x10)):
+			buf = b'\0' * 8 + usn_record(version, 0x2468, USN_REASON_HARD_LINK_CHANGE, u'n\xe4me', reference, parent)
+			self.assertEqual(DecodeUsnRecord(buf, 8),
+				UsnRecord(0x2468, 1, USN_REASON_HARD_LINK_CHANGE, reference, parent, 0x20, u'n\xe4me', 0, 0, version))
+		self.assertIsNone(DecodeUsnRecord(usn_record(4, 0, 0, u'')))
+
+	def test_page_padding(self):
+		self.assertGreater(len(self.stream), 4 * USN_PAGE_SIZE)
+		self.assertGreater(sum(usn % USN_PAGE_SIZE == 0 for usn, _, _, _ in self.expected[1:]), 3)
+		for chunk_size in (8, 333, USN_PAGE_SIZE, USN_READ_CHUNK):
+			reader = ReadUsnJournal(io.BytesIO(self.stream), reasons = None, chunk_size = chunk_size)
+			self.assertEqual(summary(reader), self.expected)
+			self.assertEqual(reader.next_usn, len(self.stream))
+
+	def test_skipped_versions(self):
+		stream = usn_record(2, 0, USN_REASON_FILE_CREATE, u'a') + usn_record(4, 0, 0, u'') + \
+			usn_record(3, 0x68, USN_REASON_FILE_DELETE, u'b')
+		self.assertEqual([record.name for record in ReadUsnJournal(io.BytesIO(stream))], [u'a', u'b'])
+
+	def test_bad_length(self):
+		stream = usn_record(2, 0, USN_REASON_FILE_CREATE, u'a') + struct.pack('<LHH', 12, 2, 0)
+		reader = iter(ReadUsnJournal(io.BytesIO(stream.ljust(64, b'\0'))))
+		self.assertEqual(next(reader).name, u'a')
+		self.assertRaises(InvalidUsnRecordException, next, reader)
+
+	def test_reasons(self):
+		reader = ReadUsnJournal(io.BytesIO(self.stream))
+		self.assertEqual(summary(reader), [entry for entry in self.expected if entry[1] & USN_REASON_LINK_CHANGES])
+		# The records that were filtered out still move the cursor along.
+		self.assertEqual(reader.next_usn, len(self.stream))
+		reader = ReadUsnJournal(io.BytesIO(self.stream), reasons = USN_REASON_BASIC_INFO_CHANGE | USN_REASON_CLOSE)
+		self.assertEqual([entry[1] for entry in summary(reader)], [USN_REASON_REPARSE_POINT_CHANGE | USN_REASON_CLOSE,
+			USN_REASON_BASIC_INFO_CHANGE] * 12)
+
+	def test_resume(self):
+		for reasons in (None, USN_REASON_LINK_CHANGES):
+			wanted = [entry for entry in self.expected if reasons is None or entry[1] & reasons]
+			for taken in (0, 1, 7, 20, len(wanted)):
+				for make in (io.BytesIO, UnseekableStream):
+					reader = ReadUsnJournal(make(self.stream), reasons = reasons, chunk_size = 1000)
+					first = summary(itertools.islice(reader, taken))
+					rest = summary(ReadUsnJournal(make(self.stream), reader.next_usn, reasons, chunk_size = 1000))
+					self.assertEqual(first + rest, wanted)
+
+	def test_resume_as_the_journal_grows(self):
+		half = len(ENTRIES) // 2
+		stream, _ = journal(ENTRIES[:half])
+		reader = ReadUsnJournal(io.BytesIO(stream), reasons = None)
+		first = summary(reader)
+		self.assertEqual(first, self.expected[:half])
+		self.assertEqual(reader.next_usn, len(stream))
+		grown, _ = journal(ENTRIES[half:], len(stream))
+		reader = ReadUsnJournal(io.BytesIO(stream + grown), reader.next_usn, None)
+		self.assertEqual(first + summary(reader), self.expected)
+
+	def test_gap(self):
+		# Like the sparse start of $J: the stream picks up again at a later USN, and the reader goes on from there.
+		later, expected = journal(ENTRIES[:5], 3 * USN_PAGE_SIZE)
+		reader = UsnReader([(0, self.stream[:200]), (3 * USN_PAGE_SIZE, later)], reasons = None)
+		self.assertEqual(summary(reader), self.expected[:1] + expected)
+
+if __name__ == '__main__':
+	unittest.main()